@@ -0,0 +1,156 @@
+import hashlib
+import json
+import marshal
+import os
+import sys
+
+# ASTキャッシュの保存先と上限サイズ
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "rust-runner-py", "ast")
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# 文法やトークン定義が変わったらキャッシュを無効にするため、これらのファイルの内容をキーに含める
+GRAMMAR_FILES = ("parser.py", "lex.py", "fastlex.py")
+
+ENTRY_SUFFIX = ".ast"
+STATS_FILE = "stats.json"
+
+_grammar_digest = None
+
+
+def grammar_digest():
+    """文法とトークン定義のファイルの内容からハッシュを計算"""
+    global _grammar_digest
+    if _grammar_digest is None:
+        digest = hashlib.sha256()
+        base_dir = os.path.dirname(os.path.abspath(__file__))
+        for name in GRAMMAR_FILES:
+            with open(os.path.join(base_dir, name), 'rb') as f:
+                digest.update(f.read())
+        _grammar_digest = digest.hexdigest()
+    return _grammar_digest
+
+
+class ASTCache:
+    """ソースの内容ハッシュをキーにしたパース結果のディスクキャッシュ（LRUで容量制限）"""
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, source):
+        """ソース、文法、Pythonのバージョン（marshal形式）からキーを作る"""
+        digest = hashlib.sha256()
+        digest.update(grammar_digest().encode())
+        digest.update(sys.version.encode())
+        digest.update(source.encode('utf-8'))
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key + ENTRY_SUFFIX)
+
+    def get(self, source):
+        """キャッシュ済みのASTを返す（なければNone）"""
+        path = self.path(self.key(source))
+        try:
+            with open(path, 'rb') as f:
+                ast = marshal.load(f)
+        except (OSError, EOFError, ValueError, TypeError):
+            self.misses += 1
+            return None
+        # 参照時刻を更新してLRUの順序に反映
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return ast
+
+    def put(self, source, ast):
+        """ASTを保存し、上限を超えたら古いものから削除"""
+        if ast is None:
+            return
+        try:
+            data = marshal.dumps(ast)
+        except ValueError:
+            return  # marshalできない値を含むASTはキャッシュしない
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self.path(self.key(source))
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)  # 書き込み途中のファイルを読まないように置き換える
+        self.evict()
+
+    def entries(self):
+        """(最終参照時刻, サイズ, パス) のリスト"""
+        result = []
+        try:
+            names = os.listdir(self.cache_dir)
+        except OSError:
+            return result
+        for name in names:
+            if not name.endswith(ENTRY_SUFFIX):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            result.append((st.st_mtime, st.st_size, path))
+        return result
+
+    def evict(self):
+        """合計サイズが上限を超えた分を最終参照の古い順に削除"""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_bytes:
+            return
+        for _, size, path in sorted(entries):
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def clear(self):
+        for _, _, path in self.entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def load_stats(self):
+        """これまでの実行で累積したヒット/ミス数"""
+        try:
+            with open(os.path.join(self.cache_dir, STATS_FILE), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"hits": 0, "misses": 0}
+
+    def save_stats(self):
+        """この実行のヒット/ミス数を累積統計に加算"""
+        if not self.hits and not self.misses:
+            return
+        stats = self.load_stats()
+        stats["hits"] = stats.get("hits", 0) + self.hits
+        stats["misses"] = stats.get("misses", 0) + self.misses
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(os.path.join(self.cache_dir, STATS_FILE), 'w') as f:
+            json.dump(stats, f)
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        """累積のヒット/ミス数とキャッシュの使用量"""
+        stats = self.load_stats()
+        stats["hits"] = stats.get("hits", 0) + self.hits
+        stats["misses"] = stats.get("misses", 0) + self.misses
+        entries = self.entries()
+        stats["entries"] = len(entries)
+        stats["bytes"] = sum(size for _, size, _ in entries)
+        stats["max_bytes"] = self.max_bytes
+        return stats
@@ -0,0 +1,603 @@
+"""`__slots__` を使ったASTノードクラスと、タプル形式のASTとの相互変換
+
+    from astnodes import to_nodes, to_tuples
+    ast = to_nodes(parse_rust_code(source))
+
+タプル形式 ('let', 名前, 値) は要素ごとにタプルのスロットを持ち、評価のたびに先頭の文字列を比べる。
+ノードクラスは種類を整数のクラス属性 kind に持ち、インスタンスには名前付きのフィールドだけを置く。
+タプル形式のASTは位置を持たないので、ノードにも開始行は持たせない。
+識別子は sys.intern で共有する。タプル形式のキャッシュ（ast_cache）やVMのコンパイラとは to_tuples で行き来できる。
+
+シミュレーターが評価するノードだけをクラスにし、それ以外の種類（パーサーの 'function_call' など）は
+Other ノードとして元の要素をそのまま持つ。async_runtime がタプル形式で評価する 'join'、'spawn'、'sleep' も
+Other のまま（評価は to_tuple で戻して行う）。
+"""
+import sys
+
+# ノードの種類（Node.kind）
+(FUNCTION, CALL, LET, BINARY_OP, IF, LOOP, BREAK, IDENTIFIER, NUMBER, RETURN, MOVE,
+ FOR, RANGE, ASYNC, MATCH, STRUCT, RESULT, GENERIC_FUNCTION, CONST, INVARIANT, INVARIANT_SCOPE,
+ FIELD_ACCESS, CAST, INDEX, METHOD_CALL, VEC, VEC_REPEAT, CLOSURE, MATCH_GUARD, ASYNC_FUNCTION, AWAIT,
+ OTHER) = range(32)
+
+intern = sys.intern
+
+
+def intern_name(value):
+    return intern(value) if type(value) is str else value
+
+
+class Node:
+    """ASTノードの基底クラス"""
+    __slots__ = ()
+    kind = OTHER
+    tag = None  # タプル形式での先頭の文字列
+    fields = ()  # タプル形式での2番目以降の要素の並び
+
+    def to_tuple(self):
+        return (self.tag,) + tuple(to_tuples(getattr(self, name)) for name in self.fields)
+
+    def __eq__(self, other):
+        return (type(self) is type(other)
+                and all(getattr(self, name) == getattr(other, name) for name in self.fields))
+
+    __hash__ = None  # タプル形式と違い値として比べるだけで、辞書のキーにはしない
+
+    def __repr__(self):
+        args = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.fields)
+        return f"{type(self).__name__}({args})"
+
+
+class Function(Node):
+    __slots__ = ('name', 'params', 'return_type', 'body')
+    kind = FUNCTION
+    tag = 'function'
+    fields = __slots__
+
+    def __init__(self, name, params, return_type, body):
+        self.name = intern_name(name)
+        self.params = params
+        self.return_type = return_type
+        self.body = body  # 文のリスト、または遅延させたボディ（toplevel.LAZY_BODY のタプル）
+
+
+class Call(Node):
+    __slots__ = ('name', 'args')
+    kind = CALL
+    tag = 'call'
+    fields = __slots__
+
+    def __init__(self, name, args):
+        self.name = intern_name(name)
+        self.args = args
+
+
+class Let(Node):
+    __slots__ = ('name', 'value')
+    kind = LET
+    tag = 'let'
+    fields = __slots__
+
+    def __init__(self, name, value):
+        self.name = intern_name(name)
+        self.value = value
+
+
+class BinaryOp(Node):
+    __slots__ = ('left', 'op', 'right')
+    kind = BINARY_OP
+    tag = 'binary_op'
+    fields = __slots__
+
+    def __init__(self, left, op, right):
+        self.left = left
+        self.op = intern_name(op)
+        self.right = right
+
+
+class If(Node):
+    __slots__ = ('condition', 'then', 'orelse')
+    kind = IF
+    tag = 'if'
+    fields = __slots__
+
+    def __init__(self, condition, then, orelse=None):
+        self.condition = condition
+        self.then = then
+        self.orelse = orelse
+
+
+class Loop(Node):
+    __slots__ = ('body',)
+    kind = LOOP
+    tag = 'loop'
+    fields = __slots__
+
+    def __init__(self, body):
+        self.body = body
+
+
+class Break(Node):
+    __slots__ = ('label',)
+    kind = BREAK
+    tag = 'break'
+    fields = __slots__
+
+    def __init__(self, label=None):
+        self.label = intern_name(label)
+
+    def to_tuple(self):
+        return ('break',) if self.label is None else ('break', self.label)
+
+
+class Identifier(Node):
+    __slots__ = ('name',)
+    kind = IDENTIFIER
+    tag = 'identifier'
+    fields = __slots__
+
+    def __init__(self, name):
+        self.name = intern_name(name)
+
+
+class Number(Node):
+    __slots__ = ('value',)
+    kind = NUMBER
+    tag = 'number'
+    fields = __slots__
+
+    def __init__(self, value):
+        self.value = value
+
+
+class Return(Node):
+    __slots__ = ('value',)
+    kind = RETURN
+    tag = 'return'
+    fields = __slots__
+
+    def __init__(self, value):
+        self.value = value
+
+
+class Move(Node):
+    __slots__ = ('name',)
+    kind = MOVE
+    tag = 'move'
+    fields = __slots__
+
+    def __init__(self, name):
+        self.name = intern_name(name)
+
+
+class For(Node):
+    __slots__ = ('name', 'iterable', 'body')
+    kind = FOR
+    tag = 'for'
+    fields = __slots__
+
+    def __init__(self, name, iterable, body):
+        self.name = intern_name(name)
+        self.iterable = iterable
+        self.body = body
+
+
+class Range(Node):
+    __slots__ = ('start', 'end')
+    kind = RANGE
+    tag = 'range'
+    fields = __slots__
+
+    def __init__(self, start, end):
+        self.start = start
+        self.end = end
+
+
+class Async(Node):
+    __slots__ = ('body',)
+    kind = ASYNC
+    tag = 'async'
+    fields = __slots__
+
+    def __init__(self, body):
+        self.body = body
+
+
+class Match(Node):
+    __slots__ = ('subject', 'arms')
+    kind = MATCH
+    tag = 'match'
+    fields = __slots__
+
+    def __init__(self, subject, arms):
+        self.subject = subject
+        self.arms = arms  # [(パターン, [ガード,] ボディ)]（パターンは値としてそのまま比べる）
+
+    def to_tuple(self):
+        return ('match', to_tuples(self.subject), [arm_to_tuple(arm) for arm in self.arms])
+
+
+class Struct(Node):
+    __slots__ = ('name', 'fields_')
+    kind = STRUCT
+    tag = 'struct'
+    fields = __slots__
+
+    def __init__(self, name, fields):
+        self.name = intern_name(name)
+        self.fields_ = fields  # フィールド名 -> 値のノード
+
+    def to_tuple(self):
+        return ('struct', self.name, {key: to_tuples(value) for key, value in self.fields_.items()})
+
+
+class FieldAccess(Node):
+    __slots__ = ('value', 'field')
+    kind = FIELD_ACCESS
+    tag = 'field_access'
+    fields = __slots__
+
+    def __init__(self, value, field):
+        self.value = value
+        self.field = intern_name(field)
+
+
+class Cast(Node):
+    __slots__ = ('value', 'type_name')
+    kind = CAST
+    tag = 'cast'
+    fields = __slots__
+
+    def __init__(self, value, type_name):
+        self.value = value
+        self.type_name = intern_name(type_name)
+
+
+class Index(Node):
+    __slots__ = ('value', 'index')
+    kind = INDEX
+    tag = 'index'
+    fields = __slots__
+
+    def __init__(self, value, index):
+        self.value = value
+        self.index = index
+
+
+class MethodCall(Node):
+    """メソッド呼び出し（引数のない 'method_chain' は args が None）"""
+    __slots__ = ('receiver', 'method', 'args')
+    kind = METHOD_CALL
+    fields = __slots__
+
+    def __init__(self, receiver, method, args):
+        self.receiver = receiver
+        self.method = intern_name(method)
+        self.args = args
+
+    @property
+    def tag(self):
+        return 'method_chain' if self.args is None else 'method_chain_with_params'
+
+    def to_tuple(self):
+        if self.args is None:
+            return ('method_chain', to_tuples(self.receiver), self.method)
+        return ('method_chain_with_params', to_tuples(self.receiver), self.method, to_tuples(self.args))
+
+
+class Result(Node):
+    __slots__ = ('variant', 'value')
+    kind = RESULT
+    tag = 'result'
+    fields = __slots__
+
+    def __init__(self, variant, value):
+        self.variant = intern_name(variant)  # 'Ok' または 'Err'
+        self.value = value
+
+
+class GenericFunction(Node):
+    __slots__ = ('name', 'generic_type')
+    kind = GENERIC_FUNCTION
+    tag = 'generic_function'
+    fields = __slots__
+
+    def __init__(self, name, generic_type):
+        self.name = intern_name(name)
+        self.generic_type = generic_type
+
+
+class Const(Node):
+    __slots__ = ('name', 'type_name', 'value')
+    kind = CONST
+    tag = 'const_declaration'
+    fields = __slots__
+
+    def __init__(self, name, type_name, value):
+        self.name = intern_name(name)
+        self.type_name = type_name
+        self.value = value  # ノード、またはパーサーの生のリテラル
+
+
+class Invariant(Node):
+    """最適化パスが巻き上げたループ不変式（optimizer.Optimizer.hoist）"""
+    __slots__ = ('index', 'value')
+    kind = INVARIANT
+    tag = 'invariant'
+    fields = __slots__
+
+    def __init__(self, index, value):
+        self.index = index
+        self.value = value
+
+
+class InvariantScope(Node):
+    __slots__ = ('count', 'loop')
+    kind = INVARIANT_SCOPE
+    tag = 'invariant_scope'
+    fields = __slots__
+
+    def __init__(self, count, loop):
+        self.count = count
+        self.loop = loop
+
+
+class Vec(Node):
+    __slots__ = ('elem_type', 'items')
+    kind = VEC
+    tag = 'vec'
+    fields = __slots__
+
+    def __init__(self, elem_type, items):
+        self.elem_type = intern_name(elem_type)
+        self.items = items
+
+
+class VecRepeat(Node):
+    __slots__ = ('elem_type', 'value', 'count')
+    kind = VEC_REPEAT
+    tag = 'vec_repeat'
+    fields = __slots__
+
+    def __init__(self, elem_type, value, count):
+        self.elem_type = intern_name(elem_type)
+        self.value = value
+        self.count = count
+
+
+class Closure(Node):
+    __slots__ = ('params', 'body')
+    kind = CLOSURE
+    tag = 'closure'
+    fields = __slots__
+
+    def __init__(self, params, body):
+        self.params = params
+        self.body = body  # 式のノード、または文のリスト
+
+
+class MatchGuard(Node):
+    __slots__ = ('subject', 'arms')
+    kind = MATCH_GUARD
+    tag = 'match_guard'
+    fields = __slots__
+
+    def __init__(self, subject, arms):
+        self.subject = subject
+        self.arms = arms  # (パターン, ガード, ボディ) か (パターン, ボディ) の腕1つ、またはそのリスト
+
+    def to_tuple(self):
+        arms = self.arms
+        if isinstance(arms, tuple):
+            return ('match_guard', to_tuples(self.subject), arm_to_tuple(arms))
+        return ('match_guard', to_tuples(self.subject), [arm_to_tuple(arm) for arm in arms])
+
+
+class AsyncFunction(Node):
+    __slots__ = ('name', 'params', 'return_type', 'body')
+    kind = ASYNC_FUNCTION
+    tag = 'async_function'
+    fields = __slots__
+
+    def __init__(self, name, params, return_type, body):
+        self.name = intern_name(name)
+        self.params = params
+        self.return_type = return_type
+        self.body = body
+
+
+class Await(Node):
+    __slots__ = ('value',)
+    kind = AWAIT
+    tag = 'await'
+    fields = __slots__
+
+    def __init__(self, value):
+        self.value = value
+
+
+class Other(Node):
+    """シミュレーターが評価しない種類のノード（評価するとNone）"""
+    __slots__ = ('tag', 'items')
+    fields = ('items',)
+
+    def __init__(self, tag, items):
+        self.tag = intern_name(tag)
+        self.items = items  # タプル形式の2番目以降の要素（変換せずに持つ）
+
+    def to_tuple(self):
+        return (self.tag,) + self.items
+
+    def __eq__(self, other):
+        return type(other) is Other and self.tag == other.tag and self.items == other.items
+
+    __hash__ = None
+
+
+def convert_list(items):
+    return [to_nodes(item) for item in items]
+
+
+def convert_block(body):
+    """文のリストか1つのノード（if の分岐など）を変換。遅延させたボディのタプルはそのまま"""
+    if isinstance(body, list):
+        return convert_list(body)
+    if isinstance(body, tuple) and body and body[0] == 'lazy_body':
+        return body
+    return to_nodes(body)
+
+
+def convert_arm(arm):
+    """match / match_guard の腕 (パターン, [ガード,] ボディ) のガードとボディを変換（パターンは値としてそのまま）"""
+    if isinstance(arm, tuple) and len(arm) == 3:
+        return (arm[0], to_nodes(arm[1]), convert_block(arm[2]))
+    if isinstance(arm, tuple) and len(arm) == 2:
+        return (arm[0], convert_block(arm[1]))
+    return arm
+
+
+def arm_to_tuple(arm):
+    if isinstance(arm, tuple):
+        return tuple(to_tuples(item) for item in arm)
+    return arm
+
+
+def convert_arms(arms):
+    """match_guard の腕（パーサーは腕1つのタプル、それ以外は腕のリスト）"""
+    if isinstance(arms, list):
+        return [convert_arm(arm) for arm in arms]
+    return convert_arm(arms)
+
+
+# タプルの先頭の文字列 -> (要素数, タプルからノードを作る関数)
+CONVERTERS = {
+    'function': (5, lambda t: Function(t[1], t[2], t[3], convert_block(t[4]))),
+    'call': (3, lambda t: Call(t[1], convert_list(t[2]))),
+    'let': (3, lambda t: Let(t[1], to_nodes(t[2]))),
+    'binary_op': (4, lambda t: BinaryOp(to_nodes(t[1]), t[2], to_nodes(t[3]))),
+    'if': ((3, 4), lambda t: If(to_nodes(t[1]), convert_block(t[2]), convert_block(t[3]) if len(t) > 3 else None)),
+    'loop': (2, lambda t: Loop(convert_block(t[1]))),
+    'break': ((1, 2), lambda t: Break(t[1] if len(t) > 1 else None)),
+    'identifier': (2, lambda t: Identifier(t[1])),
+    'number': (2, lambda t: Number(t[1])),
+    'return': (2, lambda t: Return(to_nodes(t[1]))),
+    'move': (2, lambda t: Move(t[1])),
+    'for': (4, lambda t: For(t[1], to_nodes(t[2]), convert_block(t[3]))),
+    'range': (3, lambda t: Range(to_nodes(t[1]), to_nodes(t[2]))),
+    'async': (2, lambda t: Async(convert_block(t[1]))),
+    'match': (3, lambda t: Match(to_nodes(t[1]), [convert_arm(arm) for arm in t[2]])),
+    # 構造体の宣言 ('struct', 名前, [(フィールド, 型)]) はインスタンス生成と同じ先頭の文字列なので Other にする
+    'struct': (3, lambda t: Struct(t[1], {key: to_nodes(value) for key, value in t[2].items()})
+               if isinstance(t[2], dict) else Other(t[0], t[1:])),
+    'field_access': (3, lambda t: FieldAccess(to_nodes(t[1]), t[2])),
+    'cast': (3, lambda t: Cast(to_nodes(t[1]), t[2])),
+    'index': (3, lambda t: Index(to_nodes(t[1]), to_nodes(t[2]))),
+    'method_chain': (3, lambda t: MethodCall(to_nodes(t[1]), t[2], None)),
+    'method_chain_with_params': (4, lambda t: MethodCall(to_nodes(t[1]), t[2], convert_list(t[3]))),
+    'result': (3, lambda t: Result(t[1], to_nodes(t[2]))),
+    'generic_function': (3, lambda t: GenericFunction(t[1], t[2])),
+    'const_declaration': (4, lambda t: Const(t[1], t[2], to_nodes(t[3]))),
+    'invariant': (3, lambda t: Invariant(t[1], to_nodes(t[2]))),
+    'invariant_scope': (3, lambda t: InvariantScope(t[1], to_nodes(t[2]))),
+    'vec': (3, lambda t: Vec(t[1], convert_list(t[2])) if isinstance(t[2], list) else Other(t[0], t[1:])),
+    'vec_repeat': (4, lambda t: VecRepeat(t[1], to_nodes(t[2]), to_nodes(t[3]))),
+    'closure': (3, lambda t: Closure(t[1], convert_block(t[2]))),
+    'match_guard': (3, lambda t: MatchGuard(to_nodes(t[1]), convert_arms(t[2]))),
+    'async_function': (5, lambda t: AsyncFunction(t[1], t[2], t[3], convert_block(t[4]))),
+    'await': (2, lambda t: Await(to_nodes(t[1]))),
+}
+
+
+def to_nodes(ast):
+    """タプル形式のAST（文のリストまたはノード）をノードクラスに変換
+
+    要素数が想定と違うタプルや未知の種類は Other にする。ノードでない値（パーサーが返す名前や数値）はそのまま。
+    """
+    if isinstance(ast, list):
+        return convert_list(ast)
+    if not isinstance(ast, tuple) or not ast or type(ast[0]) is not str:
+        return ast
+    converter = CONVERTERS.get(ast[0])
+    if converter is not None:
+        size, convert = converter
+        if len(ast) == size or (type(size) is tuple and len(ast) in size):
+            return convert(ast)
+    return Other(ast[0], ast[1:])
+
+
+def to_tuples(ast):
+    """ノードクラスのASTをタプル形式に戻す（ノードでない値はそのまま）"""
+    if isinstance(ast, Node):
+        return ast.to_tuple()
+    if isinstance(ast, list):
+        return [to_tuples(item) for item in ast]
+    return ast
+
+
+def count_nodes(ast):
+    """ノード（タプル形式では先頭が文字列のタプル）の数"""
+    if isinstance(ast, list):
+        return sum(count_nodes(item) for item in ast)
+    if isinstance(ast, Node):
+        return 1 + sum(count_nodes(value) for value in to_children(ast))
+    if isinstance(ast, tuple) and ast and type(ast[0]) is str:
+        return 1 + sum(count_nodes(value) for value in ast[1:])
+    if isinstance(ast, tuple):
+        return sum(count_nodes(value) for value in ast)
+    if isinstance(ast, dict):
+        return sum(count_nodes(value) for value in ast.values())
+    return 0
+
+
+def to_children(node):
+    """ノードのフィールドの値"""
+    if type(node) is Other:
+        return node.items
+    return [getattr(node, name) for name in node.fields]
+
+
+def main():
+    """ファイルをパースして、タプル形式とノードクラスのメモリ使用量と評価速度を比べる
+
+        python astnodes.py file.rs
+    """
+    import argparse
+    import io
+    import time
+    import tracemalloc
+    from contextlib import redirect_stdout
+
+    # python astnodes.py で実行したときも、シミュレーターと同じモジュールのノードクラスを使う
+    import astnodes
+    from main import parse_rust_code
+    from simulator import RustSimulator
+
+    parser = argparse.ArgumentParser(description="タプル形式とノードクラスのASTを比較")
+    parser.add_argument("rust_file")
+    parser.add_argument("--runs", type=int, default=5, help="評価の計測回数（最短の時間を使う）")
+    args = parser.parse_args()
+
+    with open(args.rust_file, 'r', encoding='utf-8') as f:
+        source = f.read()
+    parsed = parse_rust_code(source)
+
+    # パーサー内部の一時オブジェクトを除くため、AST自体の大きさは変換した複製で測る
+    for name, convert in (("tuple", lambda ast: astnodes.to_tuples(astnodes.to_nodes(ast))),
+                          ("node", astnodes.to_nodes)):
+        tracemalloc.start()
+        ast = convert(parsed)
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        count = astnodes.count_nodes(ast)
+        elapsed = None
+        for _ in range(args.runs):
+            with redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                RustSimulator().eval_ast(ast)
+                run = time.perf_counter() - start
+            elapsed = run if elapsed is None else min(elapsed, run)
+        print(f"{name:<5} {count} ノード {size / 1024:.1f}KB ({size / max(count, 1):.1f} バイト/ノード), "
+              f"評価 {elapsed * 1000:.2f}ms")
+
+if __name__ == "__main__":
+    main()
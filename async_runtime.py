@@ -0,0 +1,332 @@
+# 非同期処理のランタイム（シミュレーターごとに1つのイベントループを共有する）
+#
+# async ブロックと async fn の呼び出しは future（RustFuture）になり、.await / join / spawn で実行する。
+# 評価はコルーチンとして進み、.await（sleep や実行中のタスクの完了待ち）で中断して他のタスクに切り替わる。
+#   - ('async', ボディ)                       : async ブロック
+#   - ('async_function', 名前, 引数, 戻り値の型, ボディ): async fn の定義
+#   - ('await', 式)                           : future やタスクの完了を待つ
+#   - ('join', [式, ...])                     : 複数の future を並行に実行し、結果をリストで返す（join!）
+#   - ('spawn', 式)                           : future をタスクとして起動し、JoinHandle を返す（tokio::spawn）
+#   - ('sleep', ミリ秒の式)                    : 中断して待つ（tokio::time::sleep）
+# async ブロックや async fn の呼び出しは、イベントループの外（トップレベルの同期的なコード）でも future を返すだけで、
+# .await / join / spawn されるまで実行しない。let で変数に入れた future を join すれば、それらは並行に進む。
+# 中断しうるのは await / join / sleep を含むノードだけで、それ以外の部分はシミュレーターの通常の評価に任せる。
+import asyncio
+import weakref
+
+from astnodes import Node, to_tuples
+from simulator import RustResult, UNBOUND
+
+# 中断しうるノード
+AWAIT_NODES = ('await', 'join', 'sleep')
+
+
+class RustFuture:
+    """まだ開始していない async ブロックまたは async fn の呼び出し（1回だけ実行できる）"""
+
+    def __init__(self, start, name):
+        self.start_coroutine = start  # () -> コルーチン
+        self.name = name
+        self.started = False
+
+    def start(self):
+        if self.started:
+            raise RuntimeError(f"future '{self.name}' はすでに実行されています（所有権が移動済み）")
+        self.started = True
+        return self.start_coroutine()
+
+    def __repr__(self):
+        return f"<future {self.name}>"
+
+
+class JoinHandle:
+    """spawn で起動したタスク（.await で完了を待って値を受け取る）"""
+
+    def __init__(self, task, name):
+        self.task = task  # asyncio.Task
+        self.name = name
+
+    def __repr__(self):
+        state = "finished" if self.task.done() else "running"
+        return f"<JoinHandle {self.name} {state}>"
+
+
+def contains_await(node):
+    """ノード以下に中断しうるノードがあるか（async ブロックの中は別の future、クロージャの中は別の呼び出しなので見ない）"""
+    if isinstance(node, list):
+        return any(contains_await(child) for child in node)
+    if isinstance(node, Node):
+        node = node.to_tuple()
+    if not isinstance(node, tuple) or not node or type(node[0]) is not str:
+        return False
+    if node[0] in AWAIT_NODES:
+        return True
+    if node[0] in ('async', 'function', 'async_function'):
+        return False
+    for child in node[1:]:
+        if isinstance(child, dict):
+            child = list(child.values())
+        if isinstance(child, (list, tuple)) and contains_await(child):
+            return True
+    return False
+
+
+class AsyncRuntime:
+    """シミュレーターの非同期処理を1つのイベントループで実行する"""
+
+    def __init__(self, simulator):
+        self.simulator = simulator
+        self.loop = asyncio.new_event_loop()
+        self.await_cache = {}  # id(ノード) -> (ノード, 中断しうるか, タプル形式に戻したノード)
+        weakref.finalize(self, self.loop.close)
+
+    def running(self):
+        """イベントループの中（タスクの実行中）か"""
+        return self.loop.is_running()
+
+    def block_on(self, coroutine):
+        """イベントループの外から、コルーチンを完了まで実行する（起動済みのタスクもその間に進む）"""
+        context = self.save_context()
+        try:
+            return self.loop.run_until_complete(coroutine)
+        finally:
+            self.restore_context(context)
+
+    # --- タスクごとの実行状態 ---
+
+    def save_context(self):
+        sim = self.simulator
+        return sim.scope, sim.locals, sim.frames, sim.invariants
+
+    def restore_context(self, context):
+        sim = self.simulator
+        sim.scope, sim.locals, sim.frames, sim.invariants = context
+
+    def enter_task(self, scope, local_values):
+        """future の実行を始めるときの状態（呼び出しのスタックはタスクごとに持つ）"""
+        sim = self.simulator
+        sim.scope = scope
+        sim.locals = local_values
+        sim.frames = []
+        sim.invariants = []
+
+    async def suspend(self, awaitable):
+        """中断して待つ。再開したら、待っている間に他のタスクが切り替えた実行状態を元に戻す"""
+        context = self.save_context()
+        try:
+            return await awaitable
+        finally:
+            self.restore_context(context)
+
+    # --- future の作成 ---
+
+    def block_future(self, body):
+        """async ブロックの future（囲んでいる関数のローカル変数をそのまま参照する）"""
+        sim = self.simulator
+        scope, local_values = sim.scope, sim.locals
+
+        async def run():
+            self.enter_task(scope, local_values)
+            return await self.eval(body)
+
+        return RustFuture(run, "async block")
+
+    def function_future(self, func_name, args):
+        """async fn の呼び出しの future"""
+        params, body, scope = self.simulator.async_functions[func_name]
+
+        async def run():
+            self.enter_task(scope, scope.new_frame(args))
+            return await self.eval(body)
+
+        return RustFuture(run, func_name)
+
+    # --- 同期的なコード（シミュレーターの評価）からの入口 ---
+
+    def run_block(self, body):
+        """async ブロックの値（実行はせず、.await / join / spawn されるまで待つ future）"""
+        return self.block_future(body)
+
+    def call(self, func_name, args):
+        """async fn の呼び出しの値（実行はせず、.await / join / spawn されるまで待つ future）"""
+        return self.function_future(func_name, args)
+
+    def future_of(self, node):
+        """式を評価する。async ブロックと async fn の呼び出しは実行せずに future にする"""
+        sim = self.simulator
+        if isinstance(node, Node):
+            node = node.to_tuple()
+        if isinstance(node, tuple) and node:
+            if node[0] == 'async':
+                return self.block_future(node[1])
+            if node[0] == 'call' and node[1] in sim.async_functions and node[1] not in sim.functions:
+                return self.function_future(node[1], [sim.eval_ast(arg) for arg in node[2]])
+        return sim.eval_ast(node)
+
+    def await_node(self, node):
+        """イベントループの外での .await"""
+        self.check_blocking('.await')
+        return self.block_on(self.wait(self.future_of(node)))
+
+    def join_nodes(self, nodes):
+        """イベントループの外での join!"""
+        self.check_blocking('join!')
+        return self.block_on(self.join_all([self.future_of(node) for node in nodes]))
+
+    def spawn_node(self, node):
+        """イベントループの外での spawn"""
+        return self.spawn(self.future_of(node))
+
+    def spawn(self, value):
+        """future をタスクとして起動する（実行はイベントループが次に回ったとき）"""
+        if isinstance(value, RustFuture):
+            return JoinHandle(self.loop.create_task(self.wait(value)), value.name)
+        return value
+
+    def sleep(self, milliseconds):
+        self.check_blocking('sleep(...).await')
+        self.block_on(asyncio.sleep(milliseconds / 1000))
+
+    def check_blocking(self, what):
+        if self.running():
+            # 同期的な関数の中では中断できない（Rustでは async でない関数の中の .await はコンパイルエラー）
+            raise RuntimeError(f"{what} は async ブロックか async fn の中でしか使えません")
+
+    # --- コルーチンとしての評価 ---
+
+    async def wait(self, value):
+        """future なら実行し、タスクなら完了を待って値を返す（それ以外の値はそのまま）"""
+        if isinstance(value, RustFuture):
+            return await self.suspend(value.start())
+        if isinstance(value, JoinHandle):
+            return await self.suspend(value.task)
+        return value
+
+    async def join_all(self, values):
+        return list(await self.suspend(asyncio.gather(*(self.wait(value) for value in values))))
+
+    def prepare(self, node):
+        """(中断しうるか, タプル形式のノード)。ノードクラスはタプル形式に戻したものを覚えておいて使い回す"""
+        if not isinstance(node, (list, tuple, Node)):
+            return False, node
+        entry = self.await_cache.get(id(node))
+        if entry is None or entry[0] is not node:
+            converted = to_tuples(node)
+            entry = (node, contains_await(converted), converted)
+            self.await_cache[id(node)] = entry
+        return entry[1], entry[2]
+
+    async def eval(self, node):
+        """ノードを評価する。中断しうる部分だけをここで評価し、残りはシミュレーターの eval_ast に任せる"""
+        sim = self.simulator
+        suspends, converted = self.prepare(node)
+        if not suspends:
+            return sim.eval_ast(node)
+        node = converted
+
+        if isinstance(node, list):
+            result = None
+            for stmt in node:
+                result = await self.eval(stmt)
+                if result == 'break':
+                    break
+            return result
+
+        node_type = node[0]
+
+        if node_type == 'await':
+            return await self.wait(await self.eval(node[1]))
+
+        elif node_type == 'join':
+            values = [await self.eval(expr) for expr in node[1]]
+            return await self.join_all(values)
+
+        elif node_type == 'sleep':
+            milliseconds = await self.eval(node[1])
+            await self.suspend(asyncio.sleep(milliseconds / 1000))
+            return None
+
+        elif node_type == 'spawn':
+            return self.spawn(await self.eval(node[1]))
+
+        elif node_type == 'if':
+            if await self.eval(node[1]):
+                return await self.eval(node[2])
+            elif len(node) > 3 and node[3] is not None:
+                return await self.eval(node[3])
+            return None
+
+        elif node_type == 'loop':
+            while True:
+                if await self.eval(node[1]) == 'break':
+                    break
+            return None
+
+        elif node_type == 'for':
+            for value in await self.eval(node[2]):
+                sim.store_variable(node[1], value)
+                await self.eval(node[3])
+            return None
+
+        elif node_type in ('match', 'match_guard'):
+            subject = await self.eval(node[1])
+            for index, check, pattern, guard, body in sim.match_table(node, node[2]).candidates(subject):
+                if check and not sim.match_pattern(pattern, subject):
+                    continue
+                if guard is not None and not await self.eval(guard):
+                    continue
+                return await self.eval(body)
+            return None
+
+        elif node_type == 'invariant_scope':
+            sim.invariants.append([UNBOUND] * node[1])
+            try:
+                return await self.eval(node[2])
+            finally:
+                sim.invariants.pop()
+
+        elif node_type == 'return':
+            return await self.eval(node[1])
+
+        # 以下は子ノードを先に評価してから、同期的な評価と同じ処理をする
+        elif node_type == 'let':
+            sim.let_variable(node[1], await self.eval(node[2]))
+            return None
+
+        elif node_type == 'binary_op':
+            left = await self.eval(node[1])
+            right = await self.eval(node[3])
+            operator = node[2]
+            if operator == '+':
+                return left + right
+            elif operator == '-':
+                return left - right
+            elif operator == '*':
+                return left * right
+            elif operator == '/':
+                return left / right
+            return None
+
+        elif node_type == 'call':
+            args = [await self.eval(arg) for arg in node[2]]
+            return sim.call_function(node[1], args)
+
+        elif node_type == 'range':
+            start = await self.eval(node[1])
+            end = await self.eval(node[2])
+            return range(start, end)
+
+        elif node_type == 'struct':
+            values = [await self.eval(value) for value in node[2].values()]
+            return sim.make_struct(node[1], tuple(node[2]), values)
+
+        elif node_type == 'result':
+            if node[1] == 'Ok':
+                return RustResult(ok=await self.eval(node[2]))
+            elif node[1] == 'Err':
+                return RustResult(err=await self.eval(node[2]))
+            return None
+
+        # それ以外のノードの中の .await は同期的に評価される（check_blocking でエラーになる）
+        return sim.eval_ast(node)
+
@@ -0,0 +1,161 @@
+"""複数の.rsファイルをプロセスプールで並列に実行し、結果をJSONで出力する
+
+    python batch.py [--jobs N] [--report report.json] ディレクトリ|ファイル ...
+
+親プロセスでパーサーと依存関係の準備を一度だけ行い、fork したワーカーで各ファイルを実行する。
+ファイルごとの標準出力、エラー、所要時間をレポートにまとめ、失敗したファイルがあれば終了コード1を返す。
+"""
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+from contextlib import redirect_stdout
+
+from main import (
+    ENGINES, LEXERS, DOWNLOAD_WORKERS, ASTCache,
+    add_dependency_arguments, install_dependencies, parse_rust_code, prepare_ast, run_with_deep_stack,
+)
+
+# ワーカーで使う設定（initializer で設定する）
+_options = {}
+
+
+def collect_files(paths):
+    """ディレクトリ以下の.rsファイルと、指定されたファイルを重複なく順に並べる"""
+    files = []
+    seen = set()
+    for path in paths:
+        if os.path.isdir(path):
+            found = []
+            for root, dirs, names in os.walk(path):
+                dirs.sort()
+                found.extend(os.path.join(root, name) for name in names if name.endswith(".rs"))
+            candidates = sorted(found)
+        else:
+            candidates = [path]
+        for file_path in candidates:
+            if file_path not in seen:
+                seen.add(file_path)
+                files.append(file_path)
+    return files
+
+
+def preload(lexer):
+    """fork 前にパーサーと字句解析器を読み込み、ワーカーから共有されるようにする"""
+    from parser import parser  # 構文解析表の読み込み
+    if lexer == "fast":
+        import fastlex
+    import gc
+    # 読み込み済みのオブジェクトをGCの対象から外し、ワーカーでの書き込みによるページのコピーを減らす
+    gc.freeze()
+
+
+def init_worker(engine, lexer, cache_dir, use_cache, optimize):
+    _options["engine"] = engine
+    _options["lexer"] = lexer
+    _options["optimize"] = optimize
+    _options["cache"] = None
+    if use_cache:
+        _options["cache"] = ASTCache(cache_dir) if cache_dir else ASTCache()
+
+
+def run_file(file_path):
+    """1つのファイルをパースして実行し、結果を辞書で返す（ワーカーで実行）"""
+    result = {"file": file_path, "ok": False, "stdout": "", "error": None,
+              "parse_ms": 0.0, "run_ms": 0.0, "total_ms": 0.0, "worker": os.getpid()}
+    output = io.StringIO()
+    start = time.perf_counter()
+    parsed = start
+    with redirect_stdout(output):
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                rust_code = f.read()
+            ast = parse_rust_code(rust_code, _options["cache"], _options["lexer"])
+            simulator = ENGINES[_options["engine"]]()
+            ast = prepare_ast(ast, simulator, _options["optimize"])
+            parsed = time.perf_counter()
+            run_with_deep_stack(simulator.eval_ast, ast)
+            result["ok"] = True
+        except Exception:
+            result["error"] = traceback.format_exc()
+    end = time.perf_counter()
+    result["stdout"] = output.getvalue()
+    result["parse_ms"] = (parsed - start) * 1000
+    result["run_ms"] = (end - parsed) * 1000 if result["ok"] else 0.0
+    result["total_ms"] = (end - start) * 1000
+    return result
+
+
+def run_batch(files, jobs, engine="tree", lexer="fast", cache_dir=None, use_cache=True, optimize=True):
+    """ファイルを並列に実行してレポートを返す（結果は入力の順に並べる）"""
+    preload(lexer)
+    # fork が使える環境では、読み込み済みのパーサーをそのままワーカーに引き継ぐ
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("fork" if "fork" in methods else None)
+    start = time.perf_counter()
+    initargs = (engine, lexer, cache_dir, use_cache, optimize)
+    with context.Pool(jobs, initializer=init_worker, initargs=initargs) as pool:
+        results = list(pool.imap(run_file, files, chunksize=1))
+    wall_ms = (time.perf_counter() - start) * 1000
+
+    passed = sum(1 for result in results if result["ok"])
+    busy_ms = sum(result["total_ms"] for result in results)
+    return {
+        "summary": {
+            "files": len(results),
+            "passed": passed,
+            "failed": len(results) - passed,
+            "jobs": jobs,
+            "engine": engine,
+            "wall_ms": wall_ms,
+            # ワーカーで実際にパース・実行していた時間の合計（wall_ms * jobs との差がプロセス間のオーバーヘッド）
+            "busy_ms": busy_ms,
+        },
+        "files": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="複数のRustファイルを並列に解析・シミュレーションする")
+    parser.add_argument("paths", nargs="+", help="実行する.rsファイル、または.rsファイルを含むディレクトリ")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="ワーカープロセス数（既定はCPU数）")
+    parser.add_argument("--report", default="-", help="JSONレポートの出力先（- は標準出力）")
+    parser.add_argument("--engine", choices=sorted(ENGINES), default="tree", help="評価エンジン (tree: ツリー評価, vm: バイトコードVM)")
+    parser.add_argument("--lexer", choices=LEXERS, default="fast", help="字句解析器 (fast: 高速版, ply: PLY)")
+    parser.add_argument("--no-optimize", action="store_true", help="パース後の最適化を行わない")
+    parser.add_argument("--no-cache", action="store_true", help="パース結果のキャッシュを使わない")
+    parser.add_argument("--cache-dir", help="パース結果のキャッシュディレクトリ")
+    add_dependency_arguments(parser)
+    args = parser.parse_args()
+
+    files = collect_files(args.paths)
+    if not files:
+        print(".rsファイルが見つかりません", file=sys.stderr)
+        sys.exit(1)
+
+    # 依存関係はファイルごとではなく一度だけ準備する（進捗はレポートと混ざらないよう標準エラーへ）
+    if not args.no_download:
+        with redirect_stdout(sys.stderr):
+            install_dependencies(args, workers=DOWNLOAD_WORKERS)
+
+    report = run_batch(files, max(args.jobs, 1), args.engine, args.lexer, args.cache_dir, not args.no_cache,
+                       not args.no_optimize)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.report == "-":
+        print(text)
+    else:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+
+    summary = report["summary"]
+    print(f"{summary['passed']}/{summary['files']} 件成功, {summary['wall_ms']:.0f}ms "
+          f"({summary['jobs']} プロセス)", file=sys.stderr)
+    sys.exit(0 if summary["failed"] == 0 else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,604 @@
+"""字句解析、構文解析、評価、依存関係のダウンロードを段階ごとに計測し、ベースラインと比較する
+
+    python bench.py [--runs N] [--phases lex,parse,eval,structs,vecs,iters,deps] [--output bench_results.json]
+    python bench.py --save-baseline bench_baseline.json      # 現在の結果をベースラインとして保存
+    python bench.py --baseline bench_baseline.json [--threshold 0.25]
+
+コーパスは種類ごとに生成するRustのソース（字句解析と構文解析に使う）と、同じ処理をシミュレーターの語彙で
+書いたAST（評価に使う）の組で、乱数を使わないので毎回同じ入力になる。評価はツリー評価（tree）、
+バイトコードVM（vm）、よく呼ばれる関数をPythonに変換するツリー評価（jit、main.py の --jit）で計測する。ソースはパーサーの文法が対応する範囲
+（関数、式、loop、struct、マクロ）で書き、評価用のASTには文法にない if や for、match も使う。
+構造体のインスタンスは、宣言から作る固定レイアウト（structs.StructLayout）と宣言のないときの
+(名前, 辞書) の形で、生成とフィールドの参照の時間、1インスタンスあたりのメモリを比べる（structs）。
+Vec は要素の型を持たない（リストで持つ）ものと、array に詰めて持つ Vec<u8> / Vec<i32> で、
+作成、push、反復の時間と1要素あたりのメモリを比べる（vecs）。
+イテレーターのアダプター（map、filter、sum）は、要素を1つずつ流す遅延評価のパイプラインと、段ごとに collect する形で、
+評価の時間とメモリのピークを比べる（iters）。遅延評価のピークは範囲の長さによらず一定になる。
+依存関係はローカルに立てたスタブのレジストリから、生成した.crateをダウンロードする（ネットワークは使わない）。
+
+各計測は数回実行した中央値をミリ秒で記録し、結果はJSONで保存する。ベースラインの中央値より
+threshold の割合を超えて遅くなった計測があれば、回帰として終了コード1を返す。
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tarfile
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PHASES = ("lex", "parse", "eval", "structs", "vecs", "iters", "deps")
+# 1つの計測の実行回数（中央値を使う）
+BENCH_RUNS = 5
+# ベースラインの中央値から何割遅くなったら回帰とみなすか
+REGRESSION_THRESHOLD = 0.25
+# 計測のぶれで回帰と判定しないよう、これより小さい差（ミリ秒）は無視する
+MIN_DELTA_MS = 0.5
+
+# スタブのレジストリで配るクレートの数と、1クレートあたりのソースファイル数
+STUB_CRATES = 8
+STUB_FILES = 20
+
+# 構造体の計測で作るインスタンスの数
+STRUCT_INSTANCES = 100000
+# vec![0; n] で作る Vec の要素数と、push と反復で使う Vec の要素数
+VEC_REPEAT_ELEMENTS = 10000000
+VEC_ELEMENTS = 1000000
+# イテレーターの計測で流す範囲の長さ（メモリのピークはこの長さと10倍の長さで比べる）
+ITER_ELEMENTS = 100000
+
+
+# コーパス: 種類 -> (ソースを生成する関数, 評価用のASTを生成する関数)
+
+def arith_source():
+    lines = []
+    for i in range(200):
+        lines.append(f"fn step{i}(a, b) {{ a * {i + 1} + b / 2 - a * b + {i} }}")
+    lines.append("fn main() { loop { step0(a, b) + step1(c, d) * step2(e, f) break; } }")
+    return "\n".join(lines) + "\n"
+
+
+def arith_program():
+    # for i in 0..20000 { i * 3 + i / 2 - 1 }
+    body = [('binary_op', ('binary_op', ('binary_op', ('identifier', 'i'), '*', ('number', 3)), '+',
+                           ('binary_op', ('identifier', 'i'), '/', ('number', 2))), '-', ('number', 1))]
+    return [('for', 'i', ('range', ('number', 0), ('number', 20000)), body)]
+
+
+def recursion_source():
+    lines = ["fn fib(n) { fib(n - 1) + fib(n - 2) }"]
+    for i in range(150):
+        lines.append(f"fn down{i}(n) {{ down{i}(n - 1) + fib(n - {i}) }}")
+    lines.append("fn main() { println!(fib(20)); }")
+    return "\n".join(lines) + "\n"
+
+
+def recursion_program():
+    # fn fib(n) { if n - 1 { if n { fib(n - 1) + fib(n - 2) } else { 0 } } else { 1 } }
+    n = ('identifier', 'n')
+    fib_body = [('if', ('binary_op', n, '-', ('number', 1)),
+                 [('if', n, [('binary_op', ('call', 'fib', [('binary_op', n, '-', ('number', 1))]), '+',
+                                            ('call', 'fib', [('binary_op', n, '-', ('number', 2))]))],
+                   [('number', 0)])],
+                 [('number', 1)])]
+    return [('function', 'fib', ['n'], None, fib_body), ('call', 'fib', [('number', 18)])]
+
+
+def match_source():
+    lines = []
+    for i in range(200):
+        lines.append(f"fn classify{i}(x) {{ dispatch(x, table{i}) + println!(x) }}")
+    lines.append("fn main() { classify0(a) + classify1(b) }")
+    return "\n".join(lines) + "\n"
+
+
+def match_program():
+    # fn classify(x) { match x { 0 => 1, 1 => 2, ... 9 => 10 } } を 0..10 で 300 回呼ぶ
+    arms = [(value, [('number', value + 1)]) for value in range(10)]
+    classify = ('function', 'classify', ['x'], None, [('match', ('identifier', 'x'), arms)])
+    inner = ('for', 'i', ('range', ('number', 0), ('number', 10)), [('call', 'classify', [('identifier', 'i')])])
+    return [classify, ('for', 'j', ('range', ('number', 0), ('number', 300)), [inner])]
+
+
+def struct_source():
+    lines = []
+    for i in range(150):
+        lines.append(f"struct Point{i} {{ x: i32, y: i32, z: i32 }}")
+        lines.append(f"fn norm{i}(p) {{ p.x * p.x + p.y * p.y + p.z * p.z }}")
+    lines.append("fn main() { norm0(origin()) }")
+    return "\n".join(lines) + "\n"
+
+
+def struct_program():
+    # fn wrap(p) { Point { inner: p, scale: 2 } } を構造体を作りながら 5000 回呼ぶ
+    i = ('identifier', 'i')
+    point = ('struct', 'Point', {'x': i, 'y': ('binary_op', i, '*', ('number', 2)), 'z': ('number', 0)})
+    wrap = ('function', 'wrap', ['p'], None,
+            [('struct', 'Wrapper', {'inner': ('identifier', 'p'), 'scale': ('number', 2)})])
+    return [wrap, ('for', 'i', ('range', ('number', 0), ('number', 5000)), [('call', 'wrap', [point])])]
+
+
+def large_source():
+    # 他の種類のソースをまとめて何倍かにした大きなファイル（関数名は重複してもよい）
+    return (arith_source() + recursion_source() + match_source() + struct_source()) * 5
+
+
+def large_program():
+    # 多数の関数の定義と、それぞれ1回の呼び出し
+    program = []
+    for i in range(1000):
+        program.append(('function', f'f{i}', ['x'], None,
+                        [('binary_op', ('identifier', 'x'), '+', ('number', i))]))
+    for i in range(1000):
+        program.append(('call', f'f{i}', [('number', i)]))
+    return program
+
+
+CORPUS = {
+    "arith": (arith_source, arith_program),
+    "recursion": (recursion_source, recursion_program),
+    "match": (match_source, match_program),
+    "struct": (struct_source, struct_program),
+    "large": (large_source, large_program),
+}
+
+
+def measure(function, runs):
+    """function を1回試しに実行してから runs 回実行し、各回の所要時間（ミリ秒）を返す"""
+    function()
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def summarize(timings, **extra):
+    result = {"median_ms": statistics.median(timings), "min_ms": min(timings), "runs": len(timings)}
+    result.update(extra)
+    return result
+
+
+def bench_lex(sources, runs):
+    from fastlex import FastLexer
+    from lex import lexer as ply_lexer
+
+    results = {}
+    for name, source in sources.items():
+        for lexer_name, make_lexer in (("fast", FastLexer), ("ply", ply_lexer.clone)):
+            count = 0
+
+            def run():
+                nonlocal count
+                lexer = make_lexer()
+                lexer.input(source)
+                get_token = lexer.token
+                count = 0
+                while get_token() is not None:
+                    count += 1
+
+            timings = measure(run, runs)
+            seconds = statistics.median(timings) / 1000
+            results[f"lex/{lexer_name}/{name}"] = summarize(
+                timings, tokens=count, tokens_per_s=count / seconds, mb_per_s=len(source) / seconds / 1e6)
+    return results
+
+
+def bench_parse(sources, runs):
+    from fastlex import FastLexer
+    from parser import parser
+
+    results = {}
+    for name, source in sources.items():
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            ast = parser.parse(source, lexer=FastLexer())
+        if ast is None or output.getvalue():
+            raise RuntimeError(f"コーパス {name} のソースをパースできません: {output.getvalue().strip()}")
+        timings = measure(lambda: parser.parse(source, lexer=FastLexer()), runs)
+        results[f"parse/{name}"] = summarize(timings, statements=len(ast), bytes=len(source))
+    return results
+
+
+def jit_simulator():
+    from simulator import RustSimulator
+    from transpile import TieredCompiler
+
+    simulator = RustSimulator()
+    simulator.jit = TieredCompiler()
+    return simulator
+
+
+def bench_eval(programs, runs):
+    from simulator import RustSimulator
+    from vm import RustVM
+
+    results = {}
+    with open(os.devnull, 'w') as devnull:
+        for name, program in programs.items():
+            for engine, make_simulator in (("tree", RustSimulator), ("vm", RustVM), ("jit", jit_simulator)):
+                def run():
+                    with contextlib.redirect_stdout(devnull):
+                        make_simulator().eval_ast(program)
+
+                results[f"eval/{engine}/{name}"] = summarize(measure(run, runs))
+    return results
+
+
+def struct_layout_program(declare):
+    # struct Point { x, y, z } を宣言して（declare のとき）、インスタンスを作ってはフィールドを読む
+    i = ('identifier', 'i')
+    p = ('identifier', 'p')
+    point = ('struct', 'Point', {'x': i, 'y': ('binary_op', i, '*', ('number', 2)), 'z': ('number', 0)})
+    norm = ('function', 'norm', ['p'], None, [
+        ('binary_op', ('binary_op', ('field_access', p, 'x'), '*', ('field_access', p, 'x')), '+',
+         ('binary_op', ('field_access', p, 'y'), '*', ('field_access', p, 'z')))])
+    program = [norm, ('for', 'i', ('range', ('number', 0), ('number', 5000)), [('call', 'norm', [point])])]
+    if declare:
+        program.insert(0, ('struct', 'Point', [('x', 'i32'), ('y', 'i32'), ('z', 'i32')]))
+    return program
+
+
+def bench_structs(runs):
+    """構造体のインスタンスの生成、フィールドの参照、メモリを、固定レイアウトと (名前, 辞書) の形で比べる"""
+    import tracemalloc
+    from simulator import RustSimulator
+    from structs import FieldSite, StructLayout
+    from vm import RustVM
+
+    keys = ('x', 'y', 'z')
+    layout = StructLayout('Point', keys)
+    forms = {
+        "dict": lambda i: ('Point', dict(zip(keys, (i, i, i)))),
+        "layout": lambda i: layout.new(keys, (i, i, i)),
+    }
+    results = {}
+    for form, make in forms.items():
+        def create():
+            return [make(i) for i in range(STRUCT_INSTANCES)]
+
+        # インスタンスを入れるリスト自体の大きさは差し引く（値の整数はどちらの形でも同じだけ確保される）
+        tracemalloc.start()
+        instances = create()
+        size = tracemalloc.get_traced_memory()[0] - sys.getsizeof(instances)
+        tracemalloc.stop()
+
+        def access():
+            # VMの LOAD_FIELD と同じく、参照の位置ごとの FieldSite で読む
+            x, z = FieldSite('x'), FieldSite('z')
+            total = 0
+            for instance in instances:
+                total += (x.getter(instance) if type(instance) is x.cls else x.load(instance))
+                total += (z.getter(instance) if type(instance) is z.cls else z.load(instance))
+            return total
+
+        results[f"structs/create/{form}"] = summarize(measure(create, runs), instances=STRUCT_INSTANCES,
+                                                     bytes_per_instance=size / STRUCT_INSTANCES)
+        results[f"structs/field/{form}"] = summarize(measure(access, runs), instances=STRUCT_INSTANCES)
+
+    with open(os.devnull, 'w') as devnull:
+        for form, declare in (("dict", False), ("layout", True)):
+            program = struct_layout_program(declare)
+            for engine, make_simulator in (("tree", RustSimulator), ("vm", RustVM)):
+                def run():
+                    with contextlib.redirect_stdout(devnull):
+                        make_simulator().eval_ast(program)
+
+                results[f"structs/eval/{engine}/{form}"] = summarize(measure(run, runs))
+    return results
+
+
+def traced_bytes(function):
+    """function の戻り値が確保したままのメモリ（バイト）と戻り値"""
+    import tracemalloc
+
+    tracemalloc.start()
+    try:
+        value = function()
+        return tracemalloc.get_traced_memory()[0], value
+    finally:
+        tracemalloc.stop()
+
+
+def vec_program():
+    # let v = Vec<i32>::new(); for i in 0..20000 { v.push(i as i32) } を作ってから、要素を i64 で足し合わせる
+    i = ('identifier', 'i')
+    v = ('identifier', 'v')
+    total = ('identifier', 'total')
+    return [
+        ('let', 'v', ('vec', 'i32', [])),
+        ('for', 'i', ('range', ('number', 0), ('number', 20000)),
+         [('method_chain_with_params', v, 'push', [('cast', i, 'i32')])]),
+        ('function', 'sum', ['v'], None, [
+            ('let', 'total', ('cast', ('number', 0), 'i64')),
+            ('for', 'x', ('method_chain', v, 'iter'),
+             [('let', 'total', ('binary_op', total, '+', ('cast', ('identifier', 'x'), 'i64')))]),
+            ('return', total)]),
+        ('call', 'sum', [v]),
+    ]
+
+
+def bench_vecs(runs):
+    """要素の型を持たない Vec（リスト）と、array に詰めた Vec の作成、push、反復の時間とメモリを比べる"""
+    from fixedint import cast
+    from rustvec import RustVec
+    from simulator import RustSimulator
+    from vm import RustVM
+
+    results = {}
+    for form, elem_type, zero in (("list", None, 0), ("u8", "u8", cast(0, "u8"))):
+        def repeat():
+            return RustVec.repeat(elem_type, zero, VEC_REPEAT_ELEMENTS)
+
+        size, _ = traced_bytes(repeat)
+        results[f"vecs/repeat/{form}"] = summarize(measure(repeat, runs), elements=VEC_REPEAT_ELEMENTS,
+                                                   bytes_per_element=size / VEC_REPEAT_ELEMENTS)
+
+    for form, elem_type in (("list", None), ("i32", "i32")):
+        def push():
+            vec = RustVec(elem_type)
+            for i in range(VEC_ELEMENTS):
+                vec.push(i)
+            return vec
+
+        # リストの要素の int は1つずつ確保されたオブジェクトで、array は4バイトずつ詰めて持つ
+        size, vec = traced_bytes(push)
+
+        def iterate():
+            # 読み出した要素は i32 の値になる（足し合わせると i32 の範囲を超えるので数えるだけにする）
+            count = 0
+            for _ in vec.iter():
+                count += 1
+            return count
+
+        results[f"vecs/push/{form}"] = summarize(measure(push, runs), elements=VEC_ELEMENTS,
+                                                 bytes_per_element=size / VEC_ELEMENTS)
+        results[f"vecs/iter/{form}"] = summarize(measure(iterate, runs), elements=VEC_ELEMENTS)
+
+    program = vec_program()
+    with open(os.devnull, 'w') as devnull:
+        for engine, make_simulator in (("tree", RustSimulator), ("vm", RustVM)):
+            def run():
+                with contextlib.redirect_stdout(devnull):
+                    make_simulator().eval_ast(program)
+
+            results[f"vecs/eval/{engine}"] = summarize(measure(run, runs))
+    return results
+
+
+def peak_bytes(function):
+    """function を実行する間に確保したメモリのピーク（バイト数）と、function の戻り値"""
+    import tracemalloc
+    tracemalloc.start()
+    try:
+        value = function()
+        return tracemalloc.get_traced_memory()[1], value
+    finally:
+        tracemalloc.stop()
+
+
+def iter_program(count, lazy):
+    """(0..count).map(|x| x * 3).filter(|x| x - 3).sum()（lazy でなければ map と filter のあとに collect する）"""
+    x = ('identifier', 'x')
+    numbers = ('method_chain_with_params', ('range', ('number', 0), ('number', count)), 'map',
+               [('closure', ['x'], ('binary_op', x, '*', ('number', 3)))])
+    if not lazy:
+        numbers = ('method_chain', ('method_chain', numbers, 'collect'), 'iter')
+    numbers = ('method_chain_with_params', numbers, 'filter', [('closure', ['x'], ('binary_op', x, '-', ('number', 3)))])
+    if not lazy:
+        numbers = ('method_chain', ('method_chain', numbers, 'collect'), 'iter')
+    return ('method_chain', numbers, 'sum')
+
+
+def bench_iters(runs):
+    """遅延評価のイテレーターのパイプラインと、段ごとに collect する形の評価の時間とメモリのピークを比べる"""
+    from simulator import RustSimulator
+    from vm import RustVM
+
+    results = {}
+    for form, lazy in (("lazy", True), ("collect", False)):
+        for engine, make_simulator in (("tree", RustSimulator), ("vm", RustVM)):
+            program = iter_program(ITER_ELEMENTS, lazy)
+
+            def run():
+                return make_simulator().eval_ast(program)
+
+            peaks = {}
+            for count in (ITER_ELEMENTS, ITER_ELEMENTS * 10):
+                large = iter_program(count, lazy)
+                peaks[f"peak_bytes_{count}"], _ = peak_bytes(lambda: make_simulator().eval_ast(large))
+            results[f"iters/{form}/{engine}"] = summarize(measure(run, runs), elements=ITER_ELEMENTS, **peaks)
+    return results
+
+
+def make_crate(name, version):
+    """スタブのレジストリで配る.crate（gzip圧縮したtar）のバイト列"""
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w:gz') as tar:
+        files = {"Cargo.toml": f'[package]\nname = "{name}"\nversion = "{version}"\n'}
+        for i in range(STUB_FILES):
+            files[f"src/module{i}.rs"] = "".join(f"fn item{j}(x) {{ x * {j} + {i} }}\n" for j in range(100))
+        for path, text in files.items():
+            data = text.encode('utf-8')
+            info = tarfile.TarInfo(f"{name}-{version}/{path}")
+            info.size = len(data)
+            info.mode = 0o644
+            tar.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+class StubRegistryHandler(BaseHTTPRequestHandler):
+    """/api/v1/crates/<名前>/<バージョン>/download に生成した.crateを返す"""
+
+    def do_GET(self):
+        parts = self.path.strip("/").split("/")
+        crate = self.server.crates.get(tuple(parts[3:5])) if len(parts) == 6 and parts[5] == "download" else None
+        if crate is None:
+            self.send_response(404)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-tar")
+        self.send_header("Content-Length", str(len(crate)))
+        self.end_headers()
+        self.wfile.write(crate)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def bench_deps(runs):
+    """スタブのレジストリからのダウンロードと展開（初回）と、依存関係が最新のとき（2回目）を計測"""
+    from main import download_dependencies
+
+    dependencies = {f"stub{i}": "1.0.0" for i in range(STUB_CRATES)}
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubRegistryHandler)
+    server.crates = {(name, version): make_crate(name, version) for name, version in dependencies.items()}
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    registry_url = f"http://127.0.0.1:{server.server_address[1]}"
+    crate_bytes = sum(len(crate) for crate in server.crates.values())
+
+    cwd = os.getcwd()
+    try:
+        with tempfile.TemporaryDirectory() as work_dir, open(os.devnull, 'w') as devnull:
+            count = 0
+
+            def download():
+                # rust_modules はカレントディレクトリに作られるので、毎回空のディレクトリで実行する
+                nonlocal count
+                count += 1
+                project_dir = os.path.join(work_dir, f"project{count}")
+                os.makedirs(project_dir)
+                os.chdir(project_dir)
+                with contextlib.redirect_stdout(devnull):
+                    results = download_dependencies(dependencies, registry_url=registry_url, crate_cache=None)
+                if not all(result["ok"] for result in results):
+                    raise RuntimeError(f"スタブのレジストリからのダウンロードに失敗しました: {results}")
+
+            def up_to_date():
+                with contextlib.redirect_stdout(devnull):
+                    download_dependencies(dependencies, registry_url=registry_url, crate_cache=None)
+
+            cold = measure(download, runs)
+            warm = measure(up_to_date, runs)  # 最後にダウンロードしたディレクトリで実行する
+    finally:
+        os.chdir(cwd)
+        server.shutdown()
+        server.server_close()
+    return {
+        "deps/download": summarize(cold, crates=STUB_CRATES, bytes=crate_bytes),
+        "deps/up_to_date": summarize(warm, crates=STUB_CRATES),
+    }
+
+
+def run_benchmarks(phases, runs):
+    """指定した段階を計測して 計測名 -> 結果 の辞書を返す"""
+    results = {}
+    sources = {name: make_source() for name, (make_source, _) in CORPUS.items()}
+    if "lex" in phases:
+        results.update(bench_lex(sources, runs))
+    if "parse" in phases:
+        results.update(bench_parse(sources, runs))
+    if "eval" in phases:
+        programs = {name: make_program() for name, (_, make_program) in CORPUS.items()}
+        results.update(bench_eval(programs, runs))
+    if "structs" in phases:
+        results.update(bench_structs(runs))
+    if "vecs" in phases:
+        results.update(bench_vecs(runs))
+    if "iters" in phases:
+        results.update(bench_iters(runs))
+    if "deps" in phases:
+        results.update(bench_deps(runs))
+    return results
+
+
+def compare(results, baseline, threshold):
+    """ベースラインと比べて (計測名, ベースライン, 今回, 比, 回帰か) のリストを返す"""
+    rows = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        before = base["median_ms"]
+        after = result["median_ms"]
+        ratio = after / before if before else float('inf')
+        regressed = ratio > 1 + threshold and after - before > MIN_DELTA_MS
+        rows.append((name, before, after, ratio, regressed))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="字句解析、構文解析、評価、依存関係の処理を計測")
+    parser.add_argument("--runs", type=int, default=BENCH_RUNS, help="計測ごとの実行回数（中央値を使う）")
+    parser.add_argument("--phases", default=",".join(PHASES), help=f"計測する段階（カンマ区切り、{', '.join(PHASES)}）")
+    parser.add_argument("--output", default="bench_results.json", help="結果のJSONの出力先（- は出力しない）")
+    parser.add_argument("--baseline", help="比較するベースラインのJSON")
+    parser.add_argument("--save-baseline", help="今回の結果をベースラインとして保存するパス")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="回帰とみなす、ベースラインの中央値からの遅くなった割合")
+    args = parser.parse_args()
+
+    phases = [phase.strip() for phase in args.phases.split(",") if phase.strip()]
+    unknown = [phase for phase in phases if phase not in PHASES]
+    if unknown:
+        parser.error(f"不明な段階です: {', '.join(unknown)}")
+
+    results = run_benchmarks(phases, max(args.runs, 1))
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "runs": args.runs,
+        "results": results,
+    }
+
+    print(f"{'計測':<28} {'中央値(ms)':>12} {'最小(ms)':>10}  備考")
+    for name, result in results.items():
+        note = ""
+        if "tokens_per_s" in result:
+            note = f"{result['tokens_per_s'] / 1000:.0f}k トークン/秒, {result['mb_per_s']:.2f} MB/s"
+        elif "bytes_per_instance" in result:
+            note = f"{result['bytes_per_instance']:.0f} バイト/インスタンス"
+        elif "bytes_per_element" in result:
+            note = f"{result['bytes_per_element']:.1f} バイト/要素"
+        elif "statements" in result:
+            note = f"{result['bytes'] / result['median_ms'] / 1000:.2f} MB/s"
+        print(f"{name:<28} {result['median_ms']:>12.2f} {result['min_ms']:>10.2f}  {note}")
+
+    text = json.dumps(report, ensure_ascii=False, indent=2) + "\n"
+    if args.output != "-":
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+        print(f"結果を {args.output} に保存しました")
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            f.write(text)
+        print(f"ベースラインを {args.save_baseline} に保存しました")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)["results"]
+        rows = compare(results, baseline, args.threshold)
+        print(f"\nベースライン {args.baseline} との比較（{args.threshold:.0%} を超えて遅くなったら回帰）")
+        print(f"{'計測':<28} {'ベースライン':>12} {'今回':>10} {'比':>7}")
+        for name, before, after, ratio, regressed in rows:
+            mark = "  回帰" if regressed else ""
+            print(f"{name:<28} {before:>12.2f} {after:>10.2f} {ratio:>7.2f}{mark}")
+        regressions = [row for row in rows if row[4]]
+        if regressions:
+            print(f"{len(regressions)} 件の計測が回帰しています")
+            sys.exit(1)
+        print("回帰はありません")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""main.py --no-download のコールドスタート時間を計測し、予算と比較する
+
+    python bench_startup.py [--runs N] [--budget-ms MS]
+
+マシンの速さに左右されないよう、素のPythonインタプリタの起動時間との差（中央値）を予算と比較し、
+超えた場合は終了コード1を返す。
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# インタプリタ自体の起動時間を除いたコールドスタートの予算（ミリ秒、中央値）
+STARTUP_BUDGET_MS = 60
+
+SAMPLE_SOURCE = "fn main() { foo(1) }\n"
+
+
+def time_command(command, runs, cwd):
+    """コマンドをruns回実行し、各回の所要時間(ミリ秒)を返す"""
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=cwd, check=True, stdout=subprocess.DEVNULL)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def measure_startup(runs):
+    """素のインタプリタと main.py --no-download --no-cache の起動時間を計測"""
+    with tempfile.TemporaryDirectory() as work_dir:
+        rust_file = os.path.join(work_dir, "main.rs")
+        with open(rust_file, "w", encoding="utf-8") as f:
+            f.write(SAMPLE_SOURCE)
+        interpreter = time_command([sys.executable, "-c", "pass"], runs, work_dir)
+        command = [sys.executable, os.path.join(BASE_DIR, "main.py"), "--no-download", "--no-cache", rust_file]
+        startup = time_command(command, runs, work_dir)
+    return interpreter, startup
+
+
+def main():
+    parser = argparse.ArgumentParser(description="main.py のコールドスタート時間を計測")
+    parser.add_argument("--runs", type=int, default=10, help="計測回数")
+    parser.add_argument("--budget-ms", type=float, default=STARTUP_BUDGET_MS, help="インタプリタの起動時間を除いた中央値の予算（ミリ秒）")
+    args = parser.parse_args()
+
+    interpreter, startup = measure_startup(args.runs)
+    baseline = statistics.median(interpreter)
+    median = statistics.median(startup)
+    overhead = median - baseline
+    print(f"インタプリタ: 中央値 {baseline:.1f}ms")
+    print(f"main.py: 中央値 {median:.1f}ms, 最小 {min(startup):.1f}ms, 最大 {max(startup):.1f}ms ({args.runs} 回)")
+    print(f"main.py 固有の起動時間: {overhead:.1f}ms")
+    if overhead > args.budget_ms:
+        print(f"予算 {args.budget_ms:.0f}ms を超えています")
+        sys.exit(1)
+    print(f"予算 {args.budget_ms:.0f}ms 以内です")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+"""PLYの字句解析表(lextab.py)と構文解析表(parsetab.pickle)を再生成する
+
+lex.py のトークン定義や parser.py の文法を変更したら実行し、生成された表をコミットする。
+"""
+import os
+import subprocess
+import sys
+
+TABLE_DIR = os.path.dirname(os.path.abspath(__file__))
+TABLE_FILES = ("lextab.py", "parsetab.pickle")
+
+
+def build_tables():
+    """古い表を削除し、文法を検証しながら表を生成"""
+    for name in TABLE_FILES:
+        path = os.path.join(TABLE_DIR, name)
+        if os.path.exists(path):
+            os.remove(path)
+
+    # 開発モードで文法を検証して parsetab.pickle と parser.out を生成
+    env = dict(os.environ, RUST_RUNNER_DEV="1")
+    subprocess.run([sys.executable, "-c", "import parser"], cwd=TABLE_DIR, env=env, check=True)
+
+    # lextab.py は最適化モードでのみ書き出される
+    env["RUST_RUNNER_DEV"] = "0"
+    subprocess.run([sys.executable, "-c", "import lex"], cwd=TABLE_DIR, env=env, check=True)
+
+    for name in TABLE_FILES:
+        print(f"{os.path.join(TABLE_DIR, name)} を生成しました")
+
+
+if __name__ == "__main__":
+    build_tables()
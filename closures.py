@@ -0,0 +1,68 @@
+# クロージャ（|x| x * k）
+#
+#   - ('closure', [引数, ...], ボディ): 引数は名前、(名前, 型)、タプルを分解する名前のリスト（|(i, x)|）
+# クロージャのスコープは、作った場所の関数のスロットの後ろにクロージャの引数とボディの let/for の変数を足したもの。
+# 呼び出すたびに、作った場所のローカル変数配列を複製してから引数を束縛するので、
+# 取り込んだ変数はスロットのまま読め、クロージャの中の let は外側の変数を書き換えない。
+# トップレベルで作ったクロージャが参照する変数は、関数と同じくグローバル変数を読む。
+# RustClosure は Python の呼び出し可能なオブジェクトなので、map や filter にそのまま渡せる。
+# simulator はクロージャを作るときにこのモジュールを読み込む（simulator から先に読み込むと循環するため）。
+from simulator import Scope, UNBOUND, collect_locals, param_name
+
+
+def closure_params(params):
+    """引数を (束縛する名前のリスト) の並びにする（分解しない引数は名前1つ）"""
+    return [[param_name(name) for name in param] if isinstance(param, list) else [param_name(param)]
+            for param in params]
+
+
+def closure_scope(enclosing, params, body):
+    """作った場所のスコープ enclosing に、クロージャの引数とボディの変数を足したスコープ"""
+    slots = dict(enclosing.slots)
+    names = [name for group in closure_params(params) for name in group]
+    for var_name in collect_locals(names, body):
+        if var_name not in slots:
+            slots[var_name] = len(slots)
+    return Scope(slots)
+
+
+class RustClosure:
+    """クロージャの値（呼び出すと simulator.call_closure でボディを評価する）"""
+    __slots__ = ('simulator', 'params', 'body', 'scope', 'captured', 'bindings')
+
+    def __init__(self, simulator, params, body, scope, captured):
+        self.simulator = simulator
+        self.params = params
+        self.body = body
+        self.scope = scope  # closure_scope で作ったスコープ
+        self.captured = captured  # 作った場所のローカル変数配列（呼び出すたびに複製する）
+        # 引数ごとの束縛先のスロット（分解する引数はスロットのリスト）
+        self.bindings = []
+        for param, group in zip(params, closure_params(params)):
+            slots = [scope.slots[name] for name in group]
+            self.bindings.append(slots if isinstance(param, list) else slots[0])
+
+    def __call__(self, *args):
+        return self.simulator.call_closure(self, args)
+
+    def new_frame(self, args):
+        """取り込んだ変数を複製し、引数を束縛したローカル変数配列"""
+        if len(args) != len(self.bindings):
+            raise TypeError(f"closure takes {len(self.bindings)} arguments but {len(args)} were supplied")
+        frame = self.captured + [UNBOUND] * (len(self.scope.names) - len(self.captured))
+        for slot, value in zip(self.bindings, args):
+            if type(slot) is int:
+                frame[slot] = value
+            else:
+                values = tuple(value)
+                if len(values) != len(slot):
+                    raise TypeError(f"タプルの要素数 {len(values)} が引数のパターンの {len(slot)} と合いません")
+                for item_slot, item in zip(slot, values):
+                    frame[item_slot] = item
+        return frame
+
+    def __repr__(self):
+        names = ", ".join("(" + ", ".join(group) + ")" if isinstance(param, list) else group[0]
+                          for param, group in zip(self.params, closure_params(self.params)))
+        return f"<closure |{names}|>"
+
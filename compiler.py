@@ -0,0 +1,410 @@
+# タプル形式のASTをフラットなバイトコード列に変換するコンパイラ
+from astnodes import Node
+from match_table import MatchTable, normalize_arms
+from structs import FieldSite
+
+# オペコード（整数）
+LOAD_CONST = 0
+LOAD_NAME = 1
+STORE_LET = 2
+STORE_NAME = 3
+MOVE = 4
+POP_TOP = 5
+BINARY_ADD = 6
+BINARY_SUB = 7
+BINARY_MUL = 8
+BINARY_DIV = 9
+BINARY_OTHER = 10
+JUMP = 11
+POP_JUMP_IF_FALSE = 12
+JUMP_IF_BREAK = 13
+POP_JUMP_IF_BREAK = 14
+GET_ITER = 15
+FOR_ITER = 16
+CALL = 17
+BUILD_RANGE = 18
+MATCH_PATTERN = 19
+BUILD_STRUCT = 20
+MAKE_OK = 21
+MAKE_ERR = 22
+DEFINE_FUNCTION = 23
+DEFINE_GENERIC = 24
+ASYNC = 25
+RETURN_VALUE = 26
+BINARY_ADD_CONST = 27
+BINARY_SUB_CONST = 28
+BINARY_MUL_CONST = 29
+BINARY_DIV_CONST = 30
+POP_JUMP = 31
+LOAD_LOCAL = 32
+STORE_LOCAL = 33
+STORE_LET_LOCAL = 34
+MOVE_LOCAL = 35
+DEFINE_ASYNC_FUNCTION = 36
+AWAIT = 37
+JOIN = 38
+SPAWN = 39
+SLEEP = 40
+MATCH_JUMP = 41
+DEFINE_STRUCT = 42
+LOAD_FIELD = 43
+CAST = 44
+BUILD_VEC = 45
+VEC_REPEAT = 46
+BINARY_INDEX = 47
+CALL_METHOD = 48
+MAKE_CLOSURE = 49
+
+OPNAMES = {value: name for name, value in globals().items() if name.isupper() and isinstance(value, int)}
+
+SHARED_CONST_TYPES = (int, float, str, bool, type(None))
+
+BINARY_OPS = {'+': BINARY_ADD, '-': BINARY_SUB, '*': BINARY_MUL, '/': BINARY_DIV}
+
+# 右辺が数値リテラルの二項演算は定数を引数に持つ命令にまとめる
+BINARY_CONST_OPS = {'+': BINARY_ADD_CONST, '-': BINARY_SUB_CONST, '*': BINARY_MUL_CONST, '/': BINARY_DIV_CONST}
+
+
+class Code:
+    """コンパイル済みの命令列（オペコードと引数が交互に並ぶ）"""
+    __slots__ = ('ops', 'consts', 'names', 'varnames')
+
+    def __init__(self, ops, consts, names, varnames):
+        self.ops = ops
+        self.consts = consts
+        self.names = names  # グローバル変数名
+        self.varnames = varnames  # ローカル変数名（スロット順）
+
+
+class Compiler:
+    def __init__(self, slots=None):
+        self.slots = slots or {}  # ローカル変数名 -> スロット番号
+        self.ops = []
+        self.consts = []
+        self.names = []
+        self._const_index = {}
+        self._name_index = {}
+
+    def const(self, value):
+        """定数テーブルに登録してインデックスを返す"""
+        if type(value) in SHARED_CONST_TYPES:
+            key = (type(value), value)
+            index = self._const_index.get(key)
+        else:
+            # コンテナ型の定数は共有しない（1とTrueの取り違えを防ぐ）
+            key = None
+            index = None
+        if index is None:
+            index = len(self.consts)
+            self.consts.append(value)
+            if key is not None:
+                self._const_index[key] = index
+        return index
+
+    def name(self, var_name):
+        """変数名テーブルに登録してインデックスを返す"""
+        index = self._name_index.get(var_name)
+        if index is None:
+            index = len(self.names)
+            self.names.append(var_name)
+            self._name_index[var_name] = index
+        return index
+
+    def emit(self, op, arg=0):
+        self.ops.append(op)
+        self.ops.append(arg)
+        return len(self.ops) - 1  # 引数の位置（ジャンプ先の後埋め用）
+
+    def patch(self, position, target=None):
+        """ジャンプ先を後から設定"""
+        self.ops[position] = len(self.ops) if target is None else target
+
+    def compile(self, node):
+        """ASTを命令列に変換"""
+        self.compile_node(node, None)
+        self.emit(RETURN_VALUE)
+        return Code(self.ops, self.consts, self.names, list(self.slots))
+
+    def compile_node(self, node, loop_exit):
+        """ノードを1つの値をスタックに積む命令列に変換
+
+        loop_exit はノードの値がそのまま loop の判定に渡る位置（末尾位置）にあるとき、
+        loop の脱出先を記録するジャンプ位置のリスト
+        """
+        if isinstance(node, Node):
+            node = node.to_tuple()  # ノードクラスのASTはタプル形式に戻してからコンパイルする
+
+        if isinstance(node, list):
+            # 文の並び（ブロック）
+            if not node:
+                self.emit(LOAD_CONST, self.const(None))
+                return
+            exits = []
+            for stmt in node[:-1]:
+                self.compile_node(stmt, loop_exit)
+                if loop_exit is not None:
+                    loop_exit.append(self.emit(POP_JUMP_IF_BREAK))
+                else:
+                    exits.append(self.emit(JUMP_IF_BREAK))
+            self.compile_node(node[-1], loop_exit)
+            for position in exits:
+                self.patch(position)
+            return
+
+        node_type = node[0]
+
+        if node_type == 'function':
+            self.emit(DEFINE_FUNCTION, self.const((node[1], node[2], node[4])))
+
+        elif node_type == 'call':
+            for arg in node[2]:
+                self.compile_node(arg, None)
+            self.emit(CALL, self.const((node[1], len(node[2]))))
+
+        elif node_type == 'let':
+            self.compile_node(node[2], None)
+            if node[1] in self.slots:
+                self.emit(STORE_LET_LOCAL, self.slots[node[1]])
+            else:
+                self.emit(STORE_LET, self.name(node[1]))
+
+        elif node_type == 'binary_op':
+            self.compile_node(node[1], None)
+            right = node[3]
+            if node[2] in BINARY_CONST_OPS and isinstance(right, tuple) and right[0] == 'number':
+                self.emit(BINARY_CONST_OPS[node[2]], self.const(right[1]))
+            else:
+                self.compile_node(right, None)
+                self.emit(BINARY_OPS.get(node[2], BINARY_OTHER))
+
+        elif node_type == 'if':
+            self.compile_node(node[1], None)
+            else_jump = self.emit(POP_JUMP_IF_FALSE)
+            self.compile_node(node[2], loop_exit)
+            end_jump = self.emit(JUMP)
+            self.patch(else_jump)
+            if len(node) > 3 and node[3] is not None:
+                self.compile_node(node[3], loop_exit)
+            else:
+                self.emit(LOAD_CONST, self.const(None))
+            self.patch(end_jump)
+
+        elif node_type == 'loop':
+            start = len(self.ops)
+            exits = []
+            self.compile_node(node[1], exits)
+            exits.append(self.emit(POP_JUMP_IF_BREAK))
+            self.emit(JUMP, start)
+            for position in exits:
+                self.patch(position)
+            self.emit(LOAD_CONST, self.const(None))
+
+        elif node_type == 'break':
+            if loop_exit is not None:
+                # 末尾位置のbreakはloopの外へ直接ジャンプ
+                loop_exit.append(self.emit(JUMP))
+            else:
+                self.emit(LOAD_CONST, self.const('break'))
+
+        elif node_type == 'identifier':
+            if node[1] in self.slots:
+                self.emit(LOAD_LOCAL, self.slots[node[1]])
+            else:
+                self.emit(LOAD_NAME, self.name(node[1]))
+
+        elif node_type == 'number':
+            self.emit(LOAD_CONST, self.const(node[1]))
+
+        elif node_type == 'return':
+            self.compile_node(node[1], loop_exit)
+
+        elif node_type == 'move':
+            if node[1] in self.slots:
+                self.emit(MOVE_LOCAL, self.slots[node[1]])
+            else:
+                self.emit(MOVE, self.name(node[1]))
+
+        elif node_type == 'for':
+            self.compile_node(node[2], None)
+            self.emit(GET_ITER)
+            start = len(self.ops)
+            end_jump = self.emit(FOR_ITER)
+            if node[1] in self.slots:
+                self.emit(STORE_LOCAL, self.slots[node[1]])
+            else:
+                self.emit(STORE_NAME, self.name(node[1]))
+            self.compile_node(node[3], None)
+            self.emit(POP_JUMP, start)
+            self.patch(end_jump)
+            self.emit(LOAD_CONST, self.const(None))
+
+        elif node_type == 'range':
+            self.compile_node(node[1], None)
+            self.compile_node(node[2], None)
+            self.emit(BUILD_RANGE)
+
+        elif node_type == 'async':
+            self.emit(ASYNC, self.const(node[1]))
+
+        elif node_type == 'async_function':
+            self.emit(DEFINE_ASYNC_FUNCTION, self.const((node[1], node[2], node[4])))
+
+        elif node_type == 'await':
+            # 対象の式は future にしてから実行するので、コンパイルせずにノードのまま渡す
+            self.emit(AWAIT, self.const(node[1]))
+
+        elif node_type == 'join':
+            self.emit(JOIN, self.const(node[1]))
+
+        elif node_type == 'spawn':
+            self.emit(SPAWN, self.const(node[1]))
+
+        elif node_type == 'sleep':
+            self.compile_node(node[1], None)
+            self.emit(SLEEP)
+
+        elif node_type == 'match' and all(guard is None for pattern, guard, body in normalize_arms(node[2])):
+            # 選択表で腕を選んで、その腕の命令列へジャンプする
+            arms = normalize_arms(node[2])
+            self.compile_node(node[1], None)
+            targets = []  # 腕ごとの開始位置と、どの腕にもマッチしないときの位置
+            self.emit(MATCH_JUMP, self.const((MatchTable(arms), targets)))
+            end_jumps = []
+            for pattern, guard, body in arms:
+                targets.append(len(self.ops))
+                self.compile_node(body, loop_exit)
+                end_jumps.append(self.emit(JUMP))
+            targets.append(len(self.ops))
+            self.emit(LOAD_CONST, self.const(None))
+            for position in end_jumps:
+                self.patch(position)
+
+        elif node_type in ('match', 'match_guard'):
+            # ガードは腕ごとに評価するので、腕を順に試す（ガード付きの腕 (パターン, ガード, ボディ) を含む match も）
+            self.compile_node(node[1], None)
+            end_jumps = []
+            for pattern, guard, body in normalize_arms(node[2]):
+                self.emit(MATCH_PATTERN, self.const(pattern))
+                next_jump = self.emit(POP_JUMP_IF_FALSE)
+                guard_jump = None
+                if guard is not None:
+                    self.compile_node(guard, None)
+                    guard_jump = self.emit(POP_JUMP_IF_FALSE)
+                self.emit(POP_TOP)  # マッチ対象を捨てる
+                self.compile_node(body, loop_exit)
+                end_jumps.append(self.emit(JUMP))
+                self.patch(next_jump)
+                if guard_jump is not None:
+                    self.patch(guard_jump)
+            self.emit(POP_TOP)
+            self.emit(LOAD_CONST, self.const(None))
+            for position in end_jumps:
+                self.patch(position)
+
+        elif node_type in ('pub_struct', 'tuple_struct', 'pub_tuple_struct'):
+            self.emit(DEFINE_STRUCT, self.const(node))
+
+        elif node_type == 'field_access':
+            self.compile_node(node[1], None)
+            self.emit(LOAD_FIELD, self.const(FieldSite(node[2])))
+
+        elif node_type == 'cast':
+            self.compile_node(node[1], None)
+            self.emit(CAST, self.const(node[2]))
+
+        elif node_type == 'vec':
+            for item in node[2]:
+                self.compile_node(item, None)
+            self.emit(BUILD_VEC, self.const((node[1], len(node[2]))))
+
+        elif node_type == 'vec_repeat':
+            self.compile_node(node[2], None)
+            self.compile_node(node[3], None)
+            self.emit(VEC_REPEAT, self.const(node[1]))
+
+        elif node_type == 'index':
+            self.compile_node(node[1], None)
+            self.compile_node(node[2], None)
+            self.emit(BINARY_INDEX)
+
+        elif node_type in ('method_chain', 'method_chain_with_params'):
+            args = node[3] if node_type == 'method_chain_with_params' else []
+            self.compile_node(node[1], None)
+            for arg in args:
+                self.compile_node(arg, None)
+            self.emit(CALL_METHOD, self.const((node[2], len(args))))
+
+        elif node_type == 'closure':
+            # ボディは呼び出したときにクロージャのスコープでコンパイルする
+            self.emit(MAKE_CLOSURE, self.const(node))
+
+        elif node_type == 'struct':
+            if isinstance(node[2], list):
+                # 構造体の宣言
+                self.emit(DEFINE_STRUCT, self.const(node))
+            else:
+                keys = tuple(node[2])
+                for key in keys:
+                    self.compile_node(node[2][key], None)
+                self.emit(BUILD_STRUCT, self.const((node[1], keys)))
+
+        elif node_type == 'result':
+            if node[1] == 'Ok':
+                self.compile_node(node[2], None)
+                self.emit(MAKE_OK)
+            elif node[1] == 'Err':
+                self.compile_node(node[2], None)
+                self.emit(MAKE_ERR)
+            else:
+                self.emit(LOAD_CONST, self.const(None))
+
+        elif node_type == 'generic_function':
+            self.emit(DEFINE_GENERIC, self.const((node[1], node[2])))
+
+        elif node_type == 'const_declaration':
+            if isinstance(node[3], (tuple, list)):
+                self.compile_node(node[3], None)
+            else:
+                self.emit(LOAD_CONST, self.const(node[3]))  # パーサーの生のリテラル
+            if node[1] in self.slots:
+                self.emit(STORE_LOCAL, self.slots[node[1]])
+            else:
+                self.emit(STORE_NAME, self.name(node[1]))
+            self.emit(LOAD_CONST, self.const(None))
+
+        elif node_type == 'invariant_scope':
+            # 命令列では式の評価が軽いので、巻き上げた式もその場で評価する
+            self.compile_node(node[2], loop_exit)
+
+        elif node_type == 'invariant':
+            self.compile_node(node[2], None)
+
+        else:
+            # 未対応のノードはツリー評価と同じくNoneになる
+            self.emit(LOAD_CONST, self.const(None))
+
+
+def compile_ast(node, slots=None):
+    """ASTをコンパイルしてCodeを返す（slotsに含まれる変数はローカルとして解決）"""
+    return Compiler(slots).compile(node)
+
+
+def dis(code):
+    """命令列を人が読める形式に変換"""
+    lines = []
+    ops = code.ops
+    for pc in range(0, len(ops), 2):
+        op, arg = ops[pc], ops[pc + 1]
+        name = OPNAMES[op]
+        if op in (LOAD_NAME, STORE_LET, STORE_NAME, MOVE):
+            detail = f"{arg} ({code.names[arg]})"
+        elif op in (LOAD_LOCAL, STORE_LOCAL, STORE_LET_LOCAL, MOVE_LOCAL):
+            detail = f"{arg} ({code.varnames[arg]})"
+        elif op in (LOAD_CONST, BINARY_ADD_CONST, BINARY_SUB_CONST, BINARY_MUL_CONST, BINARY_DIV_CONST, CALL, MATCH_PATTERN, BUILD_STRUCT, DEFINE_FUNCTION, DEFINE_GENERIC, ASYNC, DEFINE_ASYNC_FUNCTION, AWAIT, JOIN, SPAWN, MATCH_JUMP, DEFINE_STRUCT, LOAD_FIELD, CAST, BUILD_VEC, VEC_REPEAT, CALL_METHOD, MAKE_CLOSURE):
+            detail = f"{arg} ({code.consts[arg]!r})"
+        elif op in (JUMP, POP_JUMP, POP_JUMP_IF_FALSE, JUMP_IF_BREAK, POP_JUMP_IF_BREAK, FOR_ITER):
+            detail = f"-> {arg}"
+        else:
+            detail = ""
+        lines.append(f"{pc:>5} {name:<18} {detail}".rstrip())
+    return "\n".join(lines)
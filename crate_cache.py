@@ -0,0 +1,154 @@
+# マシン全体で共有する、展開済みクレートのキャッシュ
+import errno
+import json
+import os
+import re
+import shutil
+import time
+
+CRATE_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "rust-runner-py", "crates")
+CRATE_CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024
+
+# 各エントリに保存するメタデータ（展開後のサイズなど）
+META_FILE = ".crate-meta.json"
+
+CHECKSUM_PATTERN = re.compile(r"[0-9a-f]{64}")
+
+class CrateCache:
+    """(クレート名, バージョン, SHA-256) をキーにした展開済みクレートのキャッシュ
+
+    エントリは <キャッシュ>/<名前>-<バージョン>-<SHA-256>/ に置かれ、.crate のチェックサムは挿入時に一度だけ検証する。
+    メタデータは検証した後に書き、ディレクトリごとrenameして登録するので、メタデータの名前、バージョン、
+    チェックサムがディレクトリ名と一致するエントリは検証済みとみなし、参照時にはファイルの中身を読まない。
+    一致しないエントリ（途中で壊れたものなど）は参照時に削除する。
+    参照のたびに更新時刻を更新し、容量を超えたら最終参照の古い順に削除する。
+    """
+
+    def __init__(self, cache_dir=CRATE_CACHE_DIR, max_bytes=CRATE_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    def entry_path(self, name, version, checksum):
+        return os.path.join(self.cache_dir, f"{name}-{version}-{checksum}")
+
+    def staging_path(self, name, version):
+        """展開途中のディレクトリ（完成後にrenameできるようキャッシュと同じファイルシステムに置く）"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        return os.path.join(self.cache_dir, f".{name}-{version}-{os.getpid()}-{time.monotonic_ns()}.partial")
+
+    def lookup(self, name, version, checksum=None):
+        """キャッシュ済みエントリのパスを返す（チェックサムが不明なら名前とバージョンで探す）"""
+        if checksum:
+            path = self.entry_path(name, version, checksum)
+            if not os.path.isdir(path):
+                return None
+            return path if self.verify(path, name, version, checksum) else None
+        prefix = f"{name}-{version}-"
+        try:
+            names = sorted(os.listdir(self.cache_dir))
+        except OSError:
+            return None
+        for entry in names:
+            if entry.startswith(prefix) and CHECKSUM_PATTERN.fullmatch(entry[len(prefix):]):
+                path = os.path.join(self.cache_dir, entry)
+                if self.verify(path, name, version, entry[len(prefix):]):
+                    return path
+        return None
+
+    def read_meta(self, path, name, version, checksum):
+        """エントリのメタデータ（名前、バージョン、チェックサムがディレクトリ名と食い違えばNone）"""
+        try:
+            with open(os.path.join(path, META_FILE), 'r') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(meta, dict) or (meta.get("name"), meta.get("version"), meta.get("checksum")) != (name, version, checksum):
+            return None
+        return meta
+
+    def verify(self, path, name, version, checksum):
+        """挿入時に検証したエントリか確かめる（メタデータがないか食い違うエントリは削除する）"""
+        if self.read_meta(path, name, version, checksum) is not None:
+            return True
+        print(f"キャッシュのエントリが壊れているため削除します: {os.path.basename(path)}")
+        shutil.rmtree(path, ignore_errors=True)
+        return False
+
+    def insert(self, name, version, checksum, staging_dir):
+        """検証済みの展開したディレクトリをキャッシュに登録してエントリのパスを返す"""
+        size = 0
+        for root, _, files in os.walk(staging_dir):
+            for file_name in files:
+                size += os.path.getsize(os.path.join(root, file_name))
+        with open(os.path.join(staging_dir, META_FILE), 'w') as f:
+            json.dump({"name": name, "version": version, "checksum": checksum, "size": size}, f)
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self.entry_path(name, version, checksum)
+        try:
+            os.replace(staging_dir, path)
+        except OSError as e:
+            if e.errno not in (errno.ENOTEMPTY, errno.EEXIST):
+                shutil.rmtree(staging_dir, ignore_errors=True)
+                raise
+            if self.verify(path, name, version, checksum):
+                # 他のプロセスが同じクレートを先に登録した
+                shutil.rmtree(staging_dir, ignore_errors=True)
+            else:
+                os.replace(staging_dir, path)  # 壊れていたエントリは verify が削除した
+        self.evict(keep=path)
+        return path
+
+    def touch(self, path):
+        """LRUの順序を更新"""
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def link(self, path, dest_dir):
+        """キャッシュのエントリをプロジェクトの rust_modules/<名前> から参照できるようにする"""
+        self.touch(path)
+        if os.path.islink(dest_dir):
+            if os.path.realpath(dest_dir) == os.path.realpath(path):
+                return
+            os.remove(dest_dir)
+        elif os.path.exists(dest_dir):
+            shutil.rmtree(dest_dir)
+        try:
+            os.symlink(path, dest_dir, target_is_directory=True)
+        except OSError:
+            # シンボリックリンクが使えない環境ではコピーする
+            shutil.copytree(path, dest_dir)
+
+    def entries(self):
+        """(最終参照時刻, サイズ, パス) のリスト"""
+        result = []
+        try:
+            names = os.listdir(self.cache_dir)
+        except OSError:
+            return result
+        for entry in names:
+            if entry.startswith('.'):
+                continue
+            path = os.path.join(self.cache_dir, entry)
+            try:
+                with open(os.path.join(path, META_FILE), 'r') as f:
+                    size = json.load(f).get("size", 0)
+                mtime = os.stat(path).st_mtime
+            except (OSError, ValueError):
+                continue
+            result.append((mtime, size, path))
+        return result
+
+    def evict(self, keep=None):
+        """合計サイズが上限を超えた分を最終参照の古い順に削除"""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
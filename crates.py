@@ -0,0 +1,83 @@
+# .crate（gzip圧縮されたtar）をストリームのまま展開する処理
+import hashlib
+import os
+import shutil
+import tarfile
+
+EXTRACT_CHUNK_SIZE = 64 * 1024
+
+
+class StreamReader:
+    """バイト列のチャンクを返すイテレータを、tarfileが読めるファイルライクなオブジェクトにする
+
+    読み込んだバイト列のSHA-256も同時に計算する（crates.ioのチェックサムは.crateファイル全体のSHA-256）。
+    """
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.buffer = bytearray()
+        self.bytes_read = 0
+        self.digest = hashlib.sha256()
+
+    def read(self, size=-1):
+        # 要求された分だけチャンクを読み進める（全体をメモリに載せない）
+        while size < 0 or len(self.buffer) < size:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                break
+            self.digest.update(chunk)
+            self.buffer += chunk
+        if size < 0 or size >= len(self.buffer):
+            data = bytes(self.buffer)
+            self.buffer.clear()
+        else:
+            data = bytes(self.buffer[:size])
+            del self.buffer[:size]
+        self.bytes_read += len(data)
+        return data
+
+    def drain(self):
+        """tarの終端より後ろの残り（gzipのトレーラなど）も読み切ってチェックサムに含める"""
+        while self.read(EXTRACT_CHUNK_SIZE):
+            pass
+
+    def hexdigest(self):
+        return self.digest.hexdigest()
+
+
+def member_path(dest_dir, name):
+    """tarのメンバー名を展開先の中のパスに変換（展開先の外を指すものはNone）"""
+    if os.path.isabs(name) or '\\' in name:
+        return None
+    root = os.path.realpath(dest_dir)
+    target = os.path.realpath(os.path.join(root, name))
+    if target != root and not target.startswith(root + os.sep):
+        return None
+    return target
+
+
+def extract_crate_stream(fileobj, dest_dir):
+    """gzip+tarのストリームを先頭から順に読みながら dest_dir に展開
+
+    通常のファイルとディレクトリだけを展開し、展開先の外を指すパスやリンク、デバイスファイルは無視する。
+    展開したファイル数を返す。
+    """
+    os.makedirs(dest_dir, exist_ok=True)
+    count = 0
+    # 'r|gz' はシーク不要のストリームモードで、一定サイズのバッファで読み進める
+    with tarfile.open(fileobj=fileobj, mode='r|gz') as tar:
+        for member in tar:
+            target = member_path(dest_dir, member.name)
+            if target is None:
+                print(f"展開先の外を指すため無視します: {member.name}")
+                continue
+            if member.isdir():
+                os.makedirs(target, exist_ok=True)
+            elif member.isfile():
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                source = tar.extractfile(member)
+                with open(target, 'wb') as f:
+                    shutil.copyfileobj(source, f, EXTRACT_CHUNK_SIZE)
+                os.chmod(target, 0o755 if member.mode & 0o111 else 0o644)
+                count += 1
+    return count
@@ -0,0 +1,269 @@
+"""Unixドメインソケットで実行リクエストを受け付ける常駐サーバーとクライアント
+
+    python daemon.py serve [--socket PATH]          # サーバーを起動
+    python daemon.py run file.rs [--socket PATH]    # ファイルを実行（- なら標準入力）
+
+パーサーとパース済みのASTはサーバーに常駐させ、リクエストごとに新しいシミュレーターで実行する。
+プロトコルは1行1つのJSONで、クライアントは {"source" または "path", "engine", "lexer", "optimize"} を送り、
+サーバーは実行中の出力を {"type": "stdout", "data"} で逐次返し、最後に {"type": "result", ...} を返す。
+"""
+import argparse
+import json
+import os
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from collections import OrderedDict
+
+SOCKET_PATH = os.environ.get(
+    "RUST_RUNNER_SOCKET", os.path.join(tempfile.gettempdir(), f"rust-runner-{os.getuid()}.sock"))
+
+# サーバーに保持するパース済みASTの数
+AST_CACHE_ENTRIES = 256
+
+
+class ThreadLocalStdout:
+    """スレッドごとに書き込み先を切り替える sys.stdout の代わり
+
+    シミュレーターは print で出力するので、リクエストを処理するスレッドの出力だけをそのクライアントに送る。
+    """
+
+    def __init__(self, default):
+        self.default = default
+        self.local = threading.local()
+
+    def target(self):
+        return getattr(self.local, "target", None) or self.default
+
+    def redirect(self, target):
+        self.local.target = target
+
+    def write(self, text):
+        return self.target().write(text)
+
+    def flush(self):
+        self.target().flush()
+
+    def __getattr__(self, name):
+        return getattr(self.default, name)
+
+
+class StreamWriter:
+    """書き込まれた出力を行単位で stdout メッセージとしてクライアントに送る"""
+
+    def __init__(self, send):
+        self.send = send
+        self.buffer = ""
+
+    def write(self, text):
+        self.buffer += text
+        if "\n" in self.buffer:
+            lines, _, self.buffer = self.buffer.rpartition("\n")
+            self.send({"type": "stdout", "data": lines + "\n"})
+        return len(text)
+
+    def flush(self):
+        if self.buffer:
+            self.send({"type": "stdout", "data": self.buffer})
+            self.buffer = ""
+
+
+class SimulationServer(socketserver.ThreadingUnixStreamServer):
+    """パーサーとパース済みASTを保持し、リクエストごとに新しいシミュレーターで実行するサーバー"""
+    daemon_threads = True
+
+    def __init__(self, socket_path):
+        super().__init__(socket_path, RequestHandler)
+        self.socket_path = socket_path
+        self.asts = OrderedDict()  # (ソース, 字句解析器) -> AST（LRU）
+        self.parse_lock = threading.Lock()  # PLYのパーサーは解析中の状態をインスタンスに持つ
+        self.requests = 0
+        self.requests_lock = threading.Lock()  # リクエストは接続ごとのスレッドで処理する
+
+    def parse(self, source, lexer):
+        """パース済みのASTを返す（同じソースは再パースしない。構文エラーのあったASTは保持しない）"""
+        from main import parse_rust_code
+        from parser import syntax_errors
+
+        key = (source, lexer)
+        with self.parse_lock:
+            ast = self.asts.get(key)
+            if ast is not None:
+                self.asts.move_to_end(key)
+                return ast
+            ast = parse_rust_code(source, None, lexer)
+            if syntax_errors:
+                # エラー回復した不完全なASTを使い回すと、次からは構文エラーが報告されない
+                return ast
+            self.asts[key] = ast
+            if len(self.asts) > AST_CACHE_ENTRIES:
+                self.asts.popitem(last=False)
+            return ast
+
+    def run(self, request, send):
+        """1つのリクエストを実行し、出力を send で逐次送って結果の辞書を返す"""
+        from main import ENGINES, prepare_ast
+
+        result = {"type": "result", "ok": False, "error": None, "parse_ms": 0.0, "run_ms": 0.0}
+        writer = StreamWriter(send)
+        sys.stdout.redirect(writer)
+        start = time.perf_counter()
+        parsed = start
+        try:
+            if "source" in request:
+                source = request["source"]
+            else:
+                with open(request["path"], 'r', encoding='utf-8') as f:
+                    source = f.read()
+            ast = self.parse(source, request.get("lexer", "fast"))
+            simulator = ENGINES[request.get("engine", "tree")]()  # リクエストごとに新しい状態で実行する
+            ast = prepare_ast(ast, simulator, request.get("optimize", True))
+            parsed = time.perf_counter()
+            simulator.eval_ast(ast)
+            result["ok"] = True
+        except Exception:
+            result["error"] = traceback.format_exc()
+        finally:
+            writer.flush()
+            sys.stdout.redirect(None)
+        end = time.perf_counter()
+        result["parse_ms"] = (parsed - start) * 1000
+        result["run_ms"] = (end - parsed) * 1000
+        return result
+
+    def serve(self):
+        # 起動時にパーサーを読み込んでおく
+        from parser import parser  # 構文解析表の読み込み
+        import fastlex
+        sys.stdout = ThreadLocalStdout(sys.stdout)
+        print(f"{self.socket_path} で待ち受けています (Ctrl+Cで終了)")
+        try:
+            self.serve_forever()
+        except KeyboardInterrupt:
+            print("サーバーを終了します")
+        finally:
+            self.server_close()
+            try:
+                os.remove(self.socket_path)
+            except OSError:
+                pass
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    """1接続で複数のリクエストを順に処理する"""
+
+    def handle(self):
+        lock = threading.Lock()
+
+        def send(message):
+            with lock:
+                self.wfile.write(json.dumps(message, ensure_ascii=False).encode('utf-8') + b"\n")
+                self.wfile.flush()
+
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                send({"type": "result", "ok": False, "error": f"不正なリクエストです: {e}"})
+                continue
+            op = request.get("op", "run")
+            if op == "ping":
+                send({"type": "result", "ok": True, "requests": self.server.requests})
+            elif op == "shutdown":
+                send({"type": "result", "ok": True})
+                threading.Thread(target=self.server.shutdown, daemon=True).start()
+                return
+            else:
+                with self.server.requests_lock:
+                    self.server.requests += 1
+                send(self.server.run(request, send))
+
+
+def remove_stale_socket(socket_path):
+    """前回のサーバーが残したソケットファイルを削除（動作中のサーバーがあればFalse）"""
+    if not os.path.exists(socket_path):
+        return True
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(socket_path)
+        return False
+    except OSError:
+        os.remove(socket_path)
+        return True
+    finally:
+        client.close()
+
+
+def request(message, socket_path=SOCKET_PATH, output=None):
+    """サーバーにリクエストを送り、出力を output に書きながら結果の辞書を返す"""
+    output = output or sys.stdout
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(socket_path)
+        client.sendall(json.dumps(message, ensure_ascii=False).encode('utf-8') + b"\n")
+        with client.makefile('rb') as reader:
+            for line in reader:
+                reply = json.loads(line)
+                if reply["type"] == "stdout":
+                    output.write(reply["data"])
+                    output.flush()
+                elif reply["type"] == "result":
+                    return reply
+    raise ConnectionError("サーバーが結果を返さずに接続を閉じました")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rustシミュレーターの常駐サーバーとクライアント")
+    parser.add_argument("--socket", default=SOCKET_PATH, help="Unixドメインソケットのパス")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("serve", help="サーバーを起動")
+    run_parser = commands.add_parser("run", help="サーバーでRustファイルを実行（- なら標準入力のソース）")
+    run_parser.add_argument("rust_file")
+    run_parser.add_argument("--engine", default="tree", help="評価エンジン (tree, vm)")
+    run_parser.add_argument("--lexer", default="fast", help="字句解析器 (fast, ply)")
+    run_parser.add_argument("--no-optimize", action="store_true", help="パース後の最適化を行わない")
+    run_parser.add_argument("--timing", action="store_true", help="パースと実行の所要時間を表示")
+    commands.add_parser("ping", help="サーバーの稼働を確認")
+    commands.add_parser("stop", help="サーバーを終了")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        if not remove_stale_socket(args.socket):
+            print(f"{args.socket} ではすでにサーバーが動作しています")
+            sys.exit(1)
+        SimulationServer(args.socket).serve()
+        return
+
+    try:
+        if args.command == "run":
+            message = {"engine": args.engine, "lexer": args.lexer, "optimize": not args.no_optimize}
+            if args.rust_file == "-":
+                message["source"] = sys.stdin.read()
+            else:
+                message["path"] = os.path.abspath(args.rust_file)  # サーバーとは作業ディレクトリが異なる
+            start = time.perf_counter()
+            result = request(message, args.socket)
+            if result["error"]:
+                print(result["error"], file=sys.stderr, end="")
+            if args.timing:
+                print(f"パース {result['parse_ms']:.2f}ms, 実行 {result['run_ms']:.2f}ms, "
+                      f"往復 {(time.perf_counter() - start) * 1000:.2f}ms", file=sys.stderr)
+            sys.exit(0 if result["ok"] else 1)
+        elif args.command == "ping":
+            result = request({"op": "ping"}, args.socket)
+            print(f"サーバーは稼働中です（処理済みリクエスト {result['requests']} 件）")
+        elif args.command == "stop":
+            request({"op": "shutdown"}, args.socket)
+            print("サーバーを終了しました")
+    except (ConnectionRefusedError, FileNotFoundError):
+        print(f"{args.socket} のサーバーに接続できません（python daemon.py serve で起動してください）")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
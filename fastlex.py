@@ -0,0 +1,221 @@
+"""PLYの lex.lexer と同じトークン列を高速に生成する字句解析器
+
+    parser.parse(source, lexer=FastLexer())
+
+PLYはトークンごとに巨大な正規表現を照合し直し、関数ルールを呼び出してトークンを作る。
+ここでは同じ規則を1つの正規表現にまとめて finditer で入力全体を一度に走査し、
+記号はまとめて1つのグループで受けて辞書で種類を引く。yaccにはトークンのリストの next をそのまま渡す。
+
+規則の優先順位は lex.py から生成されるPLYのマスター正規表現と同じにしてある
+（関数ルールを定義順に、次に文字列ルールを正規表現の長い順に試す）。
+lex.py のトークン定義を変えたらこちらも合わせて変更する。tests/test_fastlex.py が境界や不正な文字を含む
+入力で差分がないことを確かめるほか、手元のファイルでも次のように確認できる。
+
+    python fastlex.py [--bench] file.rs ...
+"""
+import re
+import sys
+from functools import partial
+
+from lex import keywords
+
+# 記号（同じ文字で始まるものは長い方を先に試す）
+PUNCTUATION = {
+    '||': 'OR', '&&': 'AND', '->': 'ARROW', '=>': 'FAT_ARROW', '::': 'DOUBLECOLON',
+    '+': 'PLUS', '*': 'MULT', '(': 'LPAREN', ')': 'RPAREN', '{': 'LBRACE', '}': 'RBRACE',
+    '[': 'LBRACKET', ']': 'RBRACKET', ',': 'COMMA', '.': 'DOT', '#': 'HASH', '?': 'QUESTION_MARK',
+    '|': 'PIPE', '\\': 'BACKSLASH', '-': 'MINUS', '/': 'DIV', '%': 'MOD', '=': 'EQ',
+    '<': 'LESS', '>': 'GREATER', '&': 'AMP', '!': 'NOT', ':': 'COLON', ';': 'SEMICOLON',
+}
+
+# グループ番号（m.lastindex で種類を判定する）
+NAME, COMMENT, PUNCT, NUMBER, NEWLINE, STRING, LIFETIME, ERROR = range(1, 9)
+
+# 空白とタブ（t_ignore）は各トークンの前に読み飛ばす。
+# 重なりのある規則（コメントと '/'、文字列と '"' など）はPLYと同じ順に並べ、
+# 重ならない規則は出現頻度の高い順に並べる。どこにも一致しない文字は ERROR で1文字ずつ受ける
+MASTER_PATTERN = re.compile(
+    r"[ \t]*(?:"
+    r"([a-zA-Z_][a-zA-Z0-9_]*)"
+    r"|(//.*|/\*[\s\S]*?\*/)"
+    r"|(\|\||&&|->|=>|::|[+*(){}\[\],.#?|\\\-/%=<>&!:;])"
+    r"|(\d+)"
+    r"|(\n+)"
+    r"|(\".*?\")"
+    r"|('[a-zA-Z_][a-zA-Z0-9_]*)"
+    r"|([^ \t]))"
+)
+
+
+class LexToken:
+    """PLYの LexToken と同じ属性を持つトークン（lexer はyaccがエラー時に設定する）"""
+    __slots__ = ('type', 'value', 'lineno', 'lexpos', 'lexer')
+
+    def __init__(self, type, value, lineno, lexpos):
+        self.type = type
+        self.value = value
+        self.lineno = lineno
+        self.lexpos = lexpos
+
+    def __str__(self):
+        return f"LexToken({self.type},{self.value!r},{self.lineno},{self.lexpos})"
+
+    __repr__ = __str__
+
+
+class FastLexer:
+    """PLYのLexerと同じ input()/token() を持つ字句解析器
+
+    PLYと同様、input() では行番号をリセットしない（同じインスタンスを使い回すと行番号が増え続ける）。
+    """
+
+    def __init__(self):
+        self.lineno = 1
+        self.lexdata = ""
+        self.token = self._end
+
+    def _end(self):
+        return None
+
+    def input(self, data):
+        self.lexdata = data
+        tokens, errors = self.tokenize(data)
+        # yaccは input() の後で lexer.token を一度だけ取り出して呼び続けるので、リストの next を直接渡す
+        if errors:
+            self.token = partial(next, self.replay(tokens, errors), None)
+        else:
+            self.token = partial(next, iter(tokens), None)
+
+    def clone(self):
+        lexer = FastLexer()
+        lexer.lineno = self.lineno
+        return lexer
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        tok = self.token()
+        if tok is None:
+            raise StopIteration
+        return tok
+
+    def tokenize(self, data):
+        """data 全体を走査して (トークンのリスト, [(直後のトークンの位置, 不正な文字)]) を返す"""
+        get_keyword = keywords.get
+        get_punct = PUNCTUATION.__getitem__
+        lineno = self.lineno
+        tokens = []
+        append = tokens.append
+        errors = []
+        for m in MASTER_PATTERN.finditer(data):
+            kind = m.lastindex
+            # 先頭の空白を含むので、トークンの位置は終端から逆算する
+            if kind == NAME:
+                value = m[NAME]
+                append(LexToken(get_keyword(value, 'NAME'), value, lineno, m.end() - len(value)))
+            elif kind == PUNCT:
+                value = m[PUNCT]
+                append(LexToken(get_punct(value), value, lineno, m.end() - len(value)))
+            elif kind == NEWLINE:
+                lineno += len(m[NEWLINE])
+            elif kind == NUMBER:
+                value = m[NUMBER]
+                append(LexToken('NUMBER', int(value), lineno, m.end() - len(value)))
+            elif kind == STRING:
+                value = m[STRING]
+                append(LexToken('STRING', value[1:-1], lineno, m.end() - len(value)))
+            elif kind == LIFETIME:
+                value = m[LIFETIME]
+                append(LexToken('LIFETIME', value, lineno, m.end() - len(value)))
+            elif kind == ERROR:
+                errors.append((len(tokens), m[ERROR]))
+        self.lineno = lineno
+        return tokens, errors
+
+    def replay(self, tokens, errors):
+        """PLYと同じく、不正な文字の表示をその直後のトークンを取り出すときに行う"""
+        errors = iter(errors)
+        error = next(errors, None)
+        for index in range(len(tokens) + 1):
+            while error is not None and error[0] == index:
+                # lex.t_error と同じ表示（その文字は読み飛ばされる）
+                print(f"Illegal character '{error[1]}'")
+                error = next(errors, None)
+            if index < len(tokens):
+                yield tokens[index]
+
+
+def token_stream(lexer, data):
+    """(type, value, lineno, lexpos) のリスト"""
+    lexer.input(data)
+    result = []
+    while True:
+        tok = lexer.token()
+        if tok is None:
+            return result
+        result.append((tok.type, tok.value, tok.lineno, tok.lexpos))
+
+
+def compare_tokens(data):
+    """PLYの字句解析器と同じトークン列になるか比べ、最初の食い違い（なければNone）を返す"""
+    from lex import lexer as ply_lexer
+
+    ply_lexer = ply_lexer.clone()
+    ply_lexer.lineno = 1
+    expected = token_stream(ply_lexer, data)
+    actual = token_stream(FastLexer(), data)
+    for index, (want, got) in enumerate(zip(expected, actual)):
+        if want != got:
+            return index, want, got
+    if len(expected) != len(actual):
+        index = min(len(expected), len(actual))
+        return (index, expected[index] if index < len(expected) else None,
+                actual[index] if index < len(actual) else None)
+    return None
+
+
+BENCH_RUNS = 5
+
+
+def main():
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="FastLexerとPLYの字句解析器のトークン列を比較")
+    parser.add_argument("files", nargs="+", help="比較するRustファイル")
+    parser.add_argument("--bench", action="store_true", help="両方の字句解析の速度も計測する")
+    args = parser.parse_args()
+
+    failed = False
+    for path in args.files:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = f.read()
+        mismatch = compare_tokens(data)
+        if mismatch is None:
+            print(f"{path}: 一致")
+        else:
+            failed = True
+            index, want, got = mismatch
+            print(f"{path}: {index} 番目のトークンが異なります PLY={want} fast={got}")
+        if args.bench:
+            from lex import lexer as ply_lexer
+            for name, make_lexer in (("PLY", ply_lexer.clone), ("fast", FastLexer)):
+                # 計測のぶれを抑えるため、数回実行して最短の時間を使う
+                elapsed = None
+                for _ in range(BENCH_RUNS):
+                    lexer = make_lexer()
+                    start = time.perf_counter()
+                    lexer.input(data)
+                    get_token = lexer.token
+                    count = 0
+                    while get_token() is not None:
+                        count += 1
+                    run = time.perf_counter() - start
+                    elapsed = run if elapsed is None else min(elapsed, run)
+                print(f"  {name:<5} {count} トークン {elapsed * 1000:.1f}ms ({len(data) / elapsed / 1e6:.2f} MB/s)")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
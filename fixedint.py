@@ -0,0 +1,205 @@
+# 幅の決まった整数型（i8 ... u64、isize、usize）
+#
+# 型ごとに int のサブクラスを作り、四則演算の結果が型の範囲を超えたら Rust と同じく扱う。
+#   - overflow='panic'（既定、Rustのデバッグビルド）: "attempt to add with overflow" のエラー（IntegerOverflowError）
+#   - overflow='wrap'（リリースビルド）: 2の補数で折り返す
+# 型のない整数（リテラル）との演算は相手の型に合わせ、型の違う整数どうしの演算は型エラーにする。
+# / は0に向かって切り捨てる整数の割り算で、0での割り算はどちらのモードでもエラーになる。
+# wrapping_add などのメソッドと as による変換（cast）は、モードによらず折り返す。
+# 型のない整数の演算は int のままなので、これまでの評価には何も追加されない。
+import struct
+
+# 型名 -> (ビット数, 符号付きか)
+INT_TYPES = {
+    'i8': (8, True), 'i16': (16, True), 'i32': (32, True), 'i64': (64, True), 'i128': (128, True),
+    'isize': (64, True),
+    'u8': (8, False), 'u16': (16, False), 'u32': (32, False), 'u64': (64, False), 'u128': (128, False),
+    'usize': (64, False),
+}
+FLOAT_TYPES = ('f32', 'f64')
+OVERFLOW_MODES = ('panic', 'wrap')
+
+# 演算子 -> オーバーフローのエラーメッセージの動詞
+OPERATION_NAMES = {'+': 'add', '-': 'subtract', '*': 'multiply', '/': 'divide'}
+
+
+class IntegerOverflowError(RuntimeError):
+    """整数の演算の結果が型の範囲を超えた（Rustのデバッグビルドの panic に相当）"""
+
+    def __init__(self, operator, type_name):
+        super().__init__(f"attempt to {OPERATION_NAMES[operator]} with overflow (`{type_name}`)")
+        self.type_name = type_name
+
+
+class FixedInt(int):
+    """幅の決まった整数の基底クラス（型ごとのサブクラスが type_name、min、max、wrapping を持つ）"""
+    __slots__ = ()
+    type_name = None
+    bits = 0
+    signed = True
+    min = 0
+    max = 0
+    wrapping = False  # 範囲を超えたら折り返すか（False ならエラー）
+    rust_methods = frozenset(('wrapping_add', 'wrapping_sub', 'wrapping_mul',
+                              'saturating_add', 'saturating_sub', 'saturating_mul', 'pow'))
+
+    @classmethod
+    def wrap(cls, value):
+        """2の補数で型の範囲に折り返す"""
+        value &= (1 << cls.bits) - 1
+        if cls.signed and value > cls.max:
+            value -= 1 << cls.bits
+        return cls(value)
+
+    def operand(self, other, operator):
+        """演算の相手を int にする（型のない整数はこの型とみなす。扱えない値ならNone）"""
+        if type(other) is int or type(other) is bool:
+            return other
+        if isinstance(other, FixedInt):
+            if other.type_name != self.type_name:
+                raise TypeError(f"mismatched types: cannot {OPERATION_NAMES[operator]} "
+                                f"`{other.type_name}` to `{self.type_name}`")
+            return int(other)
+        return None
+
+    def result(self, value, operator):
+        if self.min <= value <= self.max:
+            return type(self)(value)
+        if self.wrapping:
+            return self.wrap(value)
+        raise IntegerOverflowError(operator, self.type_name)
+
+    def __add__(self, other):
+        other = self.operand(other, '+')
+        if other is None:
+            return NotImplemented
+        return self.result(int(self) + other, '+')
+
+    def __radd__(self, other):
+        other = self.operand(other, '+')
+        if other is None:
+            return NotImplemented
+        return self.result(other + int(self), '+')
+
+    def __sub__(self, other):
+        other = self.operand(other, '-')
+        if other is None:
+            return NotImplemented
+        return self.result(int(self) - other, '-')
+
+    def __rsub__(self, other):
+        other = self.operand(other, '-')
+        if other is None:
+            return NotImplemented
+        return self.result(other - int(self), '-')
+
+    def __mul__(self, other):
+        other = self.operand(other, '*')
+        if other is None:
+            return NotImplemented
+        return self.result(int(self) * other, '*')
+
+    def __rmul__(self, other):
+        other = self.operand(other, '*')
+        if other is None:
+            return NotImplemented
+        return self.result(other * int(self), '*')
+
+    def __truediv__(self, other):
+        other = self.operand(other, '/')
+        if other is None:
+            return NotImplemented
+        return self.divide(int(self), other)
+
+    def __rtruediv__(self, other):
+        other = self.operand(other, '/')
+        if other is None:
+            return NotImplemented
+        return self.divide(other, int(self))
+
+    def divide(self, left, right):
+        """0に向かって切り捨てる割り算（MIN / -1 は折り返すモードでもエラー）"""
+        if right == 0:
+            raise ZeroDivisionError("attempt to divide by zero")
+        quotient = abs(left) // abs(right)
+        if (left < 0) != (right < 0):
+            quotient = -quotient
+        if not self.min <= quotient <= self.max:
+            raise IntegerOverflowError('/', self.type_name)
+        return type(self)(quotient)
+
+    # --- Rustのメソッド（モードによらない） ---
+
+    def wrapping_add(self, other):
+        return self.wrap(int(self) + self.operand(other, '+'))
+
+    def wrapping_sub(self, other):
+        return self.wrap(int(self) - self.operand(other, '-'))
+
+    def wrapping_mul(self, other):
+        return self.wrap(int(self) * self.operand(other, '*'))
+
+    def saturate(self, value):
+        return type(self)(min(max(value, self.min), self.max))
+
+    def saturating_add(self, other):
+        return self.saturate(int(self) + self.operand(other, '+'))
+
+    def saturating_sub(self, other):
+        return self.saturate(int(self) - self.operand(other, '-'))
+
+    def saturating_mul(self, other):
+        return self.saturate(int(self) * self.operand(other, '*'))
+
+    def pow(self, exponent):
+        return self.result(int(self) ** int(exponent), '*')
+
+
+# (型名, 折り返すか) -> FixedInt のサブクラス
+_int_classes = {}
+
+
+def int_type(type_name, wrapping=False):
+    """型名の整数のクラス（同じ型名とモードには同じクラスを返す）"""
+    cls = _int_classes.get((type_name, wrapping))
+    if cls is None:
+        bits, signed = INT_TYPES[type_name]
+        low, high = (-(1 << (bits - 1)), (1 << (bits - 1)) - 1) if signed else (0, (1 << bits) - 1)
+        cls = type(type_name, (FixedInt,), {
+            '__slots__': (), 'type_name': type_name, 'bits': bits, 'signed': signed,
+            'min': low, 'max': high, 'wrapping': wrapping,
+        })
+        _int_classes[(type_name, wrapping)] = cls
+    return cls
+
+
+def to_f32(value):
+    """f32 に丸めた値"""
+    return struct.unpack('f', struct.pack('f', value))[0]
+
+
+def f32_repr(value):
+    """f32 の値を、f32 に戻すと同じ値になる最短の桁数で表す（Rustの表示と同じく 1.1 は 1.1）"""
+    for digits in range(1, 10):
+        text = f"{value:.{digits}g}"
+        if to_f32(float(text)) == value:
+            return repr(float(text))
+    return repr(value)
+
+
+def cast(value, type_name, wrapping=False):
+    """as による型変換（整数は折り返し、浮動小数点数から整数は飽和させ、NaN は0にする）"""
+    if type_name in INT_TYPES:
+        cls = int_type(type_name, wrapping)
+        if isinstance(value, float):
+            if value != value:
+                return cls(0)
+            if value in (float('inf'), float('-inf')):
+                return cls(cls.max if value > 0 else cls.min)
+            return cls(min(max(int(value), cls.min), cls.max))
+        return cls.wrap(int(value))
+    if type_name == 'f64':
+        return float(value)
+    if type_name == 'f32':
+        return to_f32(float(value))
+    raise TypeError(f"`{type_name}` への変換はできません")
@@ -0,0 +1,102 @@
+# 変更されたトップレベルの項目だけを再パースするパーサー（--watch 用）
+from toplevel import split_items, has_tokens
+
+
+def common_prefix_length(a, b):
+    """a と b の先頭から一致する長さ（スライスの比較で二分探索する）"""
+    low, high = 0, min(len(a), len(b))
+    while low < high:
+        mid = (low + high + 1) // 2
+        if a[low:mid] == b[low:mid]:
+            low = mid
+        else:
+            high = mid - 1
+    return low
+
+
+def common_suffix_length(a, b, limit):
+    """a と b の末尾から一致する長さ（limit まで）"""
+    low, high = 0, limit
+    while low < high:
+        mid = (low + high + 1) // 2
+        if a[len(a) - mid:len(a) - low] == b[len(b) - mid:len(b) - low]:
+            low = mid
+        else:
+            high = mid - 1
+    return low
+
+
+class IncrementalParser:
+    """ソースをトップレベルの項目に分け、項目ごとのASTを再利用する
+
+    更新時は前回のソースとの差分の範囲だけ項目の区切りを探し直し、
+    変更後の区切りが前回の区切りと一致したところから後ろは前回の項目をそのまま使う。
+    """
+
+    def __init__(self, parse):
+        self.parse = parse  # parse(項目のテキスト, 開始行) -> 文のリスト
+        self.source = ""
+        self.spans = []  # 項目の (開始, 終了)
+        self.asts = []  # 項目ごとの文のリスト
+        self.reparsed = 0
+        self.reused = 0
+
+    def parse_item(self, source, start, end, known):
+        text = source[start:end]
+        ast = known.get(text)
+        if ast is not None:
+            self.reused += 1
+            return ast
+        if not has_tokens(text):
+            return []
+        self.reparsed += 1
+        return self.parse(text, source.count('\n', 0, start) + 1) or []
+
+    def update(self, source):
+        """新しいソースのASTを返す（reparsed/reused に今回の再パース数と再利用数が入る）"""
+        self.reparsed = 0
+        self.reused = 0
+        old_source, old_spans, old_asts = self.source, self.spans, self.asts
+
+        prefix = common_prefix_length(old_source, source)
+        suffix = common_suffix_length(old_source, source, min(len(old_source), len(source)) - prefix)
+        delta = len(source) - len(old_source)
+
+        # 変更位置を含む項目の1つ前から探し直す（項目の終端の判定は直後のセミコロンまで先読みするため）
+        first = 0
+        while first < len(old_spans) and old_spans[first][1] <= prefix:
+            first += 1
+        first = max(first - 1, 0)
+        if prefix == len(old_source) == len(source):
+            first = len(old_spans)  # 変更なし
+
+        # 前回の区切りの終端 -> 項目の番号（変更箇所より後ろのもの）
+        old_ends = {end: index for index, (_, end) in enumerate(old_spans) if end >= len(old_source) - suffix}
+        # 変更範囲にあった項目は、テキストが同じなら（移動しただけなど）再パースしない
+        known = {}
+        changed_end = len(old_source) - suffix
+        for index in range(first, len(old_spans)):
+            start, end = old_spans[index]
+            if start > changed_end:
+                break
+            known[old_source[start:end]] = old_asts[index]
+
+        spans = old_spans[:first]
+        asts = old_asts[:first]
+        self.reused += first
+        start = spans[-1][1] if spans else 0
+        rest = None
+        for start, end in split_items(source, start):
+            spans.append((start, end))
+            asts.append(self.parse_item(source, start, end, known))
+            if end >= len(source) - suffix and end - delta in old_ends:
+                rest = old_ends[end - delta] + 1
+                break
+        if rest is not None:
+            # ここから後ろは前回と同じ区切りなので位置をずらして再利用する
+            spans.extend((start + delta, end + delta) for start, end in old_spans[rest:])
+            asts.extend(old_asts[rest:])
+            self.reused += len(old_spans) - rest
+
+        self.source, self.spans, self.asts = source, spans, asts
+        return [stmt for ast in asts for stmt in ast]
@@ -0,0 +1,82 @@
+# Rustのイテレーターのアダプター（iter().map(...).filter(...).sum() など）
+#
+# RustIter は Python のイテレーターを1つ包み、アダプターのメソッドは組み込みの map、filter、enumerate、
+# itertools.islice、zip で包み直した新しい RustIter を返す。要素は終端のメソッド（fold、sum、count、collect）
+# か for ループが取り出すときに1つずつ流れるので、途中にリストを作らず、
+# (0..10000000).map(|x| x * 2).filter(|x| x % 3 == 0).sum() のメモリは範囲の長さによらず一定になる。
+#   - アダプター: iter、into_iter、map、filter、enumerate、take、skip、zip
+#   - 終端: fold、sum、count、collect（collect は要素から型を決めた Vec）
+# クロージャ（closures.RustClosure）や関数は Python の呼び出し可能なオブジェクトとしてそのまま渡す。
+# 範囲（0..n）、Vec、スライスは simulator.call_method と RustVec.iter で RustIter になる。
+from functools import reduce
+from itertools import islice
+
+from fixedint import int_type
+
+
+def iterate(value):
+    """zip の相手などの値を Python のイテレーターにする（RustIter は包んでいるものを取り出す）"""
+    if isinstance(value, RustIter):
+        return value.it
+    return iter(value)
+
+
+class RustIter:
+    """遅延評価のイテレーター（it は Python のイテレーター。一度しか反復できない）"""
+    __slots__ = ('it', 'wrapping')
+    rust_methods = frozenset(('iter', 'into_iter', 'map', 'filter', 'enumerate', 'take', 'skip', 'zip',
+                              'fold', 'sum', 'count', 'collect'))
+
+    def __init__(self, it, wrapping=False):
+        self.it = it
+        self.wrapping = wrapping  # collect で作る Vec の整数の演算が範囲を超えたら折り返すか
+
+    def __iter__(self):
+        return self.it
+
+    def __repr__(self):
+        return "<iterator>"
+
+    def iter(self):
+        return self
+
+    into_iter = iter
+
+    # --- アダプター（要素を取り出さずに包み直す） ---
+
+    def map(self, function):
+        return RustIter(map(function, self.it), self.wrapping)
+
+    def filter(self, predicate):
+        return RustIter(filter(predicate, self.it), self.wrapping)
+
+    def enumerate(self):
+        return RustIter(enumerate(self.it), self.wrapping)
+
+    def take(self, count):
+        return RustIter(islice(self.it, max(int(count), 0)), self.wrapping)
+
+    def skip(self, count):
+        return RustIter(islice(self.it, max(int(count), 0), None), self.wrapping)
+
+    def zip(self, other):
+        return RustIter(zip(self.it, iterate(other)), self.wrapping)
+
+    # --- 終端（要素を取り出して1つの値にする） ---
+
+    def fold(self, initial, function):
+        return reduce(function, self.it, initial)
+
+    def sum(self):
+        # 型付きの整数は 0 + 要素 で要素の型になり、範囲を超えれば要素の型のとおりエラーか折り返し
+        return sum(self.it, 0)
+
+    def count(self):
+        count = 0
+        for _ in self.it:
+            count += 1
+        return int_type('usize', self.wrapping)(count)
+
+    def collect(self):
+        from rustvec import make_vec  # rustvec がこのモジュールを読み込むので、使うときに読み込む
+        return make_vec(None, list(self.it), self.wrapping)
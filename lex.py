@@ -1,3 +1,4 @@
+import os
 import ply.lex as lex
 
 # トークンリスト
@@ -131,5 +132,10 @@ def t_error(t):
     print(f"Illegal character '{t.value[0]}'")
     t.lexer.skip(1)
 
+# 開発モード（RUST_RUNNER_DEV=1）ではルールを検証してから生成する。
+# 通常は生成済みの lextab.py を読み込み、正規表現の再構築と検証を省略する
+DEV_MODE = os.environ.get("RUST_RUNNER_DEV") == "1"
+TABLE_DIR = os.path.dirname(os.path.abspath(__file__))
+
 # 字句解析器の生成
-lexer = lex.lex()
\ No newline at end of file
+lexer = lex.lex(optimize=not DEV_MODE, lextab='lextab', outputdir=TABLE_DIR)
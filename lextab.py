@@ -0,0 +1,10 @@
+# lextab.py. This file automatically created by PLY (version 3.11). Don't edit!
+_tabversion   = '3.10'
+_lextokens    = set(('AMP', 'AND', 'ARROW', 'AS', 'ASYNC', 'AWAIT', 'BACKSLASH', 'BITAND', 'BITOR', 'BITXOR', 'BOOL', 'BOX', 'BREAK', 'CHAR', 'CLOSURE', 'COLON', 'COMMA', 'CONST', 'CONTINUE', 'CRATE', 'DERIVE', 'DIV', 'DIV_EQ', 'DOT', 'DOUBLECOLON', 'DYN', 'ELSE', 'ENUM', 'EQ', 'EXCLAMATION_MARK', 'EXTERN', 'FALSE', 'FAT_ARROW', 'FN', 'FOR', 'GREATER', 'HASH', 'IF', 'IMPL', 'IN', 'INLINE', 'LBRACE', 'LBRACKET', 'LESS', 'LET', 'LIFETIME', 'LOOP', 'LPAREN', 'MATCH', 'MINUS', 'MINUS_EQ', 'MOD', 'MOD_EQ', 'MOD_KEYWORD', 'MOVE', 'MULT', 'MULT_EQ', 'MUT', 'NAME', 'NOT', 'NUMBER', 'OR', 'PIPE', 'PLUS', 'PLUS_EQ', 'PUB', 'QUESTION_MARK', 'RBRACE', 'RBRACKET', 'RC', 'RETURN', 'RPAREN', 'SELF', 'SEMICOLON', 'SHL', 'SHL_EQ', 'SHR', 'SHR_EQ', 'STRING', 'STRING_LITERAL', 'STRUCT', 'SUPER', 'TRAIT', 'TRUE', 'TYPE', 'UNDERSCORE', 'UNSAFE', 'UNSAFE_FN', 'USE', 'WHERE', 'WHILE'))
+_lexreflags   = 64
+_lexliterals  = ''
+_lexstateinfo = {'INITIAL': 'inclusive'}
+_lexstatere   = {'INITIAL': [('(?P<t_NUMBER>\\d+)|(?P<t_NAME>[a-zA-Z_][a-zA-Z0-9_]*)|(?P<t_STRING>\\".*?\\")|(?P<t_LIFETIME>\'[a-zA-Z_][a-zA-Z0-9_]*)|(?P<t_COMMENT>//.*)|(?P<t_MULTILINE_COMMENT>/\\*[\\s\\S]*?\\*/)|(?P<t_newline>\\n+)|(?P<t_OR>\\|\\|)|(?P<t_PLUS>\\+)|(?P<t_MULT>\\*)|(?P<t_AND>&&)|(?P<t_LPAREN>\\()|(?P<t_RPAREN>\\))|(?P<t_LBRACE>\\{)|(?P<t_RBRACE>\\})|(?P<t_LBRACKET>\\[)|(?P<t_RBRACKET>\\])|(?P<t_COMMA>\\,)|(?P<t_ARROW>->)|(?P<t_FAT_ARROW>=>)|(?P<t_DOT>\\.)|(?P<t_HASH>\\#)|(?P<t_DOUBLECOLON>::)|(?P<t_QUESTION_MARK>\\?)|(?P<t_PIPE>\\|)|(?P<t_BACKSLASH>\\\\)|(?P<t_MINUS>-)|(?P<t_DIV>/)|(?P<t_MOD>%)|(?P<t_EQ>=)|(?P<t_LESS><)|(?P<t_GREATER>>)|(?P<t_AMP>&)|(?P<t_NOT>!)|(?P<t_COLON>:)|(?P<t_SEMICOLON>;)', [None, ('t_NUMBER', 'NUMBER'), ('t_NAME', 'NAME'), ('t_STRING', 'STRING'), ('t_LIFETIME', 'LIFETIME'), ('t_COMMENT', 'COMMENT'), ('t_MULTILINE_COMMENT', 'MULTILINE_COMMENT'), ('t_newline', 'newline'), (None, 'OR'), (None, 'PLUS'), (None, 'MULT'), (None, 'AND'), (None, 'LPAREN'), (None, 'RPAREN'), (None, 'LBRACE'), (None, 'RBRACE'), (None, 'LBRACKET'), (None, 'RBRACKET'), (None, 'COMMA'), (None, 'ARROW'), (None, 'FAT_ARROW'), (None, 'DOT'), (None, 'HASH'), (None, 'DOUBLECOLON'), (None, 'QUESTION_MARK'), (None, 'PIPE'), (None, 'BACKSLASH'), (None, 'MINUS'), (None, 'DIV'), (None, 'MOD'), (None, 'EQ'), (None, 'LESS'), (None, 'GREATER'), (None, 'AMP'), (None, 'NOT'), (None, 'COLON'), (None, 'SEMICOLON')])]}
+_lexstateignore = {'INITIAL': ' \t'}
+_lexstateerrorf = {'INITIAL': 't_error'}
+_lexstateeoff = {}
@@ -1,12 +1,11 @@
 import os
 import sys
-import toml
-import requests
-from zipfile import ZipFile
+import time
 import argparse
-from parser import parser, lexer
-import tarfile
-from simulator import RustSimulator
+from simulator import RustSimulator, StackOverflowError, MAX_CALL_DEPTH, run_with_deep_stack
+from fixedint import IntegerOverflowError, OVERFLOW_MODES
+from vm import RustVM
+from ast_cache import ASTCache
 
 # 依存関係をダウンロードするディレクトリ
 MODULES_DIR = "rust_modules"
@@ -18,49 +17,329 @@ def parse_cargo_toml(file_path):
         print(f"{file_path} が見つかりません")
         sys.exit(1)
 
+    import toml  # 依存関係を扱うときだけ読み込む
     with open(file_path, 'r') as f:
         cargo_data = toml.load(f)
     
     dependencies = cargo_data.get("dependencies", {})
     return dependencies
 
-# 依存関係をダウンロードする関数
+# クレートの取得元（テスト用のローカルサーバーに差し替えられるよう環境変数で上書きできる）
+REGISTRY_URL = os.environ.get("RUST_RUNNER_REGISTRY", "https://crates.io")
 
-def download_dependencies(dependencies):
-    """依存関係をダウンロードして、rust_modulesフォルダに格納"""
+# 並列ダウンロードの設定
+DOWNLOAD_WORKERS = 8  # 同時にダウンロードするクレート数（コネクションプールの大きさも同じ）
+DOWNLOAD_RETRIES = 3  # 失敗時の再試行回数
+DOWNLOAD_BACKOFF = 0.5  # 再試行までの待ち時間の初期値（秒、試行ごとに倍になる）
+DOWNLOAD_TIMEOUT = 30  # 接続・読み込みのタイムアウト（秒）
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# 前回展開した依存関係の一覧（変わっていなければダウンロード処理を丸ごと省略する）
+STAMP_FILE = ".deps-stamp"
+
+# 再試行する価値のあるHTTPステータス
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+def dependency_version(version_info):
+    """Cargo.tomlの依存関係の値からバージョン文字列を取り出す"""
+    if isinstance(version_info, str):
+        return version_info
+    elif isinstance(version_info, dict):
+        return version_info.get("version", "")
+    return ""
+
+def download_plan(dependencies):
+    """Cargo.tomlの依存関係を (名前, バージョン, チェックサム) のリストにする（チェックサムは不明）"""
+    return [(dep_name, dependency_version(version_info), None) for dep_name, version_info in dependencies.items()]
+
+def module_dir_names(plan):
+    """クレートごとの rust_modules 以下の展開先（同じクレートの複数バージョンは <名前>-<バージョン> に分ける）"""
+    counts = {}
+    for dep_name, _, _ in plan:
+        counts[dep_name] = counts.get(dep_name, 0) + 1
+    return {(dep_name, version): dep_name if counts[dep_name] == 1 else f"{dep_name}-{version}"
+            for dep_name, version, _ in plan}
+
+def download_crate(session, dep_name, version, registry_url=REGISTRY_URL, crate_cache=None, checksum=None, dest_name=None):
+    """1つのクレートをダウンロードしながら展開し、結果を辞書で返す
+
+    crate_cache があれば展開結果をキャッシュに登録し、rust_modules からはキャッシュを参照する。
+    checksum が分かっていれば、ダウンロードした.crateのSHA-256と照合する。
+    """
+    import shutil
+    import tarfile
+    import zlib
+    import requests
+    from crates import StreamReader, extract_crate_stream
+
+    download_url = f"{registry_url}/api/v1/crates/{dep_name}/{version}/download"
+    dest_dir = os.path.join(MODULES_DIR, dest_name or dep_name)
+    # 展開途中の状態が残らないよう、いったん別ディレクトリに展開してから置き換える
+    if crate_cache is not None:
+        staging_dir = crate_cache.staging_path(dep_name, version)
+    else:
+        staging_dir = os.path.join(MODULES_DIR, f".{dep_name}-{version}.partial")
+    result = {"name": dep_name, "version": version, "ok": False, "cached": False,
+              "bytes": 0, "attempts": 0, "error": None}
+    start = time.perf_counter()
+
+    for attempt in range(DOWNLOAD_RETRIES + 1):
+        if attempt:
+            time.sleep(DOWNLOAD_BACKOFF * (2 ** (attempt - 1)))
+        result["attempts"] = attempt + 1
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        try:
+            with session.get(download_url, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+                if response.status_code in RETRY_STATUS:
+                    result["error"] = f"HTTP {response.status_code}"
+                    continue
+                if response.status_code != 200:
+                    result["error"] = f"HTTP {response.status_code}"
+                    break
+                # レスポンスの本文を一定サイズのチャンクで読みながら、そのまま展開する
+                reader = StreamReader(response.iter_content(DOWNLOAD_CHUNK_SIZE))
+                extract_crate_stream(reader, staging_dir)
+                reader.drain()
+                result["bytes"] = reader.bytes_read
+        except requests.RequestException as e:
+            result["error"] = str(e)
+            continue
+        except (tarfile.TarError, zlib.error, EOFError) as e:
+            result["error"] = f"TARファイルではありません: {e}"
+            break
+
+        digest = reader.hexdigest()
+        if checksum and digest != checksum:
+            # 転送中に壊れた可能性があるので再試行する
+            result["error"] = f"チェックサムが一致しません: {digest}"
+            continue
+
+        if crate_cache is not None:
+            entry = crate_cache.insert(dep_name, version, digest, staging_dir)
+            crate_cache.link(entry, dest_dir)
+        else:
+            if os.path.islink(dest_dir):
+                os.remove(dest_dir)
+            shutil.rmtree(dest_dir, ignore_errors=True)
+            os.replace(staging_dir, dest_dir)
+        result["ok"] = True
+        result["error"] = None
+        break
+
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+def read_stamp():
+    try:
+        with open(os.path.join(MODULES_DIR, STAMP_FILE), 'r') as f:
+            return f.read()
+    except OSError:
+        return None
+
+def write_stamp(stamp):
+    with open(os.path.join(MODULES_DIR, STAMP_FILE), 'w') as f:
+        f.write(stamp)
+
+def download_dependencies(dependencies, registry_url=REGISTRY_URL, workers=DOWNLOAD_WORKERS, crate_cache=None, plan=None):
+    """依存関係を並列にダウンロードして、rust_modulesフォルダに格納
+
+    前回と同じ依存関係ですべて展開済みなら何もしない。crate_cache にあるクレートはダウンロードせず参照する。
+    """
+    import json
+
+    if plan is None:
+        plan = download_plan(dependencies)
     if not os.path.exists(MODULES_DIR):
         os.makedirs(MODULES_DIR)
-    
-    for dep_name, version_info in dependencies.items():
-        if isinstance(version_info, str):
-            version = version_info
-        elif isinstance(version_info, dict):
-            version = version_info.get("version", "")
-        
-        download_url = f"https://crates.io/api/v1/crates/{dep_name}/{version}/download"
-        print(f"{dep_name} ({version}) をダウンロードしています: {download_url}")
-        
-        response = requests.get(download_url)
-        if response.status_code == 200:
-            # クレートファイルを保存
-            file_path = os.path.join(MODULES_DIR, f"{dep_name}-{version}.crate")
-            with open(file_path, 'wb') as f:
-                f.write(response.content)
-            
-            # クレートファイルを展開
-            if tarfile.is_tarfile(file_path):
-                with tarfile.open(file_path, 'r:gz') as tar:
-                    tar.extractall(path=os.path.join(MODULES_DIR, dep_name))
-                os.remove(file_path)  # TARファイルを削除
-                print(f"{dep_name} の展開が完了しました")
+
+    # 前回の実行から依存関係が変わっていなければ、ネットワークにもキャッシュにも触れずに終わる
+    dest_names = module_dir_names(plan)
+    stamp = json.dumps({"registry": registry_url, "crates": sorted(plan, key=lambda c: (c[0], c[1]))})
+    if read_stamp() == stamp and all(os.path.isdir(os.path.join(MODULES_DIR, name)) for name in dest_names.values()):
+        print("依存関係は最新です")
+        return []
+
+    results = []
+    pending = []
+    start = time.perf_counter()
+    for dep_name, version, checksum in plan:
+        entry = crate_cache.lookup(dep_name, version, checksum) if crate_cache is not None else None
+        if entry is None:
+            pending.append((dep_name, version, checksum))
+            continue
+        # キャッシュ済みのクレートは検証済みなのでそのまま参照する
+        crate_cache.link(entry, os.path.join(MODULES_DIR, dest_names[(dep_name, version)]))
+        results.append({"name": dep_name, "version": version, "ok": True, "cached": True,
+                        "bytes": 0, "attempts": 0, "error": None, "seconds": 0.0})
+
+    if pending:
+        results.extend(fetch_crates(pending, registry_url, workers, crate_cache, dest_names))
+    elapsed = time.perf_counter() - start
+
+    print_download_summary(results, elapsed)
+    if all(result["ok"] for result in results):
+        write_stamp(stamp)
+    return results
+
+def fetch_crates(pending, registry_url, workers, crate_cache, dest_names=None):
+    """キャッシュにないクレートを並列にダウンロード"""
+    # 起動を軽くするため、ダウンロード時にだけ読み込む
+    import requests
+    from requests.adapters import HTTPAdapter
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    # 全クレートでKeep-Aliveの接続を共有する
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    results = []
+    with session, ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = []
+        for dep_name, version, checksum in pending:
+            print(f"{dep_name} ({version}) をダウンロードしています")
+            dest_name = dest_names.get((dep_name, version)) if dest_names else None
+            futures.append(executor.submit(download_crate, session, dep_name, version, registry_url, crate_cache, checksum, dest_name))
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            if result["ok"]:
+                print(f"{result['name']} の展開が完了しました")
             else:
-                print(f"{dep_name} はTARファイルではありません")
-        else:
-            print(f"{dep_name} のダウンロードに失敗しました")
+                print(f"{result['name']} のダウンロードに失敗しました: {result['error']}")
+    return results
+
+def resolve_dependencies(cargo_toml_path, index_dir):
+    """ローカルのインデックスとCargo.lockから推移的な依存関係まで解決し、ダウンロード計画を返す"""
+    from resolver import resolve_project
+
+    start = time.perf_counter()
+    try:
+        resolution = resolve_project(cargo_toml_path, index_dir)
+    except (RuntimeError, ValueError) as e:
+        print(f"依存関係の解決に失敗しました: {e}")
+        sys.exit(1)
+    for warning in resolution.warnings:
+        print(f"警告: {warning}")
+    plan = resolution.download_plan()
+    print(f"{len(plan)} 個のクレートを {(time.perf_counter() - start) * 1000:.1f}ms で解決しました")
+    return plan
+
+def print_download_summary(results, elapsed):
+    """クレートごとのダウンロード結果と所要時間を表示"""
+    if not results:
+        return
+    print(f"{'クレート':<30} {'バージョン':<12} {'結果':<6} {'サイズ':>10} {'時間':>8} {'試行':>4}")
+    for result in sorted(results, key=lambda r: r["name"]):
+        status = "キャッシュ" if result["cached"] else "成功" if result["ok"] else "失敗"
+        print(f"{result['name']:<30} {result['version']:<12} {status:<6} {result['bytes']:>10} "
+              f"{result['seconds']:>7.2f}s {result['attempts']:>4}")
+    succeeded = sum(1 for result in results if result["ok"])
+    print(f"{succeeded}/{len(results)} 件のクレートを {elapsed:.2f}秒 で取得しました")
+
+# 評価エンジン（tree: ASTを直接評価, vm: バイトコードにコンパイルして実行）
+ENGINES = {
+    "tree": RustSimulator,
+    "vm": RustVM,
+}
+
+# 字句解析器（fast: fastlex.FastLexer, ply: lex.pyのPLYの字句解析器、どちらも同じトークン列を返す）
+LEXERS = ("fast", "ply")
+
+# Rustコードをパースする関数
+def parse_rust_code(rust_code, cache=None, lexer="fast", lineno=1, recover=True):
+    """RustコードをパースしてASTを返す（キャッシュにあればパースを省略、linenoはエラー表示用の開始行）
+
+    recover が False なら、構文エラーがあったときはエラー回復した不完全なASTの代わりにNoneを返す。
+    """
+    if cache is not None:
+        ast = cache.get(rust_code)
+        if ast is not None:
+            return ast
+
+    # キャッシュヒット時はパーサーの構築も不要なので、ここで読み込む
+    from parser import parser, syntax_errors
+    if lexer == "fast":
+        from fastlex import FastLexer
+        lexer_obj = FastLexer()
+    else:
+        from parser import lexer as lexer_obj
+    lexer_obj.lineno = lineno
+    del syntax_errors[:]
+    ast = parser.parse(rust_code, lexer=lexer_obj)  # パーサーの呼び出し（parserは事前定義されたもの）
+    if syntax_errors:
+        # エラー回復で作った不完全なAST（Noneの要素を含むこともある）はキャッシュしない
+        return ast if recover else None
+
+    if cache is not None:
+        cache.put(rust_code, ast)
+    return ast
+
+def parse_rust_skeleton(rust_code, cache=None, lexer="fast"):
+    """トップレベルの関数のボディを読み飛ばしてパースし、(AST, ボディを読み込む関数) を返す
+
+    ボディは最初に呼び出されたときに、その範囲だけを字句解析・パースする。
+    """
+    from toplevel import split_source, attach_bodies
+
+    skeleton, bodies = split_source(rust_code)
+    ast = attach_bodies(parse_rust_code(skeleton, cache, lexer), bodies)
+
+    def load_body(node):
+        # 構文エラーのあるボディはNoneを返し、シミュレーターが関数名を添えてエラーにする
+        _, start, end, lineno = node
+        return parse_rust_code(rust_code[start:end], cache, lexer, lineno, recover=False)
+
+    return ast, load_body
+
+def prepare_ast(ast, simulator, optimize=True, ast_nodes=False):
+    """パース結果を評価する形に変換する（遅延させたボディも読み込んだときに同じく変換する）
+
+    キャッシュにはパーサーが返したタプル形式のまま保存し、最適化とノードクラスへの変換はその後で行う。
+    """
+    convert = []
+    if optimize:
+        from optimizer import optimize as optimize_program, optimize_body
+        ast = optimize_program(ast)
+        convert.append(optimize_body)
+    if ast_nodes:
+        from astnodes import to_nodes
+        ast = to_nodes(ast)
+        convert.append(to_nodes)
+    if convert and simulator.body_loader is not None:
+        load_body = simulator.body_loader
+
+        def load_converted_body(node):
+            body = load_body(node)
+            if body is None:
+                return None
+            for step in convert:
+                body = step(body)
+            return body
+
+        simulator.body_loader = load_converted_body
+    return ast
+
+def make_simulator(engine="tree", max_depth=MAX_CALL_DEPTH, memo=None, jit=None, overflow="panic", profile=False):
+    """コマンドラインのオプションを反映したシミュレーター（通常の実行と --watch で共通）"""
+    if profile:
+        from profiler import ProfilingSimulator
+        simulator = ProfilingSimulator()
+    else:
+        simulator = ENGINES[engine]()  # Rust解析シミュレータのインスタンス化
+    simulator.max_depth = max_depth
+    simulator.memo = memo  # 純粋な関数の呼び出し結果のキャッシュ（memo.MemoCache）
+    simulator.jit = jit  # よく呼ばれる関数をPythonに変換する（transpile.TieredCompiler）
+    simulator.wrapping = overflow == "wrap"  # 幅の決まった整数の演算が範囲を超えたときの動作
+    return simulator
 
 # Rustファイルを解析し、シミュレーションを実行する関数
-def simulate_rust_file(file_path):
-    """指定されたRustファイルを解析してシミュレーションを実行"""
+def simulate_rust_file(file_path, engine="tree", cache=None, lexer="fast", lazy=False, ast_nodes=False, optimize=True,
+                       max_depth=MAX_CALL_DEPTH, memo=None, profile=False, profile_top=20, profile_output="profile.folded",
+                       jit=None, overflow="panic"):
+    """指定されたRustファイルを解析してシミュレーションを実行（profile ならツリー評価で計測して結果を表示）"""
     print(f"{file_path} の解析を開始します")
 
     # Rustファイルの読み込み
@@ -71,29 +350,189 @@ def simulate_rust_file(file_path):
     #    print(token)
     # Rustファイルの解析とシミュレーション（この部分はRust解析コードに依存）
     # パーサーを呼び出して、実際のRustコードの解析とシミュレーションを行う
-    ast = parser.parse(rust_code, lexer=lexer)  # パーサーの呼び出し（parserは事前定義されたもの）
-    
+    simulator = make_simulator(engine, max_depth, memo, jit, overflow, profile)
+    if lazy:
+        # 関数のボディは呼び出されたときにシミュレーターがパースする
+        ast, simulator.body_loader = parse_rust_skeleton(rust_code, cache, lexer)
+    else:
+        ast = parse_rust_code(rust_code, cache, lexer)
+    ast = prepare_ast(ast, simulator, optimize, ast_nodes)
+
     # シミュレーターを使ってASTを評価し、結果を出力
-    simulator = RustSimulator()  # Rust解析シミュレータのインスタンス化
-    simulator.eval_ast(ast)  # ASTの評価
+    if not profile:
+        run_with_deep_stack(simulator.eval_ast, ast)  # ASTの評価
+        return
+    try:
+        run_with_deep_stack(simulator.profile, ast)
+    finally:
+        # 実行時エラーで止まっても、そこまでの計測結果を出す
+        print(simulator.report(profile_top))
+        simulator.write_folded(profile_output)
+        print(f"呼び出しスタックごとの時間を {profile_output} に書き出しました（flamegraph.pl などで表示できます）")
+
+# --watch でファイルの変更を確認する間隔（秒）
+WATCH_INTERVAL = 0.2
+
+def watch_rust_file(file_path, engine="tree", lexer="fast", interval=WATCH_INTERVAL, optimize=True, ast_nodes=False,
+                    max_depth=MAX_CALL_DEPTH, memo=None, jit=None, overflow="panic"):
+    """ファイルの変更を監視し、変更されたトップレベルの項目だけを再パースして実行し直す
+
+    実行のたびに simulate_rust_file と同じオプションでシミュレーターを作り直す。
+    memo と jit は実行をまたいで使い回すので、前の実行の結果と変換した関数は実行の前に捨てる。
+    """
+    from incremental import IncrementalParser
+
+    incremental = IncrementalParser(lambda text, lineno: parse_rust_code(text, None, lexer, lineno))
+    last_stat = None
+    print(f"{file_path} の監視を開始します (Ctrl+Cで終了)")
+    try:
+        while True:
+            try:
+                stat = os.stat(file_path)
+                stat = (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                stat = None
+            if stat is not None and stat != last_stat:
+                last_stat = stat
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    rust_code = f.read()
+                start = time.perf_counter()
+                ast = incremental.update(rust_code)
+                parsed = time.perf_counter()
+                print(f"再パース {incremental.reparsed} 項目 / 再利用 {incremental.reused} 項目 "
+                      f"({(parsed - start) * 1000:.1f}ms)")
+                if memo is not None:
+                    memo.invalidate()
+                if jit is not None:
+                    jit.invalidate()
+                simulator = make_simulator(engine, max_depth, memo, jit, overflow)
+                try:
+                    run_with_deep_stack(simulator.eval_ast, prepare_ast(ast, simulator, optimize, ast_nodes))
+                except Exception as e:
+                    # 監視は続けられるよう、実行時のエラーは表示するだけにする
+                    print(f"実行時エラー: {type(e).__name__}: {e}")
+                print(f"実行が完了しました ({(time.perf_counter() - start) * 1000:.1f}ms)、変更を待っています")
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        print("監視を終了します")
+
+def add_dependency_arguments(parser):
+    """依存関係のダウンロードに関するオプション（batch.py と共通）"""
+    parser.add_argument("--no-download", action="store_true", help="依存関係をダウンロードしない")
+    parser.add_argument("--registry-url", default=REGISTRY_URL, help="クレートの取得元URL")
+    parser.add_argument("--index-dir", help="レジストリインデックスのローカルミラー（指定すると推移的な依存関係とCargo.lockを使って解決する）")
+    parser.add_argument("--no-crate-cache", action="store_true", help="展開済みクレートの共有キャッシュを使わない")
+    parser.add_argument("--crate-cache-dir", help="展開済みクレートの共有キャッシュのディレクトリ")
+
+def install_dependencies(args, workers=DOWNLOAD_WORKERS, cargo_toml_path="Cargo.toml"):
+    """Cargo.tomlの依存関係を（--index-dir があれば推移的に）解決してダウンロード"""
+    dependencies = parse_cargo_toml(cargo_toml_path)
+    plan = resolve_dependencies(cargo_toml_path, args.index_dir) if args.index_dir else None
+    crate_cache = None
+    if not args.no_crate_cache:
+        from crate_cache import CrateCache
+        crate_cache = CrateCache(args.crate_cache_dir) if args.crate_cache_dir else CrateCache()
+    download_dependencies(dependencies, registry_url=args.registry_url, workers=workers, crate_cache=crate_cache, plan=plan)
 
 # メイン関数
 def main():
     parser = argparse.ArgumentParser(description="Rustファイルの依存関係を解決して解析、シミュレーションを実行するスクリプト")
     parser.add_argument("rust_file", help="シミュレーションを実行するRustファイル")
-    parser.add_argument("--no-download", action="store_true", help="依存関係をダウンロードしない")
+    add_dependency_arguments(parser)
+    parser.add_argument("--jobs", type=int, default=DOWNLOAD_WORKERS, help="並列ダウンロード数")
+    parser.add_argument("--engine", choices=sorted(ENGINES), default="tree", help="評価エンジン (tree: ツリー評価, vm: バイトコードVM)")
+    parser.add_argument("--lexer", choices=LEXERS, default="fast", help="字句解析器 (fast: 高速版, ply: PLY)")
+    parser.add_argument("--max-depth", type=int, default=MAX_CALL_DEPTH,
+                        help="関数呼び出しの深さの上限（超えるとスタックオーバーフローのエラー。vmエンジンはPythonの再帰の上限によらずこの深さまで実行できる）")
+    parser.add_argument("--memoize", action="store_true", help="副作用のない関数の呼び出し結果を引数ごとにキャッシュする")
+    parser.add_argument("--memo-size", type=int, help="--memoize でキャッシュする呼び出し結果の最大数")
+    parser.add_argument("--memo-stats", action="store_true", help="--memoize のキャッシュのヒット/ミス数を表示")
+    parser.add_argument("--jit", action="store_true", help="よく呼ばれる関数をPythonのソースに変換して実行する（ツリー評価のみ）")
+    parser.add_argument("--jit-threshold", type=int, help="--jit で関数を変換するまでの呼び出し回数")
+    parser.add_argument("--jit-dump", help="--jit で生成したPythonのソースを書き出すディレクトリ")
+    parser.add_argument("--jit-stats", action="store_true", help="--jit で変換した関数と変換しなかった関数を表示")
+    parser.add_argument("--profile", action="store_true", help="関数とASTノードの種類ごとの時間とメモリを計測して表示する（ツリー評価のみ）")
+    parser.add_argument("--profile-top", type=int, default=20, help="--profile の表に表示する行数")
+    parser.add_argument("--profile-output", default="profile.folded", help="--profile の呼び出しスタックごとの時間（folded形式）の出力先")
+    parser.add_argument("--overflow", choices=OVERFLOW_MODES, default="panic",
+                        help="i32 などの演算が範囲を超えたときの動作 (panic: エラー（デバッグビルド）, wrap: 折り返す（リリースビルド）)")
+    parser.add_argument("--lazy", action="store_true", help="関数のボディを最初に呼び出されるまでパースしない")
+    parser.add_argument("--no-optimize", action="store_true", help="パース後の最適化（定数畳み込み、不要な分岐の削除など）を行わない")
+    parser.add_argument("--ast-nodes", action="store_true", help="ASTを __slots__ のノードクラスに変換して評価する")
+    parser.add_argument("--watch", action="store_true", help="ファイルの変更を監視し、変更された項目だけを再パースして実行し直す")
+    parser.add_argument("--no-cache", action="store_true", help="パース結果のキャッシュを使わない")
+    parser.add_argument("--cache-dir", help="パース結果のキャッシュディレクトリ")
+    parser.add_argument("--cache-stats", action="store_true", help="キャッシュのヒット/ミス数を表示")
     args = parser.parse_args()
+    if args.profile and args.engine != "tree":
+        parser.error("--profile は --engine tree でのみ使えます")
+    if args.jit and args.engine != "tree":
+        parser.error("--jit は --engine tree でのみ使えます")
+    if args.jit and args.profile:
+        parser.error("--jit と --profile は同時に使えません（変換した関数の中の呼び出しは計測されません）")
+    if args.watch and args.lazy:
+        parser.error("--watch と --lazy は同時に使えません（--watch は変更された項目だけを再パースする）")
+    if args.watch and args.profile:
+        parser.error("--watch と --profile は同時に使えません")
 
-    # Cargo.tomlの依存関係を解析
-    cargo_toml_path = "Cargo.toml"
-    dependencies = parse_cargo_toml(cargo_toml_path)
+    cache = None
+    if not args.no_cache:
+        cache = ASTCache(args.cache_dir) if args.cache_dir else ASTCache()
 
-    # --no-downloadオプションが指定されていない場合、依存関係をダウンロード
+    # --no-downloadオプションが指定されていない場合、Cargo.tomlの依存関係を解析してダウンロード
     if not args.no_download:
-        download_dependencies(dependencies)
+        install_dependencies(args, workers=args.jobs)
+
+    memo = None
+    if args.memoize:
+        from memo import MemoCache
+        memo = MemoCache(args.memo_size) if args.memo_size else MemoCache()
+
+    jit = None
+    if args.jit:
+        from transpile import TieredCompiler, JIT_THRESHOLD
+        jit = TieredCompiler(args.jit_threshold or JIT_THRESHOLD, args.jit_dump)
 
     # Rustファイルを解析してシミュレーション実行
-    simulate_rust_file(args.rust_file)
+    if args.watch:
+        watch_rust_file(args.rust_file, engine=args.engine, lexer=args.lexer, optimize=not args.no_optimize,
+                        ast_nodes=args.ast_nodes, max_depth=args.max_depth, memo=memo, jit=jit, overflow=args.overflow)
+    else:
+        try:
+            simulate_rust_file(args.rust_file, engine=args.engine, cache=cache, lexer=args.lexer, lazy=args.lazy, ast_nodes=args.ast_nodes, optimize=not args.no_optimize,
+                               max_depth=args.max_depth, memo=memo, profile=args.profile,
+                               profile_top=args.profile_top, profile_output=args.profile_output, jit=jit,
+                               overflow=args.overflow)
+        except StackOverflowError as e:
+            # Rustと同じく、深い呼び出しのトレースバックは出さずにメッセージだけを表示して異常終了する
+            print(e, file=sys.stderr)
+            sys.exit(1)
+        except IntegerOverflowError as e:
+            print(f"thread 'main' panicked: {e}", file=sys.stderr)
+            sys.exit(101)
+        except SyntaxError as e:
+            # --lazy で呼び出したときに初めてパースした関数のボディに構文エラーがあった
+            print(e, file=sys.stderr)
+            sys.exit(1)
+
+    if memo is not None and args.memo_stats:
+        stats = memo.stats()
+        print(f"メモ化: ヒット {stats['hits']} / ミス {stats['misses']} (ヒット率 {stats['hit_rate']:.1%}), "
+              f"{stats['entries']} 件 / 上限 {stats['max_entries']} 件, 追い出し {stats['evictions']} 件, "
+              f"純粋な関数 {', '.join(stats['pure_functions']) or 'なし'}")
+
+    if jit is not None and args.jit_stats:
+        stats = jit.stats()
+        print(f"JIT: しきい値 {stats['threshold']} 回, 変換した関数 {', '.join(stats['compiled']) or 'なし'}")
+        for func_name, reason in stats['rejected'].items():
+            print(f"  変換しなかった関数 {func_name}: {reason}")
+
+    if cache is not None:
+        cache.save_stats()
+        if args.cache_stats:
+            stats = cache.stats()
+            print(f"ASTキャッシュ: ヒット {stats['hits']} / ミス {stats['misses']}, "
+                  f"{stats['entries']} 件 ({stats['bytes']} / {stats['max_bytes']} バイト)")
 
 if __name__ == "__main__":
     main()
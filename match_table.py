@@ -0,0 +1,114 @@
+# match の腕の選択表（決定木）
+#
+# match ノードごとに一度だけ作り、マッチ対象の値から調べるべき腕の候補をハッシュ表で引く。
+#   - リテラルのパターン（数値、文字列など）: 値 -> 腕
+#   - タプルのパターン（列挙型のタグと中身）: タグ -> 腕（中身は match_pattern で確かめる）
+#   - '_'（ワイルドカード）: どの値でも候補にする。ガードのないワイルドカードより後ろの腕には届かない
+# 候補は元の腕の順に並べるので、最初にマッチした腕を選ぶ動作は腕を順に試すのと同じになる。
+# ガード（match_guard の if 条件）のある腕はガードが偽なら次の候補に進む。
+# ハッシュできない値（構造体など）は、すべての腕を順に match_pattern で試す。
+
+# どの値にもマッチするパターン
+WILDCARD = '_'
+
+
+def match_pattern(pattern, value):
+    """パターンマッチングの実装（状態を持たないので、最適化パスからも使う）"""
+    if isinstance(pattern, tuple) and isinstance(value, tuple):
+        if pattern[0] != value[0]:
+            return False
+        for p, v in zip(pattern[1], value[1]):
+            if not match_pattern(p, v):
+                return False
+        return True
+    elif isinstance(pattern, str):
+        return pattern == WILDCARD or pattern == value
+    else:
+        return pattern == value
+
+
+class MatchTable:
+    """腕の列 [(パターン, ガード, ボディ)] から作った選択表"""
+
+    def __init__(self, arms):
+        self.arms = arms
+        literals = {}  # 値 -> リテラルのパターンの腕番号のリスト
+        tags = {}  # タグ -> タプルのパターンの腕番号のリスト
+        anywhere = []  # どの値でも候補になる腕（ワイルドカードとハッシュできないパターン）
+        for index, (pattern, guard, body) in enumerate(arms):
+            if isinstance(pattern, str) and pattern == WILDCARD:
+                anywhere.append(index)
+            elif isinstance(pattern, tuple):
+                if pattern and is_hashable(pattern[0]):
+                    tags.setdefault(pattern[0], []).append(index)
+                else:
+                    anywhere.append(index)
+            elif is_hashable(pattern):
+                literals.setdefault(pattern, []).append(index)
+            else:
+                anywhere.append(index)
+        self.literals = {value: self.candidates_of(indexes, anywhere) for value, indexes in literals.items()}
+        self.tags = {tag: self.candidates_of(indexes, anywhere) for tag, indexes in tags.items()}
+        self.default = self.candidates_of([], anywhere)
+        # ハッシュできない値では、すべての腕のパターンを確かめる
+        self.all = self.candidates_of([], range(len(arms)), check_all=True)
+
+    def __repr__(self):
+        return f"<MatchTable {len(self.arms)} arms>"
+
+    def candidates_of(self, indexes, anywhere, check_all=False):
+        """腕番号を元の順に並べた (腕番号, パターンを確かめるか, パターン, ガード, ボディ) のタプル
+
+        パターンが必ずマッチしてガードのない腕より後ろは選ばれないので含めない。
+        """
+        candidates = []
+        for index in sorted(set(indexes) | set(anywhere)):
+            pattern, guard, body = self.arms[index]
+            wildcard = isinstance(pattern, str) and pattern == WILDCARD
+            # リテラルの腕は値で引いた時点でマッチしている
+            check = not wildcard and (check_all or isinstance(pattern, tuple) or index in anywhere)
+            candidates.append((index, check, pattern, guard, body))
+            if guard is None and not check:
+                break
+        return tuple(candidates)
+
+    def candidates(self, value):
+        """値に対して順に試す腕"""
+        try:
+            if type(value) is tuple:
+                # 空のタプルはタプルのパターンと比べるとエラーになるので、腕を順に試して同じエラーを出す
+                return self.tags.get(value[0], self.default) if value else self.all
+            return self.literals.get(value, self.default)
+        except TypeError:
+            return self.all  # ハッシュできない値
+
+    def select(self, value):
+        """ガードのない match で選ばれる腕の番号（どの腕にもマッチしなければNone）"""
+        for index, check, pattern, guard, body in self.candidates(value):
+            if not check or match_pattern(pattern, value):
+                return index
+        return None
+
+
+def is_hashable(value):
+    try:
+        hash(value)
+    except TypeError:
+        return False
+    return True
+
+
+def normalize_arms(arms):
+    """match の腕 (パターン, ボディ) と match_guard の腕 (パターン, ガード, ボディ) を (パターン, ガード, ボディ) に揃える
+
+    パーサーの match_guard は腕を1つだけ持つので、リストでなければ1つの腕として扱う。
+    """
+    if isinstance(arms, tuple):
+        arms = [arms]
+    normalized = []
+    for arm in arms:
+        if len(arm) == 3:
+            normalized.append(arm)
+        else:
+            normalized.append((arm[0], None, arm[1]))
+    return normalized
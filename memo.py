@@ -0,0 +1,195 @@
+# 純粋な関数の呼び出し結果のメモ化（--memoize）
+#
+# 関数のボディを静的に調べ、引数だけから結果が決まる関数の呼び出しを (関数名, 引数) をキーに使い回す。
+# 純粋とみなすのは、次のノードだけでできていて、出力もグローバル変数の読み書きもしない関数:
+#   数値、引数とforの変数の参照、二項演算、if、match、loop、break、return、range、for、struct とフィールドの参照、
+#   as、添字、Ok/Err、optimizer の invariant / invariant_scope、純粋な関数の（引数の数が合う）呼び出し
+# let（変数の値を表示する）、move（所有権を変える）、async、関数の定義、パーサーのマクロなどを含めば純粋ではない。
+from collections import OrderedDict
+
+from astnodes import Node, to_tuples
+from simulator import MISSING, param_name
+from toplevel import is_lazy_body
+
+# メモに保持する呼び出し結果の既定の数
+MEMO_ENTRIES = 4096
+
+# 子ノードを調べれば純粋かどうかが決まるノード
+PURE_NODES = ('number', 'if', 'match', 'loop', 'break', 'return', 'range',
+              'struct', 'result', 'invariant', 'invariant_scope')
+
+
+class Impure(Exception):
+    """ボディの解析中に純粋でないノードが見つかった"""
+
+
+def analyze_body(params, body):
+    """ボディが単独で純粋なら (呼び出す関数の [(名前, 引数の数)], 参照する変数名の集合)、そうでなければNone
+
+    参照するのは引数と、forのボディの中でのそのループ変数だけに限る
+    （それ以外はローカル変数のスロットが未代入のときにグローバル変数を読むため）。
+    """
+    calls = []
+    names = set()
+
+    def walk(node, bound):
+        if isinstance(node, list):
+            for child in node:
+                walk(child, bound)
+            return
+        if not isinstance(node, tuple) or not node:
+            raise Impure()
+        node_type = node[0]
+        if node_type == 'number':
+            return
+        elif node_type == 'identifier':
+            if node[1] not in bound:
+                raise Impure()
+            names.add(node[1])
+        elif node_type == 'binary_op':
+            walk(node[1], bound)
+            walk(node[3], bound)
+        elif node_type == 'call':
+            calls.append((node[1], len(node[2])))
+            walk(node[2], bound)
+        elif node_type == 'for':
+            names.add(node[1])
+            walk(node[2], bound)
+            walk(node[3], bound | {node[1]})
+        elif node_type == 'match':
+            walk(node[1], bound)
+            for _, arm in node[2]:
+                walk(arm, bound)
+        elif node_type == 'struct' and isinstance(node[2], dict):
+            walk(list(node[2].values()), bound)
+        elif node_type in ('field_access', 'cast'):
+            walk(node[1], bound)
+        elif node_type == 'index':
+            walk(node[1], bound)
+            walk(node[2], bound)
+        elif node_type == 'result':
+            if node[1] in ('Ok', 'Err'):
+                walk(node[2], bound)
+        elif node_type in ('invariant', 'invariant_scope'):
+            walk(node[2], bound)
+        elif node_type == 'if':
+            for child in node[1:]:
+                if child is not None:
+                    walk(child, bound)
+        elif node_type in PURE_NODES:
+            for child in node[1:]:
+                walk(child, bound)
+        else:
+            raise Impure()
+
+    try:
+        walk(body, frozenset(param_name(param) for param in params))
+    except Impure:
+        return None
+    return calls, names
+
+
+def pure_functions(functions):
+    """定義済みの関数のうち純粋なものの 関数名 -> (引数の数, 実行中に借用チェックされる変数名) を返す
+
+    互いに呼び出し合う関数もあるので、単独で純粋な関数を候補にして、
+    候補でない関数を呼び出すものを候補から外すことを変化がなくなるまで繰り返す。
+    """
+    candidates = {}
+    for func_name, (params, body, scope) in functions.items():
+        if scope is None or is_lazy_body(body):
+            continue  # まだパースしていないボディは分からない
+        if isinstance(body, Node) or (isinstance(body, list) and any(isinstance(stmt, Node) for stmt in body)):
+            body = to_tuples(body)
+        result = analyze_body(params, body)
+        if result is not None:
+            candidates[func_name] = (len(params), result[0], result[1])
+
+    changed = True
+    while changed:
+        changed = False
+        for func_name, (_, calls, _) in list(candidates.items()):
+            if not all(callee in candidates and candidates[callee][0] == argc for callee, argc in calls):
+                del candidates[func_name]
+                changed = True
+
+    pure = {}
+    for func_name, (param_count, _, _) in candidates.items():
+        # 呼び出し先で参照する変数も、所有権が移動されていれば借用エラーになるので含める
+        names = set()
+        visited = set()
+        pending = [func_name]
+        while pending:
+            name = pending.pop()
+            if name in visited:
+                continue
+            visited.add(name)
+            names |= candidates[name][2]
+            pending.extend(callee for callee, _ in candidates[name][1])
+        pure[func_name] = (param_count, tuple(names))
+    return pure
+
+
+class MemoCache:
+    """純粋な関数の呼び出し結果のLRUキャッシュ"""
+
+    def __init__(self, max_entries=MEMO_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # (関数名, 引数の型, 引数) -> 戻り値
+        self.pure = None  # pure_functions の結果（関数の定義が変わったらNoneに戻して解析し直す）
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def invalidate(self, clear=True):
+        """関数の定義が変わったときに呼ぶ（clear=False ならメモした結果は残して、純粋かどうかだけ解析し直す）"""
+        self.pure = None
+        if clear:
+            self.entries.clear()
+
+    def key(self, simulator, func_name, args):
+        """メモを使える呼び出しならキー、使えなければNone"""
+        if self.pure is None:
+            self.pure = pure_functions(simulator.functions)
+        info = self.pure.get(func_name)
+        if info is None or len(args) != info[0]:
+            return None  # 足りない引数はグローバル変数から読まれる
+        ownership = simulator.ownership
+        for var_name in info[1]:
+            if ownership.get(var_name) == 'moved':
+                return None  # 実行すると借用エラーになる
+        # 1 と True と 1.0 は等しいが演算の結果が異なりうるので、型もキーに含める
+        key = (func_name, tuple(map(type, args)), tuple(args))
+        try:
+            hash(key)
+        except TypeError:
+            return None  # 構造体（辞書を含む）などはキーにできない
+        return key
+
+    def get(self, key):
+        """メモした戻り値（なければ MISSING）"""
+        value = self.entries.get(key, MISSING)
+        if value is MISSING:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = value
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "pure_functions": sorted(self.pure) if self.pure is not None else [],
+        }
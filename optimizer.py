@@ -0,0 +1,363 @@
+# パース後、シミュレーションの前にタプル形式のASTを書き換える最適化パス
+#
+# どの書き換えも評価結果と出力（print の順序、例外）を変えない範囲に限る。
+#   - 定数畳み込み: 数値リテラル同士の四則演算、リテラル境界の range
+#   - const の埋め込み: トップレベルの const を、実行時に必ず同じ値が読まれる参照に埋め込む
+#   - 到達しない分岐の削除: 条件がリテラルの if、対象がリテラルの match、break の後の文
+#     （let などを含む分岐は、関数のローカル変数の集合が変わるので残す）
+#   - ループ不変式の巻き上げ: ループ内で値の変わらない式を、ループに入るたびに最初の1回だけ評価する
+from simulator import collect_locals, match_pattern
+from toplevel import is_lazy_body
+
+# 畳み込みの対象にする値の型（bool は int のサブクラスで、実行時と同じ結果になる）
+FOLD_TYPES = (int, float, bool)
+# 埋め込んでも共有して問題のない（変更できない）値の型
+INLINE_TYPES = (int, float, bool, str, type(None))
+
+# ボディにあると巻き上げをやめるノード（変数や所有権の状態を変えうる。await などで中断すると他のタスクが変えうる）
+# メソッドは map などに渡したクロージャから関数を呼び出しうる
+IMPURE_NODES = ('call', 'move', 'async', 'function', 'await', 'join', 'spawn', 'sleep',
+                'method_chain', 'method_chain_with_params')
+# 関数を呼び出しうるノード
+CALL_NODES = ('call', 'async', 'method_chain', 'method_chain_with_params')
+LOOP_NODES = ('loop', 'for', 'invariant_scope')
+# 変数に代入するノード
+ASSIGN_NODES = ('let', 'for', 'const_declaration')
+
+
+def iter_nodes(node):
+    """node 以下のタプル形式のノードを順に返す"""
+    if isinstance(node, list):
+        for child in node:
+            yield from iter_nodes(child)
+    elif isinstance(node, tuple) and node and type(node[0]) is str:
+        yield node
+        for child in node[1:]:
+            if isinstance(child, (list, tuple)):
+                yield from iter_nodes(child)
+            elif isinstance(child, dict):
+                yield from iter_nodes(list(child.values()))
+
+
+def contains(node, node_types):
+    """node 以下に指定した種類のノードがあればTrue"""
+    return any(child[0] in node_types for child in iter_nodes(node))
+
+
+def assigned_names(node):
+    """node 以下で代入される変数名の集合"""
+    return {child[1] for child in iter_nodes(node) if child[0] in ASSIGN_NODES and len(child) > 1}
+
+
+def droppable(node):
+    """取り除いても関数のローカル変数の集合（変数の解決先）が変わらなければTrue"""
+    return not contains(node, ASSIGN_NODES)
+
+
+def is_function(stmt):
+    return isinstance(stmt, tuple) and len(stmt) == 5 and stmt[0] == 'function'
+
+
+def literal(node):
+    """リテラル（'number' ノード）なら (True, 値)"""
+    if isinstance(node, tuple) and len(node) == 2 and node[0] == 'number':
+        return True, node[1]
+    return False, None
+
+
+def fold_binary(operator, left, right):
+    """数値同士の四則演算を計算したノード（畳み込めなければNoneで、実行時に任せる）"""
+    if type(left) not in FOLD_TYPES or type(right) not in FOLD_TYPES:
+        return None
+    if operator == '+':
+        return ('number', left + right)
+    elif operator == '-':
+        return ('number', left - right)
+    elif operator == '*':
+        return ('number', left * right)
+    elif operator == '/' and right != 0:  # ゼロ除算は実行時に例外を出させる
+        return ('number', left / right)
+    return None
+
+
+class Optimizer:
+    """ASTの最適化"""
+
+    def optimize_program(self, ast):
+        """プログラム全体（トップレベルの文のリスト）を最適化"""
+        if not isinstance(ast, list):
+            return self.optimize(ast, {})
+        constants = self.collect_constants(ast)
+
+        # 関数はトップレベルで関数を呼び出しうる最初の文から呼ばれうるので、
+        # ボディにはそれより前に束縛された const だけを埋め込む
+        before_call = {}
+        for stmt in ast:
+            if not is_function(stmt) and contains(stmt, CALL_NODES):
+                break
+            if isinstance(stmt, tuple) and stmt and stmt[0] == 'const_declaration' and stmt[1] in constants:
+                before_call[stmt[1]] = constants[stmt[1]]
+
+        result = []
+        bound = {}  # この文の時点で束縛済みの const
+        for stmt in ast:
+            if is_function(stmt):
+                stmt = self.optimize(stmt, dict(before_call, **bound))
+            else:
+                stmt = self.optimize(stmt, bound)
+            if isinstance(stmt, tuple) and stmt and stmt[0] == 'const_declaration' and stmt[1] in constants:
+                bound = dict(bound, **{stmt[1]: constants[stmt[1]]})
+            result.append(stmt)
+        return self.block(result)
+
+    def collect_constants(self, ast):
+        """埋め込める const の名前 -> 値
+
+        トップレベルで一度だけ宣言され、値がリテラルに畳み込めて、どこでも代入や move をされない
+        （参照が借用エラーにならない）ものに限る。関数のローカル変数と同じ名前なら、その関数には埋め込まない。
+        遅延させたボディはまだ中身が分からないので、そのときは埋め込まない。
+        """
+        if contains(ast, ('lazy_body',)):
+            return {}
+        constants = {}
+        for stmt in ast:
+            if isinstance(stmt, tuple) and len(stmt) == 4 and stmt[0] == 'const_declaration':
+                ok, value = self.constant_value(stmt[3])
+                if ok:
+                    constants[stmt[1]] = value
+        counts = {}
+        moved = set()
+        for node in iter_nodes(ast):
+            if node[0] == 'const_declaration' and len(node) > 1:
+                counts[node[1]] = counts.get(node[1], 0) + 1
+            elif node[0] == 'move' and len(node) > 1:
+                moved.add(node[1])
+        # トップレベルの let / for はグローバル変数に書き込む（関数の中ではローカル変数になる）
+        # const 自身の宣言は上の counts で数えるので、ここでは除く
+        overwritten = {node[1] for node in iter_nodes([stmt for stmt in ast if not is_function(stmt)])
+                       if node[0] in ('let', 'for') and len(node) > 1}
+        return {name: value for name, value in constants.items()
+                if counts[name] == 1 and name not in moved and name not in overwritten}
+
+    def constant_value(self, value):
+        """const の右辺（パーサーの生の値かノード）を畳み込み、埋め込める値なら (True, 値)"""
+        if isinstance(value, (tuple, list)):
+            ok, value = literal(self.optimize(value, {}))
+            if not ok:
+                return False, None
+        if type(value) in INLINE_TYPES:
+            return True, value
+        return False, None
+
+    def block(self, stmts):
+        """文のリストから結果に影響しない文を取り除く"""
+        result = []
+        last = len(stmts) - 1
+        for index, stmt in enumerate(stmts):
+            if stmt == ('break',) and droppable(stmts[index + 1:]):
+                result.append(stmt)
+                break  # 以降の文は実行されない
+            ok, value = literal(stmt)
+            if ok and index != last and not isinstance(value, str):
+                continue  # 途中のリテラルの値は捨てられる（'break' という文字列だけはループを止める）
+            result.append(stmt)
+        return result
+
+    def optimize(self, node, env):
+        """ノードを最適化したノードを返す（env は埋め込む const の名前 -> 値）"""
+        if isinstance(node, list):
+            return self.block([self.optimize(stmt, env) for stmt in node])
+        if not isinstance(node, tuple) or not node:
+            return node
+
+        node_type = node[0]
+
+        if node_type == 'binary_op' and len(node) == 4:
+            left = self.optimize(node[1], env)
+            right = self.optimize(node[3], env)
+            left_ok, left_value = literal(left)
+            right_ok, right_value = literal(right)
+            if left_ok and right_ok:
+                folded = fold_binary(node[2], left_value, right_value)
+                if folded is not None:
+                    return folded
+            return ('binary_op', left, node[2], right)
+
+        elif node_type == 'identifier' and len(node) == 2:
+            if node[1] in env:
+                return ('number', env[node[1]])
+            return node
+
+        elif node_type == 'function' and len(node) == 5:
+            body = node[4]
+            if not is_lazy_body(body):
+                if env:
+                    # 関数のローカル変数と同じ名前の const は、その関数の中では埋め込まない
+                    local_names = collect_locals(node[2], body)
+                    env = {name: value for name, value in env.items() if name not in local_names}
+                body = self.optimize(body, env)
+            return node[:4] + (body,)
+
+        elif node_type == 'call' and len(node) == 3:
+            return ('call', node[1], [self.optimize(arg, env) for arg in node[2]])
+
+        elif node_type == 'let' and len(node) == 3:
+            return ('let', node[1], self.optimize(node[2], env))
+
+        elif node_type == 'if' and len(node) in (3, 4):
+            condition = self.optimize(node[1], env)
+            orelse = node[3] if len(node) > 3 else None
+            ok, value = literal(condition)
+            if ok and droppable(orelse if value else node[2]):
+                # 条件が決まっているので、選ばれる分岐だけを残す
+                branch = node[2] if value else orelse
+                return ('number', None) if branch is None else self.optimize(branch, env)
+            result = ('if', condition, self.optimize(node[2], env))
+            if len(node) > 3:
+                result += (None if orelse is None else self.optimize(orelse, env),)
+            return result
+
+        elif node_type == 'match' and len(node) == 3:
+            subject = self.optimize(node[1], env)
+            arms = [(arm[0],) + tuple(self.optimize(item, env) for item in arm[1:]) for arm in node[2]]
+            if any(len(arm) == 3 for arm in arms):
+                # ガード付きの腕 (パターン, ガード, ボディ) があれば、選ばれる腕は実行時まで決まらない
+                return ('match', subject, arms)
+            ok, value = literal(subject)
+            if ok:
+                for index, (pattern, body) in enumerate(arms):
+                    if match_pattern(pattern, value):
+                        if droppable([other for other_index, (_, other) in enumerate(arms) if other_index != index]):
+                            return body
+                        break
+                else:
+                    if droppable([body for _, body in arms]):
+                        return ('number', None)
+            return ('match', subject, arms)
+
+        elif node_type == 'loop' and len(node) == 2:
+            return self.hoist(('loop', self.optimize(node[1], env)), 1)
+
+        elif node_type == 'for' and len(node) == 4:
+            return self.hoist(('for', node[1], self.optimize(node[2], env), self.optimize(node[3], env)), 3)
+
+        elif node_type == 'range' and len(node) == 3:
+            start = self.optimize(node[1], env)
+            end = self.optimize(node[2], env)
+            start_ok, start_value = literal(start)
+            end_ok, end_value = literal(end)
+            if start_ok and end_ok and type(start_value) in (int, bool) and type(end_value) in (int, bool):
+                return ('number', range(start_value, end_value))  # range は変更できないので共有してよい
+            return ('range', start, end)
+
+        elif node_type == 'return' and len(node) == 2:
+            return ('return', self.optimize(node[1], env))
+
+        elif node_type == 'struct' and len(node) == 3 and isinstance(node[2], dict):
+            return ('struct', node[1], {key: self.optimize(value, env) for key, value in node[2].items()})
+
+        elif node_type in ('field_access', 'cast') and len(node) == 3:
+            return (node_type, self.optimize(node[1], env), node[2])
+
+        elif node_type == 'index' and len(node) == 3:
+            return ('index', self.optimize(node[1], env), self.optimize(node[2], env))
+
+        elif node_type == 'vec' and len(node) == 3:
+            return ('vec', node[1], [self.optimize(item, env) for item in node[2]])
+
+        elif node_type == 'vec_repeat' and len(node) == 4:
+            return ('vec_repeat', node[1], self.optimize(node[2], env), self.optimize(node[3], env))
+
+        elif node_type == 'method_chain' and len(node) == 3:
+            return ('method_chain', self.optimize(node[1], env), node[2])
+
+        elif node_type == 'method_chain_with_params' and len(node) == 4:
+            return ('method_chain_with_params', self.optimize(node[1], env), node[2],
+                    [self.optimize(arg, env) for arg in node[3]])
+
+        elif node_type == 'result' and len(node) == 3:
+            return ('result', node[1], self.optimize(node[2], env))
+
+        elif node_type == 'async' and len(node) == 2:
+            return ('async', self.optimize(node[1], env))
+
+        elif node_type == 'const_declaration' and len(node) == 4 and isinstance(node[3], (tuple, list)):
+            return node[:3] + (self.optimize(node[3], env),)
+
+        # シミュレーターが評価しないノード（パーサーの語彙など）はそのまま
+        return node
+
+    def hoist(self, loop, body_index):
+        """ループ内で値の変わらない式を ('invariant', 番号, 式) に置き換え、('invariant_scope', 個数, ループ) で包む
+
+        ボディに関数呼び出しや move がなければ、ボディで代入されない変数と数値だけの式はループの間同じ値になる。
+        巻き上げた式はループに入るたびに、元の位置で最初に評価されたときの値を使い回すので、
+        例外が出る位置や、一度も評価されないときの動作は元のままになる。
+        """
+        body = loop[body_index]
+        if contains(body, IMPURE_NODES):
+            return loop
+        assigned = assigned_names(body)
+        if loop[0] == 'for':
+            assigned.add(loop[1])
+        invariants = []
+        body = self.replace_invariants(body, assigned, invariants)
+        if not invariants:
+            return loop
+        return ('invariant_scope', len(invariants), loop[:body_index] + (body,) + loop[body_index + 1:])
+
+    def replace_invariants(self, node, assigned, invariants):
+        if isinstance(node, list):
+            return [self.replace_invariants(stmt, assigned, invariants) for stmt in node]
+        if not isinstance(node, tuple) or not node:
+            return node
+        node_type = node[0]
+        if node_type == 'binary_op' and len(node) == 4:
+            if self.is_invariant(node, assigned):
+                invariants.append(node)
+                return ('invariant', len(invariants) - 1, node)
+            return ('binary_op', self.replace_invariants(node[1], assigned, invariants), node[2],
+                    self.replace_invariants(node[3], assigned, invariants))
+        elif node_type in ('let', 'result') and len(node) == 3:
+            return node[:2] + (self.replace_invariants(node[2], assigned, invariants),)
+        elif node_type == 'return' and len(node) == 2:
+            return ('return', self.replace_invariants(node[1], assigned, invariants))
+        elif node_type == 'range' and len(node) == 3:
+            return ('range', self.replace_invariants(node[1], assigned, invariants),
+                    self.replace_invariants(node[2], assigned, invariants))
+        elif node_type == 'if' and len(node) in (3, 4):
+            return ('if',) + tuple(self.replace_invariants(child, assigned, invariants) for child in node[1:])
+        elif node_type == 'match' and len(node) == 3:
+            return ('match', self.replace_invariants(node[1], assigned, invariants),
+                    [(arm[0],) + tuple(self.replace_invariants(item, assigned, invariants) for item in arm[1:])
+                     for arm in node[2]])
+        # 内側のループの中の式は、そのループに入るたびに評価し直すので対象にしない
+        return node
+
+    def is_invariant(self, node, assigned):
+        """識別子と数値の四則演算で、ループ内で代入される変数を含まず、識別子を1つ以上含むならTrue"""
+        names = []
+
+        def walk(node):
+            if not isinstance(node, tuple) or not node:
+                return False
+            if node[0] == 'number' and len(node) == 2:
+                return True
+            if node[0] == 'identifier' and len(node) == 2:
+                names.append(node[1])
+                return node[1] not in assigned
+            if node[0] == 'binary_op' and len(node) == 4:
+                return walk(node[1]) and walk(node[3])
+            return False
+
+        return walk(node) and bool(names)
+
+
+def optimize(ast):
+    """ASTを最適化して返す"""
+    return Optimizer().optimize_program(ast)
+
+
+def optimize_body(body):
+    """遅延させた関数のボディを読み込んだときの最適化（const は埋め込まない）"""
+    return Optimizer().optimize(body, {})
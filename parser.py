@@ -1,5 +1,6 @@
+import os
 import ply.yacc as yacc
-from lex import lexer , tokens
+from lex import lexer , tokens, DEV_MODE, TABLE_DIR
 
 def p_start(p):
     '''start : statement_list'''
@@ -374,14 +375,30 @@ def p_empty(p):
     'empty :'
     p[0] = None
 
+# 直前のパースで報告した構文エラー（呼び出し側がパースの前に空にし、エラー回復した結果かどうかを判定する）
+syntax_errors = []
+
 def p_error(p):
     if p:
-        print(f"Syntax error at '{p.value}' (line {p.lineno})")
+        message = f"Syntax error at '{p.value}' (line {p.lineno})"
     else:
-        print("Syntax error at EOF")
+        message = "Syntax error at EOF"
+    syntax_errors.append(message)
+    print(message)
+
+# 生成済みの構文解析表（Pythonモジュールとして読み込むより pickle の方が速い）
+PARSE_TABLE = os.path.join(TABLE_DIR, 'parsetab.pickle')
 
 # パーサーの生成
-parser = yacc.yacc(debug=True)
+def build_parser(dev_mode=DEV_MODE):
+    """構文解析器を生成
+
+    通常は同梱の parsetab.pickle を検証なしで読み込み、parser.out も書き出さない。
+    開発モードでは文法を検証し、変更があれば表を再生成して parser.out を書き出す。
+    """
+    return yacc.yacc(debug=dev_mode, optimize=not dev_mode, picklefile=PARSE_TABLE, outputdir=TABLE_DIR)
+
+parser = build_parser()
 
 # テスト用のRustコード
 rust_code = """
@@ -0,0 +1,161 @@
+# ツリー評価のプロファイラ（--profile）
+#
+# RustSimulator のサブクラスで eval_ast と call_function を包み、Rustの関数ごと・ASTノードの種類ごとに
+# 呼び出し回数、包括時間（呼び出し先を含む）、自身の時間、メモリの増減（tracemalloc で測った確保と解放の差）を数える。
+# 関数の呼び出しの並びごとの自身の時間は、flamegraph.pl などが読める folded 形式（"a;b;c マイクロ秒"）で書き出す。
+# 通常の実行ではこのクラスを使わないので、プロファイルしないときの評価には何も追加されない。
+import time
+import tracemalloc
+import unicodedata
+
+from astnodes import Node
+from simulator import RustSimulator
+
+# 表に表示する行数の既定値
+PROFILE_TOP = 20
+# folded 形式のファイルの既定の出力先
+PROFILE_OUTPUT = "profile.folded"
+# トップレベル（関数の外）のコードを表すスタックの根
+TOPLEVEL = "(toplevel)"
+
+
+class Stat:
+    """1つの関数またはノードの種類の集計"""
+    __slots__ = ('calls', 'inclusive', 'exclusive', 'alloc', 'active')
+
+    def __init__(self):
+        self.calls = 0
+        self.inclusive = 0.0  # 秒（再帰中の呼び出しは外側の呼び出しにだけ数える）
+        self.exclusive = 0.0  # 秒
+        self.alloc = 0  # 自身の区間でのメモリの増減（バイト、解放が多ければ負）
+        self.active = 0  # 実行中の呼び出しの数
+
+
+def pad(text, width, right=False):
+    """全角文字を2桁として、表示幅が width になるように空白を詰める"""
+    text = str(text)
+    size = sum(2 if unicodedata.east_asian_width(char) in 'WF' else 1 for char in text)
+    space = " " * max(width - size, 0)
+    return space + text if right else text + space
+
+
+def node_kind(node):
+    """集計に使うノードの種類の名前"""
+    if isinstance(node, Node):
+        return node.tag
+    if isinstance(node, list):
+        return 'block'
+    if isinstance(node, tuple) and node and isinstance(node[0], str):
+        return node[0]
+    return type(node).__name__
+
+
+class ProfilingSimulator(RustSimulator):
+    """評価しながら関数とノードの種類ごとの時間とメモリを集計するシミュレーター"""
+
+    def __init__(self, memory=True):
+        super().__init__()
+        self.memory = memory  # tracemalloc でメモリも測るか（測ると評価が数倍遅くなる）
+        self.function_stats = {}  # 関数名 -> Stat
+        self.node_stats = {}  # ノードの種類 -> Stat
+        self.folded = {}  # "根;関数;関数" -> 自身の時間（秒）
+        self.call_stack = [TOPLEVEL]
+        # 計測中の区間ごとの、子（関数は呼び出し先の関数、ノードは子ノード）の [時間, メモリの増減]
+        self.function_children = [[0.0, 0]]
+        self.node_children = [[0.0, 0]]
+        self.total = 0.0
+
+    def traced(self):
+        return tracemalloc.get_traced_memory()[0] if self.memory else 0
+
+    def record(self, stat, children, elapsed, allocated):
+        """区間の計測を終えて集計に加え、自身の時間を返す"""
+        child_time, child_alloc = children.pop()
+        parent = children[-1]
+        parent[0] += elapsed
+        parent[1] += allocated
+        stat.calls += 1
+        stat.active -= 1
+        if not stat.active:
+            stat.inclusive += elapsed
+        exclusive = elapsed - child_time
+        stat.exclusive += exclusive
+        stat.alloc += allocated - child_alloc
+        return exclusive
+
+    def eval_ast(self, node):
+        kind = node_kind(node)
+        stat = self.node_stats.get(kind)
+        if stat is None:
+            stat = self.node_stats[kind] = Stat()
+        stat.active += 1
+        self.node_children.append([0.0, 0])
+        allocated = self.traced()
+        start = time.perf_counter()
+        try:
+            return super().eval_ast(node)
+        finally:
+            self.record(stat, self.node_children, time.perf_counter() - start, self.traced() - allocated)
+
+    def call_function(self, func_name, args):
+        stat = self.function_stats.get(func_name)
+        if stat is None:
+            stat = self.function_stats[func_name] = Stat()
+        stat.active += 1
+        self.call_stack.append(func_name)
+        self.function_children.append([0.0, 0])
+        allocated = self.traced()
+        start = time.perf_counter()
+        try:
+            return super().call_function(func_name, args)
+        finally:
+            exclusive = self.record(stat, self.function_children, time.perf_counter() - start,
+                                    self.traced() - allocated)
+            stack = ";".join(self.call_stack)
+            self.folded[stack] = self.folded.get(stack, 0.0) + exclusive
+            self.call_stack.pop()
+
+    def profile(self, ast):
+        """ASTを評価しながら計測する（例外で止まってもそこまでの計測は残る）"""
+        started = self.memory and not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            return self.eval_ast(ast)
+        finally:
+            self.total = time.perf_counter() - start
+            # 関数の外で使った時間はスタックの根の自身の時間にする
+            self.folded[TOPLEVEL] = self.folded.get(TOPLEVEL, 0.0) + self.total - self.function_children[0][0]
+            if started:
+                tracemalloc.stop()
+
+    def format_table(self, title, stats, top):
+        columns = [("呼び出し", 10), ("包括(ms)", 10), ("自身(ms)", 10), ("自身(%)", 8), ("メモリ増減(KB)", 15)]
+        lines = [f"{title} (自身の時間の長い順、上位 {top} 件)",
+                 pad("名前", 24) + "".join(" " + pad(name, width, True) for name, width in columns)]
+        ranked = sorted(stats.items(), key=lambda item: item[1].exclusive, reverse=True)
+        for name, stat in ranked[:top]:
+            share = stat.exclusive / self.total * 100 if self.total else 0.0
+            values = [stat.calls, f"{stat.inclusive * 1000:.2f}", f"{stat.exclusive * 1000:.2f}",
+                      f"{share:.1f}", f"{stat.alloc / 1024:.1f}"]
+            lines.append(pad(name, 24) + "".join(" " + pad(value, width, True)
+                                                 for value, (_, width) in zip(values, columns)))
+        return "\n".join(lines)
+
+    def report(self, top=PROFILE_TOP):
+        """関数とノードの種類ごとの集計表"""
+        memory = "" if self.memory else "（メモリは計測していません）"
+        return "\n\n".join([
+            f"プロファイル: 合計 {self.total * 1000:.2f}ms{memory}",
+            self.format_table("関数", self.function_stats, top),
+            self.format_table("ノードの種類", self.node_stats, top),
+        ])
+
+    def write_folded(self, path=PROFILE_OUTPUT):
+        """関数の呼び出しの並びごとの自身の時間（マイクロ秒）を folded 形式で書き出す"""
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, seconds in sorted(self.folded.items()):
+                microseconds = round(seconds * 1000000)
+                if microseconds > 0:
+                    f.write(f"{stack} {microseconds}\n")
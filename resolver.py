@@ -0,0 +1,494 @@
+# ローカルのレジストリインデックスを使って依存関係グラフをオフラインで解決する
+import glob
+import json
+import os
+import re
+from collections import deque
+from functools import lru_cache
+
+# 依存の種類のうちダウンロード対象にしないもの
+SKIPPED_KINDS = {"dev"}
+
+VERSION_PATTERN = re.compile(
+    r"^(\d+)(?:\.(\d+|\*|x|X))?(?:\.(\d+|\*|x|X))?(?:-([0-9A-Za-z.-]+))?(?:\+[0-9A-Za-z.-]+)?$"
+)
+
+
+# ---- バージョンと要求の解釈（semver） ----
+
+def prerelease_key(pre):
+    """プレリリース識別子の比較キー（数値は数値として、英数字は文字列として比較）"""
+    return tuple((0, int(part), "") if part.isdigit() else (1, 0, part) for part in pre.split("."))
+
+
+def parse_version(text):
+    """「1.2.3-beta.1」を比較可能なキーにする（リリース版は同じ番号のプレリリースより大きい）"""
+    match = VERSION_PATTERN.match(text.strip())
+    if not match or match.group(2) is None or match.group(3) is None:
+        raise ValueError(f"不正なバージョンです: {text}")
+    major, minor, patch = int(match.group(1)), int(match.group(2)), int(match.group(3))
+    pre = match.group(4)
+    if pre:
+        return (major, minor, patch, 0, prerelease_key(pre))
+    return (major, minor, patch, 1, ())
+
+
+def compat_key(version_key):
+    """互換性のある範囲（cargoでは同じ範囲のバージョンは1つにまとめられる）"""
+    major, minor, patch = version_key[:3]
+    if major:
+        return (major,)
+    if minor:
+        return (0, minor)
+    return (0, 0, patch)
+
+
+def release_key(major, minor, patch):
+    return (major, minor, patch, 1, ())
+
+
+def lowest_key(major, minor, patch):
+    """その番号のプレリリースを含めた最小のキー"""
+    return (major, minor, patch, 0, ())
+
+
+class Requirement:
+    """「^1.2, <1.5」のようなバージョン要求"""
+
+    def __init__(self, text):
+        self.text = text
+        self.ranges = []  # (下限キー, 上限キー) の組、いずれかがNoneなら無制限（下限は含み、上限は含まない）
+        self.prereleases = set()  # 要求に書かれたプレリリースの (major, minor, patch)
+        text = text.strip()
+        if text in ("", "*"):
+            return
+        for part in text.split(","):
+            self.ranges.append(self.parse_comparator(part.strip()))
+
+    def parse_comparator(self, text):
+        match = re.match(r"^(>=|<=|>|<|=|\^|~)?\s*(.*)$", text)
+        op, version = match.group(1) or "^", match.group(2)
+        if version in ("*", "x", "X"):
+            return (None, None)
+        m = VERSION_PATTERN.match(version)
+        if not m:
+            raise ValueError(f"不正なバージョン要求です: {text}")
+        major = int(m.group(1))
+        minor = None if m.group(2) in (None, "*", "x", "X") else int(m.group(2))
+        patch = None if m.group(3) in (None, "*", "x", "X") else int(m.group(3))
+        pre = m.group(4)
+        wildcard = m.group(2) in ("*", "x", "X") or m.group(3) in ("*", "x", "X")
+        if wildcard:
+            op = "="
+        if pre and patch is not None and minor is not None:
+            self.prereleases.add((major, minor, patch))
+            exact = (major, minor, patch, 0, prerelease_key(pre))
+        else:
+            exact = release_key(major, minor or 0, patch or 0)
+        low = (major, minor or 0, patch or 0, 0, prerelease_key(pre)) if pre else exact
+
+        # 省略された部分を繰り上げた上限
+        if minor is None:
+            next_partial = lowest_key(major + 1, 0, 0)
+        elif patch is None:
+            next_partial = lowest_key(major, minor + 1, 0)
+        else:
+            next_partial = None
+
+        if op == "^":
+            if major > 0 or minor is None:
+                high = lowest_key(major + 1, 0, 0)
+            elif minor > 0 or patch is None:
+                high = lowest_key(0, minor + 1, 0)
+            else:
+                high = lowest_key(0, 0, patch + 1)
+            return (low, high)
+        if op == "~":
+            high = lowest_key(major + 1, 0, 0) if minor is None else lowest_key(major, minor + 1, 0)
+            return (low, high)
+        if op == "=":
+            if next_partial is not None:
+                return (low, next_partial)
+            return (exact, exact + ("=",))
+        if op == ">=":
+            return (low, None)
+        if op == ">":
+            if next_partial is not None:
+                return (next_partial, None)
+            return (exact + (">",), None)
+        if op == "<":
+            return (None, low)
+        # "<="
+        if next_partial is not None:
+            return (None, next_partial)
+        return (None, exact + ("=",))
+
+    def matches(self, key):
+        # プレリリースは要求に同じ番号のプレリリースが書かれているときだけ対象にする
+        if key[3] == 0 and tuple(key[:3]) not in self.prereleases:
+            return False
+        for low, high in self.ranges:
+            if low is not None and key < low:
+                return False
+            if high is not None and not key < high:
+                return False
+        return True
+
+    def __repr__(self):
+        return f"Requirement({self.text!r})"
+
+
+@lru_cache(maxsize=None)
+def parse_requirement(text):
+    """同じ要求文字列は何度も現れるので解釈結果を使い回す"""
+    return Requirement(text)
+
+
+# ---- レジストリインデックス ----
+
+def index_relpath(name):
+    """crates.io のインデックスと同じ配置でのファイルパス"""
+    name = name.lower()
+    if len(name) <= 2:
+        return os.path.join(str(len(name)), name)
+    if len(name) == 3:
+        return os.path.join("3", name[0], name)
+    return os.path.join(name[:2], name[2:4], name)
+
+
+# インデックスの行全体をJSONとして読まずにバージョンを選べるよう、必要な項目だけを取り出す
+VERS_FIELD = re.compile(r'"vers"\s*:\s*"([^"]+)"')
+YANKED_FIELD = re.compile(r'"yanked"\s*:\s*true')
+
+
+class RegistryIndex:
+    """ローカルにミラーしたレジストリインデックス（1行1バージョンのJSON）
+
+    各行は最初はバージョンと yanked だけを読み、依存関係などは選ばれたバージョンについてだけ
+    entry_details() でJSONとして読む（人気のクレートは数百行あり、全行の読み込みが解決時間の大半を占める）。
+    """
+
+    def __init__(self, index_dir):
+        self.index_dir = index_dir
+        self._entries = {}
+
+    def versions(self, name):
+        """クレートの全バージョン（新しい順）、インデックスになければ空リスト"""
+        entries = self._entries.get(name)
+        if entries is None:
+            entries = []
+            try:
+                with open(os.path.join(self.index_dir, index_relpath(name)), 'r', encoding='utf-8') as f:
+                    for line in f:
+                        if not line.strip():
+                            continue
+                        match = VERS_FIELD.search(line)
+                        if match is None:
+                            continue
+                        try:
+                            key = parse_version(match.group(1))
+                        except ValueError:
+                            continue
+                        entries.append({"vers": match.group(1), "key": key,
+                                        "yanked": YANKED_FIELD.search(line) is not None, "line": line})
+            except OSError:
+                pass
+            entries.sort(key=lambda e: e["key"], reverse=True)
+            self._entries[name] = entries
+        return entries
+
+
+def entry_details(entry):
+    """インデックスのエントリの依存関係やfeatureを読み込む（読み込み済みならそのまま返す）"""
+    line = entry.pop("line", None)
+    if line is not None:
+        entry.update(json.loads(line))
+    return entry
+
+
+# ---- マニフェストとロックファイル ----
+
+def dependency_spec(dep_name, spec, workspace_deps):
+    """Cargo.tomlの依存関係1件の値を、ワークスペースから継承した項目も含めた辞書にする"""
+    if isinstance(spec, str):
+        spec = {"version": spec}
+    if spec.get("workspace"):
+        inherited = workspace_deps.get(dep_name, {})
+        if isinstance(inherited, str):
+            inherited = {"version": inherited}
+        features = list(inherited.get("features", [])) + list(spec.get("features", []))
+        spec = dict(inherited, **{k: v for k, v in spec.items() if k != "workspace"})
+        spec["features"] = features
+    return spec
+
+
+def manifest_dependency(dep_name, spec, workspace_deps):
+    """Cargo.tomlの依存関係1件をインデックスと同じ形式の辞書にする（取得対象外ならNone）
+
+    path のある依存関係は、version が併記されていても（公開時のための指定）Cargoと同じくローカルのパッケージを使う。
+    """
+    spec = dependency_spec(dep_name, spec, workspace_deps)
+    if "git" in spec or "path" in spec:
+        return None
+    return {
+        "name": dep_name,
+        "package": spec.get("package"),
+        "req": spec.get("version", "*"),
+        "features": list(spec.get("features", [])),
+        "default_features": spec.get("default-features", spec.get("default_features", True)),
+        "optional": spec.get("optional", False),
+        "kind": None,
+    }
+
+
+def manifest_dependency_tables(manifest):
+    """通常とビルド時の依存関係テーブル（ターゲット別のものも含む）"""
+    tables = [manifest.get("dependencies", {}), manifest.get("build-dependencies", {})]
+    for target in manifest.get("target", {}).values():
+        tables.append(target.get("dependencies", {}))
+        tables.append(target.get("build-dependencies", {}))
+    return tables
+
+
+def load_toml(path):
+    import toml  # 依存関係を解決するときだけ読み込む
+    with open(path, 'r', encoding='utf-8') as f:
+        return toml.load(f)
+
+
+def read_project(manifest_path):
+    """プロジェクト（とワークスペースのメンバー、パス依存）の直接の依存関係を集める"""
+    root_manifest = load_toml(manifest_path)
+    root_dir = os.path.dirname(os.path.abspath(manifest_path))
+    workspace = root_manifest.get("workspace", {})
+    workspace_deps = workspace.get("dependencies", {})
+
+    seen = set()
+    pending = [os.path.abspath(manifest_path)]
+    for pattern in workspace.get("members", []):
+        for member_dir in sorted(glob.glob(os.path.join(root_dir, pattern))):
+            pending.append(os.path.join(member_dir, "Cargo.toml"))
+
+    deps = []
+    while pending:
+        path = pending.pop(0)
+        if path in seen or not os.path.exists(path):
+            continue
+        seen.add(path)
+        manifest = root_manifest if path == os.path.abspath(manifest_path) else load_toml(path)
+        if "package" not in manifest:
+            continue  # 仮想マニフェスト
+        base_dir = os.path.dirname(path)
+        entry_deps = []
+        for table in manifest_dependency_tables(manifest):
+            for dep_name, spec in table.items():
+                resolved = dependency_spec(dep_name, spec, workspace_deps)
+                if "path" in resolved:
+                    # パス依存はローカルのパッケージとして、その依存関係をたどる
+                    # （ワークスペースから継承した path はワークスペースのルートからの相対パス）
+                    path_base = root_dir if isinstance(spec, dict) and spec.get("workspace") else base_dir
+                    pending.append(os.path.join(os.path.abspath(os.path.join(path_base, resolved["path"])),
+                                                "Cargo.toml"))
+                dep = manifest_dependency(dep_name, spec, workspace_deps)
+                if dep is not None:
+                    entry_deps.append(dep)
+        # ローカルパッケージ自身のfeatureを展開して、有効なoptional依存だけを残す
+        entry = {"deps": entry_deps, "features": manifest.get("features", {})}
+        enabled, dep_features = expand_features(entry, {"default"})
+        for dep in entry_deps:
+            if dep["optional"] and dep["name"] not in enabled:
+                continue
+            dep = dict(dep, features=dep["features"] + sorted(dep_features.get(dep["name"], ())))
+            deps.append(dep)
+    return deps
+
+
+def read_lockfile(lock_path):
+    """Cargo.lockから {クレート名: {バージョン: (チェックサム, 依存関係のリスト)}} を作る"""
+    locked = {}
+    if not lock_path or not os.path.exists(lock_path):
+        return locked
+    for package in load_toml(lock_path).get("package", []):
+        if not package.get("source", "").startswith(("registry+", "sparse+")):
+            continue  # ローカルやgitのパッケージ
+        locked.setdefault(package["name"], {})[package["version"]] = (
+            package.get("checksum"), package.get("dependencies", []))
+    return locked
+
+
+# ---- feature の展開 ----
+
+def expand_features(entry, requested):
+    """要求されたfeatureを展開し、(有効な依存名の集合, 依存名ごとに有効にするfeature) を返す"""
+    features = dict(entry.get("features") or {})
+    features.update(entry.get("features2") or {})
+    optional = {dep["name"] for dep in entry["deps"] if dep.get("optional")}
+    explicit = {item[4:] for items in features.values() for item in items if item.startswith("dep:")}
+
+    enabled_deps = set()
+    dep_features = {}
+    seen = set()
+    stack = list(requested)
+    while stack:
+        feature = stack.pop()
+        if feature in seen:
+            continue
+        seen.add(feature)
+        if feature in features:
+            for item in features[feature]:
+                if item.startswith("dep:"):
+                    enabled_deps.add(item[4:])
+                elif "/" in item:
+                    dep_name, dep_feature = item.split("/", 1)
+                    if dep_name.endswith("?"):
+                        dep_name = dep_name[:-1]  # 弱い依存: 他で有効になっていればfeatureだけ足す
+                    else:
+                        enabled_deps.add(dep_name)
+                    dep_features.setdefault(dep_name, set()).add(dep_feature)
+                else:
+                    stack.append(item)
+        elif feature in optional and feature not in explicit:
+            enabled_deps.add(feature)  # optional依存は同名の暗黙のfeatureで有効になる
+    return enabled_deps, dep_features
+
+
+# ---- 解決 ----
+
+class Package:
+    """解決済みのパッケージ（クレート名とバージョンの組）"""
+    __slots__ = ("name", "version", "key", "checksum", "entry", "features", "deps", "queued")
+
+    def __init__(self, name, entry, checksum):
+        self.name = name
+        self.version = entry["vers"]
+        self.key = entry["key"]
+        self.checksum = checksum
+        self.entry = entry
+        self.features = set()
+        self.deps = set()  # 依存先の (名前, バージョン)
+        self.queued = False
+
+
+class Resolution:
+    """解決結果。download_plan() を並列ダウンロードに渡せる"""
+
+    def __init__(self, packages, warnings):
+        self.packages = packages
+        self.warnings = warnings
+
+    def download_plan(self):
+        """(名前, バージョン, チェックサム) のリスト"""
+        return sorted((pkg.name, pkg.version, pkg.checksum) for pkg in self.packages)
+
+    def graph(self):
+        """「名前 バージョン」-> 依存先のリスト"""
+        return {f"{pkg.name} {pkg.version}": sorted(f"{n} {v}" for n, v in pkg.deps) for pkg in self.packages}
+
+
+class Resolver:
+    """インデックスとCargo.lockから依存関係グラフを組み立てる（バックトラックはしない）"""
+
+    def __init__(self, index, locked=None):
+        self.index = index
+        self.locked = locked or {}
+        self.activated = {}  # (名前, 互換範囲) -> Package
+        self.by_name = {}  # 名前 -> [Package]
+        self.queue = deque()
+        self.warnings = []
+
+    def candidates(self, name):
+        """インデックスのエントリ。インデックスになければCargo.lockの内容から作る"""
+        entries = self.index.versions(name)
+        if entries:
+            return entries
+        entries = []
+        for version, (checksum, lock_deps) in self.locked.get(name, {}).items():
+            deps = []
+            for item in lock_deps:
+                parts = item.split()
+                dep_req = f"={parts[1]}" if len(parts) > 1 else "*"
+                deps.append({"name": parts[0], "req": dep_req, "features": [], "optional": False,
+                             "default_features": False, "kind": None})
+            entries.append({"name": name, "vers": version, "key": parse_version(version), "deps": deps,
+                            "cksum": checksum, "features": {}, "yanked": False})
+        entries.sort(key=lambda e: e["key"], reverse=True)
+        return entries
+
+    def select(self, dep):
+        """依存関係の要求を満たすパッケージを選ぶ（既に選んだもの > Cargo.lock > 最新の順）"""
+        name = dep.get("package") or dep["name"]
+        req = parse_requirement(dep.get("req") or "*")
+        for pkg in self.by_name.get(name, ()):
+            if req.matches(pkg.key):
+                return pkg
+
+        entries = self.candidates(name)
+        locked_versions = self.locked.get(name, {})
+        chosen = None
+        for entry in entries:
+            if entry["vers"] in locked_versions and req.matches(entry["key"]):
+                chosen = entry
+                break
+        if chosen is None:
+            for entry in entries:
+                if not entry.get("yanked") and req.matches(entry["key"]):
+                    chosen = entry
+                    break
+        if chosen is None:
+            raise RuntimeError(f"{name} ({req.text}) を満たすバージョンがインデックスにありません")
+
+        checksum = entry_details(chosen).get("cksum")
+        if chosen["vers"] in locked_versions:
+            lock_checksum = locked_versions[chosen["vers"]][0]
+            if lock_checksum and checksum and lock_checksum != checksum:
+                raise RuntimeError(f"{name} {chosen['vers']} のチェックサムがCargo.lockとインデックスで異なります")
+            checksum = lock_checksum or checksum
+
+        key = (name, compat_key(chosen["key"]))
+        if key in self.activated:
+            # 互換範囲の中で別のバージョンが必要になった（バックトラックせずに両方使う）
+            self.warnings.append(f"{name}: {self.activated[key].version} と {chosen['vers']} の両方が必要です")
+            key = (name, chosen["vers"])
+        pkg = Package(name, chosen, checksum)
+        self.activated[key] = pkg
+        self.by_name.setdefault(name, []).append(pkg)
+        return pkg
+
+    def request(self, dep, extra_features=()):
+        """依存関係を選び、必要なfeatureを有効にする"""
+        pkg = self.select(dep)
+        features = set(dep.get("features") or ()) | set(extra_features)
+        if dep.get("default_features", True):
+            features.add("default")
+        new_features = features - pkg.features
+        if new_features or not pkg.queued:
+            pkg.features |= new_features
+            pkg.queued = True
+            self.queue.append(pkg)
+        return pkg
+
+    def process(self, pkg):
+        """パッケージの依存関係をたどる（featureが増えたら再度処理する）"""
+        enabled, dep_features = expand_features(pkg.entry, pkg.features)
+        for dep in pkg.entry["deps"]:
+            if dep.get("kind") in SKIPPED_KINDS:
+                continue
+            if dep.get("optional") and dep["name"] not in enabled:
+                continue
+            child = self.request(dep, dep_features.get(dep["name"], ()))
+            pkg.deps.add((child.name, child.version))
+
+    def resolve(self, root_deps):
+        for dep in root_deps:
+            self.request(dep)
+        while self.queue:
+            self.process(self.queue.popleft())
+        return Resolution(list(self.activated.values()), self.warnings)
+
+
+def resolve_project(manifest_path, index_dir, lock_path=None):
+    """Cargo.toml（とワークスペース、Cargo.lock）から依存関係グラフを解決"""
+    if lock_path is None:
+        lock_path = os.path.join(os.path.dirname(os.path.abspath(manifest_path)), "Cargo.lock")
+    resolver = Resolver(RegistryIndex(index_dir), read_lockfile(lock_path))
+    return resolver.resolve(read_project(manifest_path))
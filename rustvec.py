@@ -0,0 +1,258 @@
+# 型付きの Vec<T>（要素の型が数値なら array.array に詰めて持つ）
+#
+#   - ('vec', 要素の型, [式, ...])        : vec![a, b, c]（要素がなければ Vec::new()、要素の型は None でもよい）
+#   - ('vec_repeat', 要素の型, 式, 個数の式) : vec![値; 個数]
+#   - ('index', 式, 添字の式)              : v[i]。添字が range（v[a..b]）なら複製しないスライス（VecSlice）
+#   - メソッド（method_chain / method_chain_with_params）: push、len、iter、into_iter、get、is_empty
+#     iter は要素を遅延して読む iterators.RustIter を返す（map、filter などをつなげられる）
+# 要素の型が i8 ... u64、isize、usize、f32、f64 なら要素1つあたりその型の幅だけのメモリで持ち
+# （Vec<u8> の1000万要素は約10MB）、読み出した整数は fixedint の型付きの整数にする。
+# それ以外の型（i128、String、構造体など）や型のない Vec は Python のリストで持つ。
+# スライスは元の Vec と範囲だけを持つ。イテレーターは array を memoryview を通して複製せずに読み、
+# イテレーターが残っている間の push は array を複製してから追加する（イテレーターは複製前の要素を読む）。
+from array import array
+from itertools import islice
+
+from fixedint import FixedInt, INT_TYPES, f32_repr, int_type
+from iterators import RustIter
+
+# 表示する要素の数の上限（これより長い Vec は先頭だけを表示して長さを添える）
+VEC_REPR_LIMIT = 100
+
+# 浮動小数点数の型 -> array の型コード
+FLOAT_TYPECODES = {'f32': 'f', 'f64': 'd'}
+
+
+def typecode(elem_type):
+    """要素の型を詰めて持つ array の型コード（詰められない型ならNone）"""
+    if elem_type in FLOAT_TYPECODES:
+        return FLOAT_TYPECODES[elem_type]
+    if elem_type not in INT_TYPES:
+        return None
+    bits, signed = INT_TYPES[elem_type]
+    for code in ('bhilq' if signed else 'BHILQ'):
+        if array(code).itemsize * 8 == bits:
+            return code
+    return None  # i128、u128
+
+
+# (型名, 折り返すか) -> 8ビットの整数の値をすべて作っておいた表の __getitem__
+_small_items = {}
+
+
+def item_reader(elem_type, wrapping):
+    """array から読み出した int を型付きの整数にする関数（8ビットの型は作っておいた値を表で引く）"""
+    cls = int_type(elem_type, wrapping)
+    if cls.bits != 8:
+        return cls
+    reader = _small_items.get((elem_type, wrapping))
+    if reader is None:
+        # 負の値は表の後ろから引けるように、0 ... max、min ... -1 の順に並べる
+        values = list(range(0, cls.max + 1)) + list(range(cls.min, 0))
+        table = tuple(cls(value) for value in values)
+        reader = _small_items[(elem_type, wrapping)] = table.__getitem__
+    return reader
+
+
+def element_type(values):
+    """型の書かれていない vec![...] の要素の型（すべて同じ型の整数か浮動小数点数ならその型）"""
+    if values and all(isinstance(value, FixedInt) for value in values):
+        type_names = {value.type_name for value in values}
+        if len(type_names) == 1:
+            return type_names.pop()
+    if values and all(type(value) is float for value in values):
+        return 'f64'
+    return None
+
+
+def format_elements(values, length, elem_type):
+    """Rustの {:?} と同じ [a, b, c] の形（長ければ先頭だけ）"""
+    head = list(islice(values, VEC_REPR_LIMIT))
+    format_value = f32_repr if elem_type == 'f32' else repr
+    text = ", ".join(format_value(value) for value in head)
+    if length > VEC_REPR_LIMIT:
+        return f"[{text}, ...] (len {length})"
+    return f"[{text}]"
+
+
+def out_of_bounds(index, length):
+    return IndexError(f"index out of bounds: the len is {length} but the index is {index}")
+
+
+class RustVec:
+    """要素の型の決まった Vec（data は array.array か list）"""
+    __slots__ = ('elem_type', 'data', 'item', 'wrapping')
+    rust_methods = frozenset(('push', 'len', 'iter', 'into_iter', 'get', 'is_empty'))
+
+    def __init__(self, elem_type=None, values=(), wrapping=False):
+        self.elem_type = elem_type
+        self.wrapping = wrapping  # 整数の要素と len() の値の演算が範囲を超えたら折り返すか
+        code = typecode(elem_type)
+        # 読み出した整数を型付きにする関数（浮動小数点数とリストの要素はそのまま返す）
+        self.item = item_reader(elem_type, wrapping) if code is not None and elem_type in INT_TYPES else None
+        if code is None:
+            self.data = []
+        else:
+            self.data = array(code)
+        for value in values:
+            self.push(value)
+
+    @classmethod
+    def repeat(cls, elem_type, value, count, wrapping=False):
+        """vec![値; 個数]（array なら要素1つの配列を繰り返して一度に作る）"""
+        vec = cls(elem_type, wrapping=wrapping)
+        vec.push(value)
+        if count <= 0:
+            del vec.data[:]
+        else:
+            vec.data *= int(count)
+        return vec
+
+    def check(self, value):
+        """push する値を要素の型として確かめる"""
+        if isinstance(value, FixedInt) and self.elem_type is not None and value.type_name != self.elem_type:
+            raise TypeError(f"mismatched types: expected `{self.elem_type}`, found `{value.type_name}`")
+        return value
+
+    def push(self, value):
+        try:
+            self.data.append(self.check(value))
+        except OverflowError:
+            raise OverflowError(f"literal out of range for `{self.elem_type}`: {value}") from None
+        except BufferError:
+            # memoryview で読んでいるイテレーターがあると array の大きさを変えられないので、複製に追加する
+            self.data = self.data[:]
+            self.data.append(value)
+
+    def len(self):
+        return int_type('usize', self.wrapping)(len(self.data))
+
+    def is_empty(self):
+        return not self.data
+
+    def get(self, index):
+        """v[i]（範囲外ならエラー）"""
+        if not 0 <= index < len(self.data):
+            raise out_of_bounds(index, len(self.data))
+        value = self.data[index]
+        return value if self.item is None else self.item(value)
+
+    def values(self):
+        """要素の反復（array は複製せずに memoryview を通して読む）"""
+        if isinstance(self.data, array):
+            values = memoryview(self.data)
+            return iter(values) if self.item is None else map(self.item, values)
+        return iter(self.data)
+
+    def iter(self):
+        return RustIter(self.values(), self.wrapping)
+
+    into_iter = iter
+
+    def slice(self, start, stop):
+        """v[start..stop]（要素を複製しないスライス）"""
+        return VecSlice(self, 0, len(self.data)).slice(start, stop)
+
+    def index(self, key):
+        """v[添字]。添字が range ならスライス"""
+        if type(key) is range:
+            return self.slice(key.start, key.stop)
+        return self.get(key)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __iter__(self):
+        return self.values()
+
+    def __eq__(self, other):
+        if not isinstance(other, (RustVec, VecSlice)):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    __hash__ = None
+
+    def __repr__(self):
+        return format_elements(self.values(), len(self.data), self.elem_type)
+
+
+class VecSlice:
+    """Vec の一部 &v[start..stop]（元の Vec と範囲だけを持つ）"""
+    __slots__ = ('vec', 'start', 'stop')
+    rust_methods = frozenset(('len', 'iter', 'into_iter', 'get', 'is_empty'))
+
+    def __init__(self, vec, start, stop):
+        self.vec = vec
+        self.start = start
+        self.stop = stop
+
+    def len(self):
+        return int_type('usize', self.vec.wrapping)(len(self))
+
+    def is_empty(self):
+        return self.stop <= self.start
+
+    def get(self, index):
+        if not 0 <= index < len(self):
+            raise out_of_bounds(index, len(self))
+        return self.vec.get(self.start + index)
+
+    def values(self):
+        data = self.vec.data
+        if isinstance(data, array):
+            values = memoryview(data)[self.start:self.stop]
+            item = self.vec.item
+            return iter(values) if item is None else map(item, values)
+        return islice(data, self.start, self.stop)
+
+    def iter(self):
+        return RustIter(self.values(), self.vec.wrapping)
+
+    into_iter = iter
+
+    def slice(self, start, stop):
+        length = len(self)
+        if start < 0 or start > stop:
+            raise IndexError(f"slice index starts at {start} but ends at {stop}")
+        if stop > length:
+            raise IndexError(f"range end index {stop} out of range for slice of length {length}")
+        return VecSlice(self.vec, self.start + start, self.start + stop)
+
+    def index(self, key):
+        if type(key) is range:
+            return self.slice(key.start, key.stop)
+        return self.get(key)
+
+    def __len__(self):
+        return max(self.stop - self.start, 0)
+
+    def __iter__(self):
+        return self.values()
+
+    def __eq__(self, other):
+        if not isinstance(other, (RustVec, VecSlice)):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    __hash__ = None
+
+    def __repr__(self):
+        return format_elements(self.values(), len(self), self.vec.elem_type)
+
+
+def make_vec(elem_type, values, wrapping=False):
+    """vec![...] の値（要素の型がなければ要素から決める）"""
+    if elem_type is None:
+        elem_type = element_type(values)
+    return RustVec(elem_type, values, wrapping)
+
+
+def index_value(value, key):
+    """v[添字] の値（Vec とスライスのほか、リストやタプルも添字で引ける）"""
+    if isinstance(value, (RustVec, VecSlice)):
+        return value.index(key)
+    if type(key) is range:
+        return value[key.start:key.stop]
+    if not 0 <= key < len(value):
+        raise out_of_bounds(key, len(value))
+    return value[key]
@@ -1,4 +1,17 @@
-import asyncio
+import sys
+import threading
+
+from toplevel import is_lazy_body
+from match_table import MatchTable, match_pattern, normalize_arms
+from structs import declaration_layout, field_value
+from fixedint import cast
+from rustvec import RustVec, index_value, make_vec
+from iterators import RustIter
+from astnodes import (
+    Node, Other, FUNCTION, CALL, LET, BINARY_OP, IF, LOOP, BREAK, IDENTIFIER, NUMBER, RETURN, MOVE,
+    FOR, RANGE, ASYNC, MATCH, STRUCT, RESULT, GENERIC_FUNCTION, CONST, INVARIANT, INVARIANT_SCOPE,
+    FIELD_ACCESS, CAST, INDEX, METHOD_CALL, VEC, VEC_REPEAT, CLOSURE, MATCH_GUARD, ASYNC_FUNCTION, AWAIT, OTHER,
+)
 
 class RustResult:
     def __init__(self, ok=None, err=None):
@@ -14,34 +27,357 @@ class RustResult:
         else:
             raise RuntimeError(f"Unwrapped error: {self.err}")
 
+class StackOverflowError(RuntimeError):
+    """関数呼び出しの深さが上限を超えた（Rustのスタックオーバーフローに相当）"""
+
+    def __init__(self, func_name, depth):
+        super().__init__(f"thread 'main' has overflowed its stack "
+                         f"(関数 '{func_name}' の呼び出しの深さが {depth} に達しました)")
+        self.func_name = func_name
+        self.depth = depth
+
+# 関数呼び出しの深さの既定の上限（RustVM は呼び出しごとにPythonのスタックを使わないので、この深さまで実行できる）
+MAX_CALL_DEPTH = 500000
+
+# ツリー評価は呼び出しごとにPythonのスタックを使うので、プログラムは大きなスタックのスレッドで評価する
+# （Pythonの関数どうしの呼び出しはCのスタックをほとんど使わないが、組み込み関数を挟むと1段に数KBを使いうる）
+EVAL_STACK_SIZE = 1024 * 1024 * 1024
+EVAL_RECURSION_LIMIT = 250000
+
+def run_with_deep_stack(function, *args):
+    """function(*args) を EVAL_STACK_SIZE のスタックのスレッドで、Pythonの再帰の上限を上げて実行する
+
+    上限に達したときは call_function が RecursionError を StackOverflowError にする。
+    """
+    result = {}
+
+    def target():
+        try:
+            result["value"] = function(*args)
+        except BaseException as e:
+            result["error"] = e
+
+    try:
+        previous_size = threading.stack_size(EVAL_STACK_SIZE)
+    except (ValueError, RuntimeError):
+        return function(*args)  # スタックの大きさを変えられない環境ではそのまま実行する
+    previous_limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(previous_limit, EVAL_RECURSION_LIMIT))
+    try:
+        thread = threading.Thread(target=target, daemon=True)
+        thread.start()
+        threading.stack_size(previous_size)
+        thread.join()
+    finally:
+        sys.setrecursionlimit(previous_limit)
+    if "error" in result:
+        raise result["error"]
+    return result.get("value")
+
+# 未代入のローカル変数スロットを表す番兵（読み出し時はグローバルを参照する）
+UNBOUND = object()
+
+# 所有権を移動したローカル変数スロットを表す番兵（ownership はグローバル変数の状態だけを名前で持つ）
+MOVED = object()
+
+# メモ化した呼び出し結果がないことを表す番兵（memo.MemoCache.get）
+MISSING = object()
+
+def moved_error(var_name):
+    return RuntimeError(f"変数 '{var_name}' はすでに所有権が移動されました")
+
+def param_name(param):
+    """パーサーの引数表現（名前、(名前, 型)、None）から変数名を取り出す"""
+    if isinstance(param, tuple):
+        return param[0]
+    return param
+
+def collect_locals(params, body):
+    """関数の引数とボディ内のlet/for変数を集めてスロット番号を割り当てる"""
+    slots = {}
+
+    def add(var_name):
+        if isinstance(var_name, str) and var_name not in slots:
+            slots[var_name] = len(slots)
+
+    def walk(node):
+        if isinstance(node, list):
+            for child in node:
+                walk(child)
+        elif isinstance(node, Node):
+            if node.kind == FUNCTION or node.kind == CLOSURE:
+                return  # 入れ子の関数とクロージャは別スコープ
+            if node.kind in (LET, FOR):
+                add(node.name)
+            if type(node) is Other:
+                walk(list(node.items))
+            else:
+                for name in node.fields:
+                    child = getattr(node, name)
+                    if isinstance(child, dict):
+                        child = list(child.values())
+                    walk(child)
+        elif isinstance(node, tuple) and node:
+            node_type = node[0]
+            if node_type in ('function', 'closure'):
+                return  # 入れ子の関数とクロージャは別スコープ
+            if node_type in ('let', 'for'):
+                add(node[1])
+            for child in node[1:]:
+                if isinstance(child, (list, tuple, Node)):
+                    walk(child)  # match の腕のタプルはノードクラスのボディを持ちうる
+                elif isinstance(child, dict):
+                    for value in child.values():
+                        walk(value)
+
+    for param in params:
+        add(param_name(param))
+    walk(body)
+    return slots
+
+class Scope:
+    """関数ごとのローカル変数のスロット配置"""
+    __slots__ = ('slots', 'names', 'param_slots')
+
+    def __init__(self, slots, params=()):
+        self.slots = slots  # 変数名 -> スロット番号
+        self.names = list(slots)  # スロット番号 -> 変数名
+        self.param_slots = [slots.get(param_name(p)) for p in params]
+
+    def new_frame(self, args):
+        """引数を束縛したローカル変数配列を作る"""
+        frame = [UNBOUND] * len(self.names)
+        for slot, value in zip(self.param_slots, args):
+            if slot is not None:
+                frame[slot] = value
+        return frame
+
+# トップレベル（関数の外）のスコープ。変数はすべてグローバルテーブルに入る
+GLOBAL_SCOPE = Scope({})
+
 class RustSimulator:
     def __init__(self):
         # 変数、関数、所有権、ジェネリクスを管理
-        self.variables = {}  # 変数の保存先
-        self.functions = {}  # 関数の保存先
+        self.variables = {}  # グローバル変数の保存先
+        self.functions = {}  # 関数の保存先 (引数, ボディ, スコープ)
         self.ownership = {}  # 借用と所有権の追跡
         self.generic_types = {}  # ジェネリクス型の追跡
+        self.scope = GLOBAL_SCOPE  # 実行中の関数のスコープ
+        self.locals = []  # 実行中の関数のローカル変数配列
+        self.frames = []  # 呼び出し元の (スコープ, ローカル変数配列) のスタック
+        self.max_depth = MAX_CALL_DEPTH  # 関数呼び出しの深さの上限（超えると StackOverflowError）
+        self.invariants = []  # 実行中のループごとの、巻き上げた式の値の配列（optimizer.Optimizer.hoist）
+        self.body_loader = None  # 遅延させた関数のボディをパースする関数（toplevel.LAZY_BODYノード -> 文のリスト）
+        self.memo = None  # 純粋な関数の呼び出し結果のキャッシュ（memo.MemoCache、--memoize のときだけ）
+        self.async_functions = {}  # async fn の保存先 (引数, ボディ, スコープ)
+        self.runtime = None  # 非同期処理のランタイム（async_runtime.AsyncRuntime、最初に使うときに作る）
+        self.jit = None  # よく呼ばれる関数をPythonに変換する（transpile.TieredCompiler、--jit のときだけ）
+        self.match_tables = {}  # id(match ノード) -> (ノード, MatchTable)
+        self.struct_layouts = {}  # 宣言された構造体の名前 -> structs.StructLayout
+        self.wrapping = False  # 幅の決まった整数の演算が範囲を超えたら折り返すか（--overflow wrap、既定はエラー）
+        self.closure_scopes = {}  # id(クロージャのボディ) -> (ボディ, 作った場所のスコープ, クロージャのスコープ)
 
     def borrow_check(self, var_name):
-        """借用チェックを実行"""
+        """グローバル変数の借用チェックを実行"""
         if self.ownership.get(var_name) == 'moved':
-            raise RuntimeError(f"変数 '{var_name}' はすでに所有権が移動されました")
+            raise moved_error(var_name)
     
     def move_variable(self, var_name):
-        """変数の所有権を移動"""
-        self.ownership[var_name] = 'moved'
+        """変数の所有権を移動（代入済みのローカル変数はスロットに、それ以外はグローバル変数の状態に記録）"""
+        slot = self.scope.slots.get(var_name)
+        if slot is not None and self.locals[slot] is not UNBOUND:
+            self.locals[slot] = MOVED
+        else:
+            self.ownership[var_name] = 'moved'
+
+    def load_variable(self, var_name):
+        """借用チェックをして、ローカル変数、なければグローバル変数を読み出す"""
+        slot = self.scope.slots.get(var_name)
+        if slot is not None:
+            value = self.locals[slot]
+            if value is not UNBOUND:
+                if value is MOVED:
+                    raise moved_error(var_name)
+                return value
+        self.borrow_check(var_name)
+        return self.variables.get(var_name, None)
+
+    def store_variable(self, var_name, value):
+        """ローカル変数ならスロットへ、そうでなければグローバル変数へ書き込む"""
+        slot = self.scope.slots.get(var_name)
+        if slot is None:
+            self.variables[var_name] = value
+        else:
+            self.locals[slot] = value
+
+    def let_variable(self, var_name, value):
+        """let で変数を定義する（グローバル変数は所有権を戻す。ローカル変数はスロットの値を置き換えれば戻る）"""
+        slot = self.scope.slots.get(var_name)
+        if slot is None:
+            self.variables[var_name] = value
+            self.ownership[var_name] = 'owned'
+        else:
+            self.locals[slot] = value
+        print(f"Variable '{var_name}' = {value}")
+
+    def define_function(self, func_name, params, body):
+        """関数を登録し、ローカル変数のスロットを事前に解決"""
+        if is_lazy_body(body):
+            # ボディはまだパースしていないので、スロットの解決も最初の呼び出しまで遅らせる
+            self.functions[func_name] = (params, body, None)
+        else:
+            scope = Scope(collect_locals(params, body), params)
+            self.functions[func_name] = (params, body, scope)
+        if self.memo is not None:
+            self.memo.invalidate()  # 定義し直した関数の古い結果を使わない
+        if self.jit is not None:
+            self.jit.invalidate()
+        print(f"Function '{func_name}' defined.")
+
+    def define_async_function(self, func_name, params, body):
+        """async fn を登録（呼び出すと future になる）"""
+        scope = Scope(collect_locals(params, body), params)
+        self.async_functions[func_name] = (params, body, scope)
+        print(f"Async function '{func_name}' defined.")
+
+    def load_function_body(self, func_name):
+        """遅延させた関数のボディをパースし、スロットを解決して登録し直す"""
+        params, lazy_body, _ = self.functions[func_name]
+        body = self.body_loader(lazy_body)
+        if body is None:
+            # 空の関数として実行を続けると、構文エラーが黙って戻り値 None になる
+            raise SyntaxError(f"関数 '{func_name}' のボディをパースできませんでした (line {lazy_body[3]})")
+        scope = Scope(collect_locals(params, body), params)
+        self.functions[func_name] = (params, body, scope)
+        if self.memo is not None:
+            self.memo.invalidate(clear=False)  # 読み込んだボディで純粋かどうかを解析し直す
+        if self.jit is not None:
+            self.jit.invalidate(clear=False)  # 読み込んだボディを呼び出す関数も変換できるかもしれない
+        return params, body, scope
     
     def eval_ast(self, node):
-        """ASTノードを評価して実行"""
+        """ASTノードを評価して実行（タプル形式とノードクラスのどちらでもよい）"""
+        if isinstance(node, Node):
+            # ノードクラスは整数の種類で分岐する（タプル形式の同じ種類のノードと同じ動作）
+            kind = node.kind
+            if kind == IDENTIFIER:
+                return self.load_variable(node.name)
+            elif kind == NUMBER:
+                return node.value
+            elif kind == BINARY_OP:
+                left = self.eval_ast(node.left)
+                right = self.eval_ast(node.right)
+                operator = node.op
+                if operator == '+':
+                    return left + right
+                elif operator == '-':
+                    return left - right
+                elif operator == '*':
+                    return left * right
+                elif operator == '/':
+                    return left / right
+            elif kind == CALL:
+                return self.call_function(node.name, [self.eval_ast(arg) for arg in node.args])
+            elif kind == INVARIANT:
+                values = self.invariants[-1]
+                value = values[node.index]
+                if value is UNBOUND:
+                    value = values[node.index] = self.eval_ast(node.value)
+                return value
+            elif kind == IF:
+                if self.eval_ast(node.condition):
+                    return self.eval_ast(node.then)
+                elif node.orelse is not None:
+                    return self.eval_ast(node.orelse)
+            elif kind == LET:
+                self.let_variable(node.name, self.eval_ast(node.value))
+            elif kind == RETURN:
+                return self.eval_ast(node.value)
+            elif kind == FUNCTION:
+                self.define_function(node.name, node.params, node.body)
+            elif kind == LOOP:
+                while True:
+                    if self.eval_ast(node.body) == 'break':
+                        break
+            elif kind == BREAK:
+                return 'break'
+            elif kind == FOR:
+                var_name = node.name
+                for value in self.eval_ast(node.iterable):
+                    self.store_variable(var_name, value)
+                    self.eval_ast(node.body)
+            elif kind == RANGE:
+                return range(self.eval_ast(node.start), self.eval_ast(node.end))
+            elif kind == MOVE:
+                var_name = node.name
+                value = self.load_variable(var_name)
+                if value is None and var_name not in self.scope.slots:
+                    value = self.variables[var_name]  # 未定義ならKeyError
+                self.move_variable(var_name)
+                return value
+            elif kind == MATCH:
+                return self.eval_match(node, self.eval_ast(node.subject), node.arms)
+            elif kind == STRUCT:
+                fields = node.fields_
+                return self.make_struct(node.name, tuple(fields), [self.eval_ast(v) for v in fields.values()])
+            elif kind == FIELD_ACCESS:
+                return field_value(self.eval_ast(node.value), node.field)
+            elif kind == INDEX:
+                return index_value(self.eval_ast(node.value), self.eval_ast(node.index))
+            elif kind == METHOD_CALL:
+                receiver = self.eval_ast(node.receiver)
+                args = [] if node.args is None else [self.eval_ast(arg) for arg in node.args]
+                return self.call_method(receiver, node.method, args)
+            elif kind == CAST:
+                return cast(self.eval_ast(node.value), node.type_name, self.wrapping)
+            elif kind == RESULT:
+                if node.variant == 'Ok':
+                    return RustResult(ok=self.eval_ast(node.value))
+                elif node.variant == 'Err':
+                    return RustResult(err=self.eval_ast(node.value))
+            elif kind == ASYNC:
+                return self.run_async(node.body)
+            elif kind == GENERIC_FUNCTION:
+                self.generic_types[node.name] = node.generic_type
+                print(f"Generic function '{node.name}' with type '{node.generic_type}' defined.")
+            elif kind == INVARIANT_SCOPE:
+                self.invariants.append([UNBOUND] * node.count)
+                try:
+                    return self.eval_ast(node.loop)
+                finally:
+                    self.invariants.pop()
+            elif kind == CONST:
+                self.store_variable(node.name, self.eval_const(node.value))
+            elif kind == VEC:
+                return make_vec(node.elem_type, [self.eval_ast(item) for item in node.items], self.wrapping)
+            elif kind == VEC_REPEAT:
+                return RustVec.repeat(node.elem_type, self.eval_ast(node.value), self.eval_ast(node.count), self.wrapping)
+            elif kind == CLOSURE:
+                return self.make_closure(node)
+            elif kind == MATCH_GUARD:
+                return self.eval_match(node, self.eval_ast(node.subject), node.arms)
+            elif kind == ASYNC_FUNCTION:
+                self.define_async_function(node.name, node.params, node.body)
+            elif kind == AWAIT:
+                return self.async_runtime().await_node(node.value)
+            elif kind == OTHER:
+                return self.eval_ast(node.to_tuple())  # 専用のクラスがない種類はタプル形式と同じ動作
+            return None
+
+        if isinstance(node, list):
+            # 文の並び（ブロック）を順に評価し、breakが現れたらそこで打ち切る
+            result = None
+            for stmt in node:
+                result = self.eval_ast(stmt)
+                if result == 'break':
+                    break
+            return result
+
         node_type = node[0]
 
         if node_type == 'function':
             # 関数定義
-            func_name = node[1]
-            params = node[2]
-            body = node[4]
-            self.functions[func_name] = (params, body)
-            print(f"Function '{func_name}' defined.")
+            self.define_function(node[1], node[2], node[4])
         
         elif node_type == 'call':
             # 関数呼び出し
@@ -49,13 +385,17 @@ class RustSimulator:
             args = [self.eval_ast(arg) for arg in node[2]]
             return self.call_function(func_name, args)
 
+        elif node_type == 'invariant':
+            # ループ不変式（ループに入ってから最初の評価の値を使い回す）
+            values = self.invariants[-1]
+            value = values[node[1]]
+            if value is UNBOUND:
+                value = values[node[1]] = self.eval_ast(node[2])
+            return value
+
         elif node_type == 'let':
             # 変数定義
-            var_name = node[1]
-            value = self.eval_ast(node[2])
-            self.variables[var_name] = value
-            self.ownership[var_name] = 'owned'  # 所有権を設定
-            print(f"Variable '{var_name}' = {value}")
+            self.let_variable(node[1], self.eval_ast(node[2]))
         
         elif node_type == 'binary_op':
             # 二項演算（+,-,*,/など）
@@ -91,9 +431,7 @@ class RustSimulator:
 
         elif node_type == 'identifier':
             # 変数の参照時に借用チェック
-            var_name = node[1]
-            self.borrow_check(var_name)
-            return self.variables.get(var_name, None)
+            return self.load_variable(node[1])
 
         elif node_type == 'number':
             # 数値リテラル
@@ -106,8 +444,9 @@ class RustSimulator:
         elif node_type == 'move':
             # 所有権を移動する
             var_name = node[1]
-            self.borrow_check(var_name)
-            value = self.variables[var_name]
+            value = self.load_variable(var_name)
+            if value is None and var_name not in self.scope.slots:
+                value = self.variables[var_name]  # 未定義ならKeyError
             self.move_variable(var_name)
             return value
 
@@ -116,7 +455,7 @@ class RustSimulator:
             var_name = node[1]
             iterator = self.eval_ast(node[2])
             for value in iterator:
-                self.variables[var_name] = value
+                self.store_variable(var_name, value)
                 self.eval_ast(node[3])  # ループの本体
 
         elif node_type == 'range':
@@ -126,22 +465,80 @@ class RustSimulator:
             return range(start, end)
 
         elif node_type == 'async':
-            # 非同期関数の定義
+            # 非同期ブロック
             async_body = node[1]
-            return asyncio.run(self.eval_async(async_body))
+            return self.run_async(async_body)
+
+        elif node_type == 'async_function':
+            # 非同期関数の定義
+            self.define_async_function(node[1], node[2], node[4])
+
+        elif node_type == 'await':
+            return self.async_runtime().await_node(node[1])
+
+        elif node_type == 'join':
+            return self.async_runtime().join_nodes(node[1])
+
+        elif node_type == 'spawn':
+            return self.async_runtime().spawn_node(node[1])
+
+        elif node_type == 'sleep':
+            self.async_runtime().sleep(self.eval_ast(node[1]))
 
         elif node_type == 'match':
             # パターンマッチ
-            match_expr = self.eval_ast(node[1])
-            for pattern, body in node[2]:
-                if self.match_pattern(pattern, match_expr):
-                    return self.eval_ast(body)
+            return self.eval_match(node, self.eval_ast(node[1]), node[2])
+
+        elif node_type == 'match_guard':
+            # ガード（if 条件）付きの腕を持つパターンマッチ
+            return self.eval_match(node, self.eval_ast(node[1]), node[2])
 
         elif node_type == 'struct':
+            if isinstance(node[2], list):
+                # 構造体の宣言
+                self.define_struct(node)
+                return None
             # 構造体のインスタンス生成
             struct_name = node[1]
-            fields = {k: self.eval_ast(v) for k, v in node[2].items()}
-            return (struct_name, fields)
+            fields = node[2]
+            return self.make_struct(struct_name, tuple(fields), [self.eval_ast(v) for v in fields.values()])
+
+        elif node_type in ('pub_struct', 'tuple_struct', 'pub_tuple_struct'):
+            # 構造体の宣言（pub、タプル構造体）
+            self.define_struct(node)
+
+        elif node_type == 'field_access':
+            # フィールドの参照
+            return field_value(self.eval_ast(node[1]), node[2])
+
+        elif node_type == 'cast':
+            # as による型変換
+            return cast(self.eval_ast(node[1]), node[2], self.wrapping)
+
+        elif node_type == 'vec':
+            # vec![a, b, c]
+            return make_vec(node[1], [self.eval_ast(item) for item in node[2]], self.wrapping)
+
+        elif node_type == 'vec_repeat':
+            # vec![値; 個数]
+            return RustVec.repeat(node[1], self.eval_ast(node[2]), self.eval_ast(node[3]), self.wrapping)
+
+        elif node_type == 'index':
+            # 添字（範囲ならスライス）
+            return index_value(self.eval_ast(node[1]), self.eval_ast(node[2]))
+
+        elif node_type == 'method_chain':
+            # 引数のないメソッド呼び出し v.len()
+            return self.call_method(self.eval_ast(node[1]), node[2], [])
+
+        elif node_type == 'method_chain_with_params':
+            # メソッド呼び出し v.push(x)
+            receiver = self.eval_ast(node[1])
+            return self.call_method(receiver, node[2], [self.eval_ast(arg) for arg in node[3]])
+
+        elif node_type == 'closure':
+            # クロージャ |x| x * k
+            return self.make_closure(node)
 
         elif node_type == 'result':
             # Result型のシミュレーション
@@ -157,39 +554,163 @@ class RustSimulator:
             self.generic_types[func_name] = generic_type
             print(f"Generic function '{func_name}' with type '{generic_type}' defined.")
 
-    async def eval_async(self, async_body):
-        """非同期ブロックを実行"""
-        result = self.eval_ast(async_body)
-        await asyncio.sleep(1)  # 非同期処理の待機
-        return result
+        elif node_type == 'invariant_scope':
+            # ループ不変式の値はループに入るたびに評価し直す
+            self.invariants.append([UNBOUND] * node[1])
+            try:
+                return self.eval_ast(node[2])
+            finally:
+                self.invariants.pop()
+
+        elif node_type == 'const_declaration':
+            # 定数の定義（値はパーサーの生のリテラルかノード）
+            self.store_variable(node[1], self.eval_const(node[3]))
+
+    def eval_const(self, value):
+        """const の右辺を評価（ノードでない値はリテラルとしてそのまま使う）"""
+        if isinstance(value, (tuple, list, Node)):
+            return self.eval_ast(value)
+        return value
+
+    def async_runtime(self):
+        """このシミュレーターのイベントループ（シミュレーションの間ずっと同じものを使う）"""
+        if self.runtime is None:
+            from async_runtime import AsyncRuntime  # 起動を軽くするため、非同期処理を使うときだけ読み込む
+            self.runtime = AsyncRuntime(self)
+        return self.runtime
+
+    def run_async(self, async_body):
+        """非同期ブロックの値（.await / join / spawn されるまで実行しない future）"""
+        return self.async_runtime().run_block(async_body)
 
     def call_function(self, func_name, args):
         """関数を実行"""
         if func_name not in self.functions:
+            if func_name in self.async_functions:
+                return self.async_runtime().call(func_name, args)
+            layout = self.struct_layouts.get(func_name)
+            if layout is not None and layout.tuple_struct and len(args) == len(layout.fields):
+                # タプル構造体のインスタンス生成 Point(1, 2)
+                return layout.instance_class(*args)
+            closure = self.load_variable(func_name)
+            if callable(closure):
+                # クロージャを入れた変数の呼び出し f(x)
+                return closure(*args)
             raise ValueError(f"Function '{func_name}' is not defined.")
         
-        params, body = self.functions[func_name]
-        local_variables = dict(zip(params, args))
-        previous_variables = self.variables.copy()
-        self.variables.update(local_variables)
-        
-        # 関数のボディを評価
-        result = self.eval_ast(body)
-        
-        # グローバル変数を元に戻す
-        self.variables = previous_variables
-        return result
+        params, body, scope = self.functions[func_name]
+        if scope is None:
+            params, body, scope = self.load_function_body(func_name)
+        memo_key = None
+        if self.memo is not None:
+            memo_key = self.memo.key(self, func_name, args)
+            if memo_key is not None:
+                value = self.memo.get(memo_key)
+                if value is not MISSING:
+                    return value
+        if self.jit is not None:
+            function = self.jit.lookup(self, func_name, args)
+            if function is not None:
+                try:
+                    value = function(*args)
+                except RecursionError:
+                    raise StackOverflowError(func_name, len(self.frames)) from None
+                if memo_key is not None:
+                    self.memo.put(memo_key, value)
+                return value
+        if len(self.frames) >= self.max_depth:
+            raise StackOverflowError(func_name, len(self.frames))
+        # 新しいフレームを積む（グローバル変数の数によらず一定のコスト）
+        self.frames.append((self.scope, self.locals))
+        self.scope = scope
+        self.locals = scope.new_frame(args)
+        try:
+            # 関数のボディを評価
+            value = self.eval_body(body, scope)
+            if memo_key is not None:
+                self.memo.put(memo_key, value)
+            return value
+        except RecursionError:
+            # ツリー評価は呼び出しごとにPythonのスタックを使うので、max_depth より先にPythonの上限に達しうる
+            raise StackOverflowError(func_name, len(self.frames)) from None
+        finally:
+            # 呼び出し元のフレームに戻す
+            self.scope, self.locals = self.frames.pop()
+
+    def make_closure(self, node):
+        """クロージャの値（スコープはボディと作った場所のスコープの組ごとに一度だけ作る）"""
+        from closures import RustClosure, closure_scope  # simulator を読み込むモジュールなので、使うときに読み込む
+        if isinstance(node, Node):
+            params, body = node.params, node.body
+        else:
+            params, body = node[1], node[2]
+        # 同じクロージャの式を評価するたびにスコープを作り直さないよう、ボディで引く
+        entry = self.closure_scopes.get(id(body))
+        if entry is None or entry[0] is not body or entry[1] is not self.scope:
+            entry = (body, self.scope, closure_scope(self.scope, params, body))
+            self.closure_scopes[id(body)] = entry
+        return RustClosure(self, params, body, entry[2], self.locals)
+
+    def call_closure(self, closure, args):
+        """クロージャを実行（関数の呼び出しと同じくフレームを積む）"""
+        if len(self.frames) >= self.max_depth:
+            raise StackOverflowError('<closure>', len(self.frames))
+        frame = closure.new_frame(args)
+        self.frames.append((self.scope, self.locals))
+        self.scope = closure.scope
+        self.locals = frame
+        try:
+            return self.eval_body(closure.body, closure.scope)
+        except RecursionError:
+            raise StackOverflowError('<closure>', len(self.frames)) from None
+        finally:
+            self.scope, self.locals = self.frames.pop()
+
+    def call_method(self, receiver, method, args):
+        """値のメソッドを呼び出す（値の型の rust_methods にあるものだけ。範囲はイテレーターとして扱う）"""
+        if type(receiver) is range:
+            receiver = RustIter(iter(receiver), self.wrapping)
+        if method in getattr(type(receiver), 'rust_methods', ()):
+            return getattr(receiver, method)(*args)
+        raise ValueError(f"Method '{method}' is not defined for {type(receiver).__name__}.")
+
+    def define_struct(self, node):
+        """構造体の宣言からレイアウトを作る（以降のインスタンス生成に使う）"""
+        layout = declaration_layout(node)
+        self.struct_layouts[layout.name] = layout
+        print(f"Struct '{layout.name}' defined.")
+
+    def make_struct(self, struct_name, keys, values):
+        """構造体のインスタンス（宣言と同じフィールドの組ならスロットのオブジェクト、それ以外は (名前, 辞書)）"""
+        layout = self.struct_layouts.get(struct_name)
+        if layout is not None:
+            instance = layout.new(keys, values)
+            if instance is not None:
+                return instance
+        return (struct_name, dict(zip(keys, values)))
+
+    def eval_body(self, body, scope):
+        """関数のボディを評価（現在のフレームはscopeのもの）"""
+        return self.eval_ast(body)
+
+    def match_table(self, node, arms):
+        """match ノードの腕の選択表（ノードごとに一度だけ作る）"""
+        entry = self.match_tables.get(id(node))
+        if entry is None or entry[0] is not node:
+            entry = (node, MatchTable(normalize_arms(arms)))
+            self.match_tables[id(node)] = entry
+        return entry[1]
+
+    def eval_match(self, node, value, arms):
+        """値にマッチする最初の腕（ガードがあれば真のもの）のボディを評価する"""
+        for index, check, pattern, guard, body in self.match_table(node, arms).candidates(value):
+            if check and not self.match_pattern(pattern, value):
+                continue
+            if guard is not None and not self.eval_ast(guard):
+                continue
+            return self.eval_ast(body)
+        return None
 
     def match_pattern(self, pattern, value):
         """パターンマッチングの実装"""
-        if isinstance(pattern, tuple) and isinstance(value, tuple):
-            if pattern[0] != value[0]:
-                return False
-            for p, v in zip(pattern[1], value[1]):
-                if not self.match_pattern(p, v):
-                    return False
-            return True
-        elif isinstance(pattern, str):
-            return pattern == value
-        else:
-            return pattern == value
+        return match_pattern(pattern, value)
@@ -0,0 +1,142 @@
+# 構造体の宣言から作る固定レイアウト
+#
+# 構造体の宣言（パーサーの struct_declaration）ごとに StructLayout を作り、フィールドの並びを決めておく。
+#   - ('struct', 名前, [(フィールド, 型), ...])       : 名前付きフィールドの構造体
+#   - ('tuple_struct', 名前, [型, ...])              : タプル構造体（フィールドは 0, 1, ...）
+#   - ('pub_struct', ...) / ('pub_tuple_struct', ...) : 同じ（可視性は見ない）
+# インスタンスはレイアウトごとに作る __slots__ のクラス（StructValue のサブクラス）で、辞書を持たない。
+# フィールドの参照はレイアウトでフィールド名を番号に引き、番号ごとに用意した取り出し関数で読む。
+# VMの命令列では参照の位置ごとに FieldSite を置き、直前に見たクラスの取り出し関数を使い回す（インラインキャッシュ）。
+# 宣言のない構造体や、宣言とフィールドの組が違うインスタンス生成は従来どおり (名前, {フィールド: 値}) にする。
+from operator import attrgetter
+
+
+class StructValue:
+    """宣言のある構造体のインスタンスの基底クラス（フィールドはサブクラスのスロット f0, f1, ... に入る）"""
+    __slots__ = ()
+    layout = None
+
+    # 辞書を持つ従来の形と同じく、ハッシュできない値として扱う
+    __hash__ = None
+
+    def values(self):
+        return tuple(getter(self) for getter in self.layout.getters)
+
+    def to_dict(self):
+        return dict(zip(self.layout.fields, self.values()))
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return self.values() == other.values()
+
+    def __repr__(self):
+        # 表示は従来の (名前, {フィールド: 値}) と同じ（タプル構造体は (名前, (値, ...))）
+        if self.layout.tuple_struct:
+            return repr((self.layout.name, self.values()))
+        return repr((self.layout.name, self.to_dict()))
+
+
+class StructLayout:
+    """構造体の宣言から決めたフィールドの並びと、インスタンスのクラス"""
+
+    def __init__(self, name, fields, tuple_struct=False):
+        self.name = name
+        self.fields = tuple(str(field) for field in fields)
+        self.tuple_struct = tuple_struct
+        self.index = {field: i for i, field in enumerate(self.fields)}  # フィールド名 -> 番号
+        if tuple_struct:
+            self.index.update({i: i for i in range(len(self.fields))})  # p.0 は数値でも引ける
+        self.slots = tuple(f"f{i}" for i in range(len(self.fields)))
+        self.getters = tuple(attrgetter(slot) for slot in self.slots)
+        self.field_getters = {field: self.getters[i] for field, i in self.index.items()}
+        self.orders = {}  # インスタンス生成のフィールド名の並び -> order() の結果
+        self.instance_class = self.make_class()
+
+    def __repr__(self):
+        return f"<StructLayout {self.name} {self.fields}>"
+
+    def make_class(self):
+        """スロットを持つインスタンスのクラス（__init__ はフィールドを順に代入するだけのものを生成する）"""
+        params = "".join(f", {slot}" for slot in self.slots)
+        body = "".join(f"    self.{slot} = {slot}\n" for slot in self.slots) or "    pass\n"
+        namespace = {}
+        exec(f"def __init__(self{params}):\n{body}", namespace)
+        return type(self.name, (StructValue,), {
+            '__slots__': self.slots,
+            '__init__': namespace['__init__'],
+            'layout': self,
+        })
+
+    def getter(self, field):
+        """フィールドの値を取り出す関数（宣言にないフィールドならKeyError）"""
+        return self.field_getters[field]
+
+    def order(self, keys):
+        """インスタンス生成のフィールド名の並び keys を宣言の順にする番号の列
+
+        宣言と同じ並びなら True、フィールドの組が宣言と違えば False（レイアウトを使わない）。
+        """
+        order = self.orders.get(keys)
+        if order is None:
+            if len(keys) != len(self.fields) or set(keys) != set(self.fields):
+                order = False
+            elif keys == self.fields:
+                order = True
+            else:
+                position = {key: i for i, key in enumerate(keys)}
+                order = tuple(position[field] for field in self.fields)
+            self.orders[keys] = order
+        return order
+
+    def new(self, keys, values):
+        """フィールド名の並び keys の値 values からインスタンスを作る（宣言と組が違えばNone）"""
+        order = self.order(keys)
+        if order is True:
+            return self.instance_class(*values)
+        if order is False:
+            return None
+        return self.instance_class(*[values[i] for i in order])
+
+
+def declaration_layout(node):
+    """構造体の宣言のノードならレイアウトを、そうでなければNoneを返す"""
+    node_type = node[0]
+    if node_type in ('struct', 'pub_struct') and isinstance(node[2], list):
+        return StructLayout(node[1], [field for field, _ in node[2]])
+    if node_type in ('tuple_struct', 'pub_tuple_struct'):
+        return StructLayout(node[1], range(len(node[2])), tuple_struct=True)
+    return None
+
+
+def field_value(value, field):
+    """構造体の値のフィールド（レイアウトのあるものは番号で、従来の形は辞書で引く）"""
+    if isinstance(value, StructValue):
+        return value.layout.field_getters[field](value)
+    if isinstance(value, tuple) and len(value) == 2 and isinstance(value[1], dict):
+        return value[1][field]
+    raise TypeError(f"フィールド '{field}' を持たない値です: {value!r}")
+
+
+class FieldSite:
+    """命令列の中のフィールドの参照1か所（最後に見たインスタンスのクラスと、そのフィールドの取り出し関数）
+
+    VMは type(値) is site.cls なら site.getter(値) で読み、違えば load() でキャッシュを更新する。
+    """
+    __slots__ = ('field', 'cls', 'getter')
+
+    def __init__(self, field):
+        self.field = field
+        self.cls = None
+        self.getter = None
+
+    def __repr__(self):
+        return repr(self.field)
+
+    def load(self, value):
+        if isinstance(value, StructValue):
+            getter = value.layout.getter(self.field)
+            self.cls = type(value)
+            self.getter = getter
+            return getter(value)
+        return field_value(value, self.field)
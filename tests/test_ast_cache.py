@@ -0,0 +1,95 @@
+# ast_cache.ASTCache と main.parse_rust_code のキャッシュのテスト
+import os
+import shutil
+
+import pytest
+
+import ast_cache
+import parser as rust_parser
+from ast_cache import ASTCache, GRAMMAR_FILES
+from main import parse_rust_code
+
+SOURCE = "fn f(x) { x * 2 }\nfn g(x) { x + 1 }\n"
+MALFORMED = "fn f(x) { x * }\nfn g(x) { x + 1 }\n"
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ASTCache(str(tmp_path / "ast"))
+
+
+@pytest.fixture
+def grammar_dir(tmp_path, monkeypatch):
+    """文法ファイルの複製を置いたディレクトリを ast_cache の場所に見せかける"""
+    base_dir = tmp_path / "grammar"
+    base_dir.mkdir()
+    repo_dir = os.path.dirname(os.path.abspath(ast_cache.__file__))
+    for name in GRAMMAR_FILES:
+        shutil.copy(os.path.join(repo_dir, name), base_dir / name)
+    monkeypatch.setattr(ast_cache, "__file__", str(base_dir / "ast_cache.py"))
+    monkeypatch.setattr(ast_cache, "_grammar_digest", None)
+    return base_dir
+
+
+def test_marshal_round_trip(cache, tmp_path):
+    ast = [('function', 'f', ['x', ('y', 'i32')], None, [('let', 'z', ('number', 1.5)), None]),
+           ('call', 'f', [-3, "文字列", True, (1, (2, [3]))])]
+    cache.put(SOURCE, ast)
+    # 別のインスタンス（次の実行）から読んでも同じ値になる
+    assert ASTCache(str(tmp_path / "ast")).get(SOURCE) == ast
+    assert cache.get(SOURCE + " ") is None
+
+
+def test_parse_uses_cache(cache, monkeypatch):
+    ast = parse_rust_code(SOURCE, cache)
+    assert cache.misses == 1 and len(cache.entries()) == 1
+
+    def fail(*args, **kwargs):
+        raise AssertionError("キャッシュにあるソースをパースし直した")
+
+    monkeypatch.setattr(rust_parser.parser, "parse", fail)
+    assert parse_rust_code(SOURCE, cache) == ast
+    assert cache.hits == 1
+
+
+def test_parse_with_syntax_error_is_not_cached(cache, capsys):
+    ast = parse_rust_code(MALFORMED, cache)
+    assert "Syntax error" in capsys.readouterr().out
+    assert ast is not None  # エラー回復した不完全なASTはそのまま返す
+    assert cache.entries() == []
+    # 次の実行でもパースし直して構文エラーを報告する
+    parse_rust_code(MALFORMED, cache)
+    assert "Syntax error" in capsys.readouterr().out
+    assert cache.hits == 0 and cache.entries() == []
+
+
+def test_grammar_change_invalidates_entries(cache, grammar_dir):
+    cache.put(SOURCE, [('number', 1)])
+    assert cache.get(SOURCE) == [('number', 1)]
+    for name in GRAMMAR_FILES:
+        key = cache.key(SOURCE)
+        with open(grammar_dir / name, 'a') as f:
+            f.write("\n# changed\n")
+        ast_cache._grammar_digest = None
+        assert cache.key(SOURCE) != key
+        assert cache.get(SOURCE) is None
+
+
+def test_lru_eviction(tmp_path):
+    sources = [f"fn f{i}(x) {{ x }}\n" for i in range(4)]
+    ast = [('number', 0)] * 50
+    cache = ASTCache(str(tmp_path / "ast"))
+    cache.put(sources[0], ast)
+    entry_size = cache.entries()[0][1]
+    cache.max_bytes = entry_size * 3
+    for source in sources[1:3]:
+        cache.put(source, ast)
+    for i, source in enumerate(sources[:3]):
+        os.utime(cache.path(cache.key(source)), (100 + i, 100 + i))
+    # 最も古いエントリを参照すると、次に古いものが先に追い出される
+    assert cache.get(sources[0]) == ast
+    cache.put(sources[3], ast)
+    assert cache.get(sources[1]) is None
+    for source in (sources[0], sources[2], sources[3]):
+        assert cache.get(source) == ast
+    assert sum(size for _, size, _ in cache.entries()) <= cache.max_bytes
@@ -0,0 +1,124 @@
+# ノードクラスのAST（astnodes.to_nodes）がタプル形式と同じ評価結果と出力になること
+import contextlib
+import io
+import re
+
+import pytest
+
+from astnodes import Node, Other, count_nodes, to_nodes, to_tuples
+from simulator import RustSimulator
+from vm import RustVM
+
+N = lambda value: ('number', value)
+I = lambda name: ('identifier', name)
+B = lambda left, operator, right: ('binary_op', left, operator, right)
+CALL = lambda name, *args: ('call', name, list(args))
+METHOD = lambda receiver, name, *args: ('method_chain_with_params', receiver, name, list(args))
+
+PROGRAMS = {
+    'basic': [('let', 'a', B(N(2), '*', N(3))),
+              ('function', 'f', ['x'], None,
+               [('let', 't', B(I('x'), '+', N(1))),
+                ('if', I('x'), [('return', B(I('t'), '*', N(2)))], [('return', N(0))])]),
+              ('let', 'b', CALL('f', I('a'))),
+              ('for', 'i', ('range', N(0), N(3)), [('let', 'a', B(I('a'), '+', I('i')))]),
+              ('loop', [('let', 'a', B(I('a'), '-', N(1))), ('if', B(I('a'), '-', N(5)), [N(0)], [('break',)])]),
+              ('let', 'm', ('match', I('a'), [(5, N(50)), ('_', N(0))])),
+              ('let', 's', ('struct', 'P', {'x': N(1), 'y': I('b')})),
+              ('let', 'y', ('field_access', I('s'), 'y')),
+              ('let', 'c', ('cast', N(300), 'u8')),
+              ('let', 'r', ('result', 'Ok', I('y'))),
+              ('let', 'moved', ('move', 'c')),
+              B(I('m'), '+', I('y'))],
+    'vec': [('let', 'v', ('vec', 'i32', [N(1), N(2), N(3)])),
+            METHOD(I('v'), 'push', N(4)),
+            ('let', 'n', ('method_chain', I('v'), 'len')),
+            ('let', 'w', ('vec_repeat', 'i32', N(7), N(3))),
+            ('let', 'x', ('index', I('v'), N(2))),
+            ('let', 'sl', ('index', I('v'), ('range', N(1), N(3)))),
+            B(I('x'), '+', ('index', I('w'), N(0)))],
+    'closure': [('let', 'k', N(3)),
+                ('function', 'scaled', ['n'], None,
+                 [('let', 'f', ('closure', ['x'], B(I('x'), '*', I('n')))),
+                  ('return', ('method_chain', METHOD(('method_chain', ('range', N(0), N(4)), 'iter'), 'map', I('f')), 'sum'))]),
+                ('let', 'a', CALL('scaled', N(2))),
+                ('let', 'b', CALL('scaled', I('k'))),
+                ('let', 'g', ('closure', ['x'], [('let', 'y', B(I('x'), '+', I('k'))), I('y')])),
+                ('let', 'c', CALL('g', N(1))),
+                B(B(I('a'), '+', I('b')), '+', I('c'))],
+    'match_guard': [('function', 'classify', ['x'], None,
+                     [('return', ('match_guard', I('x'),
+                                  [('_', B(I('x'), '-', N(1)), [('let', 'r', B(I('x'), '*', N(10))), I('r')]),
+                                   ('_', N(1), N(-1))]))]),
+                    ('let', 'a', CALL('classify', N(1))),
+                    ('let', 'b', CALL('classify', N(4))),
+                    ('let', 'single', ('match_guard', N(7), ('_', N(1), N(70)))),
+                    B(I('a'), '+', I('b'))],
+    'async': [('async_function', 'work', ['x'], None, [('sleep', N(0)), ('return', B(I('x'), '*', N(2)))]),
+              ('let', 'a', ('await', CALL('work', N(3)))),
+              ('let', 'b', ('await', ('async', [('let', 'z', N(4)), ('await', CALL('work', I('z')))]))),
+              B(I('a'), '+', I('b'))],
+}
+
+
+def run(engine, ast):
+    """(出力, 最後の値または例外)"""
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        try:
+            result = repr(engine().eval_ast(ast))
+        except Exception as error:
+            result = f"{type(error).__name__}: {error}"
+    return re.sub(r' at 0x[0-9a-f]+', '', out.getvalue()), result
+
+
+def others(ast):
+    """Other になったノードの種類"""
+    found = set()
+    pending = [ast]
+    while pending:
+        node = pending.pop()
+        if type(node) is Other:
+            found.add(node.tag)
+        if isinstance(node, Node):
+            pending.extend(getattr(node, name) for name in node.fields)
+        elif isinstance(node, (list, tuple)):
+            pending.extend(node)
+        elif isinstance(node, dict):
+            pending.extend(node.values())
+    return found
+
+
+@pytest.mark.parametrize("name", sorted(PROGRAMS))
+def test_round_trip(name):
+    ast = PROGRAMS[name]
+    nodes = to_nodes(ast)
+    assert to_tuples(nodes) == ast
+    assert count_nodes(nodes) == count_nodes(ast)
+    # 'join' / 'spawn' / 'sleep' は非同期ランタイムがタプル形式で評価するので Other のまま
+    assert others(nodes) <= {'join', 'spawn', 'sleep'}
+
+
+@pytest.mark.parametrize("engine", [RustSimulator, RustVM])
+@pytest.mark.parametrize("name", sorted(PROGRAMS))
+def test_nodes_match_tuples(engine, name):
+    expected = run(engine, PROGRAMS[name])
+    assert "Error" not in expected[1]
+    assert run(engine, to_nodes(PROGRAMS[name])) == expected
+
+
+def test_expected_values():
+    assert run(RustSimulator, PROGRAMS['match_guard'])[1] == repr(-1 + 40)
+    assert run(RustSimulator, PROGRAMS['closure'])[1] == repr(12 + 18 + 4)
+    assert run(RustSimulator, PROGRAMS['async'])[1] == repr(6 + 8)
+
+
+def test_unknown_nodes_become_other():
+    node = to_nodes(('function_call', 'f', [1]))
+    assert type(node) is Other and node.to_tuple() == ('function_call', 'f', [1])
+    assert type(to_nodes(('let', 'x'))) is Other  # 要素数が違う
+
+
+def test_nodes_have_no_position():
+    for node in (to_nodes(('let', 'x', N(1))), to_nodes(('closure', ['x'], I('x'))), to_nodes(('await', I('f')))):
+        assert not hasattr(node, 'lineno')
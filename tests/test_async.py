@@ -0,0 +1,99 @@
+# async ブロックと async fn の future は .await / join / spawn されるまで実行されず、join の中は並行に進むこと
+# 順序は sleep(0) での切り替えだけで決まるので、実行時間には依存しない
+import contextlib
+import io
+import re
+
+import pytest
+
+from simulator import RustSimulator
+from vm import RustVM
+
+N = lambda value: ('number', value)
+I = lambda name: ('identifier', name)
+B = lambda left, operator, right: ('binary_op', left, operator, right)
+CALL = lambda name, *args: ('call', name, list(args))
+
+# step(n): 開始と再開を let で表示し、n * 10 を返す（間の sleep(0) で他のタスクに切り替わる）
+STEP = ('async_function', 'step', ['n'], None,
+        [('let', 'start', I('n')),
+         ('sleep', N(0)),
+         ('let', 'resume', I('n')),
+         ('return', B(I('n'), '*', N(10)))])
+
+
+def run(engine, ast):
+    """(表示した変数の (名前, 値) の並び, 最後の値または例外)"""
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        try:
+            result = engine().eval_ast(ast)
+        except Exception as error:
+            result = f"{type(error).__name__}: {error}"
+    return re.findall(r"Variable '(\w+)' = (.*)", out.getvalue()), result
+
+
+@pytest.mark.parametrize("engine", [RustSimulator, RustVM])
+def test_futures_are_lazy(engine):
+    ast = [STEP,
+           ('let', 'a', CALL('step', N(1))),
+           ('let', 'b', ('async', [('let', 'inner', N(2)), N(2)])),
+           ('let', 'marker', N(0))]
+    printed, result = run(engine, ast)
+    assert [name for name, value in printed] == ['a', 'b', 'marker']  # future を作っただけで実行していない
+    assert printed[0][1] == '<future step>' and printed[1][1] == '<future async block>'
+
+
+@pytest.mark.parametrize("engine", [RustSimulator, RustVM])
+def test_join_runs_futures_concurrently(engine):
+    ast = [STEP,
+           ('let', 'a', CALL('step', N(1))),
+           ('let', 'b', CALL('step', N(2))),
+           ('let', 'marker', N(0)),
+           ('join', [I('a'), I('b')])]
+    printed, result = run(engine, ast)
+    # 先に作った future から順に始まり、sleep の間にもう一方が進む
+    assert printed[3:] == [('start', '1'), ('start', '2'), ('resume', '1'), ('resume', '2')]
+    assert result == [10, 20]
+
+
+@pytest.mark.parametrize("engine", [RustSimulator, RustVM])
+def test_await_runs_one_future(engine):
+    ast = [STEP,
+           ('let', 'a', CALL('step', N(1))),
+           ('let', 'b', CALL('step', N(2))),
+           ('let', 'x', ('await', I('b'))),
+           ('let', 'y', ('await', I('a'))),
+           B(I('x'), '+', I('y'))]
+    printed, result = run(engine, ast)
+    assert printed[2:] == [('start', '2'), ('resume', '2'), ('x', '20'),
+                           ('start', '1'), ('resume', '1'), ('y', '10')]
+    assert result == 30
+
+
+@pytest.mark.parametrize("engine", [RustSimulator, RustVM])
+def test_spawn_starts_when_the_loop_runs(engine):
+    ast = [STEP,
+           ('let', 'h', ('spawn', CALL('step', N(1)))),
+           ('let', 'marker', N(0)),
+           ('let', 'x', ('await', CALL('step', N(2)))),
+           ('let', 'y', ('await', I('h'))),
+           ('let', 'again', ('await', I('h'))),  # 完了したタスクは何度でも値を返す
+           ('join', [('spawn', CALL('step', N(3))), CALL('step', N(4))])]
+    printed, result = run(engine, ast)
+    names = [name for name, value in printed]
+    assert names[:2] == ['h', 'marker']
+    assert printed[2:6] == [('start', '1'), ('start', '2'), ('resume', '1'), ('resume', '2')]
+    assert ('x', '20') in printed and ('y', '10') in printed and ('again', '10') in printed
+    assert printed[0][1].startswith('<JoinHandle step')
+    assert result == [30, 40]
+
+
+@pytest.mark.parametrize("engine", [RustSimulator, RustVM])
+def test_future_runs_only_once(engine):
+    ast = [STEP,
+           ('let', 'a', CALL('step', N(1))),
+           ('let', 'x', ('await', I('a'))),
+           ('await', I('a'))]
+    printed, result = run(engine, ast)
+    assert result == "RuntimeError: future 'step' はすでに実行されています（所有権が移動済み）"
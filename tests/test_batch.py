@@ -0,0 +1,60 @@
+# batch.py で複数のファイルを実行したときのファイルごとのレポートと終了コード
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+BATCH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "batch.py")
+
+VALID = "fn f(x) { x * 2 }\nfn main() { f(3) }\n"
+OTHER = "fn g(y) { y + 1 }\n"
+MALFORMED = "fn f(x) { x * }\n"
+
+
+def run_batch(tmp_path, *args):
+    """batch.py を実行して (終了コード, レポート) を返す"""
+    report = tmp_path / "report.json"
+    process = subprocess.run(
+        [sys.executable, BATCH, "--no-download", "--no-cache", "--jobs", "2", "--report", str(report), *args],
+        cwd=tmp_path, capture_output=True, text=True, timeout=120)
+    assert "件成功" in process.stderr
+    return process.returncode, json.loads(report.read_text(encoding="utf-8"))
+
+
+@pytest.mark.parametrize("engine", ["tree", "vm"])
+def test_all_files_pass(tmp_path, engine):
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "b.rs").write_text(OTHER)
+    (tmp_path / "src" / "notes.txt").write_text("not rust")
+    (tmp_path / "a.rs").write_text(VALID)
+    status, report = run_batch(tmp_path, "--engine", engine, "a.rs", "src", "a.rs")
+    assert status == 0
+    # 入力の順に並び、重複したファイルは1回だけ実行する
+    assert [result["file"] for result in report["files"]] == ["a.rs", os.path.join("src", "b.rs")]
+    assert report["summary"]["files"] == 2 and report["summary"]["passed"] == 2
+    assert report["summary"]["engine"] == engine and report["summary"]["jobs"] == 2
+    first, second = report["files"]
+    assert first["stdout"] == "Function 'f' defined.\nFunction 'main' defined.\n"
+    assert second["stdout"] == "Function 'g' defined.\n"
+    assert all(result["ok"] and result["error"] is None for result in report["files"])
+
+
+def test_failed_file_sets_exit_status(tmp_path):
+    (tmp_path / "good.rs").write_text(VALID)
+    (tmp_path / "bad.rs").write_text(MALFORMED)
+    status, report = run_batch(tmp_path, "good.rs", "bad.rs")
+    assert status == 1
+    assert report["summary"]["passed"] == 1 and report["summary"]["failed"] == 1
+    good, bad = report["files"]
+    assert good["ok"] and good["error"] is None and "Syntax error" not in good["stdout"]
+    assert not bad["ok"] and bad["error"].startswith("Traceback") and bad["run_ms"] == 0.0
+    assert "Syntax error at '}' (line 1)" in bad["stdout"]  # 出力はそのファイルの分だけ
+    assert all(result["total_ms"] >= result["parse_ms"] for result in report["files"])
+
+
+def test_no_files(tmp_path):
+    process = subprocess.run([sys.executable, BATCH, "--no-download", str(tmp_path)],
+                             cwd=tmp_path, capture_output=True, text=True, timeout=120)
+    assert process.returncode == 1 and ".rsファイルが見つかりません" in process.stderr
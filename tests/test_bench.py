@@ -0,0 +1,57 @@
+# bench.py がすべての段階を1回ずつ計測でき、結果のJSONとベースラインとの比較を出力すること
+import json
+import sys
+
+import pytest
+
+import bench
+
+
+@pytest.fixture
+def small_corpus(monkeypatch):
+    """計測の大きさを小さくして、テストの時間を短くする"""
+    monkeypatch.setattr(bench, "STRUCT_INSTANCES", 100)
+    monkeypatch.setattr(bench, "VEC_REPEAT_ELEMENTS", 1000)
+    monkeypatch.setattr(bench, "VEC_ELEMENTS", 100)
+    monkeypatch.setattr(bench, "ITER_ELEMENTS", 100)
+    monkeypatch.setattr(bench, "STUB_CRATES", 2)
+    monkeypatch.setattr(bench, "STUB_FILES", 2)
+    monkeypatch.setattr(bench, "CORPUS", {name: bench.CORPUS[name] for name in ("arith", "match", "struct")})
+
+
+def run_main(monkeypatch, *args):
+    monkeypatch.setattr(sys, "argv", ["bench.py", "--runs", "1", *args])
+    bench.main()
+
+
+def test_one_iteration_of_every_phase(tmp_path, monkeypatch, capsys, small_corpus):
+    output = tmp_path / "results.json"
+    run_main(monkeypatch, "--output", str(output))
+    report = json.loads(output.read_text(encoding="utf-8"))
+    assert report["runs"] == 1
+    results = report["results"]
+    prefixes = {name.split("/")[0] for name in results}
+    assert prefixes == set(bench.PHASES)
+    assert {"eval/tree/arith", "eval/vm/arith", "eval/jit/arith", "deps/download"} <= set(results)
+    assert all(result["median_ms"] >= 0 and result["min_ms"] <= result["median_ms"] for result in results.values())
+    assert "結果を" in capsys.readouterr().out
+
+    # 同じ結果をベースラインにすれば回帰はない（しきい値を大きくして計測のぶれを無視する）
+    run_main(monkeypatch, "--phases", "lex,structs", "--output", "-", "--baseline", str(output), "--threshold", "100")
+    assert "回帰はありません" in capsys.readouterr().out
+
+
+def test_unknown_phase(monkeypatch):
+    with pytest.raises(SystemExit):
+        run_main(monkeypatch, "--phases", "lex,nope", "--output", "-")
+
+
+def test_regression_exit_status(tmp_path, monkeypatch):
+    baseline = {"results": {"lex/fast/arith": {"median_ms": 0.0001, "min_ms": 0.0001}}}
+    path = tmp_path / "baseline.json"
+    path.write_text(json.dumps(baseline), encoding="utf-8")
+    monkeypatch.setattr(bench, "MIN_DELTA_MS", 0.0)
+    monkeypatch.setattr(bench, "CORPUS", {"arith": bench.CORPUS["arith"]})
+    with pytest.raises(SystemExit) as exit_info:
+        run_main(monkeypatch, "--phases", "lex", "--output", "-", "--baseline", str(path))
+    assert exit_info.value.code == 1
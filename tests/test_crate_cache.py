@@ -0,0 +1,124 @@
+# crate_cache.CrateCache の参照と検証のテスト
+import json
+import os
+
+import pytest
+
+from crate_cache import META_FILE, CrateCache
+
+CHECKSUM = "ab" * 32
+
+
+def stage(cache, name, version, files):
+    staging = cache.staging_path(name, version)
+    for rel, data in files.items():
+        path = os.path.join(staging, rel)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+    return staging
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return CrateCache(str(tmp_path / "cache"), max_bytes=10 ** 6)
+
+
+def test_lookup_reuses_intact_entry(cache):
+    path = cache.insert("foo", "1.0.0", CHECKSUM, stage(cache, "foo", "1.0.0", {"src/lib.rs": b"fn f() {}"}))
+    assert cache.lookup("foo", "1.0.0") == path
+    assert cache.lookup("foo", "1.0.0", CHECKSUM) == path
+    assert cache.lookup("foo", "1.0.1") is None
+
+
+def test_lookup_does_not_read_entry_contents(cache, monkeypatch):
+    # 中身は挿入時に検証済みなので、参照のたびにディレクトリをたどらない
+    path = cache.insert("foo", "1.0.0", CHECKSUM, stage(cache, "foo", "1.0.0", {"src/lib.rs": b"fn f() {}"}))
+
+    def fail(*args, **kwargs):
+        raise AssertionError("参照時にエントリの中身をたどった")
+
+    monkeypatch.setattr(os, "walk", fail)
+    assert cache.lookup("foo", "1.0.0") == path
+    assert cache.lookup("foo", "1.0.0", CHECKSUM) == path
+
+
+def test_lookup_without_checksum_rejects_entry_without_meta(cache):
+    # 名前だけ正しいディレクトリ（途中で壊れたエントリなど）は使わない
+    path = cache.entry_path("foo", "1.0.0", CHECKSUM)
+    os.makedirs(path)
+    with open(os.path.join(path, "lib.rs"), 'wb') as f:
+        f.write(b"fn f() {}")
+    assert cache.lookup("foo", "1.0.0") is None
+    assert cache.lookup("foo", "1.0.0", CHECKSUM) is None
+
+
+def test_lookup_rejects_meta_that_disagrees_with_directory_name(cache):
+    path = cache.insert("foo", "1.0.0", CHECKSUM, stage(cache, "foo", "1.0.0", {"lib.rs": b"fn f() {}"}))
+    meta_path = os.path.join(path, META_FILE)
+    with open(meta_path) as f:
+        meta = json.load(f)
+    meta["checksum"] = "cd" * 32
+    with open(meta_path, 'w') as f:
+        json.dump(meta, f)
+    assert cache.lookup("foo", "1.0.0", CHECKSUM) is None
+    assert cache.lookup("foo", "1.0.0") is None
+
+
+def break_meta(path, text):
+    with open(os.path.join(path, META_FILE), 'w') as f:
+        f.write(text)
+
+
+@pytest.mark.parametrize("meta", [None, "{", '{"name": "foo"}'])
+def test_lookup_with_checksum_removes_corrupt_entry(cache, meta):
+    path = cache.insert("foo", "1.0.0", CHECKSUM, stage(cache, "foo", "1.0.0", {"lib.rs": b"fn f() {}"}))
+    if meta is None:
+        os.remove(os.path.join(path, META_FILE))
+    else:
+        break_meta(path, meta)
+    assert cache.lookup("foo", "1.0.0", CHECKSUM) is None
+    assert not os.path.exists(path)
+    assert cache.insert("foo", "1.0.0", CHECKSUM, stage(cache, "foo", "1.0.0", {"lib.rs": b"fn g() {}"})) == path
+    assert cache.lookup("foo", "1.0.0", CHECKSUM) == path
+
+
+def test_insert_replaces_corrupt_entry(cache):
+    # 参照せずに挿入しても、壊れたエントリを残したままそのパスを返さない
+    path = cache.insert("foo", "1.0.0", CHECKSUM, stage(cache, "foo", "1.0.0", {"lib.rs": b"old"}))
+    break_meta(path, "{")
+    staging = stage(cache, "foo", "1.0.0", {"lib.rs": b"new"})
+    assert cache.insert("foo", "1.0.0", CHECKSUM, staging) == path
+    assert not os.path.exists(staging)
+    with open(os.path.join(path, "lib.rs"), 'rb') as f:
+        assert f.read() == b"new"
+    assert cache.lookup("foo", "1.0.0", CHECKSUM) == path
+
+
+def test_insert_keeps_entry_registered_first(cache):
+    # 他のプロセスが先に登録した検証済みのエントリはそのまま使い、自分の展開結果は捨てる
+    path = cache.insert("foo", "1.0.0", CHECKSUM, stage(cache, "foo", "1.0.0", {"lib.rs": b"first"}))
+    staging = stage(cache, "foo", "1.0.0", {"lib.rs": b"second"})
+    assert cache.insert("foo", "1.0.0", CHECKSUM, staging) == path
+    assert not os.path.exists(staging)
+    with open(os.path.join(path, "lib.rs"), 'rb') as f:
+        assert f.read() == b"first"
+
+
+def test_insert_creates_missing_cache_dir(tmp_path):
+    cache = CrateCache(str(tmp_path / "missing" / "cache"))
+    staging = tmp_path / "staging"
+    staging.mkdir()
+    (staging / "lib.rs").write_bytes(b"fn f() {}")
+    path = cache.insert("foo", "1.0.0", CHECKSUM, str(staging))
+    assert os.path.isdir(path)
+    assert cache.lookup("foo", "1.0.0") == path
+
+
+def test_evict_removes_least_recently_used(tmp_path):
+    cache = CrateCache(str(tmp_path / "cache"), max_bytes=150)
+    first = cache.insert("a", "1.0.0", CHECKSUM, stage(cache, "a", "1.0.0", {"lib.rs": b"x" * 100}))
+    os.utime(first, (1, 1))
+    second = cache.insert("b", "1.0.0", CHECKSUM, stage(cache, "b", "1.0.0", {"lib.rs": b"y" * 100}))
+    assert not os.path.exists(first)
+    assert cache.lookup("b", "1.0.0") == second
@@ -0,0 +1,105 @@
+# daemon.py のサーバーとクライアントの往復のテスト
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import threading
+
+import pytest
+
+import daemon
+import main
+
+SOURCE = "fn f(x) { x * 2 }\nfn g(x) { x + 1 }\n"
+MALFORMED = "fn f(x) { x * }\nfn g(x) { x + 1 }\n"
+
+
+@contextlib.contextmanager
+def thread_local_stdout():
+    """serve() と同じく、リクエストを処理するスレッドの出力を切り替えられる sys.stdout にする
+
+    pytest は各テストの実行の前に sys.stdout を差し替えるので、フィクスチャではなくテストの中で使う。
+    """
+    stdout = sys.stdout
+    sys.stdout = daemon.ThreadLocalStdout(stdout)
+    try:
+        yield
+    finally:
+        sys.stdout = stdout
+
+
+@pytest.fixture
+def server():
+    # ソケットのパスの長さには上限があるので、短い一時ディレクトリに作る
+    socket_dir = tempfile.mkdtemp(prefix="rr-", dir="/tmp")
+    server = daemon.SimulationServer(os.path.join(socket_dir, "s.sock"))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join()
+    shutil.rmtree(socket_dir, ignore_errors=True)
+
+
+@pytest.fixture
+def parse_calls(monkeypatch):
+    calls = []
+    parse_rust_code = main.parse_rust_code
+
+    def counting(source, *args, **kwargs):
+        calls.append(source)
+        return parse_rust_code(source, *args, **kwargs)
+
+    monkeypatch.setattr(main, "parse_rust_code", counting)
+    return calls
+
+
+def send(server, message):
+    output = io.StringIO()
+    result = daemon.request(message, server.socket_path, output)
+    return result, output.getvalue()
+
+
+def test_round_trip_and_cache_hit(server, parse_calls):
+    with thread_local_stdout():
+        for engine in ("tree", "vm", "tree"):
+            result, output = send(server, {"source": SOURCE, "engine": engine})
+            assert result["ok"] and result["error"] is None
+            assert output == "Function 'f' defined.\nFunction 'g' defined.\n"
+        # 2回目以降はサーバーが保持しているASTを使う
+        assert parse_calls == [SOURCE]
+        assert len(server.asts) == 1
+        assert send(server, {"op": "ping"})[0]["requests"] == 3
+
+
+def test_path_request(server, tmp_path):
+    with thread_local_stdout():
+        path = tmp_path / "a.rs"
+        path.write_text(SOURCE)
+        result, output = send(server, {"path": str(path)})
+        assert result["ok"] and "Function 'g' defined." in output
+        result, _ = send(server, {"path": str(tmp_path / "missing.rs")})
+        assert not result["ok"] and "FileNotFoundError" in result["error"]
+
+
+def test_syntax_error_is_reported_on_every_request(server, parse_calls):
+    with thread_local_stdout():
+        for _ in range(2):
+            result, output = send(server, {"source": MALFORMED})
+            assert "Syntax error" in output
+        # エラー回復した不完全なASTは保持しないので、毎回パースし直す
+        assert parse_calls == [MALFORMED, MALFORMED]
+        assert server.asts == {}
+
+
+def test_concurrent_requests_are_counted(server):
+    with thread_local_stdout():
+        threads = [threading.Thread(target=send, args=(server, {"source": SOURCE})) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert send(server, {"op": "ping"})[0]["requests"] == 8
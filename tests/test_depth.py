@@ -0,0 +1,71 @@
+# 深い再帰と呼び出しの深さの上限（StackOverflowError）のテスト
+import contextlib
+import io
+import sys
+
+import pytest
+
+from simulator import RustSimulator, StackOverflowError, run_with_deep_stack
+from vm import RustVM
+
+N = lambda value: ('number', value)
+I = lambda name: ('identifier', name)
+B = lambda left, operator, right: ('binary_op', left, operator, right)
+
+# down(n) は n 段の再帰で n を返す
+DOWN = [('function', 'down', ['n'], None,
+         [('if', I('n'), [('return', B(('call', 'down', [B(I('n'), '-', N(1))]), '+', N(1)))],
+           [('return', N(0))])])]
+
+
+def make(engine, max_depth=None):
+    simulator = engine()
+    if max_depth is not None:
+        simulator.max_depth = max_depth
+    with contextlib.redirect_stdout(io.StringIO()):
+        simulator.eval_ast(DOWN)
+    return simulator
+
+
+def test_vm_runs_deep_recursion_without_python_stack():
+    # VM は呼び出しごとにPythonのスタックを使わないので、Pythonの再帰の上限より深く呼び出せる
+    vm = make(RustVM)
+    assert vm.call_function('down', [100000]) == 100000
+    assert vm.frames == []
+
+
+@pytest.mark.parametrize("engine", [RustSimulator, RustVM])
+def test_max_depth_raises_and_unwinds_frames(engine):
+    simulator = make(engine, max_depth=50)
+    assert simulator.call_function('down', [49]) == 49
+    with pytest.raises(StackOverflowError) as info:
+        simulator.call_function('down', [1000])
+    assert info.value.depth == 50 and info.value.func_name == 'down'
+    assert "has overflowed its stack" in str(info.value)
+    # 呼び出し元のフレームに戻っていて、続けて実行できる
+    assert simulator.frames == [] and simulator.locals == []
+    assert simulator.call_function('down', [10]) == 10
+
+
+def test_tree_engine_reaches_depth_on_deep_stack():
+    simulator = make(RustSimulator)
+    assert run_with_deep_stack(simulator.call_function, 'down', [20000]) == 20000
+    assert simulator.frames == []
+
+
+def test_tree_engine_python_limit_is_a_stack_overflow():
+    # Pythonのスタックが max_depth より先に尽きても、RecursionError ではなく StackOverflowError にする
+    simulator = make(RustSimulator)
+    with pytest.raises(StackOverflowError) as info:
+        run_with_deep_stack(simulator.call_function, 'down', [10 ** 6])
+    assert 20000 < info.value.depth < simulator.max_depth
+    assert simulator.frames == []
+    assert simulator.call_function('down', [10]) == 10
+
+
+def test_run_with_deep_stack_restores_recursion_limit():
+    limit = sys.getrecursionlimit()
+    with pytest.raises(ValueError):
+        run_with_deep_stack(int, "x")
+    assert run_with_deep_stack(int, "7") == 7
+    assert sys.getrecursionlimit() == limit
@@ -0,0 +1,201 @@
+# クレートのダウンロード（main.download_crate）とストリームのままの展開（crates.extract_crate_stream）
+import hashlib
+import io
+import os
+import tarfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+requests = pytest.importorskip("requests")
+
+import main
+from crates import StreamReader, extract_crate_stream
+
+
+def make_crate(entries):
+    """[(名前, 内容のバイト列 または ('symlink', リンク先) / ('dir',))] から .crate（gzip+tar）のバイト列を作る"""
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w:gz') as tar:
+        for name, content in entries:
+            info = tarfile.TarInfo(name)
+            if isinstance(content, tuple) and content[0] == 'symlink':
+                info.type = tarfile.SYMTYPE
+                info.linkname = content[1]
+                tar.addfile(info)
+            elif isinstance(content, tuple) and content[0] == 'dir':
+                info.type = tarfile.DIRTYPE
+                info.mode = 0o755
+                tar.addfile(info)
+            else:
+                info.size = len(content)
+                info.mode = 0o644
+                tar.addfile(info, io.BytesIO(content))
+    return buffer.getvalue()
+
+
+GOOD_CRATE = make_crate([("demo-1.0.0/Cargo.toml", b'[package]\nname = "demo"\n'),
+                         ("demo-1.0.0/src/lib.rs", b"fn f() {}\n" * 2000)])
+
+
+class RegistryHandler(BaseHTTPRequestHandler):
+    """パスごとに用意した応答の列を、リクエストのたびに1つずつ返す（最後の応答は繰り返す）
+
+    応答は (ステータス, 本文, 送る本文の長さ)。送る長さが本文より短ければ、Content-Length は本文の長さのまま途中で切断する。
+    """
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        responses = self.server.responses.get(self.path)
+        self.server.requests.append(self.path)
+        if not responses:
+            status, body, sent = 404, b"", 0
+        else:
+            status, body, sent = responses.pop(0) if len(responses) > 1 else responses[0]
+        self.send_response(status)
+        self.send_header("Content-Type", "application/x-tar")
+        self.send_header("Content-Length", str(len(body)))
+        if sent < len(body):
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(body[:sent])
+        if sent < len(body):
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def registry():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RegistryHandler)
+    server.responses = {}
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(main, "DOWNLOAD_BACKOFF", 0)
+    os.makedirs(main.MODULES_DIR)
+    return tmp_path
+
+
+def crate_path(name, version):
+    return f"/api/v1/crates/{name}/{version}/download"
+
+
+def ok(body):
+    return (200, body, len(body))
+
+
+def download(registry, checksum=None):
+    with requests.Session() as session:
+        return main.download_crate(session, "demo", "1.0.0", registry_url=registry.url, checksum=checksum)
+
+
+def leftover_staging(project):
+    return [name for name in os.listdir(project / main.MODULES_DIR) if name.endswith(".partial")]
+
+
+def test_download_extracts_and_checks_checksum(registry, project):
+    registry.responses[crate_path("demo", "1.0.0")] = [ok(GOOD_CRATE)]
+    result = download(registry, checksum=hashlib.sha256(GOOD_CRATE).hexdigest())
+    assert result["ok"] and result["attempts"] == 1 and result["bytes"] == len(GOOD_CRATE)
+    lib = project / main.MODULES_DIR / "demo" / "demo-1.0.0" / "src" / "lib.rs"
+    assert lib.read_bytes() == b"fn f() {}\n" * 2000
+    assert leftover_staging(project) == []
+
+
+def test_truncated_body_is_retried(registry, project):
+    registry.responses[crate_path("demo", "1.0.0")] = [(200, GOOD_CRATE, len(GOOD_CRATE) // 2), ok(GOOD_CRATE)]
+    result = download(registry, checksum=hashlib.sha256(GOOD_CRATE).hexdigest())
+    assert result["ok"] and result["attempts"] == 2
+    assert (project / main.MODULES_DIR / "demo" / "demo-1.0.0" / "Cargo.toml").exists()
+    assert leftover_staging(project) == []
+
+
+def test_truncated_body_on_every_attempt_fails_without_partial_output(registry, project):
+    registry.responses[crate_path("demo", "1.0.0")] = [(200, GOOD_CRATE, len(GOOD_CRATE) // 2)]
+    result = download(registry)
+    assert not result["ok"]
+    assert result["attempts"] == main.DOWNLOAD_RETRIES + 1
+    assert not (project / main.MODULES_DIR / "demo").exists()
+    assert leftover_staging(project) == []
+
+
+def test_checksum_mismatch_is_retried_then_rejected(registry, project):
+    registry.responses[crate_path("demo", "1.0.0")] = [ok(GOOD_CRATE)]
+    result = download(registry, checksum="0" * 64)
+    assert not result["ok"]
+    assert "チェックサム" in result["error"]
+    assert result["attempts"] == main.DOWNLOAD_RETRIES + 1
+    assert len(registry.requests) == main.DOWNLOAD_RETRIES + 1
+    assert not (project / main.MODULES_DIR / "demo").exists()
+    assert leftover_staging(project) == []
+
+
+def test_retry_status_and_not_found(registry, project):
+    registry.responses[crate_path("demo", "1.0.0")] = [(503, b"", 0), ok(GOOD_CRATE)]
+    assert download(registry)["attempts"] == 2
+    with requests.Session() as session:
+        result = main.download_crate(session, "missing", "1.0.0", registry_url=registry.url)
+    assert not result["ok"] and result["error"] == "HTTP 404" and result["attempts"] == 1
+
+
+def test_existing_install_is_replaced_from_staging(registry, project):
+    old = project / main.MODULES_DIR / "demo"
+    old.mkdir()
+    (old / "stale.rs").write_text("old")
+    registry.responses[crate_path("demo", "1.0.0")] = [ok(GOOD_CRATE)]
+    assert download(registry)["ok"]
+    assert not (old / "stale.rs").exists()
+    assert (old / "demo-1.0.0" / "Cargo.toml").exists()
+
+
+def extract(tmp_path, entries):
+    dest = tmp_path / "dest"
+    data = make_crate(entries)
+    count = extract_crate_stream(StreamReader([data[i:i + 100] for i in range(0, len(data), 100)]), str(dest))
+    return dest, count
+
+
+def test_extract_skips_parent_directory_entries(tmp_path, capsys):
+    dest, count = extract(tmp_path, [("demo/ok.rs", b"ok"), ("../evil.rs", b"evil"),
+                                     ("demo/../../evil2.rs", b"evil"), ("/abs.rs", b"evil")])
+    assert count == 1
+    assert (dest / "demo" / "ok.rs").read_bytes() == b"ok"
+    assert not (tmp_path / "evil.rs").exists() and not (tmp_path / "evil2.rs").exists()
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["dest"]
+    out = capsys.readouterr().out
+    assert "../evil.rs" in out and "demo/../../evil2.rs" in out
+
+
+def test_extract_skips_symlinks(tmp_path):
+    outside = tmp_path / "outside.txt"
+    outside.write_text("secret")
+    dest, count = extract(tmp_path, [("demo", ('dir',)),
+                                     ("demo/link", ('symlink', str(outside))),
+                                     ("demo/rel", ('symlink', "../../outside.txt")),
+                                     ("demo/link", b"written through the link?")])
+    # リンクは作らないので、同じ名前の通常のファイルは展開先の中に書かれる
+    assert count == 1
+    assert not os.path.islink(dest / "demo" / "link")
+    assert not os.path.lexists(dest / "demo" / "rel")
+    assert (dest / "demo" / "link").read_bytes() == b"written through the link?"
+    assert outside.read_text() == "secret"
+
+
+def test_stream_reader_digest_covers_trailer(tmp_path):
+    reader = StreamReader([GOOD_CRATE[i:i + 7] for i in range(0, len(GOOD_CRATE), 7)])
+    assert extract_crate_stream(reader, str(tmp_path)) == 2
+    reader.drain()
+    assert reader.hexdigest() == hashlib.sha256(GOOD_CRATE).hexdigest()
+    assert reader.bytes_read == len(GOOD_CRATE)
@@ -0,0 +1,69 @@
+# FastLexer と PLY の字句解析器が同じトークン列を返すこと（FastLexer は既定の字句解析器）
+import contextlib
+import io
+import random
+
+import pytest
+
+from fastlex import FastLexer, token_stream
+from lex import lexer as ply_lexer
+
+CORPUS = {
+    'empty': "",
+    'whitespace': " \t \n\n\t ",
+    'function': "fn main() {\n    let x = 5;\n    println!(\"x = {}\", x);\n}\n",
+    'keywords': "extern crate fn let mut if else while for in match struct enum impl use mod return async await "
+                "dyn Box Rc as unsafe const type where move pub super self loop break continue trait true false",
+    'names': "_ _a a_1 fn_ letx Box2 rc RC selfish",
+    'punctuation': "|| && -> => :: + * ( ) { } [ ] , . # ? | \\ - / % = < > & ! : ; ||| &&& ->> ==> :::",
+    'numbers': "0 007 123456789012345678901234567890 1.5 3u8 1_000",
+    'strings': 'let s = "hello"; let t = ""; "a" "b" "\\n" "multi\nline"',
+    'unterminated_string': 'let s = "never closed;\nlet t = 1;',
+    'lifetimes': "fn f<'a>(x: &'a str) -> &'static str { x } 'x' '",
+    'line_comment': "let a = 1; // comment with \"quote\" and /* block\nlet b = 2;",
+    'block_comment': "a /* one\ntwo\nthree */ b /**/ c /* unterminated\nd",
+    'division_vs_comment': "a / b // c\n/ d",
+    'illegal': "let x = 1 @ 2 $ 3;\n` ~ ^ é\n日本語",
+    'illegal_at_end': "x @",
+    'crlf': "fn main() {\r\n    let x = 1;\r\n}\r\n",
+    'newlines': "\n\n\na\n\nb\n",
+}
+
+
+def lex_with(make_lexer, data):
+    """(トークン列, 不正な文字の表示)"""
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        tokens = token_stream(make_lexer(), data)
+    return tokens, out.getvalue()
+
+
+def ply():
+    lexer = ply_lexer.clone()
+    lexer.lineno = 1
+    return lexer
+
+
+def assert_same_tokens(data):
+    assert lex_with(FastLexer, data) == lex_with(ply, data)
+
+
+@pytest.mark.parametrize('name', list(CORPUS))
+def test_corpus_matches_ply(name):
+    assert_same_tokens(CORPUS[name])
+
+
+def test_random_inputs_match_ply():
+    # 規則の境界になりやすい文字を混ぜた入力（乱数の種を固定して毎回同じ入力にする）
+    alphabet = list("ab_Z09 \t\n\"'/*|&-=>:<+.!#?\\%;,(){}[]@$~é") + ["fn", "let", "//", "/*", "*/", "'a"]
+    rng = random.Random(1234)
+    for _ in range(500):
+        data = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 60)))
+        assert_same_tokens(data)
+
+
+def test_lineno_continues_across_inputs_like_ply():
+    # PLY と同じく、同じインスタンスの input() では行番号をリセットしない
+    fast, slow = FastLexer(), ply()
+    for data in ("a\nb\n", "c\n"):
+        assert token_stream(fast, data) == token_stream(slow, data)
@@ -0,0 +1,80 @@
+# 幅の決まった整数型: 範囲を超えたときの panic と折り返し、as による変換
+import pytest
+
+from fixedint import INT_TYPES, IntegerOverflowError, cast, int_type
+
+# 128ビットより狭い型（isize と usize は64ビット）
+TYPES = sorted(name for name, (bits, signed) in INT_TYPES.items() if bits < 128)
+
+
+@pytest.mark.parametrize("type_name", TYPES)
+def test_overflow_panics(type_name):
+    cls = int_type(type_name)
+    with pytest.raises(IntegerOverflowError, match=f"attempt to add with overflow \\(`{type_name}`\\)"):
+        cls(cls.max) + 1
+    with pytest.raises(IntegerOverflowError, match="attempt to subtract with overflow"):
+        cls(cls.min) - 1
+    with pytest.raises(IntegerOverflowError, match="attempt to multiply with overflow"):
+        cls(cls.max) * 2
+    assert cls(cls.max) - 1 == cls.max - 1 and type(cls(cls.max) - 1) is cls
+
+
+@pytest.mark.parametrize("type_name", TYPES)
+def test_overflow_wraps(type_name):
+    cls = int_type(type_name, wrapping=True)
+    assert cls(cls.max) + 1 == cls.min
+    assert cls(cls.min) - 1 == cls.max
+    assert 1 + cls(cls.max) == cls.min  # 型のない整数は相手の型に合わせる
+    assert type(cls(cls.max) + 1) is cls
+    # wrapping_* と saturating_* はモードによらない
+    panicking = int_type(type_name)
+    assert panicking(cls.max).wrapping_add(1) == cls.min
+    assert panicking(cls.max).saturating_add(1) == cls.max
+    assert panicking(cls.min).saturating_sub(1) == cls.min
+
+
+def test_mixed_types_are_rejected():
+    with pytest.raises(TypeError, match="cannot add `u8` to `i32`"):
+        int_type('i32')(1) + int_type('u8')(1)
+
+
+def test_division():
+    i32 = int_type('i32', wrapping=True)
+    assert i32(-7) / 2 == -3  # 0に向かって切り捨てる
+    with pytest.raises(ZeroDivisionError):
+        i32(1) / 0
+    with pytest.raises(IntegerOverflowError):
+        i32(i32.min) / -1  # 折り返すモードでもエラー
+
+
+@pytest.mark.parametrize("value, type_name, expected", [
+    (300, 'u8', 44),
+    (-1, 'u8', 255),
+    (128, 'i8', -128),
+    (-129, 'i8', 127),
+    (65537, 'u16', 1),
+    (1 << 32, 'u32', 0),
+    (-1, 'u64', (1 << 64) - 1),
+    (1 << 63, 'i64', -(1 << 63)),
+    (-1, 'usize', (1 << 64) - 1),
+])
+def test_cast_truncates(value, type_name, expected):
+    result = cast(value, type_name)
+    assert result == expected and result.type_name == type_name
+
+
+@pytest.mark.parametrize("value, type_name, expected", [
+    (300.7, 'u8', 255),
+    (-5.5, 'u8', 0),
+    (-1.9, 'i8', -1),
+    (float('nan'), 'i32', 0),
+    (float('inf'), 'i16', 32767),
+    (float('-inf'), 'i16', -32768),
+])
+def test_float_cast_saturates(value, type_name, expected):
+    assert cast(value, type_name) == expected
+
+
+def test_cast_to_float():
+    assert cast(int_type('u8')(3), 'f64') == 3.0
+    assert cast(0.1, 'f32') != 0.1 and abs(cast(0.1, 'f32') - 0.1) < 1e-8
@@ -0,0 +1,124 @@
+# イテレーターのアダプターの遅延評価と、クロージャの変数の取り込み・スコープの使い回し
+import contextlib
+import io
+import re
+
+import pytest
+
+from closures import RustClosure
+from iterators import RustIter
+from simulator import RustSimulator
+from vm import RustVM
+
+N = lambda value: ('number', value)
+I = lambda name: ('identifier', name)
+B = lambda left, operator, right: ('binary_op', left, operator, right)
+CALL = lambda name, *args: ('call', name, list(args))
+METHOD = lambda receiver, name, *args: ('method_chain_with_params', receiver, name, list(args))
+TERMINAL = lambda receiver, name: ('method_chain', receiver, name)
+
+ENGINES = [RustSimulator, RustVM]
+
+# 呼ばれるたびに let で値を表示するクロージャ
+TRACED_DOUBLE = ('closure', ['x'], [('let', 'mapped', I('x')), B(I('x'), '*', N(2))])
+TRACED_KEEP = ('closure', ['x'], [('let', 'tested', I('x')), B(I('x'), '-', N(2))])  # 2 以外を残す
+
+
+def run(engine, ast):
+    """(シミュレーター, 表示した変数の (名前, 値) の並び, 最後の値)"""
+    simulator = engine()
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        result = simulator.eval_ast(ast)
+    return simulator, re.findall(r"Variable '(\w+)' = (.*)", out.getvalue()), result
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_chain_runs_only_at_collect(engine):
+    chain = METHOD(METHOD(METHOD(TERMINAL(('range', N(0), N(1000000)), 'iter'), 'map', I('f')),
+                          'filter', I('keep')), 'take', N(3))
+    ast = [('let', 'f', TRACED_DOUBLE),
+           ('let', 'keep', TRACED_KEEP),
+           ('let', 'it', chain),
+           ('let', 'marker', N(0)),
+           ('let', 'v', TERMINAL(I('it'), 'collect'))]
+    simulator, printed, result = run(engine, ast)
+    names = [name for name, value in printed]
+    assert names[:4] == ['f', 'keep', 'it', 'marker']  # collect まで要素は流れない
+    assert printed[2][1] == '<iterator>'
+    # 要素は1つずつ map から filter へ流れ、take が3つ揃ったところで止まる
+    assert printed[4:-1] == [('mapped', '0'), ('tested', '0'), ('mapped', '1'), ('tested', '2'),
+                             ('mapped', '2'), ('tested', '4'), ('mapped', '3'), ('tested', '6')]
+    assert list(simulator.variables['v']) == [0, 4, 6]
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_terminal_methods(engine):
+    numbers = TERMINAL(('vec', 'i32', [N(1), N(2), N(3), N(4)]), 'iter')
+    ast = [('let', 'total', TERMINAL(METHOD(numbers, 'map', ('closure', ['x'], B(I('x'), '*', I('x')))), 'sum')),
+           ('let', 'n', TERMINAL(METHOD(numbers, 'skip', N(1)), 'count')),
+           ('let', 'folded', METHOD(numbers, 'fold', N(100), ('closure', ['a', 'x'], B(I('a'), '-', I('x'))))),
+           ('let', 'pairs', TERMINAL(METHOD(TERMINAL(numbers, 'enumerate'), 'map',
+                                            ('closure', [['i', 'x']], B(I('i'), '*', I('x')))), 'collect')),
+           B(B(I('total'), '+', ('cast', I('n'), 'i32')), '+', I('folded'))]
+    simulator, printed, result = run(engine, ast)
+    assert result == 30 + 3 + 90
+    assert list(simulator.variables['pairs']) == [0, 2, 6, 12]
+    assert simulator.variables['n'].type_name == 'usize'
+
+
+def test_iterator_is_single_pass():
+    it = RustIter(iter(range(5))).map(lambda x: x + 1)
+    assert list(it.take(2)) == [1, 2]
+    assert list(it.collect()) == [3, 4, 5]
+    assert it.count() == 0
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_closure_captures_enclosing_frame(engine):
+    ast = [('let', 'k', N(1000)),
+           ('function', 'make', ['n'], None,
+            [('let', 'offset', B(I('n'), '*', N(10))),
+             ('return', ('closure', ['x'], [('let', 'n', B(I('x'), '+', I('offset'))), I('n')]))]),
+           ('let', 'add10', CALL('make', N(1))),
+           ('let', 'add20', CALL('make', N(2))),
+           # make から戻った後でも、作ったときの関数のローカル変数を読む
+           ('let', 'a', CALL('add10', N(1))),
+           ('let', 'b', CALL('add20', N(1))),
+           ('let', 'c', CALL('add10', N(2))),  # クロージャの中の let n は取り込んだ n を書き換えない
+           ('let', 'top', ('closure', ['x'], B(I('x'), '+', I('k')))),
+           ('let', 'k', N(2000)),
+           ('let', 'd', CALL('top', N(1))),  # トップレベルのクロージャはグローバル変数を読む
+           ('let', 'x', N(7))]
+    simulator, printed, result = run(engine, ast)
+    values = simulator.variables
+    assert (values['a'], values['b'], values['c'], values['d']) == (11, 21, 12, 2001)
+    assert values['x'] == 7 and 'offset' not in values
+    assert isinstance(values['add10'], RustClosure) and repr(values['add10']) == "<closure |x|>"
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_closure_scope_is_reused(engine):
+    closure = ('closure', ['x'], B(I('x'), '+', I('i')))
+    ast = [('function', 'make', ['i'], None, [('return', closure)]),
+           ('for', 'i', ('range', N(0), N(5)), [('let', 'f', CALL('make', I('i')))]),
+           ('let', 'g', CALL('make', N(9)))]
+    simulator, printed, result = run(engine, ast)
+    # 同じクロージャの式を何度評価しても、スコープはボディと作った場所の組ごとに1つ
+    assert len(simulator.closure_scopes) == 1
+    body, enclosing, scope = next(iter(simulator.closure_scopes.values()))
+    assert simulator.variables['f'].scope is scope and simulator.variables['g'].scope is scope
+    assert enclosing is simulator.functions['make'][2]
+    assert scope.slots == {'i': 0, 'x': 1}
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert simulator.eval_ast(CALL('g', N(1))) == 10
+        assert simulator.eval_ast(CALL('f', N(1))) == 5
+
+
+def test_closure_argument_count():
+    simulator = RustSimulator()
+    with contextlib.redirect_stdout(io.StringIO()):
+        closure = simulator.eval_ast(('closure', ['x', 'y'], B(I('x'), '+', I('y'))))
+    assert closure(1, 2) == 3
+    with pytest.raises(TypeError, match="closure takes 2 arguments but 1 were supplied"):
+        closure(1)
@@ -0,0 +1,111 @@
+# --jit（transpile.TieredCompiler）で変換した関数がツリー評価と同じ結果と出力になること
+import contextlib
+import io
+
+import pytest
+
+from astnodes import to_nodes
+from optimizer import optimize
+from simulator import RustSimulator
+from transpile import TieredCompiler
+
+N = lambda value: ('number', value)
+I = lambda name: ('identifier', name)
+B = lambda left, operator, right: ('binary_op', left, operator, right)
+CALL = lambda name, *args: ('call', name, list(args))
+
+
+def repeat(name, count=6):
+    """name(0) から name(count - 1) までを呼び出して結果を表示する（しきい値を超えて変換される）"""
+    return ('for', 'k', ('range', N(0), N(count)), [('let', 'r', CALL(name, I('k')))])
+
+
+PROGRAMS = {
+    # 再帰（変換した関数どうしは Python の関数呼び出しで呼び合う）
+    'recursion': [('function', 'fact', ['n'], None,
+                   [('if', I('n'), [('return', B(I('n'), '*', CALL('fact', B(I('n'), '-', N(1)))))],
+                     [('return', N(1))])]),
+                  repeat('fact'),
+                  CALL('fact', N(10))],
+    # loop と break（break の後の文は評価しない）
+    'loop': [('function', 'count', ['n'], None,
+              [('let', 'c', N(0)),
+               ('loop', [('let', 'c', B(I('c'), '+', N(1))),
+                         ('if', B(I('c'), '-', B(I('n'), '+', N(1))), [N(0)], [('break',)]),
+                         ('let', 'after', I('c'))]),
+               ('return', B(I('c'), '*', N(10)))]),
+             repeat('count'),
+             CALL('count', N(7))],
+    # 未代入のローカル変数はグローバル変数を読む（x が 0 のときは let t を通らない）
+    'global': [('let', 't', N(100)),
+               ('function', 'pick', ['x'], None,
+                [('if', I('x'), [('let', 't', B(I('x'), '*', N(2)))]),
+                 ('return', B(I('t'), '+', I('x')))]),
+               repeat('pick'),
+               CALL('pick', N(0))],
+    # for で値を積み上げる
+    'accumulate': [('function', 'total', ['n'], None,
+                    [('let', 's', N(0)),
+                     ('for', 'i', ('range', N(0), I('n')), [('let', 's', B(I('s'), '+', I('i')))]),
+                     ('return', I('s'))]),
+                   repeat('total'),
+                   CALL('total', N(20))],
+    # クロージャを作る関数は変換せず、ツリー評価で実行する
+    'rejected': [('function', 'shift', ['x'], None,
+                  [('let', 'add', ('closure', ['y'], B(I('y'), '+', I('x')))),
+                   ('return', B(I('x'), '+', N(1)))]),
+                 repeat('shift'),
+                 CALL('shift', N(3))],
+    # 変換した後でも、参照するグローバル変数の所有権が移動されていればツリー評価で借用エラーを出す
+    'moved': [('let', 'g', N(5)),
+              ('function', 'addg', ['x'], None, [('return', B(I('x'), '+', I('g')))]),
+              repeat('addg'),
+              ('let', 'h', ('move', 'g')),
+              CALL('addg', N(1))],
+    # 呼び出し先の関数が参照するグローバル変数の所有権が移動されたときも、ツリー評価で借用エラーを出す
+    'moved_callee': [('let', 'g', N(1)),
+                     ('function', 'inner', ['x'], None, [('return', B(I('x'), '+', I('g')))]),
+                     ('function', 'outer', ['x'], None, [('return', CALL('inner', I('x')))]),
+                     repeat('outer', 3),
+                     ('let', 'h', ('move', 'g')),
+                     ('let', 'b', CALL('outer', N(2)))],
+}
+
+CONVERSIONS = {'tuples': lambda ast: ast, 'optimize': optimize, 'nodes': to_nodes}
+
+
+def run(ast, jit):
+    """(出力, 最後の値または例外)"""
+    simulator = RustSimulator()
+    simulator.jit = jit
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        try:
+            result = repr(simulator.eval_ast(ast))
+        except Exception as error:
+            result = f"{type(error).__name__}: {error}"
+    return out.getvalue(), result
+
+
+@pytest.mark.parametrize("conversion", sorted(CONVERSIONS))
+@pytest.mark.parametrize("name", sorted(PROGRAMS))
+def test_jit_matches_tree(name, conversion):
+    ast = CONVERSIONS[conversion](PROGRAMS[name])
+    jit = TieredCompiler(threshold=2)
+    assert run(ast, jit) == run(ast, None)
+    stats = jit.stats()
+    if name == 'rejected':
+        assert stats["compiled"] == [] and "'closure' ノード" in stats["rejected"]["shift"]
+    else:
+        assert stats["compiled"] and stats["rejected"] == {}
+
+
+def test_jit_results():
+    # 比べる相手のツリー評価が期待どおりに動いていること
+    assert run(PROGRAMS['recursion'], None)[1] == repr(3628800)
+    assert run(PROGRAMS['loop'], None)[1] == repr(80)
+    assert run(PROGRAMS['global'], None)[1] == repr(100)
+    assert run(PROGRAMS['accumulate'], None)[1] == repr(190)
+    assert run(PROGRAMS['rejected'], None)[1] == repr(4)
+    assert run(PROGRAMS['moved'], None)[1] == "RuntimeError: 変数 'g' はすでに所有権が移動されました"
+    assert run(PROGRAMS['moved_callee'], None)[1] == "RuntimeError: 変数 'g' はすでに所有権が移動されました"
@@ -0,0 +1,50 @@
+# --lazy（関数のボディを最初の呼び出しまでパースしない）と通常のパースの比較
+import pytest
+
+from astnodes import to_tuples
+from main import parse_rust_code, parse_rust_skeleton, prepare_ast
+from simulator import RustSimulator
+from vm import RustVM
+
+VALID = "fn f(x) { x * 2 }\nfn g(x) { x + 1 }\n"
+MALFORMED = "fn f(x) { x * }\nfn g(x) { x + 1 }\n"
+
+
+def load(source, engine, lazy, optimize=True, ast_nodes=False):
+    simulator = engine()
+    if lazy:
+        ast, simulator.body_loader = parse_rust_skeleton(source)
+    else:
+        ast = parse_rust_code(source)
+    simulator.eval_ast(prepare_ast(ast, simulator, optimize, ast_nodes))
+    return simulator
+
+
+@pytest.mark.parametrize("engine", [RustSimulator, RustVM])
+@pytest.mark.parametrize("ast_nodes", [False, True])
+def test_lazy_matches_eager_on_valid_source(engine, ast_nodes):
+    eager = load(VALID, engine, lazy=False, ast_nodes=ast_nodes)
+    lazy = load(VALID, engine, lazy=True, ast_nodes=ast_nodes)
+    for name in ("f", "g"):
+        assert lazy.call_function(name, [3]) == eager.call_function(name, [3])
+        # 呼び出した後は、通常のパースと同じボディが登録されている（VM はタプル形式に戻して登録する）
+        assert to_tuples(lazy.functions[name][1]) == to_tuples(eager.functions[name][1])
+
+
+@pytest.mark.parametrize("engine", [RustSimulator, RustVM])
+@pytest.mark.parametrize("ast_nodes", [False, True])
+def test_malformed_body_is_an_error_in_both_modes(engine, ast_nodes, capsys):
+    eager = load(MALFORMED, engine, lazy=False, ast_nodes=ast_nodes)
+    assert "Syntax error" in capsys.readouterr().out
+    # 通常のパースではエラー回復で f の定義ごと落ち、呼び出すと未定義のエラーになる
+    with pytest.raises(ValueError, match="'f'"):
+        eager.call_function("f", [3])
+
+    lazy = load(MALFORMED, engine, lazy=True, ast_nodes=ast_nodes)
+    assert lazy.call_function("g", [3]) == eager.call_function("g", [3])
+    # 遅延させたボディは呼び出したときにパースし、空の関数として None を返さずにエラーにする
+    with pytest.raises(SyntaxError, match="'f'"):
+        lazy.call_function("f", [3])
+    assert "Syntax error" in capsys.readouterr().out
+    with pytest.raises(SyntaxError, match="'f'"):
+        lazy.call_function("f", [3])
@@ -0,0 +1,29 @@
+# match の選択表（match_table.MatchTable）のキャッシュ
+from astnodes import to_nodes
+from simulator import RustSimulator
+
+N = lambda value: ('number', value)
+I = lambda name: ('identifier', name)
+
+
+def guarded_match_loop(count):
+    """for i in 0..count { match i { 1 if i => 10, _ => 20 } }（match_guard の腕は1つ）"""
+    guard_match = ('match_guard', I('i'), [(1, I('i'), N(10)), ('_', N(20))])
+    return [('for', 'i', ('range', N(0), N(count)), [guard_match])]
+
+
+def test_match_guard_table_is_built_once_under_ast_nodes():
+    program = to_nodes(guarded_match_loop(2000))
+    simulator = RustSimulator()
+    simulator.eval_ast(program)
+    assert len(simulator.match_tables) == 1
+
+
+def test_match_guard_result_same_for_tuples_and_nodes():
+    ast = [('let', 'x', ('match_guard', N(1), [(1, N(0), N(10)), (1, N(1), N(11)), ('_', N(20))]))]
+    values = []
+    for program in (ast, to_nodes(ast)):
+        simulator = RustSimulator()
+        simulator.eval_ast(program)
+        values.append(simulator.variables['x'])
+    assert values == [11, 11]
@@ -0,0 +1,81 @@
+# --memoize（memo.MemoCache）が結果を変えないこと
+import contextlib
+import io
+
+import pytest
+
+from memo import MemoCache
+from simulator import RustSimulator
+from vm import RustVM
+
+N = lambda value: ('number', value)
+I = lambda name: ('identifier', name)
+B = lambda left, operator, right: ('binary_op', left, operator, right)
+CALL = lambda name, *args: ('call', name, list(args))
+
+
+def run(engine, ast, memo):
+    """(出力, 最後の値)"""
+    simulator = engine()
+    simulator.memo = memo
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        result = simulator.eval_ast(ast)
+    return out.getvalue(), result
+
+
+PROGRAMS = {
+    # let は変数の値を表示するので、メモすると2回目以降の出力が消える
+    'print': [('function', 'noisy', ['x'], None, [('let', 'y', B(I('x'), '*', N(2))), ('return', I('y'))]),
+              ('let', 'a', CALL('noisy', N(3))),
+              ('let', 'b', CALL('noisy', N(3))),
+              B(I('a'), '+', I('b'))],
+    # グローバル変数を読む関数は、同じ引数でもグローバル変数への let で結果が変わる
+    'global': [('let', 'g', N(1)),
+               ('function', 'reads', ['x'], None, [('return', B(I('x'), '+', I('g')))]),
+               ('let', 'a', CALL('reads', N(3))),
+               ('let', 'g', N(10)),
+               ('let', 'b', CALL('reads', N(3))),
+               B(I('a'), '*', I('b'))],
+    # 純粋でない関数を呼び出す関数も純粋ではない
+    'caller': [('function', 'noisy', ['x'], None, [('let', 'y', I('x')), ('return', I('y'))]),
+               ('function', 'outer', ['x'], None, [('return', B(CALL('noisy', I('x')), '+', N(1)))]),
+               ('let', 'a', CALL('outer', N(3))),
+               ('let', 'b', CALL('outer', N(3))),
+               B(I('a'), '+', I('b'))],
+    # 定義し直した関数は、前の定義でメモした結果を使わない（呼び出し元の関数の結果も）
+    'redefine': [('function', 'f', ['x'], None, [('return', B(I('x'), '*', N(2)))]),
+                 ('function', 'h', ['x'], None, [('return', B(CALL('f', I('x')), '+', N(1)))]),
+                 ('let', 'a', CALL('f', N(3))),
+                 ('let', 'b', CALL('h', N(3))),
+                 ('let', 'a2', CALL('f', N(3))),
+                 ('function', 'f', ['x'], None, [('return', B(I('x'), '*', N(3)))]),
+                 ('let', 'c', CALL('f', N(3))),
+                 ('let', 'd', CALL('h', N(3))),
+                 B(B(I('a'), '+', I('b')), '+', B(I('c'), '*', I('d')))],
+}
+
+
+@pytest.mark.parametrize("engine", [RustSimulator, RustVM])
+@pytest.mark.parametrize("name", sorted(PROGRAMS))
+def test_memo_matches_plain_run(engine, name):
+    assert run(engine, PROGRAMS[name], MemoCache()) == run(engine, PROGRAMS[name], None)
+
+
+@pytest.mark.parametrize("engine", [RustSimulator, RustVM])
+def test_impure_functions_are_never_memoized(engine):
+    for name in ('print', 'global', 'caller'):
+        memo = MemoCache()
+        run(engine, PROGRAMS[name], memo)
+        assert memo.stats()["pure_functions"] == []
+        assert memo.hits == 0 and not memo.entries
+
+
+@pytest.mark.parametrize("engine", [RustSimulator, RustVM])
+def test_redefinition_invalidates_memoized_results(engine):
+    memo = MemoCache()
+    out, result = run(engine, PROGRAMS['redefine'], memo)
+    assert "Variable 'a2' = 6" in out and "Variable 'c' = 9" in out and "Variable 'd' = 10" in out
+    assert result == 6 + 7 + 9 * 10
+    assert memo.hits == 3  # h の中の f(3) と a2（定義し直す前）、d の中の f(3)（定義し直した後）
+    assert memo.stats()["pure_functions"] == ['f', 'h']
@@ -0,0 +1,81 @@
+# 最適化パス（optimizer.optimize）が評価結果と出力を変えないこと
+import contextlib
+import io
+
+import pytest
+
+from optimizer import optimize
+from simulator import RustSimulator
+from vm import RustVM
+
+N = lambda value: ('number', value)
+I = lambda name: ('identifier', name)
+B = lambda left, operator, right: ('binary_op', left, operator, right)
+
+PROGRAMS = {
+    # 定数畳み込み
+    'fold': [('let', 'a', B(B(N(2), '*', N(3)), '+', B(N(10), '/', N(4)))),
+             ('let', 'b', B(I('a'), '-', B(N(1), '+', N(1)))),
+             B(N(1), '/', N(0))],
+    # const の埋め込み（関数の中と、ローカル変数で隠される名前）
+    'const': [('const_declaration', 'K', 'i32', N(7)),
+              ('function', 'f', ['x'], None, [('return', B(I('x'), '*', I('K')))]),
+              ('function', 'g', ['K'], None, [('return', B(I('K'), '+', N(1)))]),
+              ('let', 'a', ('call', 'f', [N(3)])),
+              ('let', 'b', ('call', 'g', [N(3)])),
+              B(I('a'), '+', I('K'))],
+    # 到達しない分岐の削除（let を含む分岐は残す）
+    'prune': [('if', N(0), [('let', 'x', N(1))], [('let', 'y', N(2))]),
+              ('if', N(1), [N(5)], [N(6)]),
+              ('let', 'm', ('match', N(2), [(1, N(10)), (2, N(20)), ('_', N(30))])),
+              ('let', 'n', ('match', N(9), [(1, N(10)), ('_', ('let', 'z', N(1)))])),
+              ('loop', [('let', 'c', N(1)), ('break',), ('let', 'never', N(0))]),
+              I('y')],
+    # ループ不変式はループに入るたびに評価し直す（外側のループ変数 j が変わる）
+    'invariant_scope': [('for', 'j', ('range', N(0), N(3)),
+                         [('for', 'i', ('range', N(0), N(2)),
+                           [('let', 't', B(B(I('j'), '*', N(10)), '+', I('i')))])]),
+                        I('t')],
+    # 巻き上げたループの中の break（不変式より前で抜けるときは、不変式は評価されない）
+    'break': [('let', 'k', N(4)),
+              ('let', 'z', N(0)),
+              ('let', 'c', N(0)),
+              ('loop', [('let', 'c', B(I('c'), '+', N(1))),
+                        ('if', B(I('c'), '-', N(3)), [('let', 't', B(I('k'), '*', N(2)))], [('break',)])]),
+              ('loop', [('if', N(1), [('break',)]), ('let', 'u', B(I('k'), '/', I('z')))]),
+              ('loop', [('let', 'd', B(I('k'), '*', N(3))), ('break',)]),
+              B(I('c'), '+', I('t'))],
+}
+
+
+def run(make_simulator, ast):
+    """(出力, 最後の値または例外)"""
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        try:
+            result = repr(make_simulator().eval_ast(ast))
+        except Exception as error:
+            result = f"{type(error).__name__}: {error}"
+    return out.getvalue(), result
+
+
+@pytest.mark.parametrize('make_simulator', [RustSimulator, RustVM])
+@pytest.mark.parametrize('name', list(PROGRAMS))
+def test_optimize_preserves_output_and_value(name, make_simulator):
+    program = PROGRAMS[name]
+    assert run(make_simulator, optimize(program)) == run(make_simulator, program)
+
+
+def test_optimize_rewrites_programs():
+    # 等価性の検査が空振りしないよう、それぞれの書き換えが実際に起きていることを確かめる
+    assert optimize(PROGRAMS['fold'])[0] == ('let', 'a', N(8.5))
+    assert optimize(PROGRAMS['const'])[1][4] == [('return', B(I('x'), '*', N(7)))]
+    assert optimize(PROGRAMS['prune'])[1:3] == [[N(5)], ('let', 'm', N(20))]
+    inner = optimize(PROGRAMS['invariant_scope'])[0][3][0]
+    assert inner[0] == 'invariant_scope'
+    assert optimize(PROGRAMS['break'])[3][0] == 'invariant_scope'
+
+
+def test_invariant_is_reevaluated_on_each_loop_entry():
+    out, _ = run(RustSimulator, optimize(PROGRAMS['invariant_scope']))
+    assert [line.split(' = ')[1] for line in out.splitlines()] == ['0', '1', '10', '11', '20', '21']
@@ -0,0 +1,53 @@
+# --profile（profiler.ProfilingSimulator）の集計表と folded 形式の出力に、呼び出した関数が入ること
+import contextlib
+import io
+
+from main import simulate_rust_file
+from profiler import TOPLEVEL, ProfilingSimulator
+
+N = lambda value: ('number', value)
+I = lambda name: ('identifier', name)
+B = lambda left, operator, right: ('binary_op', left, operator, right)
+CALL = lambda name, *args: ('call', name, list(args))
+
+PROGRAM = [('function', 'fact', ['n'], None,
+            [('if', I('n'), [('return', B(I('n'), '*', CALL('fact', B(I('n'), '-', N(1)))))],
+              [('return', CALL('one'))])]),
+           ('function', 'one', [], None, [('return', N(1))]),
+           ('function', 'unused', [], None, [('return', N(0))]),
+           ('let', 'r', CALL('fact', N(5)))]
+
+
+def test_profile_lists_called_functions(tmp_path):
+    simulator = ProfilingSimulator(memory=False)
+    with contextlib.redirect_stdout(io.StringIO()):
+        simulator.profile(PROGRAM)
+    assert simulator.variables['r'] == 120
+    assert simulator.function_stats['fact'].calls == 6 and simulator.function_stats['one'].calls == 1
+    assert 'unused' not in simulator.function_stats
+    assert simulator.node_stats['let'].calls == 1 and simulator.node_stats['function'].calls == 3
+
+    report = simulator.report()
+    assert "fact" in report and "one" in report and "unused" not in report
+    assert "（メモリは計測していません）" in report
+
+    # fact(5) から fact(0) までの再帰と、その先の one の呼び出しの並び
+    expected = {TOPLEVEL} | {TOPLEVEL + ";fact" * depth for depth in range(1, 7)} | {TOPLEVEL + ";fact" * 6 + ";one"}
+    assert set(simulator.folded) == expected
+    path = tmp_path / "profile.folded"
+    simulator.write_folded(str(path))
+    for line in path.read_text(encoding="utf-8").splitlines():
+        stack, microseconds = line.rsplit(" ", 1)
+        assert stack in expected and int(microseconds) > 0
+
+
+def test_profile_from_file(tmp_path):
+    source = tmp_path / "a.rs"
+    source.write_text("fn f(x) { x * 2 }\n")
+    output = tmp_path / "out.folded"
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        simulate_rust_file(str(source), profile=True, profile_output=str(output))
+    text = out.getvalue()
+    assert "プロファイル: 合計" in text and "ノードの種類" in text and "function" in text
+    assert output.exists()
@@ -0,0 +1,63 @@
+# マニフェストのパス依存とワークスペースの継承（resolver.read_project / resolve_project）
+import json
+
+import pytest
+
+pytest.importorskip("toml")
+
+from resolver import read_project, resolve_project
+
+
+def write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+
+
+def write_index(index_dir, name, versions):
+    from resolver import index_relpath
+    lines = [json.dumps({"name": name, "vers": version, "deps": [], "cksum": f"{i:064x}", "features": {},
+                         "yanked": False}) for i, version in enumerate(versions, 1)]
+    write(index_dir / index_relpath(name), "\n".join(lines) + "\n")
+
+
+@pytest.fixture
+def index_dir(tmp_path):
+    index = tmp_path / "index"
+    write_index(index, "serde", ["1.0.5"])
+    write_index(index, "itoa", ["1.0.1"])
+    return index
+
+
+def test_path_dependency_with_version_is_local(tmp_path, index_dir):
+    # 公開用に version を併記したパス依存（local はインデックスにない）
+    write(tmp_path / "app" / "Cargo.toml",
+          '[package]\nname = "app"\nversion = "0.1.0"\n\n'
+          '[dependencies]\nlocal = { path = "local", version = "0.1" }\n')
+    write(tmp_path / "app" / "local" / "Cargo.toml",
+          '[package]\nname = "local"\nversion = "0.1.0"\n\n[dependencies]\nserde = "1"\n')
+    manifest = str(tmp_path / "app" / "Cargo.toml")
+    assert [dep["name"] for dep in read_project(manifest)] == ["serde"]
+    assert resolve_project(manifest, str(index_dir)).download_plan() == [("serde", "1.0.5", f"{1:064x}")]
+
+
+def test_workspace_inherited_path_dependency_is_traversed(tmp_path, index_dir):
+    write(tmp_path / "ws" / "Cargo.toml",
+          '[workspace]\nmembers = ["member"]\n\n'
+          '[workspace.dependencies]\nshared = { path = "crates/shared", version = "0.2" }\nserde = "1"\n')
+    write(tmp_path / "ws" / "member" / "Cargo.toml",
+          '[package]\nname = "member"\nversion = "0.1.0"\n\n'
+          '[dependencies]\nshared = { workspace = true }\nserde = { workspace = true }\n')
+    # 継承した path はワークスペースのルートからの相対パス
+    write(tmp_path / "ws" / "crates" / "shared" / "Cargo.toml",
+          '[package]\nname = "shared"\nversion = "0.2.0"\n\n[dependencies]\nitoa = "1"\n')
+    manifest = str(tmp_path / "ws" / "Cargo.toml")
+    assert sorted(dep["name"] for dep in read_project(manifest)) == ["itoa", "serde"]
+    plan = resolve_project(manifest, str(index_dir)).download_plan()
+    assert [name for name, _, _ in plan] == ["itoa", "serde"]
+
+
+def test_git_dependency_is_skipped(tmp_path):
+    write(tmp_path / "Cargo.toml",
+          '[package]\nname = "app"\nversion = "0.1.0"\n\n'
+          '[dependencies]\nremote = { git = "https://example.com/remote.git" }\nserde = { version = "1" }\n')
+    assert [dep["name"] for dep in read_project(str(tmp_path / "Cargo.toml"))] == ["serde"]
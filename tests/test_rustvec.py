@@ -0,0 +1,72 @@
+# 型付きの Vec: push、添字、スライス、反復中の push
+import pytest
+
+from fixedint import int_type
+from rustvec import RustVec, VecSlice, index_value, make_vec
+
+
+def test_push_and_index():
+    vec = RustVec('i32')
+    for value in (1, 2, 3):
+        vec.push(value)
+    assert vec.len() == 3 and vec.len().type_name == 'usize'
+    assert vec.get(0) == 1 and vec.index(2) == 3
+    assert type(vec.get(1)) is int_type('i32')
+    assert repr(vec) == "[1, 2, 3]"
+    with pytest.raises(IndexError, match="the len is 3 but the index is 3"):
+        vec.index(3)
+    with pytest.raises(IndexError):
+        vec.get(-1)
+
+
+def test_push_checks_element_type():
+    vec = RustVec('u8')
+    with pytest.raises(OverflowError, match="literal out of range for `u8`: 256"):
+        vec.push(256)
+    with pytest.raises(TypeError, match="expected `u8`, found `i32`"):
+        vec.push(int_type('i32')(1))
+    vec.push(int_type('u8')(255))
+    assert list(vec) == [255]
+
+
+def test_packed_storage():
+    vec = RustVec.repeat('u8', 7, 1000)
+    assert vec.data.itemsize == 1 and len(vec) == 1000
+    assert RustVec.repeat('i64', 1, 0).is_empty()
+    assert make_vec(None, [1.5, 2.5]).elem_type == 'f64'
+    assert make_vec(None, [int_type('u16')(1)]).elem_type == 'u16'
+    assert isinstance(RustVec('i128', [1 << 100]).data, list)
+
+
+def test_slice():
+    vec = RustVec('i32', range(10))
+    part = vec.index(range(2, 6))
+    assert isinstance(part, VecSlice) and list(part) == [2, 3, 4, 5]
+    assert part.len() == 4 and part.get(0) == 2
+    assert list(part.slice(1, 3)) == [3, 4]
+    assert part == RustVec('i32', [2, 3, 4, 5])
+    assert list(index_value(vec, range(8, 10))) == [8, 9]
+    vec.push(10)  # スライスは元の Vec を参照する
+    assert list(vec.slice(9, 11)) == [9, 10]
+    with pytest.raises(IndexError, match="range end index 5 out of range for slice of length 4"):
+        part.slice(0, 5)
+    with pytest.raises(IndexError, match="slice index starts at 3 but ends at 2"):
+        part.slice(3, 2)
+    with pytest.raises(IndexError):
+        part.get(4)
+
+
+@pytest.mark.parametrize("elem_type", ['i32', 'u8', 'f64'])
+def test_push_while_iterating(elem_type):
+    vec = RustVec(elem_type, [1, 2, 3])
+    # 残っているイテレーターがあっても push でき、イテレーターは push する前の要素を読む
+    iterator = vec.iter()
+    assert next(iter(iterator)) == 1
+    vec.push(4)
+    assert list(iterator) == [2, 3]
+    for value in vec.values():
+        vec.push(value)
+    assert list(vec) == [1, 2, 3, 4, 1, 2, 3, 4]
+    sliced = vec.slice(0, 2).values()
+    vec.push(5)
+    assert list(sliced) == [1, 2] and vec.len() == 9
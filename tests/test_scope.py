@@ -0,0 +1,147 @@
+# 関数ごとのローカル変数スロット（Scope）と、未代入のスロットからグローバル変数への読み出し、所有権の移動
+import contextlib
+import io
+
+import pytest
+
+from astnodes import to_nodes
+from simulator import GLOBAL_SCOPE, UNBOUND, RustSimulator, Scope, collect_locals
+from vm import RustVM
+
+N = lambda value: ('number', value)
+I = lambda name: ('identifier', name)
+B = lambda left, operator, right: ('binary_op', left, operator, right)
+CALL = lambda name, *args: ('call', name, list(args))
+
+ENGINES = [RustSimulator, RustVM]
+MOVED = "RuntimeError: 変数 '{}' はすでに所有権が移動されました"
+
+
+def run(engine, ast):
+    """(シミュレーター, 最後の値または例外)"""
+    simulator = engine()
+    with contextlib.redirect_stdout(io.StringIO()):
+        try:
+            result = simulator.eval_ast(ast)
+        except Exception as error:
+            result = f"{type(error).__name__}: {error}"
+    return simulator, result
+
+
+@pytest.mark.parametrize("convert", [lambda body: body, to_nodes])
+def test_collect_locals(convert):
+    body = convert([('let', 'a', N(1)),
+                    ('if', I('a'), [('let', 'b', N(2))]),
+                    ('for', 'i', ('range', N(0), N(3)), [('let', 'a', I('i'))]),
+                    ('function', 'inner', ['p'], None, [('let', 'q', N(0))]),
+                    ('let', 'f', ('closure', ['y'], [('let', 'z', I('y'))])),
+                    ('let', 'm', ('match', N(1), [(1, [('let', 'c', N(3))])]))])
+    # 入れ子の関数とクロージャの変数は含めない
+    assert collect_locals(['x', ('n', 'i32')], body) == {'x': 0, 'n': 1, 'a': 2, 'b': 3, 'i': 4, 'f': 5, 'm': 6, 'c': 7}
+
+
+def test_new_frame_binds_params_only():
+    scope = Scope(collect_locals(['x', None, 'y'], [('let', 't', N(0))]), ['x', None, 'y'])
+    assert scope.new_frame([1, 2, 3]) == [1, 3, UNBOUND]
+    assert scope.new_frame([]) == [UNBOUND, UNBOUND, UNBOUND]
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_unbound_slot_reads_global(engine):
+    # let t を通らなかったときは、同じ名前のグローバル変数を読む
+    ast = [('function', 'pick', ['x'], None,
+            [('if', I('x'), [('let', 't', B(I('x'), '*', N(2)))]),
+             ('return', B(I('t'), '+', I('x')))]),
+           ('let', 't', N(100)),  # 関数の定義より後に定義したグローバル変数
+           ('let', 'a', CALL('pick', N(0))),
+           ('let', 'b', CALL('pick', N(3))),
+           B(I('a'), '+', I('b'))]
+    simulator, result = run(engine, ast)
+    assert result == 100 + 9
+    assert simulator.variables['t'] == 100  # 関数の中の let t はローカル変数に入る
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_locals_shadow_globals(engine):
+    ast = [('let', 'x', N(1)),
+           ('function', 'f', ['x'], None,
+            [('let', 'x', B(I('x'), '+', N(10))),
+             ('let', 'y', I('x')),
+             ('return', I('y'))]),
+           ('let', 'r', CALL('f', N(5))),
+           B(I('r'), '+', I('x'))]
+    simulator, result = run(engine, ast)
+    assert result == 15 + 1
+    assert simulator.variables['x'] == 1
+    assert 'y' not in simulator.variables
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_each_call_has_its_own_frame(engine):
+    # 再帰呼び出しから戻っても、呼び出し元のローカル変数はそのまま
+    ast = [('function', 'depth', ['n'], None,
+            [('let', 't', B(I('n'), '*', N(10))),
+             ('if', I('n'), [('let', 'inner', CALL('depth', B(I('n'), '-', N(1))))]),
+             ('return', I('t'))]),
+           CALL('depth', N(4))]
+    simulator, result = run(engine, ast)
+    assert result == 40
+    assert simulator.frames == [] and simulator.scope is GLOBAL_SCOPE and 't' not in simulator.variables
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_moved_local_in_function(engine):
+    ast = [('function', 'f', ['a'], None,
+            [('let', 'b', ('move', 'a')),
+             ('return', B(I('a'), '+', N(1)))]),
+           ('function', 'g', ['a'], None, [('return', B(I('a'), '*', N(2)))]),
+           CALL('f', N(3))]
+    simulator, result = run(engine, ast)
+    assert result == MOVED.format('a')
+    # エラーで抜けた関数のフレームは残らない
+    assert simulator.frames == [] and simulator.scope is GLOBAL_SCOPE and simulator.locals == []
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert simulator.eval_ast(CALL('g', N(4))) == 8  # 引数の a は新しい値なので読める
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_moved_global_in_function(engine):
+    # 関数の中でグローバル変数の所有権を移動すると、戻った後も読めない
+    ast = [('let', 'g', N(5)),
+           ('function', 'take', [], None, [('let', 'h', ('move', 'g')), ('return', I('h'))]),
+           ('let', 'r', CALL('take')),
+           B(I('g'), '+', I('r'))]
+    simulator, result = run(engine, ast)
+    assert result == MOVED.format('g')
+    assert simulator.variables['r'] == 5
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_moves_stay_in_their_frame(engine):
+    # 引数の所有権の移動は同じ名前のグローバル変数に影響しない
+    ast = [('let', 'x', N(1)),
+           ('function', 'f', ['x'], None, [('let', 'y', ('move', 'x')), ('return', I('y'))]),
+           ('let', 'r', CALL('f', N(2))),
+           B(I('x'), '+', I('r'))]
+    assert run(engine, ast)[1] == 3
+    # グローバル変数の所有権が移動されていても、同じ名前の引数やローカル変数は読める
+    ast = [('let', 'x', N(1)),
+           ('let', 'z', ('move', 'x')),
+           ('function', 'f', ['x'], None, [('let', 'w', N(10)), ('return', B(I('x'), '+', I('w')))]),
+           ('function', 'g', [], None, [('let', 'x', N(4)), ('return', I('x'))]),
+           B(CALL('f', N(2)), '+', CALL('g'))]
+    assert run(engine, ast)[1] == 16
+    # 関数の中の let は、所有権が移動されたグローバル変数を元に戻さない
+    ast = ast[:-1] + [('let', 'r', CALL('g')), I('x')]
+    assert run(engine, ast)[1] == MOVED.format('x')
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_moved_local_is_restored_by_let(engine):
+    ast = [('function', 'f', ['a'], None,
+            [('let', 'b', ('move', 'a')),
+             ('let', 'a', B(I('b'), '+', N(1))),
+             ('let', 'c', ('move', 'a')),
+             ('return', B(I('b'), '+', I('c')))]),
+           CALL('f', N(1))]
+    assert run(engine, ast)[1] == 3
@@ -0,0 +1,91 @@
+# 構造体の固定レイアウト（StructLayout）とフィールド参照のインラインキャッシュ（FieldSite）
+import contextlib
+import io
+
+import pytest
+
+from simulator import RustSimulator
+from structs import FieldSite, StructLayout, StructValue, declaration_layout, field_value
+from vm import RustVM
+
+N = lambda value: ('number', value)
+I = lambda name: ('identifier', name)
+B = lambda left, operator, right: ('binary_op', left, operator, right)
+FIELD = lambda value, field: ('field_access', value, field)
+
+
+def test_layout_orders_fields():
+    layout = declaration_layout(('struct', 'P', [('x', 'i32'), ('y', 'i32')]))
+    same = layout.new(('x', 'y'), (1, 2))
+    swapped = layout.new(('y', 'x'), (2, 1))  # インスタンス生成の並びが宣言と違っても宣言の順に入る
+    assert isinstance(same, StructValue) and same == swapped
+    assert same.values() == (1, 2) and same.to_dict() == {'x': 1, 'y': 2}
+    assert repr(swapped) == repr(('P', {'x': 1, 'y': 2}))
+    assert not hasattr(same, '__dict__')
+    assert layout.new(('x',), (1,)) is None and layout.new(('x', 'z'), (1, 2)) is None
+    assert layout.order(('y', 'x')) == (1, 0) and layout.order(('x', 'y')) is True
+
+
+def test_tuple_struct_layout():
+    layout = declaration_layout(('tuple_struct', 'Pair', ['i32', 'i32']))
+    value = layout.instance_class(3, 4)
+    assert field_value(value, 0) == 3 and field_value(value, '1') == 4
+    assert repr(value) == repr(('Pair', (3, 4)))
+
+
+def test_field_site_caches_getter():
+    layout = StructLayout('P', ['x', 'y'])
+    site = FieldSite('y')
+    first = layout.instance_class(1, 2)
+    assert site.load(first) == 2
+    assert site.cls is layout.instance_class
+    second = layout.instance_class(5, 6)
+    assert type(second) is site.cls and site.getter(second) == 6  # VMがキャッシュから読む経路
+    # 別のクラスや従来の (名前, 辞書) の値に変わっても正しく読める
+    other = StructLayout('Q', ['y']).instance_class(9)
+    assert site.load(other) == 9 and site.cls is type(other)
+    assert site.load(('P', {'y': 7})) == 7 and site.cls is type(other)
+    with pytest.raises(KeyError):
+        FieldSite('z').load(first)
+    with pytest.raises(TypeError, match="フィールド 'y' を持たない値です"):
+        site.load(5)
+
+
+def test_redefinition_replaces_layout():
+    old = StructLayout('P', ['x', 'y'])
+    new = StructLayout('P', ['y', 'x', 'z'])
+    site = FieldSite('x')
+    assert site.load(old.instance_class(1, 2)) == 1
+    value = new.new(('x', 'y', 'z'), (10, 20, 30))
+    assert type(value) is not site.cls
+    assert site.load(value) == 10 and site.cls is new.instance_class
+    assert site.load(old.instance_class(3, 4)) == 3  # 再定義前のインスタンスも読める
+
+
+PROGRAM = [
+    ('struct', 'P', [('x', 'i32'), ('y', 'i32')]),
+    ('function', 'sum', ['p'], None, [('return', B(FIELD(I('p'), 'x'), '+', FIELD(I('p'), 'y')))]),
+    ('let', 'a', ('struct', 'P', {'x': N(1), 'y': N(2)})),
+    ('let', 'b', ('struct', 'P', {'y': N(20), 'x': N(10)})),
+    ('let', 's1', B(('call', 'sum', [I('a')]), '+', ('call', 'sum', [I('b')]))),
+    # 再定義した後は新しいレイアウトで作る（同じ関数の同じ参照の位置から読む）
+    ('struct', 'P', [('y', 'i32'), ('x', 'i32'), ('z', 'i32')]),
+    ('let', 'c', ('struct', 'P', {'x': N(100), 'y': N(200), 'z': N(300)})),
+    ('let', 'd', ('struct', 'P', {'x': N(5), 'y': N(6)})),  # フィールドの組が宣言と違えば辞書の形
+    ('let', 's2', B(B(('call', 'sum', [I('c')]), '+', ('call', 'sum', [I('d')])), '+', ('call', 'sum', [I('a')]))),
+    B(B(I('s1'), '*', N(1000)), '+', I('s2')),
+]
+
+
+@pytest.mark.parametrize("engine", [RustSimulator, RustVM])
+def test_program_with_redefinition(engine):
+    simulator = engine()
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        result = simulator.eval_ast(PROGRAM)
+    assert result == 33 * 1000 + 300 + 11 + 3
+    assert simulator.struct_layouts['P'].fields == ('y', 'x', 'z')
+    assert isinstance(simulator.variables['c'], StructValue)
+    assert simulator.variables['d'] == ('P', {'x': 5, 'y': 6})
+    assert type(simulator.variables['a']) is not type(simulator.variables['c'])
+    assert out.getvalue().count("Struct 'P' defined.") == 2
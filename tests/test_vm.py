@@ -0,0 +1,101 @@
+# バイトコードVM（compiler.py / vm.py）がツリー評価（RustSimulator.eval_ast）と同じ結果と出力になること
+import contextlib
+import io
+
+import pytest
+
+from astnodes import to_nodes
+from optimizer import optimize
+from simulator import RustSimulator
+from vm import RustVM
+
+N = lambda value: ('number', value)
+I = lambda name: ('identifier', name)
+B = lambda left, operator, right: ('binary_op', left, operator, right)
+CALL = lambda name, *args: ('call', name, list(args))
+
+PROGRAMS = {
+    'arithmetic': [('let', 'a', B(N(7), '*', B(N(3), '+', N(2)))),
+                   ('let', 'b', B(I('a'), '/', N(5))),
+                   ('let', 'c', B(B(I('a'), '-', N(40)), '-', I('b'))),
+                   B(I('c'), '+', B(I('a'), '*', I('b')))],
+    # 所有権を移動した変数は読めない
+    'let_move': [('let', 'a', N(1)),
+                 ('let', 'b', ('move', 'a')),
+                 ('let', 'a', B(I('b'), '+', N(1))),
+                 ('let', 'c', ('move', 'a')),
+                 B(I('b'), '+', I('c'))],
+    'moved': [('let', 'a', N(1)),
+              ('let', 'b', ('move', 'a')),
+              B(I('a'), '+', N(1))],
+    'moved_in_function': [('function', 'f', ['x'], None,
+                           [('let', 'y', ('move', 'x')), ('return', I('x'))]),
+                          CALL('f', N(3))],
+    'if': [('let', 'a', N(0)),
+           ('if', I('a'), [('let', 'b', N(1))], [('let', 'b', N(2))]),
+           ('if', I('b'), [('let', 'c', N(3))]),
+           ('let', 'd', ('if', B(I('b'), '-', N(2)), [N(10)], [N(20)])),
+           B(I('c'), '+', I('d'))],
+    # while の代わりの loop と break（break の後の文は評価しない）
+    'loop': [('let', 'i', N(0)),
+             ('let', 's', N(0)),
+             ('loop', [('if', B(I('i'), '-', N(5)), [N(0)], [('break',)]),
+                       ('let', 's', B(I('s'), '+', I('i'))),
+                       ('let', 'i', B(I('i'), '+', N(1)))]),
+             ('for', 'k', ('range', N(0), N(4)), [('let', 's', B(I('s'), '*', N(2)))]),
+             I('s')],
+    'match': [('function', 'name', ['x'], None,
+               [('return', ('match', I('x'), [(0, N(100)), (1, N(101)), ('_', B(I('x'), '*', N(2)))]))]),
+              ('for', 'k', ('range', N(0), N(4)), [('let', 'r', CALL('name', I('k')))]),
+              ('let', 'none', ('match', N(9), [(1, N(1))])),
+              CALL('name', N(1))],
+    # ガード付きの腕 (パターン, ガード, ボディ) を含む match
+    'match_guarded': [('function', 'sign', ['x'], None,
+                       [('return', ('match', I('x'), [(0, N(1), N(-1)), ('_', I('x'), N(1)), ('_', N(0))]))]),
+                      ('for', 'k', ('range', N(0), N(3)), [('let', 'r', CALL('sign', I('k')))]),
+                      ('let', 'g', ('match_guard', N(2), [(2, N(0), N(20)), (2, N(1), N(21)), ('_', N(0))])),
+                      B(CALL('sign', N(0)), '+', I('g'))],
+    'calls': [('let', 'base', N(10)),
+              ('function', 'fib', ['n'], None,
+               [('if', B(I('n'), '-', N(1)),
+                 [('if', I('n'), [('return', B(CALL('fib', B(I('n'), '-', N(1))), '+',
+                                             CALL('fib', B(I('n'), '-', N(2)))))],
+                   [('return', N(0))])],
+                 [('return', N(1))])]),
+              ('function', 'offset', ['x'], None, [('return', B(I('x'), '+', I('base')))]),
+              ('let', 'f', CALL('fib', N(12))),
+              CALL('offset', I('f'))],
+}
+
+CONVERSIONS = {'tuples': lambda ast: ast, 'optimize': optimize, 'nodes': to_nodes}
+
+
+def run(engine, ast):
+    """(出力, 最後の値または例外)"""
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        try:
+            result = repr(engine().eval_ast(ast))
+        except Exception as error:
+            result = f"{type(error).__name__}: {error}"
+    return out.getvalue(), result
+
+
+@pytest.mark.parametrize("conversion", sorted(CONVERSIONS))
+@pytest.mark.parametrize("name", sorted(PROGRAMS))
+def test_vm_matches_tree(name, conversion):
+    ast = CONVERSIONS[conversion](PROGRAMS[name])
+    assert run(RustVM, ast) == run(RustSimulator, ast)
+
+
+def test_tree_results():
+    # 比べる相手のツリー評価が期待どおりに動いていること
+    assert run(RustSimulator, PROGRAMS['arithmetic'])[1] == repr(-12 + 35 * 7.0)  # '/' は浮動小数点数の除算
+    assert run(RustSimulator, PROGRAMS['let_move'])[1] == repr(3)
+    assert run(RustSimulator, PROGRAMS['moved'])[1] == "RuntimeError: 変数 'a' はすでに所有権が移動されました"
+    assert run(RustSimulator, PROGRAMS['moved_in_function'])[1] == "RuntimeError: 変数 'x' はすでに所有権が移動されました"
+    assert run(RustSimulator, PROGRAMS['if'])[1] == repr(23)
+    assert run(RustSimulator, PROGRAMS['loop'])[1] == repr(160)
+    assert run(RustSimulator, PROGRAMS['match'])[1] == repr(101)
+    assert run(RustSimulator, PROGRAMS['match_guarded'])[1] == repr(-1 + 21)
+    assert run(RustSimulator, PROGRAMS['calls'])[1] == repr(144 + 10)
@@ -0,0 +1,75 @@
+# --watch のシミュレーターに、通常の実行と同じオプションが反映されること
+import sys
+
+import pytest
+
+import main
+from astnodes import Node
+from simulator import RustSimulator
+
+
+class RecordingSimulator(RustSimulator):
+    """評価したASTを記録するシミュレーター"""
+    created = []
+
+    def __init__(self):
+        super().__init__()
+        self.evaluated = []
+        RecordingSimulator.created.append(self)
+
+    def eval_ast(self, node):
+        if not self.evaluated:
+            self.evaluated.append(node)
+        return super().eval_ast(node)
+
+
+class StopWatching(KeyboardInterrupt):
+    pass
+
+
+def watch_once(tmp_path, monkeypatch, **options):
+    """ファイルを1回だけ実行して監視を終える"""
+    source = tmp_path / "watched.rs"
+    source.write_text("fn f(x) { x * 2 }\nfn main() { f(3) }\n")
+    RecordingSimulator.created = []
+    monkeypatch.setitem(main.ENGINES, "tree", RecordingSimulator)
+
+    def stop(interval):
+        raise StopWatching()
+
+    monkeypatch.setattr(main.time, "sleep", stop)
+    main.watch_rust_file(str(source), **options)
+    assert len(RecordingSimulator.created) == 1
+    return RecordingSimulator.created[0]
+
+
+def test_watch_applies_simulator_options(tmp_path, monkeypatch):
+    from memo import MemoCache
+    from transpile import TieredCompiler
+
+    memo = MemoCache()
+    jit = TieredCompiler(1)
+    simulator = watch_once(tmp_path, monkeypatch, max_depth=123, memo=memo, jit=jit, overflow="wrap",
+                           ast_nodes=True)
+    assert simulator.max_depth == 123
+    assert simulator.memo is memo
+    assert simulator.jit is jit
+    assert simulator.wrapping is True
+    assert all(isinstance(stmt, Node) for stmt in simulator.evaluated[0])
+
+
+def test_watch_defaults_match_simulate(tmp_path, monkeypatch):
+    simulator = watch_once(tmp_path, monkeypatch)
+    assert simulator.max_depth == main.MAX_CALL_DEPTH
+    assert simulator.memo is None and simulator.jit is None
+    assert simulator.wrapping is False
+    assert not any(isinstance(stmt, Node) for stmt in simulator.evaluated[0])
+
+
+@pytest.mark.parametrize("flag", ["--lazy", "--profile"])
+def test_watch_rejects_unsupported_flags(flag, monkeypatch, capsys):
+    monkeypatch.setattr(sys, "argv", ["main.py", "x.rs", "--no-download", "--watch", flag])
+    with pytest.raises(SystemExit) as exit_info:
+        main.main()
+    assert exit_info.value.code == 2
+    assert "--watch" in capsys.readouterr().err
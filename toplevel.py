@@ -0,0 +1,166 @@
+# トップレベルの関数定義のボディを読み飛ばして、呼び出されるまでパースを遅らせる
+import re
+
+# 遅延させたボディを表すASTノード ('lazy_body', 開始位置, 終了位置, 開始行)
+LAZY_BODY = 'lazy_body'
+
+# スケルトンのソースでボディの代わりに置く識別子（パース後に LAZY_BODY ノードへ置き換える）
+PLACEHOLDER_PREFIX = '__lazy_body_'
+
+# 括弧の対応を数えるときに読み飛ばすもの（lex.py と同じく、文字列は1行内、ブロックコメントは入れ子なし）
+SKIP = r'//.*|/\*[\s\S]*?\*/|"[^"\n]*"'
+TOPLEVEL_PATTERN = re.compile(SKIP + r'|[{}]|(?<![A-Za-z0-9_])fn(?![A-Za-z0-9_])')
+BRACE_PATTERN = re.compile(SKIP + r'|[{}]')
+PAREN_PATTERN = re.compile(SKIP + r'|[(){}]')
+
+# fn の直後の「名前(」と、引数リストの「)」の後ろの「{」
+HEADER_PATTERN = re.compile(r'[ \t\n]+([a-zA-Z_][a-zA-Z0-9_]*)[ \t\n]*\(')
+BODY_OPEN_PATTERN = re.compile(r'[ \t\n]*\{')
+# unsafe fn / async fn は別のノードになるので遅延させない
+PREFIX_PATTERN = re.compile(r'(?<![A-Za-z0-9_])(unsafe|async)[ \t\n]*$')
+PREFIX_WINDOW = 32
+
+
+def find_closing(source, pattern, pos, open_char, close_char):
+    """pos の直後から対応する閉じ括弧を探し、その位置を返す（なければNone）"""
+    depth = 1
+    while True:
+        m = pattern.search(source, pos)
+        if m is None:
+            return None
+        text = m.group()
+        pos = m.end()
+        if text == open_char:
+            depth += 1
+        elif text == close_char:
+            depth -= 1
+            if depth == 0:
+                return m.start()
+        elif text in '{}':
+            return None  # 引数リストの中の波括弧は想定しない
+
+
+def find_functions(source):
+    """トップレベルの `fn 名前(引数) { ボディ }` のボディの範囲 [(開始, 終了)] を返す"""
+    bodies = []
+    depth = 0
+    pos = 0
+    while True:
+        m = TOPLEVEL_PATTERN.search(source, pos)
+        if m is None:
+            return bodies
+        text = m.group()
+        pos = m.end()
+        if text == '{':
+            depth += 1
+        elif text == '}':
+            depth -= 1
+        elif text == 'fn' and depth == 0:
+            if PREFIX_PATTERN.search(source, max(0, m.start() - PREFIX_WINDOW), m.start()):
+                continue
+            header = HEADER_PATTERN.match(source, pos)
+            if header is None:
+                continue
+            params_end = find_closing(source, PAREN_PATTERN, header.end(), '(', ')')
+            if params_end is None:
+                continue
+            body_open = BODY_OPEN_PATTERN.match(source, params_end + 1)
+            if body_open is None:
+                continue
+            body_end = find_closing(source, BRACE_PATTERN, body_open.end(), '{', '}')
+            if body_end is None:
+                return bodies
+            body_start = body_open.end()
+            # 空のボディは通常どおりパースさせる（構文エラーの扱いを変えないため）
+            if source[body_start:body_end].strip():
+                bodies.append((body_start, body_end))
+            pos = body_end + 1
+
+
+def split_source(source):
+    """関数のボディを識別子に置き換えたスケルトンと、識別子 -> (開始, 終了, 開始行) の辞書を返す
+
+    置き換えたボディと同じ数の改行を残すので、スケルトンの行番号は元のソースと変わらない。
+    """
+    pieces = []
+    bodies = {}
+    last = 0
+    lineno = 1
+    for index, (start, end) in enumerate(find_functions(source)):
+        lineno += source.count('\n', last, start)
+        placeholder = f"{PLACEHOLDER_PREFIX}{index}"
+        newlines = source.count('\n', start, end)
+        pieces.append(source[last:start])
+        pieces.append(f" {placeholder} " + "\n" * newlines)
+        bodies[placeholder] = (start, end, lineno)
+        lineno += newlines
+        last = end
+    pieces.append(source[last:])
+    return ''.join(pieces), bodies
+
+
+def attach_bodies(ast, bodies):
+    """スケルトンのASTの識別子だけのボディを LAZY_BODY ノードに置き換えたリストを返す"""
+    if not isinstance(ast, list):
+        return ast
+    result = []
+    for stmt in ast:
+        if (isinstance(stmt, tuple) and len(stmt) == 5 and stmt[0] == 'function'
+                and isinstance(stmt[4], list) and len(stmt[4]) == 1 and stmt[4][0] in bodies):
+            stmt = stmt[:4] + ((LAZY_BODY,) + bodies[stmt[4][0]],)
+        result.append(stmt)
+    return result
+
+
+def is_lazy_body(body):
+    return isinstance(body, tuple) and len(body) == 4 and body[0] == LAZY_BODY
+
+
+# トップレベルの項目（fn, struct, impl, use, const, mod など）の区切り
+ITEM_PATTERN = re.compile(SKIP + r'|[{}()\[\];]')
+OPENERS = '{(['
+CLOSERS = '})]'
+# 項目の直後のセミコロン（`struct S { .. };` など）は同じ項目に含める
+TRAILING_SEMICOLON = re.compile(r'[ \t\n]*;')
+# トークンを含むかどうかの判定用（コメントを除いて空白以外が残るか）
+COMMENT_PATTERN = re.compile(r'//.*|/\*[\s\S]*?\*/')
+
+
+def item_end(source, pos):
+    """pos から始まる項目の終端（括弧の外の '}' か ';' の直後）を返す。終端がなければソースの末尾"""
+    depth = 0
+    while True:
+        m = ITEM_PATTERN.search(source, pos)
+        if m is None:
+            return len(source)
+        text = m.group()
+        pos = m.end()
+        if len(text) != 1:
+            continue  # 文字列とコメント
+        if text in OPENERS:
+            depth += 1
+        elif text in CLOSERS:
+            depth -= 1
+            if depth <= 0 and text == '}':
+                semicolon = TRAILING_SEMICOLON.match(source, pos)
+                return semicolon.end() if semicolon else pos
+            depth = max(depth, 0)
+        elif text == ';' and depth == 0:
+            return pos
+
+
+def split_items(source, pos=0):
+    """pos 以降をトップレベルの項目に分け、(開始, 終了) を順に返すジェネレーター
+
+    項目の前の空白やコメントはその項目に含めるので、範囲は隙間なくソース全体を覆う。
+    各項目は括弧の外から始まるので、項目ごとに字句解析・パースしても全体をパースしたときと同じ文になる。
+    """
+    while pos < len(source):
+        end = item_end(source, pos)
+        yield pos, end
+        pos = end
+
+
+def has_tokens(text):
+    """空白とコメントだけの項目でなければTrue"""
+    return bool(COMMENT_PATTERN.sub('', text).strip())
@@ -0,0 +1,521 @@
+# よく呼ばれる関数のPythonのソースへの変換（--jit）
+#
+# ツリー評価で関数ごとの呼び出し回数を数え、しきい値を超えた関数のボディを同じ動作のPythonのソースに変換し、
+# compile() して以後の呼び出しに使う。変換するのは次のノードだけでできている関数:
+#   数値、変数の参照、二項演算、if、loop、break、for（range などの反復）、match、let、return、range、
+#   構造体のインスタンス生成とフィールドの参照、as、vec!、添字、メソッド呼び出し、
+#   optimizer の invariant / invariant_scope、同じく変換できる関数の（引数の数が合う）呼び出し
+# 呼び出す関数もまとめて1つのモジュールに変換し、関数どうしはPythonの関数呼び出しで直接呼び合う。
+# move、async、構造体の宣言などを含む関数や、変換できない関数を呼び出す関数は変換せず、ツリー評価のまま実行する。
+# 値としての 'break'（ブロックを打ち切る）や、未代入のローカル変数がグローバル変数を読むことなど、評価器と同じ動作にする。
+import linecache
+import os
+import sys
+
+from astnodes import Node, to_tuples
+from simulator import UNBOUND, match_pattern, param_name
+from structs import field_value
+from fixedint import cast
+from rustvec import RustVec, index_value, make_vec
+
+# 変換するまでの呼び出し回数の既定値
+JIT_THRESHOLD = 100
+# 生成するPythonのソースの字下げの深さの上限（Pythonの上限の100より小さくする）
+MAX_INDENT = 80
+
+# ブロックの値が 'break' になりえない（途中で打ち切る判定がいらない）文
+NO_BREAK_NODES = ('let', 'for', 'loop', 'binary_op', 'range')
+
+
+class Unsupported(Exception):
+    """変換できないノードや関数が見つかった"""
+
+
+def python_name(prefix, name, index):
+    """Rustの名前をPythonの識別子にする（使えない名前は番号で表す）"""
+    if isinstance(name, str) and name.isidentifier():
+        return f"{prefix}_{name}"
+    return f"{prefix}{index}"
+
+
+class FunctionTranslator:
+    """1つの関数のボディをPythonの関数定義のソースに変換する"""
+
+    def __init__(self, func_name, params, body, scope, group, constants):
+        self.func_name = func_name
+        self.params = params
+        self.body = body
+        self.scope = scope
+        self.group = group  # 同じモジュールに変換する関数名 -> (Pythonの関数名, 引数の数)
+        self.constants = constants  # リテラルで書けない定数（K[番号] で参照する）
+        self.lines = []
+        self.depth = 1
+        self.temps = set()
+        self.invariant_scopes = []  # 実行中の invariant_scope ごとの一時変数名のリスト
+        self.local_names = {name: python_name('v', name, slot) for name, slot in scope.slots.items()}
+        self.param_names = {param_name(param) for param in params}
+
+    def emit(self, line):
+        if self.depth > MAX_INDENT:
+            raise Unsupported("入れ子が深すぎます")
+        self.lines.append("    " * self.depth + line)
+
+    def temp(self):
+        name = f"t{len(self.temps) + 1}"
+        self.temps.add(name)
+        return name
+
+    def constant(self, value):
+        if value is None or type(value) in (int, bool):
+            return repr(value)
+        self.constants.append(value)
+        return f"K[{len(self.constants) - 1}]"
+
+    def translate(self):
+        """def 文のソース"""
+        python_params = [self.local_names.get(param_name(param), f"p{index}")
+                         for index, param in enumerate(self.params)]
+        header = f"def {self.group[self.func_name][0]}({', '.join(python_params)}):"
+        for name, python in self.local_names.items():
+            if name not in self.param_names:
+                self.emit(f"{python} = UNBOUND")
+        self.block(self.body, "result")
+        self.emit("return result")
+        return "\n".join([f"# {self.func_name}", header] + self.lines)
+
+    # --- 文（値を target に代入する命令列） ---
+
+    def block(self, body, target):
+        """ブロック（文のリストか1つのノード）の値を target に代入する。'break' になった文で打ち切る"""
+        if not isinstance(body, list):
+            self.statement(body, target)
+            return
+        if not body:
+            self.emit(f"{target} = None")
+            return
+        opened = 0
+        for index, stmt in enumerate(body):
+            self.statement(stmt, target)
+            if index < len(body) - 1 and self.may_break(stmt):
+                self.emit(f"if {target} != 'break':")
+                self.depth += 1
+                opened += 1
+        self.depth -= opened
+
+    def may_break(self, node):
+        if not isinstance(node, tuple) or not node:
+            return True
+        if node[0] == 'number':
+            return node[1] == 'break'
+        return node[0] not in NO_BREAK_NODES
+
+    def statement(self, node, target):
+        if isinstance(node, list):
+            self.block(node, target)
+            return
+        if not isinstance(node, tuple) or not node or type(node[0]) is not str:
+            raise Unsupported(f"ノードでない値 {node!r}")
+        node_type = node[0]
+
+        if node_type == 'let' and len(node) == 3:
+            var_name = node[1]
+            if var_name not in self.local_names:
+                raise Unsupported("ローカル変数でない let")
+            value = self.expression(node[2])
+            python = self.local_names[var_name]
+            self.emit(f"{python} = {value}")
+            message = f"Variable '{var_name}' = "
+            self.emit(f"print({message!r} + format({python}))")
+            self.emit(f"{target} = None")
+
+        elif node_type == 'if' and len(node) in (3, 4):
+            condition = self.expression(node[1])
+            self.emit(f"if {condition}:")
+            self.depth += 1
+            self.block(node[2], target)
+            self.depth -= 1
+            self.emit("else:")
+            self.depth += 1
+            if len(node) > 3 and node[3] is not None:
+                self.block(node[3], target)
+            else:
+                self.emit(f"{target} = None")
+            self.depth -= 1
+
+        elif node_type == 'loop' and len(node) == 2:
+            result = self.temp()
+            self.emit("while True:")
+            self.depth += 1
+            self.block(node[1], result)
+            self.emit(f"if {result} == 'break':")
+            self.emit("    break")
+            self.depth -= 1
+            self.emit(f"{target} = None")
+
+        elif node_type == 'break' and len(node) <= 2:
+            self.emit(f"{target} = 'break'")
+
+        elif node_type == 'for' and len(node) == 4:
+            if node[1] not in self.local_names:
+                raise Unsupported("ローカル変数でない for の変数")
+            iterable = self.expression(node[2])
+            self.emit(f"for {self.local_names[node[1]]} in {iterable}:")
+            self.depth += 1
+            self.block(node[3], self.temp())  # ボディの値は使わない（'break' でも for は止まらない）
+            self.depth -= 1
+            self.emit(f"{target} = None")
+
+        elif node_type == 'match' and len(node) == 3:
+            if any(len(arm) == 3 for arm in node[2]):
+                raise Unsupported("ガード付きの腕を含む 'match' ノード")
+            subject = self.temp()
+            self.emit(f"{subject} = {self.expression(node[1])}")
+            keyword = "if"
+            for pattern, body in node[2]:
+                self.emit(f"{keyword} match_pattern({self.constant(pattern)}, {subject}):")
+                self.depth += 1
+                self.block(body, target)
+                self.depth -= 1
+                keyword = "elif"
+            if keyword == "if":
+                self.emit(f"{target} = None")
+            else:
+                self.emit("else:")
+                self.emit(f"    {target} = None")
+
+        elif node_type == 'invariant_scope' and len(node) == 3:
+            names = [f"i{len(self.invariant_scopes)}_{index}" for index in range(node[1])]
+            for name in names:
+                self.emit(f"{name} = UNBOUND")  # ループに入るたびに評価し直す
+            self.invariant_scopes.append(names)
+            try:
+                self.statement(node[2], target)
+            finally:
+                self.invariant_scopes.pop()
+
+        elif node_type == 'return' and len(node) == 2:
+            self.statement(node[1], target)
+
+        else:
+            self.emit(f"{target} = {self.expression(node)}")
+
+    # --- 式 ---
+
+    def complex(self, node):
+        """式として書けず、文に展開する必要があるノードか"""
+        if isinstance(node, list):
+            return True
+        if not isinstance(node, tuple) or not node:
+            return False
+        node_type = node[0]
+        if node_type in ('number', 'identifier'):
+            return False
+        if node_type == 'binary_op' and len(node) == 4:
+            return self.complex(node[1]) or self.complex(node[3])
+        if node_type == 'call' and len(node) == 3:
+            return any(self.complex(arg) for arg in node[2])
+        if node_type == 'range' and len(node) == 3:
+            return self.complex(node[1]) or self.complex(node[2])
+        if node_type == 'return' and len(node) == 2:
+            return self.complex(node[1])
+        if node_type in ('field_access', 'cast', 'method_chain') and len(node) == 3:
+            return self.complex(node[1])
+        if node_type == 'index' and len(node) == 3:
+            return self.complex(node[1]) or self.complex(node[2])
+        if node_type == 'vec' and len(node) == 3:
+            return any(self.complex(item) for item in node[2])
+        if node_type == 'vec_repeat' and len(node) == 4:
+            return self.complex(node[2]) or self.complex(node[3])
+        if node_type == 'method_chain_with_params' and len(node) == 4:
+            return self.complex(node[1]) or any(self.complex(arg) for arg in node[3])
+        if node_type == 'struct' and len(node) == 3 and isinstance(node[2], dict):
+            return any(self.complex(value) for value in node[2].values())
+        return True
+
+    def operands(self, nodes):
+        """左から順に評価する式のリスト。後ろに文に展開する式があれば、前の式は先に一時変数に入れる
+        （展開した文が let で変数を書き換えたり print したりするより前に評価するため）"""
+        values = []
+        for node in nodes:
+            if self.complex(node):
+                for index, value in enumerate(values):
+                    if value not in self.temps:
+                        temp = self.temp()
+                        self.emit(f"{temp} = {value}")
+                        values[index] = temp
+            values.append(self.expression(node))
+        return values
+
+    def expression(self, node):
+        """ノードの値を表すPythonの式（必要なら文を出力して一時変数にする）"""
+        if isinstance(node, list):
+            temp = self.temp()
+            self.block(node, temp)
+            return temp
+        if not isinstance(node, tuple) or not node or type(node[0]) is not str:
+            raise Unsupported(f"ノードでない値 {node!r}")
+        node_type = node[0]
+
+        if node_type == 'number' and len(node) == 2:
+            return self.constant(node[1])
+
+        elif node_type == 'identifier' and len(node) == 2:
+            var_name = node[1]
+            python = self.local_names.get(var_name)
+            if python is None:
+                return f"variables.get({var_name!r})"
+            if var_name in self.param_names:
+                return python
+            # 未代入のローカル変数はグローバル変数を読む
+            return f"({python} if {python} is not UNBOUND else variables.get({var_name!r}))"
+
+        elif node_type == 'binary_op' and len(node) == 4:
+            left, right = self.operands([node[1], node[3]])
+            if node[2] in ('+', '-', '*', '/'):
+                return f"({left} {node[2]} {right})"
+            return f"other_op({left}, {right})"
+
+        elif node_type == 'call' and len(node) == 3:
+            callee = self.group.get(node[1])
+            if callee is None or callee[1] != len(node[2]):
+                raise Unsupported(f"変換できない関数 '{node[1]}' の呼び出し")
+            return f"{callee[0]}({', '.join(self.operands(node[2]))})"
+
+        elif node_type == 'range' and len(node) == 3:
+            start, end = self.operands([node[1], node[2]])
+            return f"range({start}, {end})"
+
+        elif node_type == 'return' and len(node) == 2:
+            return self.expression(node[1])
+
+        elif node_type == 'field_access' and len(node) == 3:
+            return f"field_value({self.expression(node[1])}, {node[2]!r})"
+
+        elif node_type == 'struct' and len(node) == 3 and isinstance(node[2], dict):
+            values = self.operands(list(node[2].values()))
+            return f"make_struct({node[1]!r}, {tuple(node[2])!r}, [{', '.join(values)}])"
+
+        elif node_type == 'cast' and len(node) == 3:
+            return f"cast({self.expression(node[1])}, {node[2]!r}, WRAPPING)"
+
+        elif node_type == 'index' and len(node) == 3:
+            value, key = self.operands([node[1], node[2]])
+            return f"index_value({value}, {key})"
+
+        elif node_type == 'vec' and len(node) == 3:
+            return f"make_vec({node[1]!r}, [{', '.join(self.operands(node[2]))}], WRAPPING)"
+
+        elif node_type == 'vec_repeat' and len(node) == 4:
+            value, count = self.operands([node[2], node[3]])
+            return f"RustVec.repeat({node[1]!r}, {value}, {count}, WRAPPING)"
+
+        elif node_type in ('method_chain', 'method_chain_with_params') and len(node) in (3, 4):
+            args = node[3] if node_type == 'method_chain_with_params' else []
+            values = self.operands([node[1]] + list(args))
+            return f"call_method({values[0]}, {node[2]!r}, [{', '.join(values[1:])}])"
+
+        elif node_type == 'invariant' and len(node) == 3:
+            if not self.invariant_scopes:
+                raise Unsupported("invariant_scope の外の invariant")
+            name = self.invariant_scopes[-1][node[1]]
+            self.emit(f"if {name} is UNBOUND:")
+            self.depth += 1
+            self.emit(f"{name} = {self.expression(node[2])}")
+            self.depth -= 1
+            return name
+
+        elif node_type in ('if', 'loop', 'break', 'for', 'match', 'let', 'invariant_scope'):
+            temp = self.temp()
+            self.statement(node, temp)
+            return temp
+
+        raise Unsupported(f"'{node_type}' ノード")
+
+
+def other_op(left, right):
+    """+ - * / 以外の二項演算（評価器と同じく値はNone）"""
+    return None
+
+
+def callees(body):
+    """ボディの中で呼び出す関数名"""
+    names = set()
+    pending = [body]
+    while pending:
+        node = pending.pop()
+        if isinstance(node, list):
+            pending.extend(node)
+        elif isinstance(node, tuple) and node and type(node[0]) is str:
+            if node[0] == 'call' and len(node) == 3:
+                names.add(node[1])
+            for child in node[1:]:
+                if isinstance(child, (list, tuple)):
+                    pending.append(child)
+                elif isinstance(child, dict):
+                    pending.extend(child.values())
+    return names
+
+
+class TieredCompiler:
+    """呼び出し回数を数え、よく呼ばれる関数をPythonのソースに変換して使う"""
+
+    def __init__(self, threshold=JIT_THRESHOLD, dump_dir=None):
+        self.threshold = threshold
+        self.dump_dir = dump_dir  # 生成したソースを書き出すディレクトリ（None なら書き出さない）
+        self.counts = {}  # 関数名 -> 変換を試すまでの呼び出し回数
+        self.compiled = {}  # 関数名 -> (Pythonの関数, 引数の数, 参照する変数名)
+        self.rejected = {}  # 関数名 -> 変換しなかった理由
+        self.sources = {}  # 変換を始めた関数名 -> 生成したモジュールのソース
+
+    def invalidate(self, clear=True):
+        """関数の定義が変わったときに呼ぶ（変換済みの関数は古いボディを直接呼び合っているので捨てる）
+
+        clear=False なら変換済みの関数は残し、変換しなかった関数だけを数え直す（遅延させたボディを読み込んだとき）
+        """
+        if clear:
+            self.compiled.clear()
+        self.rejected.clear()
+        self.counts.clear()
+
+    def lookup(self, simulator, func_name, args):
+        """変換済みの関数（使えなければNone）。呼び出し回数がしきい値に達したらここで変換する"""
+        entry = self.compiled.get(func_name)
+        if entry is None:
+            if func_name in self.rejected:
+                return None
+            count = self.counts.get(func_name, 0) + 1
+            self.counts[func_name] = count
+            if count < self.threshold:
+                return None
+            entry = self.compile(simulator, func_name)
+            if entry is None:
+                return None
+        function, param_count, names = entry
+        if len(args) != param_count:
+            return None  # 足りない引数はグローバル変数から読まれる
+        ownership = simulator.ownership
+        for var_name in names:
+            if ownership.get(var_name) == 'moved':
+                return None  # 借用エラーはツリー評価で出す
+        return function
+
+    def compile(self, simulator, func_name):
+        try:
+            if simulator.max_depth < sys.getrecursionlimit():
+                # 変換した関数は呼び出しの深さを数えないので、Pythonの上限より小さい上限は守れない
+                raise Unsupported(f"--max-depth {simulator.max_depth} が小さすぎます")
+            group = self.collect_group(simulator, func_name)
+            source, constants = self.translate(simulator, func_name, group)
+            filename = f"<jit {func_name}>"
+            code = compile(source, filename, 'exec')
+        except (Unsupported, SyntaxError, RecursionError) as e:
+            reason = str(e) if isinstance(e, Unsupported) else type(e).__name__
+            self.rejected[func_name] = reason
+            return None
+        # トレースバックに生成したソースの行を表示できるようにする
+        linecache.cache[filename] = (len(source), None, source.splitlines(True), filename)
+        namespace = {
+            'UNBOUND': UNBOUND,
+            'K': constants,
+            'variables': simulator.variables,
+            'match_pattern': match_pattern,
+            'other_op': other_op,
+            'field_value': field_value,
+            'make_struct': simulator.make_struct,
+            'call_method': simulator.call_method,
+            'cast': cast,
+            'index_value': index_value,
+            'make_vec': make_vec,
+            'RustVec': RustVec,
+            'WRAPPING': simulator.wrapping,
+        }
+        exec(code, namespace)
+        self.sources[func_name] = source
+        if self.dump_dir is not None:
+            os.makedirs(self.dump_dir, exist_ok=True)
+            path = os.path.join(self.dump_dir, f"{python_name('jit', func_name, len(self.sources))}.py")
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(source)
+        for name, (python, param_count, names) in group.items():
+            if name not in self.compiled:
+                self.compiled[name] = (namespace[python], param_count, names)
+        return self.compiled[func_name]
+
+    def collect_group(self, simulator, func_name):
+        """func_name と、そこから呼び出しうる関数の 関数名 -> (Pythonの関数名, 引数の数, 参照する変数名)
+
+        参照する変数名には呼び出し先の関数で参照するものも含める
+        （変換した関数どうしは直接呼び合い、呼び出し先では借用チェックをしないため）。
+        """
+        functions = {}
+        pending = [func_name]
+        while pending:
+            name = pending.pop()
+            if name in functions:
+                continue
+            entry = simulator.functions.get(name)
+            if entry is None or entry[2] is None:
+                raise Unsupported(f"関数 '{name}' のボディがまだ読み込まれていません")
+            params, body, scope = entry
+            body = tuples(body)
+            functions[name] = (len(params), {node[1] for node in iter_identifiers(body)}, callees(body))
+            pending.extend(functions[name][2])
+
+        group = {}
+        for name, (param_count, _, _) in functions.items():
+            names = set()
+            visited = set()
+            pending = [name]
+            while pending:
+                callee = pending.pop()
+                if callee in visited:
+                    continue
+                visited.add(callee)
+                names |= functions[callee][1]
+                pending.extend(functions[callee][2])
+            group[name] = (python_name('f', name, len(group)), param_count, tuple(names))
+        return group
+
+    def translate(self, simulator, func_name, group):
+        """グループの関数をまとめた1つのモジュールのソースと、定数のリスト"""
+        constants = []
+        calls = {name: (python, param_count) for name, (python, param_count, _) in group.items()}
+        definitions = []
+        for name in group:
+            params, body, scope = simulator.functions[name]
+            body = tuples(body)
+            try:
+                definitions.append(FunctionTranslator(name, params, body, scope, calls, constants).translate())
+            except Unsupported as e:
+                raise Unsupported(f"関数 '{name}': {e}") from None
+        header = f"# '{func_name}' から呼び出しうる関数をPythonに変換したもの（transpile.TieredCompiler）"
+        return "\n\n".join([header] + definitions) + "\n", constants
+
+    def stats(self):
+        return {
+            "compiled": sorted(self.compiled),
+            "rejected": dict(sorted(self.rejected.items())),
+            "threshold": self.threshold,
+        }
+
+
+def tuples(body):
+    """ノードクラスのボディはタプル形式に戻す"""
+    if isinstance(body, Node) or (isinstance(body, list) and any(isinstance(stmt, Node) for stmt in body)):
+        return to_tuples(body)
+    return body
+
+
+def iter_identifiers(body):
+    """ボディの中の変数の参照ノード"""
+    pending = [body]
+    while pending:
+        node = pending.pop()
+        if isinstance(node, list):
+            pending.extend(node)
+        elif isinstance(node, tuple) and node and type(node[0]) is str:
+            if node[0] == 'identifier' and len(node) == 2:
+                yield node
+            for child in node[1:]:
+                if isinstance(child, (list, tuple)):
+                    pending.append(child)
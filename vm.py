@@ -0,0 +1,366 @@
+from compiler import (
+    compile_ast,
+    LOAD_CONST, LOAD_NAME, STORE_LET, STORE_NAME, MOVE, POP_TOP,
+    BINARY_ADD, BINARY_SUB, BINARY_MUL, BINARY_DIV, BINARY_OTHER,
+    JUMP, POP_JUMP_IF_FALSE, JUMP_IF_BREAK, POP_JUMP_IF_BREAK, GET_ITER, FOR_ITER,
+    CALL, BUILD_RANGE, MATCH_PATTERN, BUILD_STRUCT, MAKE_OK, MAKE_ERR,
+    DEFINE_FUNCTION, DEFINE_GENERIC, ASYNC, RETURN_VALUE,
+    BINARY_ADD_CONST, BINARY_SUB_CONST, BINARY_MUL_CONST, BINARY_DIV_CONST, POP_JUMP,
+    LOAD_LOCAL, STORE_LOCAL, STORE_LET_LOCAL, MOVE_LOCAL,
+    DEFINE_ASYNC_FUNCTION, AWAIT, JOIN, SPAWN, SLEEP, MATCH_JUMP, DEFINE_STRUCT, LOAD_FIELD,
+    CAST, BUILD_VEC, VEC_REPEAT, BINARY_INDEX, CALL_METHOD, MAKE_CLOSURE,
+)
+from simulator import RustSimulator, RustResult, StackOverflowError, MISSING, MOVED, UNBOUND, moved_error
+from fixedint import cast
+from rustvec import RustVec, index_value, make_vec
+
+
+class RustVM(RustSimulator):
+    """ASTをバイトコードにコンパイルしてスタックマシンで実行するシミュレータ"""
+
+    def __init__(self):
+        super().__init__()
+        self.code_cache = {}  # id(ノード) -> (ノード, スコープ, Code)
+
+    def compile(self, node, scope):
+        """ノードのコンパイル結果を返す（同じノードとスコープの組は一度だけコンパイル）"""
+        entry = self.code_cache.get(id(node))
+        if entry is None or entry[0] is not node or entry[1] is not scope:
+            entry = (node, scope, compile_ast(node, scope.slots))
+            self.code_cache[id(node)] = entry
+        return entry[2]
+
+    def eval_ast(self, node):
+        """ASTノードを現在のスコープでコンパイルして実行"""
+        return self.run(self.compile(node, self.scope))
+
+    def eval_body(self, body, scope):
+        """関数のボディをスロット解決済みの命令列として実行"""
+        return self.run(self.compile(body, scope))
+
+    def run(self, code):
+        """命令列を実行して最後の値を返す
+
+        関数呼び出しはPythonの再帰ではなく、呼び出し元の実行状態を calls に積んで呼び出し先の命令列に切り替える。
+        そのため呼び出しの深さはPythonのスタックの上限ではなく max_depth で決まる。
+        """
+        ops = code.ops
+        consts = code.consts
+        names = code.names
+        ownership = self.ownership
+        varnames = code.varnames
+        variables = self.variables
+        local_values = self.locals
+        frames = self.frames
+        functions = self.functions
+        max_depth = self.max_depth
+        memo = self.memo
+        calls = []  # この run の中で呼び出し中の関数の、呼び出し元の (命令列, 戻り先, 値スタック, メモのキー)
+        stack = []
+        push = stack.append
+        pop = stack.pop
+        pc = 0
+
+        try:
+            while True:
+                op = ops[pc]
+                arg = ops[pc + 1]
+                pc += 2
+
+                # 実行頻度の高い命令から順に判定する
+                if op == LOAD_LOCAL:
+                    value = local_values[arg]
+                    if value is UNBOUND:
+                        var_name = varnames[arg]
+                        if ownership.get(var_name) == 'moved':
+                            self.borrow_check(var_name)
+                        value = variables.get(var_name, None)
+                    elif value is MOVED:
+                        raise moved_error(varnames[arg])
+                    push(value)
+
+                elif op == LOAD_NAME:
+                    var_name = names[arg]
+                    if ownership.get(var_name) == 'moved':
+                        self.borrow_check(var_name)
+                    push(variables.get(var_name, None))
+
+                elif op == LOAD_CONST:
+                    push(consts[arg])
+
+                elif op == BINARY_ADD_CONST:
+                    stack[-1] = stack[-1] + consts[arg]
+
+                elif op == BINARY_SUB_CONST:
+                    stack[-1] = stack[-1] - consts[arg]
+
+                elif op == POP_JUMP_IF_FALSE:
+                    if not pop():
+                        pc = arg
+
+                elif op == JUMP:
+                    pc = arg
+
+                elif op == FOR_ITER:
+                    try:
+                        push(next(stack[-1]))
+                    except StopIteration:
+                        pop()
+                        pc = arg
+
+                elif op == STORE_LOCAL:
+                    local_values[arg] = pop()
+
+                elif op == STORE_NAME:
+                    variables[names[arg]] = pop()
+
+                elif op == POP_JUMP:
+                    pop()
+                    pc = arg
+
+                elif op == BINARY_MUL_CONST:
+                    stack[-1] = stack[-1] * consts[arg]
+
+                elif op == BINARY_DIV_CONST:
+                    stack[-1] = stack[-1] / consts[arg]
+
+                elif op == BINARY_ADD:
+                    right = pop()
+                    stack[-1] = stack[-1] + right
+
+                elif op == BINARY_SUB:
+                    right = pop()
+                    stack[-1] = stack[-1] - right
+
+                elif op == BINARY_MUL:
+                    right = pop()
+                    stack[-1] = stack[-1] * right
+
+                elif op == BINARY_DIV:
+                    right = pop()
+                    stack[-1] = stack[-1] / right
+
+                elif op == POP_JUMP_IF_BREAK:
+                    if pop() == 'break':
+                        pc = arg
+
+                elif op == JUMP_IF_BREAK:
+                    if stack[-1] == 'break':
+                        pc = arg
+                    else:
+                        pop()
+
+                elif op == POP_TOP:
+                    pop()
+
+                elif op == CALL:
+                    func_name, argc = consts[arg]
+                    if argc:
+                        args = stack[-argc:]
+                        del stack[-argc:]
+                    else:
+                        args = []
+                    entry = functions.get(func_name)
+                    if entry is None:
+                        # async fn（未定義ならエラー）
+                        push(self.call_function(func_name, args))
+                        continue
+                    params, body, scope = entry
+                    if scope is None:
+                        params, body, scope = self.load_function_body(func_name)
+                    memo_key = None
+                    if memo is not None:
+                        memo_key = memo.key(self, func_name, args)
+                        if memo_key is not None:
+                            value = memo.get(memo_key)
+                            if value is not MISSING:
+                                push(value)
+                                continue
+                    if len(frames) >= max_depth:
+                        raise StackOverflowError(func_name, len(frames))
+                    # 呼び出し元の実行状態を保存して、呼び出し先の命令列に切り替える
+                    frames.append((self.scope, local_values))
+                    calls.append((code, pc, stack, memo_key))
+                    code = self.compile(body, scope)
+                    ops = code.ops
+                    consts = code.consts
+                    names = code.names
+                    varnames = code.varnames
+                    self.scope = scope
+                    self.locals = local_values = scope.new_frame(args)
+                    stack = []
+                    push = stack.append
+                    pop = stack.pop
+                    pc = 0
+
+                elif op == STORE_LET:
+                    var_name = names[arg]
+                    value = pop()
+                    variables[var_name] = value
+                    ownership[var_name] = 'owned'  # 所有権を設定
+                    print(f"Variable '{var_name}' = {value}")
+                    push(None)
+
+                elif op == STORE_LET_LOCAL:
+                    var_name = varnames[arg]
+                    value = pop()
+                    local_values[arg] = value  # 移動済みのスロットも新しい値で所有権が戻る
+                    print(f"Variable '{var_name}' = {value}")
+                    push(None)
+
+                elif op == MOVE_LOCAL:
+                    value = local_values[arg]
+                    if value is UNBOUND:
+                        var_name = varnames[arg]
+                        self.borrow_check(var_name)
+                        value = variables.get(var_name, None)
+                        self.move_variable(var_name)
+                    elif value is MOVED:
+                        raise moved_error(varnames[arg])
+                    else:
+                        local_values[arg] = MOVED
+                    push(value)
+
+                elif op == MOVE:
+                    var_name = names[arg]
+                    self.borrow_check(var_name)
+                    value = variables[var_name]
+                    self.move_variable(var_name)
+                    push(value)
+
+                elif op == MATCH_JUMP:
+                    table, targets = consts[arg]
+                    index = table.select(pop())
+                    pc = targets[-1] if index is None else targets[index]
+
+                elif op == MATCH_PATTERN:
+                    push(self.match_pattern(consts[arg], stack[-1]))
+
+                elif op == GET_ITER:
+                    stack[-1] = iter(stack[-1])
+
+                elif op == BUILD_RANGE:
+                    end = pop()
+                    stack[-1] = range(stack[-1], end)
+
+                elif op == BINARY_OTHER:
+                    pop()
+                    stack[-1] = None
+
+                elif op == BUILD_STRUCT:
+                    struct_name, keys = consts[arg]
+                    if keys:
+                        values = stack[-len(keys):]
+                        del stack[-len(keys):]
+                    else:
+                        values = []
+                    push(self.make_struct(struct_name, keys, values))
+
+                elif op == LOAD_FIELD:
+                    site = consts[arg]
+                    value = stack[-1]
+                    if type(value) is site.cls:
+                        stack[-1] = site.getter(value)
+                    else:
+                        stack[-1] = site.load(value)
+
+                elif op == DEFINE_STRUCT:
+                    self.define_struct(consts[arg])
+                    push(None)
+
+                elif op == BINARY_INDEX:
+                    key = pop()
+                    stack[-1] = index_value(stack[-1], key)
+
+                elif op == CALL_METHOD:
+                    method, argc = consts[arg]
+                    if argc:
+                        args = stack[-argc:]
+                        del stack[-argc:]
+                    else:
+                        args = []
+                    stack[-1] = self.call_method(stack[-1], method, args)
+
+                elif op == MAKE_CLOSURE:
+                    push(self.make_closure(consts[arg]))
+
+                elif op == CAST:
+                    stack[-1] = cast(stack[-1], consts[arg], self.wrapping)
+
+                elif op == BUILD_VEC:
+                    elem_type, count = consts[arg]
+                    if count:
+                        values = stack[-count:]
+                        del stack[-count:]
+                    else:
+                        values = []
+                    push(make_vec(elem_type, values, self.wrapping))
+
+                elif op == VEC_REPEAT:
+                    count = pop()
+                    stack[-1] = RustVec.repeat(consts[arg], stack[-1], count, self.wrapping)
+
+                elif op == MAKE_OK:
+                    stack[-1] = RustResult(ok=stack[-1])
+
+                elif op == MAKE_ERR:
+                    stack[-1] = RustResult(err=stack[-1])
+
+                elif op == DEFINE_FUNCTION:
+                    func_name, params, body = consts[arg]
+                    self.define_function(func_name, params, body)
+                    push(None)
+
+                elif op == DEFINE_GENERIC:
+                    func_name, generic_type = consts[arg]
+                    self.generic_types[func_name] = generic_type
+                    print(f"Generic function '{func_name}' with type '{generic_type}' defined.")
+                    push(None)
+
+                elif op == ASYNC:
+                    push(self.run_async(consts[arg]))
+
+                elif op == DEFINE_ASYNC_FUNCTION:
+                    func_name, params, body = consts[arg]
+                    self.define_async_function(func_name, params, body)
+                    push(None)
+
+                elif op == AWAIT:
+                    push(self.async_runtime().await_node(consts[arg]))
+
+                elif op == JOIN:
+                    push(self.async_runtime().join_nodes(consts[arg]))
+
+                elif op == SPAWN:
+                    push(self.async_runtime().spawn_node(consts[arg]))
+
+                elif op == SLEEP:
+                    self.async_runtime().sleep(pop())
+                    push(None)
+
+                elif op == RETURN_VALUE:
+                    if not calls:
+                        return pop()
+                    # 呼び出し元に戻り、戻り値を呼び出し元の値スタックに積む
+                    value = pop()
+                    code, pc, stack, memo_key = calls.pop()
+                    if memo_key is not None:
+                        memo.put(memo_key, value)
+                    ops = code.ops
+                    consts = code.consts
+                    names = code.names
+                    varnames = code.varnames
+                    self.scope, self.locals = frames.pop()
+                    local_values = self.locals
+                    push = stack.append
+                    pop = stack.pop
+                    push(value)
+
+                else:
+                    raise RuntimeError(f"Unknown opcode {op} at {pc - 2}")
+        except BaseException:
+            # 呼び出し先で例外が出たら、この run で積んだフレームを外して呼び出し元のスコープに戻す
+            while calls:
+                calls.pop()
+                self.scope, self.locals = frames.pop()
+            raise